@@ -1,14 +1,85 @@
 import os
 import re
+import json
+import logging
+import unicodedata
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-from google import genai
-from google.genai import types
 import time
 import random
 
-from database import db, Pessoas, Classificacao, MovimentoContas, ParcelasContas
+from sqlalchemy import select
+
+from database import db, somente_leitura, MovimentoContas, ParcelasContas
+from cache import CacheTTL, CacheSemantico, embedding_lexical, versao_dados
+import agregacoes
+import documentos
+import invalidacao
+import llm
+import telemetria
+from contexto import empacotar, estimar_tokens, tabela
+
+logger = logging.getLogger(__name__)
+
+# Orçamento de tokens do bloco DADOS do prompt e linhas candidatas ao ranqueamento (ver contexto.py)
+ORCAMENTO_CONTEXTO = int(os.getenv('RAG_CONTEXTO_TOKENS', '1000'))
+CANDIDATOS_CONTEXTO = int(os.getenv('RAG_CONTEXTO_CANDIDATOS', '50'))
+
+# Respostas por (versão dos dados, pergunta normalizada, filtros resolvidos, modelo).
+# RAG_CACHE_TAMANHO=0 ou RAG_CACHE_TTL_S=0 desativa.
+CACHE_RESPOSTAS = CacheTTL(
+    'rag_respostas',
+    tamanho_maximo=int(os.getenv('RAG_CACHE_TAMANHO', '512')),
+    ttl_segundos=int(os.getenv('RAG_CACHE_TTL_S', '600')),
+)
+
+# 'gemini' (text-embedding-004) ou 'lexical' (local, sem rede; ver cache.embedding_lexical)
+EMBEDDINGS_CACHE = os.getenv('RAG_CACHE_SEMANTICO_EMBEDDINGS', 'gemini')
+# Limiar padrão por tipo de embedding. Lexical: em benchmarks/bench_cache_rag.py, com os pares
+# de sentido oposto separados pela assinatura, a precisão é 1,0 de 0,6 para cima; 0,7 fica um
+# passo acima do menor limiar sem erros (cobertura 0,37 contra 0,23 em 0,8)
+LIMIAR_PADRAO = {'gemini': 0.9, 'lexical': 0.7}
+
+# Paráfrases: mesma versão, filtros, registros candidatos e sentido, pergunta com embedding parecido.
+# RAG_CACHE_SEMANTICO_TAMANHO=0 desativa.
+CACHE_SEMANTICO = CacheSemantico(
+    'rag_semantico',
+    tamanho_maximo=int(os.getenv('RAG_CACHE_SEMANTICO_TAMANHO', '256')),
+    ttl_segundos=int(os.getenv('RAG_CACHE_TTL_S', '600')),
+    limiar=float(os.getenv('RAG_CACHE_SEMANTICO_LIMIAR') or LIMIAR_PADRAO.get(EMBEDDINGS_CACHE, 0.9)),
+)
+
+# Entradas de versões antigas saem a cada escrita, sem esperar LRU/TTL
+invalidacao.registrar_cache(CACHE_RESPOSTAS)
+invalidacao.registrar_cache(CACHE_SEMANTICO)
+
+
+def normalizar_pergunta(q: str) -> str:
+    """Minúsculas, sem acentos, espaços colapsados e sem pontuação final ("Despesas do Mês atual?" == "despesas do mes atual")."""
+    q = unicodedata.normalize('NFKD', (q or '').lower())
+    q = ''.join(c for c in q if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', q).strip().rstrip('?!.; ')
+
+
+# Palavras que invertem ou restringem a resposta sem mudar os filtros nem os candidatos
+# recuperados ("maiores" x "menores", "pagas" x "não pagas"). Entram na assinatura do cache
+# semântico: os embeddings dão similaridade alta a esses pares (0,875 e 0,886 no lexical).
+# "maior que"/"menor que" ficam de fora: são filtros de valor, já resolvidos.
+_SENTIDOS = {
+    'crescente': re.compile(r'\b(menor|menores|menos)\b(?! que)|\bmais (baix|barat)|\bminim'),
+    'decrescente': re.compile(r'\b(maior|maiores)\b(?! que)|\bmais (alt|car)|\bmaxim|\btop\b'),
+    'antigas': re.compile(r'\bmais antig|\bprimeir'),
+    'negacao': re.compile(r'\b(nao|sem|nunca|nenhum|nenhuma|exceto)\b'),
+    'pagas': re.compile(r'\bpag[ao]s?\b|\bquitad'),
+    'pendentes': re.compile(r'\bpendentes?\b|\bem aberto\b|\babert[ao]s?\b|\bvencid'),
+}
+
+
+def sentido_pergunta(q: str) -> tuple:
+    """Marcadores de ordem, negação e situação da pergunta (ver _SENTIDOS), em ordem fixa."""
+    normalizada = normalizar_pergunta(q)
+    return tuple(nome for nome, padrao in _SENTIDOS.items() if padrao.search(normalizada))
 
 
 class Agent3:
@@ -17,37 +88,172 @@ class Agent3:
     """
 
     def __init__(self, model_name: str = 'gemini-2.5-flash'):
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
+        if not llm.disponivel():
             raise RuntimeError('GEMINI_API_KEY não configurada.')
-        self.client = genai.Client(api_key=api_key)
+        self.client = llm.cliente()  # Gemini, simulador ou gravação (LLM_BACKEND)
         self.model_name = model_name
 
     def run_query(self, user_query: str) -> Dict[str, Any]:
         if not user_query or not user_query.strip():
             return {"sucesso": False, "erro": "Pergunta vazia."}
 
-        filtros = self._extract_filters(user_query)
-        context_lines = self._retrieve_data(user_query, filtros)
+        # Recuperação no bind de leitura; a conexão é devolvida antes da geração
+        inicio = time.perf_counter()
+        with somente_leitura(), telemetria.estagio('retrieval'):
+            filtros = self._extract_filters(user_query)
+            # A versão e a geração são lidas antes da recuperação: com uma escrita no meio,
+            # a resposta não é gravada (ver invalidacao.geracao)
+            geracao = invalidacao.geracao()
+            chave = self._cache_key(user_query, filtros)
+            if chave is not None:
+                em_cache = CACHE_RESPOSTAS.obter(chave)
+                if em_cache is not None:
+                    return {"sucesso": True, **em_cache, "cache": "exato"}
 
-        # Se não houver dados para o recorte solicitado, tentar uma amostra recente
-        amostra_prefix = ""
-        if not context_lines:
-            amostra = self._fallback_context(n=10)
-            if amostra:
-                amostra_prefix = "[AMOSTRA RECENTE – sem correspondência direta à pergunta]\n"
-                context_lines = amostra
+            pacote = self._prepare_context(user_query, filtros)
+        ms_recuperacao = round((time.perf_counter() - inicio) * 1000, 1)
+
+        # Linhas legíveis do contexto (exibidas na página do RAG)
+        context_lines = pacote['linhas']
+        dados_texto = pacote['texto'] or "(sem dados)"
 
-        # Converte o contexto em texto estruturado
-        dados_texto = (amostra_prefix + "\n".join(context_lines)) if context_lines else "(sem dados)"
+        assinatura, vetor = None, None
+        uso: Dict[str, Any] = {}
+        inicio = time.perf_counter()
+        if pacote['resposta_direta']:
+            # Contagem/soma: o número calculado no SQL já é a resposta; sem LLM nem embedding
+            resposta_texto = pacote['resposta_direta']
+        else:
+            # Cache semântico: só compara perguntas com os mesmos filtros, os mesmos candidatos recuperados
+            # (o recorte empacotado depende das palavras da pergunta; os candidatos, só dos filtros)
+            # e o mesmo sentido (ordem, negação, situação)
+            if chave is not None and CACHE_SEMANTICO.ativo:
+                versao, modelo, _, filtros_json = chave
+                assinatura = (versao, modelo, filtros_json, pacote['assinatura'], sentido_pergunta(user_query))
+                vetor = self._embed_question(user_query)
+                if vetor:
+                    em_cache, _ = CACHE_SEMANTICO.buscar(assinatura, vetor)
+                    if em_cache is not None:
+                        if invalidacao.geracao() == geracao:
+                            CACHE_RESPOSTAS.gravar(chave, {**em_cache, "contexto": context_lines})
+                        return {"sucesso": True, **em_cache, "contexto": context_lines, "cache": "semantico"}
+            inicio = time.perf_counter()
+            resposta_texto = self._call_models(user_query, dados_texto, uso)
+        metricas = {
+            "intencao": pacote['intencao'],
+            "ms_recuperacao": ms_recuperacao,
+            "tokens_prompt": 0 if pacote['resposta_direta'] else estimar_tokens(self._build_prompt(user_query, dados_texto)),
+            "tokens_prompt_modelo": uso.get('tokens_prompt'),
+            "tokens_resposta_modelo": uso.get('tokens_resposta'),
+            "tokens_contexto": pacote['tokens'],
+            "linhas_contexto": len(context_lines),
+            "linhas_descartadas": pacote['descartados'],
+            "ms_geracao": round((time.perf_counter() - inicio) * 1000, 1),
+            "modelo": uso.get('modelo'),
+        }
+        logger.info("Agent3: %s", json.dumps(metricas))
 
-        resposta_texto = self._generate_response(user_query, dados_texto)
+        if resposta_texto and chave is not None and invalidacao.geracao() == geracao:
+            # Só respostas do modelo ou do SQL; o resumo de indisponibilidade não é guardado
+            CACHE_RESPOSTAS.gravar(chave, {"resposta": resposta_texto, "contexto": context_lines})
+            if vetor:
+                CACHE_SEMANTICO.gravar(assinatura, vetor, {"resposta": resposta_texto, "pergunta_origem": user_query})
         return {
             "sucesso": True,
-            "resposta": resposta_texto,
+            "resposta": resposta_texto or self._offline_summary(context_lines),
             "contexto": context_lines,
+            "cache": False,
+            "metricas": metricas,
         }
 
+    def _prepare_context(self, user_query: str, filtros: Dict[str, Any], agregar: bool = True) -> Dict[str, Any]:
+        """
+        Monta o bloco DADOS do prompt.
+
+        Perguntas analíticas (agregacoes.detectar) viram uma tabela calculada no SQL sobre todo
+        o recorte; 'top' recupera os N registros de maior (ou menor) valor. As demais recuperam os
+        candidatos mais recentes e empacotam os mais relevantes no orçamento de tokens.
+
+        Retorna o resultado de contexto.empacotar mais: 'candidatos' (registros recuperados),
+        'linhas' (legíveis), 'assinatura' (para o cache semântico), 'intencao' e
+        'resposta_direta' (contagem/soma: dispensa o LLM).
+        """
+        intencao = agregacoes.detectar(user_query, filtros) if agregar else None
+        if intencao:
+            filtros = {**filtros, 'tipo': intencao['tipo'], 'status': intencao['status']}
+        if intencao and intencao['nome'] != 'top':
+            try:
+                agregado = agregacoes.executar(intencao, filtros, self._filtrar_movimentos, self._filtrar_parcelas)
+            except Exception:
+                logger.exception("Agent3: falha na agregação '%s'; usando as linhas recuperadas", intencao['nome'])
+                telemetria.contar('nf_fallbacks_total', operacao='agregacao', destino='linhas')
+                db.session.rollback()
+                intencao = None
+            else:
+                texto = tabela(agregado['titulo'], agregado['colunas'], agregado['linhas'])
+                return {
+                    'texto': texto, 'tokens': estimar_tokens(texto), 'incluidos': [], 'descartados': 0,
+                    'candidatos': [], 'linhas': agregado['legiveis'], 'intencao': intencao['nome'],
+                    'resposta_direta': agregado['resposta_direta'],
+                    'assinatura': ('agregado', intencao['nome'], intencao['n'], intencao['tipo'], intencao['status'],
+                                   intencao['ordem']),
+                }
+
+        top = intencao['n'] if intencao else None
+        registros = self._retrieve_data(user_query, filtros, por_valor=bool(top), limite=top,
+                                        crescente=bool(intencao) and intencao['ordem'] == 'asc')
+
+        # Se não houver dados para o recorte solicitado, tentar uma amostra recente
+        prefixo = ""
+        if not registros:
+            telemetria.contar('nf_fallbacks_total', operacao='retrieval', destino='amostra_recente')
+            registros = self._fallback_context(n=10)
+            if registros:
+                prefixo = "[AMOSTRA RECENTE – sem correspondência direta à pergunta]"
+        pacote = empacotar(registros, user_query, ORCAMENTO_CONTEXTO, prefixo=prefixo)
+        pacote.update(
+            candidatos=registros,
+            linhas=[self._context_line(r) for r in pacote['incluidos']],
+            assinatura=tuple(self._context_ids(registros)),
+            intencao='top' if top else None,
+            resposta_direta=None,
+        )
+        return pacote
+
+    @staticmethod
+    def _context_ids(registros: List[Dict[str, Any]]) -> List[str]:
+        """Identificadores dos registros do contexto ("movimentos:123"), ordenados: independem do ranqueamento."""
+        return sorted(r['id'] for r in registros)
+
+    @staticmethod
+    def _context_line(r: Dict[str, Any]) -> str:
+        """Linha legível de um registro: "[movimentos:123] " + o texto canônico do documento."""
+        return f"[{r['id']}] {r['texto']}"
+
+    def _embed_question(self, user_query: str) -> Optional[List[float]]:
+        """Embedding da pergunta normalizada para o cache semântico; None se falhar."""
+        texto = normalizar_pergunta(user_query)
+        if EMBEDDINGS_CACHE == 'lexical':
+            with telemetria.estagio('llm_embed', modelo='lexical'):
+                return embedding_lexical(texto)
+        try:
+            with telemetria.estagio('llm_embed', modelo='text-embedding-004'):
+                resp = self.client.models.embed_content(model='text-embedding-004', contents=texto)
+            return list(resp.embeddings[0].values or []) or None
+        except Exception:
+            return None
+
+    def _cache_key(self, user_query: str, filtros: Dict[str, Any]) -> Optional[tuple]:
+        """Chave do cache de respostas, ou None se o cache estiver desativado ou sem versão dos dados."""
+        if not CACHE_RESPOSTAS.ativo:
+            return None
+        versao = versao_dados()
+        if versao is None:
+            return None
+        filtros_chave = {k: sorted(v) if isinstance(v, list) else v for k, v in filtros.items()}
+        return (versao, self.model_name, normalizar_pergunta(user_query),
+                json.dumps(filtros_chave, sort_keys=True, default=str))
+
     def _extract_filters(self, q: str) -> Dict[str, Any]:
         ql = (q or '').lower()
         hoje = datetime.today().date()
@@ -140,126 +346,101 @@ class Agent3:
         if m_menor:
             filtros['max_valor'] = parse_val(m_menor.group(2))
 
-        # Classificações mencionadas
+        # Classificações mencionadas (nomes em cache até a próxima escrita na tabela)
         try:
-            for c in Classificacao.query.all():
-                nm = (c.descricao or '').lower()
-                if nm and nm in ql:
-                    filtros['classificacoes_incluidas'].append(c.descricao)
+            filtros['classificacoes_incluidas'] = documentos.classificacoes_citadas(ql)
         except Exception:
-            pass
+            db.session.rollback()
 
         # Pessoas mencionadas
         try:
-            for p in Pessoas.query.all():
-                nm = (p.razaosocial or '').lower()
-                fn = (p.fantasia or '').lower()
-                if nm and nm in ql:
-                    filtros['pessoas_nomes'].append(p.razaosocial)
-                if fn and fn in ql:
-                    filtros['pessoas_nomes'].append(p.fantasia)
+            filtros['pessoas_nomes'] = documentos.pessoas_citadas(ql)
         except Exception:
-            pass
+            db.session.rollback()
 
         return filtros
 
-    def _retrieve_data(self, query: str, filtros: Dict[str, Any]) -> List[str]:
-        """Recupera dados reais do banco e retorna como linhas de contexto estruturadas."""
+    def _retrieve_data(self, query: str, filtros: Dict[str, Any], por_valor: bool = False,
+                       limite: Optional[int] = None, crescente: bool = False) -> List[Dict[str, Any]]:
+        """
+        Recupera dados reais do banco como registros (dicionários) candidatos ao contexto:
+        os `limite` (CANDIDATOS_CONTEXTO) mais recentes, ou os de maior valor com `por_valor`
+        (de menor valor com `crescente`).
+        """
         alvo = filtros.get('alvo') or 'movimentos'
-        di = filtros.get('data_inicio')
-        df = filtros.get('data_fim')
-        minv = filtros.get('min_valor')
-        maxv = filtros.get('max_valor')
-        pessoas_n = set(filtros.get('pessoas_nomes') or [])
-        cls_in = set(filtros.get('classificacoes_incluidas') or [])
-
-        linhas: List[str] = []
         try:
-            if alvo == 'parcelas':
-                q = ParcelasContas.query
-                if di:
-                    q = q.filter(ParcelasContas.datavencimento >= di)
-                if df:
-                    q = q.filter(ParcelasContas.datavencimento <= df)
-                if minv is not None:
-                    q = q.filter(ParcelasContas.valorparcela >= minv)
-                if maxv is not None:
-                    q = q.filter(ParcelasContas.valorparcela <= maxv)
-                itens = q.order_by(ParcelasContas.datavencimento.desc()).limit(20).all()
-                for p in itens:
-                    linhas.append(
-                        f"[parcelas:{p.idParcelasContas}] Parcela {p.identificacao}; Vencimento {p.datavencimento}; "
-                        f"Valor {float(p.valorparcela):.2f}; Pago {float(p.valorpago or 0):.2f}; Saldo {float(p.valorsaldo or 0):.2f}; "
-                        f"Status {p.statusparcela}"
-                    )
-            else:
-                q = MovimentoContas.query.filter(MovimentoContas.status == 'ATIVO')
-                if di:
-                    q = q.filter(MovimentoContas.dataemissao >= di)
-                if df:
-                    q = q.filter(MovimentoContas.dataemissao <= df)
-                if minv is not None:
-                    q = q.filter(MovimentoContas.valortotal >= minv)
-                if maxv is not None:
-                    q = q.filter(MovimentoContas.valortotal <= maxv)
-                itens = q.order_by(MovimentoContas.dataemissao.desc()).limit(20).all()
-                for m in itens:
-                    if cls_in:
-                        nomes = [c.descricao for c in (m.classificacoes or [])]
-                        if not any(n in cls_in for n in nomes):
-                            continue
-                    if pessoas_n:
-                        fc = getattr(m, 'fornecedor_cliente', None)
-                        nm = ((fc.razaosocial if fc else '') + ' ' + (fc.fantasia if fc and fc.fantasia else '')).lower()
-                        if not any(x.lower() in nm for x in pessoas_n):
-                            continue
-                    fornecedor = m.fornecedor_cliente.razaosocial if m.fornecedor_cliente else '-'
-                    destinatario = m.faturado.razaosocial if m.faturado else '-'
-                    classes = ', '.join([c.descricao for c in (m.classificacoes or [])]) or '-'
-                    linhas.append(
-                        f"[movimentos:{m.idMovimentoContas}] NF {m.numeronotafiscal or '-'}; Emissão {m.dataemissao}; "
-                        f"Valor {float(m.valortotal):.2f}; Emitente {fornecedor}; Destinatário {destinatario}; "
-                        f"Classificações {classes}; Descrição {(m.descricao or '').strip()}"
-                    )
+            # Documentos prontos (rag_documentos): um SELECT indexado, sem juntar pessoas e classificações
+            return documentos.buscar(alvo, filtros, limite or CANDIDATOS_CONTEXTO, por_valor=por_valor,
+                                     crescente=crescente)
         except Exception:
             # Em caso de falha de consulta, retorna vazio para evitar quebrar a geração
-            pass
+            logger.exception("Agent3: falha na recuperação de %s", alvo)
+            db.session.rollback()
+            return []
 
-        return linhas
-
-    def _fallback_context(self, n: int = 10) -> List[str]:
+    def _fallback_context(self, n: int = 10) -> List[Dict[str, Any]]:
         """Retorna uma amostra recente genérica para nunca deixar a resposta vazia."""
-        linhas: List[str] = []
         try:
-            itens = (
-                MovimentoContas.query
-                .filter(MovimentoContas.status == 'ATIVO')
-                .order_by(MovimentoContas.dataemissao.desc())
-                .limit(n)
-                .all()
-            )
-            for m in itens:
-                fornecedor = m.fornecedor_cliente.razaosocial if m.fornecedor_cliente else '-'
-                destinatario = m.faturado.razaosocial if m.faturado else '-'
-                classes = ', '.join([c.descricao for c in (m.classificacoes or [])]) or '-'
-                linhas.append(
-                    f"[movimentos:{m.idMovimentoContas}] NF {m.numeronotafiscal or '-'}; Emissão {m.dataemissao}; "
-                    f"Valor {float(m.valortotal):.2f}; Emitente {fornecedor}; Destinatário {destinatario}; "
-                    f"Classificações {classes}; Descrição {(m.descricao or '').strip()}"
-                )
+            return documentos.buscar('movimentos', {}, n)
         except Exception:
-            pass
-        return linhas
+            db.session.rollback()
+            return []
 
-    def _generate_response(self, user_query: str, retrieved_data: str) -> str:
-        prompt = (
+    def _filtrar_movimentos(self, q, filtros: Dict[str, Any]):
+        """Aplica a `q` (qualquer consulta sobre movimento_contas) os filtros da pergunta."""
+        q = q.filter(MovimentoContas.status == 'ATIVO')
+        if filtros.get('tipo'):
+            q = q.filter(MovimentoContas.tipo == filtros['tipo'])
+        if filtros.get('data_inicio'):
+            q = q.filter(MovimentoContas.dataemissao >= filtros['data_inicio'])
+        if filtros.get('data_fim'):
+            q = q.filter(MovimentoContas.dataemissao <= filtros['data_fim'])
+        if filtros.get('min_valor') is not None:
+            q = q.filter(MovimentoContas.valortotal >= filtros['min_valor'])
+        if filtros.get('max_valor') is not None:
+            q = q.filter(MovimentoContas.valortotal <= filtros['max_valor'])
+        if filtros.get('pessoas_nomes'):
+            q = q.filter(MovimentoContas.Pessoas_idFornecedorCliente.in_(documentos.ids_pessoas(filtros['pessoas_nomes'])))
+        if filtros.get('classificacoes_incluidas'):
+            vinculo = MovimentoContas.classificacoes.property.secondary
+            ids_cls = documentos.ids_classificacoes(filtros['classificacoes_incluidas'])
+            q = q.filter(select(vinculo.c.Classificacao_idClassificacao)
+                         .where(vinculo.c.MovimentoContas_idMovimentoContas == MovimentoContas.idMovimentoContas,
+                                vinculo.c.Classificacao_idClassificacao.in_(ids_cls))
+                         .exists())
+        return q
+
+    @staticmethod
+    def _filtrar_parcelas(q, filtros: Dict[str, Any]):
+        if filtros.get('status') == 'PENDENTE':
+            q = q.filter(ParcelasContas.statusparcela == 'PENDENTE')
+        elif filtros.get('status') == 'PAGA':
+            q = q.filter(ParcelasContas.statusparcela != 'PENDENTE')
+        if filtros.get('data_inicio'):
+            q = q.filter(ParcelasContas.datavencimento >= filtros['data_inicio'])
+        if filtros.get('data_fim'):
+            q = q.filter(ParcelasContas.datavencimento <= filtros['data_fim'])
+        if filtros.get('min_valor') is not None:
+            q = q.filter(ParcelasContas.valorparcela >= filtros['min_valor'])
+        if filtros.get('max_valor') is not None:
+            q = q.filter(ParcelasContas.valorparcela <= filtros['max_valor'])
+        return q
+
+    def _build_prompt(self, user_query: str, retrieved_data: str) -> str:
+        return (
             "Você é um assistente de gestão financeira. Use EXCLUSIVAMENTE os DADOS a seguir (sem inventar nada). "
             "Responda em português do Brasil com tom casual, didático e amigável.\n\n"
+            "Formato dos DADOS:\n"
+            "- Tabelas com o nome (MOVIMENTOS, PARCELAS), o cabeçalho e uma linha por registro, colunas separadas por '|'.\n"
+            "- Pessoas e classificações aparecem por código (P1, C1...), definidos nas linhas PESSOAS e CLASSIFICACOES; "
+            "responda sempre com os nomes, nunca com os códigos. Valores em R$.\n"
+            "- Tabelas AGREGADO trazem totais já calculados no banco sobre TODOS os registros do recorte: "
+            "use esses números como estão, sem recalcular nem estimar.\n\n"
             "Como responder:\n"
             "- Comece com um RESUMO curto (1–2 frases) dizendo o que foi encontrado.\n"
             "- Em seguida, traga DETALHES em tópicos simples: data, valor, emitente/destinatário e classificação.\n"
             "- Se a pergunta pedir 'maiores' ou 'top', foque nos registros de maior valor presentes nos DADOS.\n"
-            "- Cite fontes quando útil usando o identificador entre colchetes (ex.: [movimentos:123], [parcelas:45]).\n"
+            "- Cite fontes quando útil usando o id da linha entre colchetes (ex.: [movimentos:123], [parcelas:45]).\n"
             "- Caso os dados sejam insuficientes, diga isso de forma objetiva e cordial.\n\n"
             "Regras para ausência de dados:\n"
             "- Se os DADOS vierem com o rótulo 'AMOSTRA RECENTE – sem correspondência direta à pergunta', informe claramente que não há dados para a pergunta do usuário.\n"
@@ -269,10 +450,29 @@ class Agent3:
             f"PERGUNTA: {user_query}\n\n"
             "Formato: RESUMO; depois DETALHES em tópicos. Evite jargões e respostas confusas."
         )
+
+    def _call_models(self, user_query: str, retrieved_data: str, uso: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Texto gerado pelo modelo principal ou pelos de fallback; vazio se todos falharem.
+
+        Se `uso` for passado, recebe o modelo que respondeu e os tokens contados pelo
+        Gemini (usage_metadata: tokens_prompt, tokens_resposta).
+        """
+        prompt = self._build_prompt(user_query, retrieved_data)
+        from google.genai import types
         content = types.Content(role='user', parts=[types.Part.from_text(text=prompt)])
 
         def call_model(model_name: str) -> str:
-            resp = self.client.models.generate_content(model=model_name, contents=[content])
+            with telemetria.estagio('llm_generate', modelo=model_name):
+                resp = self.client.models.generate_content(model=model_name, contents=[content])
+            metadados = getattr(resp, 'usage_metadata', None)
+            telemetria.contar_tokens(model_name, metadados)
+            if uso is not None:
+                uso.update(
+                    modelo=model_name,
+                    tokens_prompt=getattr(metadados, 'prompt_token_count', None),
+                    tokens_resposta=getattr(metadados, 'candidates_token_count', None),
+                )
             txt = (getattr(resp, 'text', None) or '').strip()
             if not txt:
                 try:
@@ -290,6 +490,8 @@ class Agent3:
                     last_err = e
                     msg = str(e).lower()
                     if '503' in msg or 'unavailable' in msg or 'overload' in msg:
+                        if i + 1 < attempts:
+                            telemetria.contar('nf_tentativas_total', operacao='llm_generate', modelo=model_name)
                         delay = (0.5 * (2 ** i)) + random.uniform(0, 0.5)
                         time.sleep(delay)
                         continue
@@ -306,14 +508,18 @@ class Agent3:
             pass
 
         for fallback_model in ['gemini-1.5-flash', 'gemini-1.5-pro']:
+            telemetria.contar('nf_fallbacks_total', operacao='llm_generate', destino=fallback_model)
             try:
                 texto = generate_with_retry(fallback_model, attempts=3)
                 if texto:
                     return texto
             except Exception:
                 continue
+        return ''
 
-        linhas = [ln for ln in (retrieved_data.splitlines()) if ln.strip()][:3]
+    def _offline_summary(self, context_lines: List[str]) -> str:
+        telemetria.contar('nf_fallbacks_total', operacao='llm_generate', destino='resumo_offline')
+        linhas = context_lines[:3]
         resumo = (
             "Ops, o modelo está indisponível agora. Para não te deixar sem resposta, segue um resumo rápido do que encontrei:\n"
             + ('\n'.join(f"- {ln}" for ln in linhas) if linhas else "(sem dados)")
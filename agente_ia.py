@@ -1,16 +1,20 @@
-from google import genai
-from google.genai import types
 import json
+import logging
 import os
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 # Voltando para PostgreSQL conforme solicitado
-from database import db, Pessoas, Classificacao, MovimentoContas, ParcelasContas
+from database import db, somente_leitura, Pessoas, Classificacao, MovimentoContas, ParcelasContas
+import llm
+import telemetria
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class AgenteIA:
     """
     Segundo agente IA especializado em análise financeira e relatórios
@@ -18,16 +22,22 @@ class AgenteIA:
     
     def __init__(self):
         try:
-            self.api_key = os.getenv('GEMINI_API_KEY')
-            if not self.api_key:
+            if not llm.disponivel():
                 raise ValueError("GEMINI_API_KEY não encontrada nas variáveis de ambiente")
             
-            # Configurar o cliente do Gemini com a chave API
-            self.client = genai.Client(api_key=self.api_key)
+            # Cliente do Gemini, do simulador ou da gravação (LLM_BACKEND; import adiado: ~0,6 s)
+            self.client = llm.cliente()
         except Exception as e:
-            print(f"Erro ao inicializar AgenteIA: {str(e)}")
+            logger.error("Erro ao inicializar AgenteIA: %s", e)
             raise
     
+    def _gerar(self, content, modelo='gemini-2.5-flash'):
+        """Chamada ao Gemini medida (estágio llm_generate e tokens em telemetria)"""
+        with telemetria.estagio('llm_generate', modelo=modelo):
+            response = self.client.models.generate_content(model=modelo, contents=content)
+        telemetria.contar_tokens(modelo, getattr(response, 'usage_metadata', None))
+        return response
+
     def analisar_fluxo_caixa(self, periodo_dias=30):
         """
         Analisa o fluxo de caixa dos últimos N dias
@@ -35,34 +45,40 @@ class AgenteIA:
         try:
             data_inicio = datetime.now().date() - timedelta(days=periodo_dias)
             
-            # Buscar movimentos do período
-            movimentos = MovimentoContas.query.filter(
-                MovimentoContas.dataemissao >= data_inicio,
-                MovimentoContas.status == 'ATIVO'
-            ).all()
-            
-            # Organizar dados para análise
-            dados_analise = {
-                'periodo': f'{data_inicio.strftime("%d/%m/%Y")} a {datetime.now().strftime("%d/%m/%Y")}',
-                'total_movimentos': len(movimentos),
-                'movimentos': []
-            }
-            
-            total_despesas = 0
-            total_receitas = 0
-            
-            for movimento in movimentos:
-                movimento_dict = movimento.to_dict()
-                dados_analise['movimentos'].append(movimento_dict)
+            # Consultas no bind de leitura; a conexão volta ao pool antes da chamada ao Gemini
+            with somente_leitura():
+                # Buscar movimentos do período (relações de to_dict carregadas em lote, sem N+1)
+                movimentos = MovimentoContas.query.options(
+                    selectinload(MovimentoContas.fornecedor_cliente),
+                    selectinload(MovimentoContas.faturado),
+                    selectinload(MovimentoContas.classificacoes)
+                ).filter(
+                    MovimentoContas.dataemissao >= data_inicio,
+                    MovimentoContas.status == 'ATIVO'
+                ).all()
+            
+                # Organizar dados para análise
+                dados_analise = {
+                    'periodo': f'{data_inicio.strftime("%d/%m/%Y")} a {datetime.now().strftime("%d/%m/%Y")}',
+                    'total_movimentos': len(movimentos),
+                    'movimentos': []
+                }
+            
+                total_despesas = 0
+                total_receitas = 0
+            
+                for movimento in movimentos:
+                    movimento_dict = movimento.to_dict()
+                    dados_analise['movimentos'].append(movimento_dict)
                 
-                if movimento.tipo == 'DESPESA':
-                    total_despesas += float(movimento.valortotal)
-                elif movimento.tipo == 'RECEITA':
-                    total_receitas += float(movimento.valortotal)
+                    if movimento.tipo == 'DESPESA':
+                        total_despesas += float(movimento.valortotal)
+                    elif movimento.tipo == 'RECEITA':
+                        total_receitas += float(movimento.valortotal)
             
-            dados_analise['total_despesas'] = total_despesas
-            dados_analise['total_receitas'] = total_receitas
-            dados_analise['saldo_liquido'] = total_receitas - total_despesas
+                dados_analise['total_despesas'] = total_despesas
+                dados_analise['total_receitas'] = total_receitas
+                dados_analise['saldo_liquido'] = total_receitas - total_despesas
             
             # Prompt para análise da IA
             prompt = f"""
@@ -81,16 +97,14 @@ class AgenteIA:
             """
             
             # Criar o conteúdo para o modelo
+            from google.genai import types
             content = types.Content(
                 role='user',
                 parts=[types.Part.from_text(text=prompt)]
             )
             
             # Gerar a resposta
-            response = self.client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=content
-            )
+            response = self._gerar(content)
             analise_ia = response.text.strip()
             
             # Limpar formatação markdown se presente
@@ -153,16 +167,14 @@ class AgenteIA:
                     """
                     
                     # Criar o conteúdo para o modelo
+                    from google.genai import types
                     content = types.Content(
                         role='user',
                         parts=[types.Part.from_text(text=prompt)]
                     )
                     
                     # Gerar a resposta
-                    response = self.client.models.generate_content(
-                        model='gemini-2.5-flash',
-                        contents=content
-                    )
+                    response = self._gerar(content)
                     nova_classificacao = response.text.strip().upper()
                     
                     # Buscar classificação no banco
@@ -202,43 +214,55 @@ class AgenteIA:
         Gera relatório detalhado por categorias de despesas
         """
         try:
-            # Buscar todas as classificações de despesas
-            classificacoes = Classificacao.query.filter_by(tipo='DESPESA', status='ATIVO').all()
-            
-            relatorio = {
-                'data_geracao': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
-                'categorias': []
-            }
-            
-            for classificacao in classificacoes:
-                # Buscar movimentos desta classificação
-                movimentos = []
-                for movimento in classificacao.movimentos:
-                    if movimento.status == 'ATIVO' and movimento.tipo == 'DESPESA':
-                        movimentos.append(movimento)
+            # Consultas no bind de leitura; a conexão volta ao pool antes da chamada ao Gemini
+            with somente_leitura():
+                # Buscar todas as classificações de despesas
+                classificacoes = Classificacao.query.options(
+                    selectinload(Classificacao.movimentos)
+                ).filter_by(tipo='DESPESA', status='ATIVO').all()
+            
+                relatorio = {
+                    'data_geracao': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+                    'categorias': []
+                }
+            
+                for classificacao in classificacoes:
+                    # Buscar movimentos desta classificação
+                    movimentos = []
+                    for movimento in classificacao.movimentos:
+                        if movimento.status == 'ATIVO' and movimento.tipo == 'DESPESA':
+                            movimentos.append(movimento)
                 
-                if movimentos:
-                    total_categoria = sum(float(m.valortotal) for m in movimentos)
+                    if movimentos:
+                        total_categoria = sum(float(m.valortotal) for m in movimentos)
                     
-                    categoria_info = {
-                        'nome': classificacao.descricao,
-                        'total_movimentos': len(movimentos),
-                        'valor_total': total_categoria,
-                        'movimentos_recentes': [
-                            {
-                                'data': m.dataemissao.strftime('%d/%m/%Y'),
-                                'descricao': m.descricao,
-                                'valor': float(m.valortotal),
-                                'fornecedor': m.fornecedor_cliente.razaosocial if m.fornecedor_cliente else 'N/A'
-                            }
-                            for m in sorted(movimentos, key=lambda x: x.dataemissao, reverse=True)[:5]
-                        ]
-                    }
+                        categoria_info = {
+                            'nome': classificacao.descricao,
+                            'total_movimentos': len(movimentos),
+                            'valor_total': total_categoria,
+                            'movimentos_recentes': sorted(movimentos, key=lambda x: x.dataemissao, reverse=True)[:5]
+                        }
                     
-                    relatorio['categorias'].append(categoria_info)
-            
-            # Ordenar por valor total decrescente
-            relatorio['categorias'].sort(key=lambda x: x['valor_total'], reverse=True)
+                        relatorio['categorias'].append(categoria_info)
+            
+                # Fornecedores só dos movimentos listados, em uma consulta (e não um lazy load por movimento)
+                ids_fornecedores = {m.Pessoas_idFornecedorCliente
+                                    for c in relatorio['categorias'] for m in c['movimentos_recentes']}
+                razoes_sociais = dict(db.session.query(Pessoas.idPessoas, Pessoas.razaosocial)
+                                      .filter(Pessoas.idPessoas.in_(ids_fornecedores)).all()) if ids_fornecedores else {}
+                for categoria_info in relatorio['categorias']:
+                    categoria_info['movimentos_recentes'] = [
+                        {
+                            'data': m.dataemissao.strftime('%d/%m/%Y'),
+                            'descricao': m.descricao,
+                            'valor': float(m.valortotal),
+                            'fornecedor': razoes_sociais.get(m.Pessoas_idFornecedorCliente, 'N/A')
+                        }
+                        for m in categoria_info['movimentos_recentes']
+                    ]
+            
+                # Ordenar por valor total decrescente
+                relatorio['categorias'].sort(key=lambda x: x['valor_total'], reverse=True)
             
             # Usar IA para análise do relatório
             prompt = f"""
@@ -256,16 +280,14 @@ class AgenteIA:
             """
             
             # Criar o conteúdo para o modelo
+            from google.genai import types
             content = types.Content(
                 role='user',
                 parts=[types.Part.from_text(text=prompt)]
             )
             
             # Gerar a resposta
-            response = self.client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=content
-            )
+            response = self._gerar(content)
             analise_ia = response.text.strip()
             
             if analise_ia.startswith('```json'):
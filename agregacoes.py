@@ -0,0 +1,243 @@
+"""
+Perguntas analíticas do RAG respondidas com SQL agregado sobre todo o recorte filtrado.
+
+detectar(pergunta, filtros) reconhece a intenção da pergunta:
+  - por_fornecedor / por_categoria / por_mes: totais agrupados ("fornecedores com maiores
+    despesas", "resumo das despesas por categoria", "gastos mês a mês");
+  - top: os N registros de maior (ou menor) valor ("top 5 notas por valor", "menores
+    despesas"), que o Agent3 recupera ordenando por valor no lugar da data;
+  - contagem / soma: um número ("quantas notas...", "quanto gastei com ..."); exigem o que
+    contar (notas, parcelas...) ou um valor em dinheiro ("quanto tempo falta" não é soma).
+"menor"/"menos" ordenam do menor para o maior; "mais antiga"/"mais recentes" ordenam por data
+e não são ranking por valor.
+
+executar(...) roda a consulta agrupada com os mesmos filtros da recuperação de linhas e
+devolve só a tabela do resultado. Contagem e soma trazem `resposta_direta` e dispensam o LLM
+só quando a pergunta não pede mais que o número (comparação, média, explicação) nem cita um
+período que os filtros não resolveram ("em 2024", "em março").
+"""
+import re
+import unicodedata
+
+from sqlalchemy import func
+
+from database import db, Pessoas, Classificacao, MovimentoContas, ParcelasContas
+
+N_PADRAO = 10
+N_MAXIMO = 50
+MESES_PADRAO = 12
+
+_N = re.compile(r'\btop\s*(\d{1,3})\b|\b(\d{1,3})\s+(?:maiores|menores|principais|mais|menos)\b')
+_AGRUPAMENTOS = [
+    ('por_fornecedor', re.compile(r'\b(fornecedor(es)?|emitentes?|clientes?)\b')),
+    ('por_categoria', re.compile(r'\b(categorias?|classificac(ao|oes))\b')),
+    ('por_mes', re.compile(r'\b(por mes|mes a mes|mensal(mente)?|cada mes)\b')),
+]
+_PISTA_AGREGADO = re.compile(
+    r'\b(maior(es)?|mais|menor(es)?|menos|total|totais|soma|quanto|resumo|ranking|top|principais|por|gast\w*|'
+    r'distribuic\w*)\b')
+# Ordem por data ("despesa mais antiga do fornecedor"): retirada antes de procurar as pistas
+_ORDEM_DATA = re.compile(r'\bmais (antig|recent|nov|velh)\w*')
+_RECENTES = re.compile(r'\b(recentes?|lancad[ao]s?)\b|\bultim[ao]s (notas|despesas|receitas|lancamentos)\b')
+_TOP = re.compile(r'\b(top|maiores|menores|principais|mais (altas?|altos|caras?|caros|baixas?|baixos|baratas?|baratos)|'
+                  r'de (maior|menor) valor)\b')
+_CRESCENTE = re.compile(r'\b(menor(es)?|menos)\b(?! que)|\bmais (baix|barat)')
+_DECRESCENTE = re.compile(r'\b(maior(es)?|top|principais)\b(?! que)|\bmais (alt|car)')
+_CONTAGEM = re.compile(r'\b(quant[ao]s|quantidade de|numero de)\s+(\w+\s+)?(notas?|despesas?|receitas?|parcelas?|'
+                       r'lancamentos?|movimentos?|compras?|vendas?|pagamentos?|boletos?)\b')
+_SOMA = re.compile(r'\b(total|totais|soma|somatorio)\b|'
+                   r'\bquanto\b(?=.*\b(gast|pag|receb|fatur|vend|cust|dev|despesa|receita|valor|reais|dinheiro))')
+# Pedidos que só o número não responde, e períodos que _extract_filters não resolve
+_ALEM_DO_NUMERO = re.compile(r'\b(por ?que|compar\w*|versus|vs|media|medio|diferenca|variacao|tendencia|previs\w*|'
+                             r'expli\w*|analis\w*|recomend\w*|sugest\w*|percentual|porcentagem)\b|'
+                             r'\b(maior|menor)(es)?\b(?! que)')
+_PERIODO = re.compile(r'\b(19|20)\d{2}\b|\b(janeiro|fevereiro|marco|abril|maio|junho|julho|agosto|setembro|outubro|'
+                      r'novembro|dezembro|ontem|hoje|passad[ao]|anterior)\b')
+
+_TIPOS = [
+    ('DESPESA', re.compile(r'\b(despesas?|gastos?|gastei|gastamos|paguei|pagamos|compras?|custos?)\b')),
+    ('RECEITA', re.compile(r'\b(receitas?|recebi|recebemos|faturamento|faturei|vendas?)\b')),
+]
+_PENDENTES = re.compile(r'\b(pendentes?|em aberto|abertas?|a pagar|a vencer)\b')
+_PAGAS = re.compile(r'\b(pagas|quitadas?|liquidadas?)\b')
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _moeda(valor):
+    return 'R$ ' + f'{valor:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _plural(n, singular, plural):
+    return f"{n} {singular if n == 1 else plural}"
+
+
+def detectar(pergunta, filtros):
+    """
+    Intenção analítica da pergunta ({'nome', 'alvo', 'n', 'tipo', 'status', 'ordem', 'direta'})
+    ou None. 'ordem' é 'desc' ou 'asc' (rankings); 'direta' diz se contagem/soma podem ser
+    respondidas só com o número, sem o LLM.
+    """
+    q = _normalizar(pergunta)
+    sem_datas = _ORDEM_DATA.sub(' ', q)
+    alvo = filtros.get('alvo') or 'movimentos'
+    m = _N.search(q)
+    n = min(int(m.group(1) or m.group(2)), N_MAXIMO) if m else None
+
+    tipo = status = None
+    tipos = []
+    if alvo == 'movimentos':
+        tipos = [t for t, padrao in _TIPOS if padrao.search(q)]
+        tipo = tipos[0] if len(tipos) == 1 else None
+    elif _PENDENTES.search(q):
+        status = 'PENDENTE'
+    elif _PAGAS.search(q):
+        status = 'PAGA'
+    ordem = 'asc' if _CRESCENTE.search(sem_datas) and not _DECRESCENTE.search(sem_datas) else 'desc'
+
+    def intencao(nome, padrao_n=N_PADRAO):
+        return {'nome': nome, 'alvo': alvo, 'n': n or padrao_n, 'tipo': tipo, 'status': status,
+                'ordem': ordem, 'direta': False}
+
+    if alvo == 'movimentos' and _PISTA_AGREGADO.search(sem_datas) and not _RECENTES.search(q):
+        for nome, padrao in _AGRUPAMENTOS:
+            if padrao.search(q):
+                return intencao(nome, MESES_PADRAO if nome == 'por_mes' else N_PADRAO)
+    if _TOP.search(q) or (n and _PISTA_AGREGADO.search(sem_datas)):
+        return intencao('top')
+    for nome, padrao in (('contagem', _CONTAGEM), ('soma', _SOMA)):
+        if padrao.search(q):
+            resultado = intencao(nome)
+            periodo_sem_filtro = _PERIODO.search(q) and not (filtros.get('data_inicio') or filtros.get('data_fim'))
+            resultado['direta'] = not (_ALEM_DO_NUMERO.search(q) or periodo_sem_filtro or len(tipos) > 1)
+            return resultado
+    return None
+
+
+def executar(intencao, filtros, filtrar_movimentos, filtrar_parcelas):
+    """
+    Resultado de uma intenção agregada (não 'top'):
+    {'titulo', 'colunas', 'linhas', 'quantidade', 'valor', 'resposta_direta', 'legiveis'}.
+
+    `filtros` já traz o tipo (movimentos) ou status (parcelas) da intenção. Contagem e soma
+    só trazem `resposta_direta` com intencao['direta']; sem ela, o número vai ao LLM como tabela.
+    filtrar_movimentos(q, filtros) / filtrar_parcelas(q, filtros) aplicam esses filtros a uma
+    consulta (Agent3._filtrar_movimentos / _filtrar_parcelas): a agregação vê o mesmo recorte.
+    """
+    if intencao['alvo'] == 'parcelas':
+        return _parcelas(intencao, filtros, filtrar_parcelas)
+
+    def base(*colunas):
+        return filtrar_movimentos(db.session.query(*colunas).select_from(MovimentoContas), filtros)
+
+    quantidade, valor = base(func.count(MovimentoContas.idMovimentoContas),
+                             func.coalesce(func.sum(MovimentoContas.valortotal), 0)).one()
+    quantidade, valor = int(quantidade), float(valor)
+    rotulo = {'DESPESA': ('despesa', 'despesas'), 'RECEITA': ('receita', 'receitas')}.get(
+        intencao['tipo'], ('nota fiscal', 'notas fiscais'))
+    recorte = _recorte(filtros)
+    resultado = {'quantidade': quantidade, 'valor': valor, 'colunas': [], 'linhas': [], 'legiveis': [],
+                 'resposta_direta': None}
+
+    if intencao['nome'] in ('contagem', 'soma'):
+        if not quantidade:
+            resposta = f"Não encontrei {rotulo[1]}{recorte}."
+        elif intencao['nome'] == 'contagem':
+            resposta = f"Encontrei {_plural(quantidade, *rotulo)}{recorte}, somando {_moeda(valor)}."
+        else:
+            resposta = f"O total de {rotulo[1]}{recorte} é {_moeda(valor)} ({_plural(quantidade, *rotulo)})."
+        resultado['resposta_direta'] = resposta if intencao.get('direta') else None
+        resultado['titulo'] = f"TOTAL DE {rotulo[1].upper()}"
+        resultado['colunas'] = ['quantidade', 'valor_total']
+        resultado['linhas'] = [(quantidade, valor)]
+        resultado['legiveis'] = [resposta]
+        return resultado
+
+    total = func.sum(MovimentoContas.valortotal).label('total')
+    ordem_total = total.asc() if intencao.get('ordem') == 'asc' else total.desc()
+    extremo = 'menores' if intencao.get('ordem') == 'asc' else 'maiores'
+    if intencao['nome'] == 'por_fornecedor':
+        q = (base(Pessoas.razaosocial, func.count(MovimentoContas.idMovimentoContas), total)
+             .join(Pessoas, Pessoas.idPessoas == MovimentoContas.Pessoas_idFornecedorCliente)
+             .group_by(Pessoas.idPessoas, Pessoas.razaosocial)
+             .order_by(ordem_total).limit(intencao['n']))
+        titulo, rotulo_grupo = f"AGREGADO: {rotulo[1]} por fornecedor/cliente ({extremo} {intencao['n']})", 'fornecedor'
+    elif intencao['nome'] == 'por_categoria':
+        vinculo = MovimentoContas.classificacoes.property.secondary
+        q = (base(Classificacao.descricao, func.count(MovimentoContas.idMovimentoContas), total)
+             .join(vinculo, vinculo.c.MovimentoContas_idMovimentoContas == MovimentoContas.idMovimentoContas)
+             .join(Classificacao, Classificacao.idClassificacao == vinculo.c.Classificacao_idClassificacao)
+             .group_by(Classificacao.descricao)
+             .order_by(ordem_total).limit(intencao['n']))
+        # Um movimento com duas classificações entra nas duas: a soma das categorias passa do total
+        titulo, rotulo_grupo = (f"AGREGADO: {rotulo[1]} por categoria ({extremo} {intencao['n']}; "
+                                f"notas com mais de uma categoria contam em cada uma)"), 'categoria'
+    else:
+        mes = func.date_trunc('month', MovimentoContas.dataemissao).label('mes')
+        q = (base(mes, func.count(MovimentoContas.idMovimentoContas), total)
+             .group_by(mes).order_by(mes.desc()).limit(intencao['n']))
+        titulo, rotulo_grupo = f"AGREGADO: {rotulo[1]} por mês (últimos {intencao['n']} meses com movimento)", 'mes'
+
+    linhas = [(g, int(c), float(t or 0)) for g, c, t in q.all()]
+    if intencao['nome'] == 'por_mes':
+        linhas = [(g.strftime('%m/%Y'), c, t) for g, c, t in reversed(linhas)]
+    resultado['titulo'] = titulo + (recorte and f" -{recorte}")
+    resultado['colunas'] = [rotulo_grupo, 'quantidade', 'valor_total', 'percentual_do_total']
+    resultado['linhas'] = [(g, c, t, round(t / valor * 100, 1) if valor else 0.0) for g, c, t in linhas]
+    resultado['linhas'].append(('TOTAL GERAL', quantidade, valor, 100.0))
+    resultado['legiveis'] = [f"{g}: {_plural(c, *rotulo)}; {_moeda(t)}; {p}% do total"
+                             for g, c, t, p in resultado['linhas']]
+    return resultado
+
+
+def _parcelas(intencao, filtros, filtrar_parcelas):
+    quantidade, valor, saldo = filtrar_parcelas(db.session.query(
+        func.count(ParcelasContas.idParcelasContas),
+        func.coalesce(func.sum(ParcelasContas.valorparcela), 0),
+        func.coalesce(func.sum(ParcelasContas.valorsaldo), 0),
+    ), filtros).one()
+    quantidade, valor, saldo = int(quantidade), float(valor), float(saldo)
+    rotulo = 'parcelas' + {'PENDENTE': ' pendentes', 'PAGA': ' pagas'}.get(filtros.get('status'), '')
+    recorte = _recorte(filtros, campo_data='vencimento')
+
+    if not quantidade:
+        resposta = f"Não encontrei {rotulo}{recorte}."
+    elif intencao['nome'] == 'contagem':
+        resposta = (f"Encontrei {quantidade} {rotulo}{recorte}, somando {_moeda(valor)} "
+                    f"(saldo em aberto {_moeda(saldo)}).")
+    else:
+        resposta = (f"O total de {rotulo}{recorte} é {_moeda(valor)} "
+                    f"({quantidade} parcelas; saldo em aberto {_moeda(saldo)}).")
+    return {
+        'titulo': f"TOTAL DE {rotulo.upper()}",
+        'colunas': ['quantidade', 'valor_total', 'saldo_total'],
+        'linhas': [(quantidade, valor, saldo)],
+        'quantidade': quantidade,
+        'valor': valor,
+        'resposta_direta': resposta if intencao.get('direta') else None,
+        'legiveis': [resposta],
+    }
+
+
+def _recorte(filtros, campo_data='emissão'):
+    """Descrição dos filtros aplicados (" com emissão de 01/10/2026 a 19/10/2026 em INSUMOS ...")."""
+    partes = []
+    di, df = filtros.get('data_inicio'), filtros.get('data_fim')
+    if di and df:
+        partes.append(f"com {campo_data} de {di.strftime('%d/%m/%Y')} a {df.strftime('%d/%m/%Y')}")
+    elif di:
+        partes.append(f"com {campo_data} desde {di.strftime('%d/%m/%Y')}")
+    elif df:
+        partes.append(f"com {campo_data} até {df.strftime('%d/%m/%Y')}")
+    if filtros.get('min_valor') is not None:
+        partes.append(f"acima de {_moeda(filtros['min_valor'])}")
+    if filtros.get('max_valor') is not None:
+        partes.append(f"até {_moeda(filtros['max_valor'])}")
+    if filtros.get('classificacoes_incluidas'):
+        partes.append('em ' + ', '.join(sorted(filtros['classificacoes_incluidas'])))
+    if filtros.get('pessoas_nomes'):
+        partes.append('de ' + ', '.join(sorted(set(filtros['pessoas_nomes']))))
+    return (' ' + ' '.join(partes)) if partes else ''
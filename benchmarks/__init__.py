@@ -0,0 +1 @@
+"""Benchmarks reexecutáveis (rodar a partir da raiz: python -m benchmarks.<nome>)."""
@@ -0,0 +1,184 @@
+"""
+Perguntas analíticas do Agent3: agregação no SQL (agregacoes.py) x linhas recuperadas.
+
+Para cada pergunta, em uma base sintética:
+  - intenção detectada x esperada (acerto da detecção, inclusive perguntas que NÃO são
+    analíticas e devem continuar na recuperação de linhas);
+  - valor de referência calculado direto no banco (psycopg, SQL escrito à mão) e o valor
+    que cada caminho entrega ao modelo:
+      * agregado: o total/ranking da tabela AGREGADO (ou da resposta direta);
+      * linhas: a soma das linhas que caberiam no prompt antes desta mudança, isto é, o
+        máximo que o modelo conseguiria somar (cobertura = linhas no prompt / linhas no recorte);
+  - tempo de montagem do contexto e tokens do prompt; 'llm' diz se o caminho chama o modelo.
+
+Uso:
+    python -m benchmarks.bench_agregacoes --movimentos 200000
+"""
+import argparse
+import os
+import statistics
+import time
+from datetime import date
+
+from benchmarks.comum import conectar, recriar_schema, gerar_dados, aplicar_migracoes, criar_app_flask, salvar_resultado
+
+SCHEMA = 'bench_agregacoes'
+
+# (pergunta, intenção esperada)
+PERGUNTAS = [
+    ('Qual o total de despesas do ano atual?', 'soma'),
+    ('quanto gastei no total este ano', 'soma'),
+    ('Total de receitas do ano atual', 'soma'),
+    ('Quantas notas fiscais foram emitidas este ano?', 'contagem'),
+    ('quantas despesas tive no último trimestre?', 'contagem'),
+    ('Qual o valor total das parcelas este trimestre?', 'soma'),
+    ('quantas parcelas pendentes?', 'contagem'),
+    ('Quais fornecedores com maiores despesas este ano?', 'por_fornecedor'),
+    ('top 5 fornecedores por valor gasto no ano atual', 'por_fornecedor'),
+    ('Resumo das despesas por categoria este ano', 'por_categoria'),
+    ('total de despesas por classificação no último trimestre', 'por_categoria'),
+    ('gastos mês a mês', 'por_mes'),
+    ('Qual o faturamento por mês?', 'por_mes'),
+    ('Quais as maiores despesas do mês atual?', 'top'),
+    ('top 5 notas por valor este ano', 'top'),
+    ('Quais as notas fiscais mais recentes?', None),
+    ('Quais fornecedores aparecem nas notas recentes?', None),
+    ('Quais despesas acima de 10000 este ano?', None),
+    ('Mostre as parcelas em aberto deste trimestre', None),
+    ('despesas da semana atual', None),
+]
+
+# Referência independente do ORM: (quantidade, soma) no recorte
+SQL_MOVIMENTOS = """
+    SELECT count(*), coalesce(sum(valortotal), 0) FROM movimento_contas
+    WHERE status = 'ATIVO' AND (%(tipo)s::text IS NULL OR tipo = %(tipo)s)
+      AND dataemissao >= coalesce(%(inicio)s::date, '-infinity') AND dataemissao <= coalesce(%(fim)s::date, 'infinity')
+"""
+SQL_PARCELAS = """
+    SELECT count(*), coalesce(sum(valorparcela), 0) FROM parcelas_contas
+    WHERE (%(status)s::text IS NULL OR (statusparcela = 'PENDENTE') = (%(status)s = 'PENDENTE'))
+      AND datavencimento >= coalesce(%(inicio)s::date, '-infinity') AND datavencimento <= coalesce(%(fim)s::date, 'infinity')
+"""
+SQL_MAIOR_FORNECEDOR = """
+    SELECT max(total) FROM (
+        SELECT sum(valortotal) AS total FROM movimento_contas
+        WHERE status = 'ATIVO' AND (%(tipo)s::text IS NULL OR tipo = %(tipo)s)
+          AND dataemissao >= coalesce(%(inicio)s::date, '-infinity') AND dataemissao <= coalesce(%(fim)s::date, 'infinity')
+        GROUP BY "Pessoas_idFornecedorCliente") t
+"""
+
+
+def referencia(conn, intencao, filtros):
+    params = {'tipo': intencao['tipo'], 'status': intencao['status'],
+              'inicio': filtros['data_inicio'], 'fim': filtros['data_fim']}
+    sql = SQL_PARCELAS if intencao['alvo'] == 'parcelas' else SQL_MOVIMENTOS
+    quantidade, valor = conn.execute(sql, params).fetchone()
+    r = {'quantidade': quantidade, 'valor': float(valor)}
+    if intencao['nome'] == 'por_fornecedor':
+        r['maior_grupo'] = float(conn.execute(SQL_MAIOR_FORNECEDOR, params).fetchone()[0] or 0)
+    return r
+
+
+def medir(agente, conn, repeticoes):
+    from contexto import estimar_tokens
+    import agregacoes
+    resultados = []
+    for pergunta, esperada in PERGUNTAS:
+        filtros = agente._extract_filters(pergunta)
+        intencao = agregacoes.detectar(pergunta, filtros)
+        r = {'pergunta': pergunta, 'esperada': esperada, 'detectada': intencao and intencao['nome']}
+        r['acerto'] = r['esperada'] == r['detectada']
+        if not intencao or intencao['nome'] == 'top':
+            resultados.append(r)
+            continue
+
+        tempos = {'agregado': [], 'linhas': []}
+        for _ in range(repeticoes):
+            for caminho in tempos:
+                t = time.perf_counter()
+                pacote = agente._prepare_context(pergunta, filtros, agregar=caminho == 'agregado')
+                tempos[caminho].append((time.perf_counter() - t) * 1000)
+                r[caminho] = pacote
+
+        ref = referencia(conn, intencao, filtros)
+        agregado, linhas = r.pop('agregado'), r.pop('linhas')
+        resultado = agregacoes.executar(intencao, {**filtros, 'tipo': intencao['tipo'], 'status': intencao['status']},
+                                        agente._filtrar_movimentos, agente._filtrar_parcelas)
+        soma_linhas = sum(x['valor'] for x in linhas['incluidos'])
+        r.update({
+            'referencia': ref,
+            'agregado': {
+                'valor': resultado['valor'], 'quantidade': resultado['quantidade'],
+                'correto': abs(resultado['valor'] - ref['valor']) < 0.01 and resultado['quantidade'] == ref['quantidade'],
+                'ms': round(statistics.median(tempos['agregado']), 2),
+                'tokens_prompt': 0 if agregado['resposta_direta'] else
+                estimar_tokens(agente._build_prompt(pergunta, agregado['texto'])),
+                'llm': not agregado['resposta_direta'],
+            },
+            'linhas': {
+                'valor': round(soma_linhas, 2), 'quantidade': len(linhas['incluidos']),
+                'cobertura': round(len(linhas['incluidos']) / ref['quantidade'], 4) if ref['quantidade'] else 1.0,
+                'erro_relativo': round(abs(soma_linhas - ref['valor']) / ref['valor'], 4) if ref['valor'] else 0.0,
+                'ms': round(statistics.median(tempos['linhas']), 2),
+                'tokens_prompt': estimar_tokens(agente._build_prompt(pergunta, linhas['texto'] or '(sem dados)')),
+                'llm': True,
+            },
+        })
+        if 'maior_grupo' in ref:
+            maior = max((t for g, _, t, _ in resultado['linhas'] if g != 'TOTAL GERAL'), default=0.0)
+            r['agregado']['correto'] &= abs(maior - ref['maior_grupo']) < 0.01
+        resultados.append(r)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movimentos', type=int, default=200_000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+    with conectar(SCHEMA) as conn:
+        print(f'Gerando base sintética ({args.movimentos:,} movimentos)...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos, pessoas=20_000, classificacoes_extras=200, anos=3)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '008_rag_documentos.sql')
+        conn.execute('ANALYZE')
+
+    import agent3
+    app = criar_app_flask(SCHEMA)
+    try:
+        with app.app_context(), conectar(SCHEMA) as conn:
+            print(f'Medindo {len(PERGUNTAS)} perguntas (hoje: {date.today():%d/%m/%Y})...')
+            resultados = medir(agent3.Agent3(), conn, args.repeticoes)
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'pergunta':52} {'esperada':>14} {'detectada':>14}  {'ok':>3} {'agreg. certo':>12} {'ms':>6} {'tokens':>6} "
+          f"{'cobertura linhas':>16} {'erro linhas':>11} {'ms':>6} {'tokens':>6}")
+    for r in resultados:
+        a, l = r.get('agregado'), r.get('linhas')
+        extra = (f"{str(a['correto']):>12} {a['ms']:>6} {a['tokens_prompt']:>6} {l['cobertura']:>16} "
+                 f"{l['erro_relativo']:>11} {l['ms']:>6} {l['tokens_prompt']:>6}") if a else ''
+        print(f"{r['pergunta'][:52]:52} {str(r['esperada']):>14} {str(r['detectada']):>14}  "
+              f"{'sim' if r['acerto'] else 'NÃO':>3} {extra}")
+
+    agregadas = [r for r in resultados if 'agregado' in r]
+    resumo = {
+        'acerto_deteccao': round(sum(r['acerto'] for r in resultados) / len(resultados), 3),
+        'agregados_corretos': sum(r['agregado']['correto'] for r in agregadas),
+        'agregados': len(agregadas),
+        'sem_llm': sum(not r['agregado']['llm'] for r in agregadas),
+        'erro_relativo_linhas_p50': statistics.median(r['linhas']['erro_relativo'] for r in agregadas),
+    }
+    print(f"\n{resumo}")
+    caminho = salvar_resultado('agregacoes', {'parametros': vars(args), 'resumo': resumo, 'resultados': resultados})
+    print(f'Resultados gravados em {caminho}')
+    if resumo['agregados_corretos'] < resumo['agregados']:
+        raise SystemExit('Agregação diferente da referência calculada no banco')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Precisão e taxa de acerto dos caches de resposta do RAG (exato e semântico) em um conjunto
+reproduzível de perguntas (benchmarks/perguntas_rag.json).
+
+As perguntas são reproduzidas contra Agent3.run_query (filtros e recuperação reais, em
+uma base sintética), alternando entre as intenções: cada paráfrase chega depois de
+outras da mesma intenção já terem sido respondidas. A geração do Gemini é substituída
+por uma resposta que registra a pergunta de origem. Assim, cada acerto semântico pode
+ser conferido: ele é correto quando a resposta veio de uma pergunta da mesma intenção.
+
+Para cada limiar de similaridade:
+  - taxa de acerto: (acertos exatos + semânticos) / perguntas;
+  - precisão: acertos semânticos corretos / acertos semânticos;
+  - cobertura: acertos semânticos corretos / oportunidades (perguntas cuja intenção já
+    foi respondida com a mesma assinatura: filtros e ids do contexto iguais).
+
+Uso:
+    python -m benchmarks.bench_cache_rag                                  # embeddings lexicais (sem rede)
+    python -m benchmarks.bench_cache_rag --embeddings gemini --limiares 0.8 0.85 0.9 0.95
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.comum import RAIZ, conectar, recriar_schema, gerar_dados, aplicar_migracoes, criar_app_flask, salvar_resultado
+
+SCHEMA = 'bench_cache_rag'
+ARQUIVO_PERGUNTAS = os.path.join(RAIZ, 'benchmarks', 'perguntas_rag.json')
+
+
+def sequencia(conjunto):
+    """Paráfrases intercaladas entre as intenções (rodízio), seguidas das repetições."""
+    perguntas = []
+    intencao_de = {}
+    filas = [list(i['perguntas']) for i in conjunto['intencoes']]
+    for intencao in conjunto['intencoes']:
+        for pergunta in intencao['perguntas']:
+            intencao_de[pergunta] = intencao['id']
+    while any(filas):
+        for fila in filas:
+            if fila:
+                perguntas.append(fila.pop(0))
+    from agent3 import normalizar_pergunta
+    normalizadas = {normalizar_pergunta(p): intencao_de[p] for p in intencao_de}
+    for pergunta in conjunto['repeticoes']:
+        intencao_de[pergunta] = normalizadas[normalizar_pergunta(pergunta)]
+        perguntas.append(pergunta)
+    return perguntas, intencao_de
+
+
+def reproduzir(agente, perguntas, intencao_de):
+    import agent3
+    from cache import limpar_todos
+    limpar_todos()
+    respondidas = set()  # (intenção, assinatura) já respondidas pelo modelo ou pelo cache
+    r = {'perguntas': len(perguntas), 'chamadas_modelo': 0, 'exatos': 0, 'semanticos': 0,
+         'semanticos_corretos': 0, 'oportunidades': 0, 'erros': []}
+    for pergunta in perguntas:
+        intencao = intencao_de[pergunta]
+        filtros = agente._extract_filters(pergunta)
+        ids = agente._prepare_context(pergunta, filtros)['assinatura']
+        assinatura = (json.dumps({k: sorted(v) if isinstance(v, list) else v for k, v in filtros.items()},
+                                 sort_keys=True, default=str), ids)
+        resultado = agente.run_query(pergunta)
+        if resultado['cache'] == 'exato':
+            r['exatos'] += 1
+        elif (intencao, assinatura) in respondidas:
+            r['oportunidades'] += 1
+        if resultado['cache'] == 'semantico':
+            r['semanticos'] += 1
+            origem = resultado['pergunta_origem']
+            if intencao_de[origem] == intencao:
+                r['semanticos_corretos'] += 1
+            else:
+                r['erros'].append({'pergunta': pergunta, 'respondida_com': origem})
+        if not resultado['cache']:
+            r['chamadas_modelo'] += 1
+        respondidas.add((intencao, assinatura))
+
+    semanticos = r['semanticos']
+    r['taxa_acerto'] = round((r['exatos'] + semanticos) / len(perguntas), 3)
+    r['precisao'] = round(r['semanticos_corretos'] / semanticos, 3) if semanticos else None
+    r['cobertura'] = round(r['semanticos_corretos'] / r['oportunidades'], 3) if r['oportunidades'] else None
+    r['metricas_cache'] = agent3.CACHE_SEMANTICO.metricas()
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', choices=['lexical', 'gemini'], default='lexical')
+    parser.add_argument('--limiares', type=float, nargs='+', default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument('--movimentos', type=int, default=20_000)
+    args = parser.parse_args()
+    if args.embeddings == 'lexical':
+        os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+    with open(ARQUIVO_PERGUNTAS, encoding='utf-8') as f:
+        conjunto = json.load(f)
+
+    with conectar(SCHEMA) as conn:
+        print(f'Gerando base sintética ({args.movimentos:,} movimentos)...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos, pessoas=2_000, classificacoes_extras=0, anos=2)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '006_versao_dados.sql', '008_rag_documentos.sql')
+
+    import agent3
+    import cache
+    import invalidacao
+    from database import db
+    agent3.EMBEDDINGS_CACHE = args.embeddings
+    app = criar_app_flask(SCHEMA)
+    resultados = []
+    try:
+        with app.app_context():
+            # O cache de respostas só liga com a versão dos dados entregue pelo ouvinte
+            invalidacao.iniciar(db.engine)
+            while cache.versao_dados() is None:
+                time.sleep(0.01)
+            agente = agent3.Agent3()
+            # Geração simulada: a resposta identifica a pergunta que a originou
+            agente._call_models = lambda pergunta, dados, uso=None: f'resposta gerada para: {pergunta}'
+            # Embeddings memorizados: cada pergunta é embutida uma vez entre os limiares
+            embed_original, memoria = agente._embed_question, {}
+            agente._embed_question = lambda q: memoria[q] if q in memoria else memoria.setdefault(q, embed_original(q))
+
+            perguntas, intencao_de = sequencia(conjunto)
+            for limiar in args.limiares:
+                agent3.CACHE_SEMANTICO.limiar = limiar
+                print(f'Reproduzindo {len(perguntas)} perguntas com limiar {limiar}...')
+                resultados.append({'limiar': limiar, **reproduzir(agente, perguntas, intencao_de)})
+    finally:
+        invalidacao.parar()
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'limiar':>7} {'exatos':>7} {'semânt.':>8} {'corretos':>9} {'oport.':>7} {'modelo':>7} "
+          f"{'acerto':>7} {'precisão':>9} {'cobertura':>10}")
+    for r in resultados:
+        print(f"{r['limiar']:>7} {r['exatos']:>7} {r['semanticos']:>8} {r['semanticos_corretos']:>9} "
+              f"{r['oportunidades']:>7} {r['chamadas_modelo']:>7} {r['taxa_acerto']:>7} "
+              f"{str(r['precisao']):>9} {str(r['cobertura']):>10}")
+
+    caminho = salvar_resultado('cache_rag', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Rajada de requisições idênticas: sem coalescência, coalescência no worker e entre workers.
+
+Simula `processos` workers com `threads` requisições simultâneas cada (todas liberadas
+juntas por uma barreira), pedindo o mesmo relatório. A chamada upstream faz a agregação
+por categoria no banco e dorme `--latencia-llm` segundos, como a chamada ao Gemini.
+Cada execução upstream gera um id próprio; o número de ids distintos nas respostas é o
+número de chamadas upstream pagas.
+
+Uso:
+    python -m benchmarks.bench_coalescencia --processos 4 --threads 8 --latencia-llm 1.5
+"""
+import argparse
+import multiprocessing
+import statistics
+import threading
+import time
+import uuid
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.comum import url_conexao, conectar, recriar_schema, gerar_dados, aplicar_migracoes, salvar_resultado
+
+SCHEMA = 'bench_coalescencia'
+MODOS = ['sem_coalescencia', 'no_worker', 'entre_workers']
+
+SQL_RELATORIO = """
+    SELECT c.descricao, count(*), sum(m.valortotal)
+    FROM movimento_contas m
+    JOIN "MovimentoContas_has_Classificacao" mc ON mc."MovimentoContas_idMovimentoContas" = m."idMovimentoContas"
+    JOIN classificacao c ON c."idClassificacao" = mc."Classificacao_idClassificacao"
+    WHERE m.status = 'ATIVO' AND m.tipo = 'DESPESA'
+    GROUP BY c.descricao
+"""
+
+
+def worker(modo, threads, latencia, barreira, fila, rodada):
+    from coalescencia import Coalescedor
+    engine = create_engine(url_conexao().replace('postgresql://', 'postgresql+psycopg://', 1),
+                           connect_args={'options': f'-c search_path={SCHEMA},public'},
+                           pool_size=threads, max_overflow=threads)
+    coalescedor = Coalescedor('bench', entre_workers=(modo == 'entre_workers'), espera_segundos=60)
+
+    def upstream():
+        with engine.connect() as conexao:
+            linhas = conexao.execute(text(SQL_RELATORIO)).all()
+        time.sleep(latencia)
+        return {'sucesso': True, 'execucao': uuid.uuid4().hex, 'categorias': len(linhas)}
+
+    resultados = []
+
+    def requisicao():
+        barreira.wait()
+        inicio = time.perf_counter()
+        if modo == 'sem_coalescencia':
+            resultado = upstream()
+        else:
+            resultado, _ = coalescedor.executar(('relatorio-categorias', rodada), upstream, engine=engine)
+        resultados.append(((time.perf_counter() - inicio) * 1000, resultado['execucao']))
+
+    ts = [threading.Thread(target=requisicao) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    engine.dispose()
+    fila.put(resultados)
+
+
+def rajada(modo, processos, threads, latencia, rodada):
+    contexto = multiprocessing.get_context('fork')
+    barreira = contexto.Barrier(processos * threads)
+    fila = contexto.Queue()
+    ps = [contexto.Process(target=worker, args=(modo, threads, latencia, barreira, fila, rodada))
+          for _ in range(processos)]
+    inicio = time.perf_counter()
+    for p in ps:
+        p.start()
+    respostas = [r for _ in ps for r in fila.get()]
+    for p in ps:
+        p.join()
+    duracao = time.perf_counter() - inicio
+    latencias = sorted(ms for ms, _ in respostas)
+    return {
+        'requisicoes': len(respostas),
+        'chamadas_upstream': len({execucao for _, execucao in respostas}),
+        'segundos_total': round(duracao, 2),
+        'latencia_p50_ms': round(statistics.median(latencias), 1),
+        'latencia_max_ms': round(latencias[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processos', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latencia-llm', type=float, default=1.5)
+    parser.add_argument('--movimentos', type=int, default=200_000)
+    args = parser.parse_args()
+
+    with conectar(SCHEMA) as conn:
+        print(f'Gerando base sintética ({args.movimentos:,} movimentos)...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos, pessoas=20_000, classificacoes_extras=0)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '007_resultados_compartilhados.sql',
+                          '013_resultados_compartilhados_reserva.sql')
+
+    resultados = {}
+    try:
+        for rodada, modo in enumerate(MODOS):
+            print(f'Rajada {modo}: {args.processos} processos x {args.threads} threads...')
+            resultados[modo] = rajada(modo, args.processos, args.threads, args.latencia_llm, rodada)
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'modo':18} {'requisições':>12} {'upstream':>9} {'total s':>8} {'p50 ms':>9} {'max ms':>9}")
+    for modo, r in resultados.items():
+        print(f"{modo:18} {r['requisicoes']:>12} {r['chamadas_upstream']:>9} {r['segundos_total']:>8} "
+              f"{r['latencia_p50_ms']:>9} {r['latencia_max_ms']:>9}")
+
+    caminho = salvar_resultado('coalescencia', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
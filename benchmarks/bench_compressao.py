@@ -0,0 +1,141 @@
+"""
+Banda e latência economizadas pela compressão: estáticos pré-comprimidos e gzip das respostas JSON.
+
+Estáticos: roda estaticos.construir() e compara, para cada arquivo de static/css e static/js,
+os bytes originais, do .gz e do .br (com o pacote brotli), e os bytes de uma primeira visita a
+cada página (HTML + CSS + JS). Numa visita seguinte, os arquivos com hash vêm do cache do
+navegador sem nenhuma requisição (immutable); só o HTML trafega.
+
+JSON: sobe o app completo (LLM_BACKEND=simulador) sobre uma base sintética e mede cada rota sem
+e com Accept-Encoding: gzip: mediana do tempo no servidor (corpo inteiro lido pelo cliente de
+teste) e bytes da resposta. Com --banda-mbps, estima o tempo total (servidor + transferência)
+em cada banda, que é onde o gzip compensa o custo de CPU.
+
+Uso:
+    python -m benchmarks.bench_compressao --escala 10k --repeticoes 10 --banda-mbps 2 10 100
+"""
+import argparse
+import gzip
+import logging
+import os
+import statistics
+import time
+
+from benchmarks.comum import conectar, criar_app_completo, salvar_resultado
+from benchmarks.gerar import preparar_base
+from benchmarks.bench_suite import AMBIENTE_SUITE
+
+SCHEMA = 'bench_compressao'
+SEMENTE = 0.42
+PAGINAS = {
+    '/': ('css/style.css', 'js/script.js'),
+    '/admin': ('css/admin.css', 'js/admin.js'),
+    '/rag': ('css/admin.css', 'css/rag.css', 'js/busca_rag.js'),
+}
+ROTAS = {
+    'admin_movimentos_500': '/admin/api/movimentos?limite=500',
+    'admin_movimentos_50': '/admin/api/movimentos?limite=50',
+    'admin_pessoas': '/admin/api/pessoas?limite=200',
+    'relatorio_categorias': '/agente-ia/relatorio-categorias',
+    'analisar_fluxo_caixa': '/agente-ia/analisar-fluxo-caixa?periodo=365',
+    'exportar_movimentos_ndjson': '/exportar/movimentos?formato=ndjson',
+}
+
+
+def medir_estaticos(app, cliente):
+    import estaticos
+    inicio = time.perf_counter()
+    manifesto = estaticos.construir()
+    estaticos.manifesto.cache_clear()
+    construcao_ms = round((time.perf_counter() - inicio) * 1000, 1)
+    destino = os.path.join(estaticos.ORIGEM, estaticos.DESTINO)
+    arquivos = {}
+    for original, com_hash in sorted(manifesto.items()):
+        caminho = os.path.join(destino, com_hash)
+        tamanhos = {'original': os.path.getsize(caminho)}
+        for sufixo, nome in (('.gz', 'gzip'), ('.br', 'brotli')):
+            if os.path.exists(caminho + sufixo):
+                tamanhos[nome] = os.path.getsize(caminho + sufixo)
+        arquivos[original] = tamanhos
+    paginas = {}
+    app.debug = False  # estatico() só usa o manifesto fora do debug
+    for pagina, recursos in PAGINAS.items():
+        html = cliente.get(pagina).get_data()
+        sem = len(html) + sum(arquivos[r]['original'] for r in recursos)
+        com = len(gzip.compress(html, 6)) + sum(min(arquivos[r].values()) for r in recursos)
+        paginas[pagina] = {'primeira_visita_sem_compressao': sem, 'primeira_visita_comprimida': com,
+                           'visita_seguinte_comprimida': len(gzip.compress(html, 6)), 'economia': round(1 - com / sem, 3)}
+    return {'construcao_ms': construcao_ms, 'arquivos': arquivos, 'paginas': paginas}
+
+
+def medir_rota(cliente, url, repeticoes, cabecalhos):
+    tempos, tamanhos, codificacao = [], set(), None
+    cliente.get(url, headers=cabecalhos).get_data()  # aquecimento
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente.get(url, headers=cabecalhos)
+        corpo = resposta.get_data()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        tamanhos.add(len(corpo))
+        codificacao = resposta.headers.get('Content-Encoding')
+    return {'servidor_ms': round(statistics.median(tempos), 2), 'bytes': max(tamanhos), 'codificacao': codificacao}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escala', default='10k')
+    parser.add_argument('--schema', default=SCHEMA)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--banda-mbps', type=float, nargs='+', default=[2, 10, 100],
+                        help='bandas (Mbit/s) para estimar o tempo de transferência')
+    args = parser.parse_args()
+
+    for variavel, valor in AMBIENTE_SUITE.items():
+        os.environ.setdefault(variavel, valor)
+    logging.basicConfig(level=logging.ERROR)
+
+    with conectar(args.schema) as conn:
+        print(f'Gerando a escala {args.escala} (semente {SEMENTE}) no schema {args.schema}...')
+        base = preparar_base(conn, args.schema, args.escala, semente=SEMENTE)
+
+    rotas = {}
+    try:
+        app = criar_app_completo(args.schema)
+        cliente = app.test_client()
+        estaticos = medir_estaticos(app, cliente)
+        print(f"\nEstáticos (build em {estaticos['construcao_ms']} ms):")
+        for nome, tamanhos in estaticos['arquivos'].items():
+            print(f"  {nome:20} " + '  '.join(f'{tipo} {valor:>6} B' for tipo, valor in tamanhos.items()))
+        for pagina, r in estaticos['paginas'].items():
+            print(f"  página {pagina:8} 1ª visita {r['primeira_visita_sem_compressao']:>7} B -> "
+                  f"{r['primeira_visita_comprimida']:>6} B ({r['economia']:.0%} menos); "
+                  f"seguintes {r['visita_seguinte_comprimida']} B")
+
+        print('\nRespostas JSON (sem gzip -> com gzip):')
+        for nome, url in ROTAS.items():
+            sem = medir_rota(cliente, url, args.repeticoes, {})
+            com = medir_rota(cliente, url, args.repeticoes, {'Accept-Encoding': 'gzip'})
+            estimativas = {}
+            for banda in args.banda_mbps:
+                transferir = lambda n: n * 8 / (banda * 1e6) * 1000
+                estimativas[f'{banda:g}mbps'] = {
+                    'sem_gzip_ms': round(sem['servidor_ms'] + transferir(sem['bytes']), 1),
+                    'com_gzip_ms': round(com['servidor_ms'] + transferir(com['bytes']), 1),
+                }
+            rotas[nome] = {'url': url, 'sem_gzip': sem, 'com_gzip': com,
+                           'razao': round(com['bytes'] / sem['bytes'], 3), 'total_estimado': estimativas}
+            print(f"  {nome:28} {sem['bytes']:>9} B -> {com['bytes']:>8} B ({rotas[nome]['razao']:.0%})  "
+                  f"servidor {sem['servidor_ms']:>7} -> {com['servidor_ms']:>7} ms  "
+                  + '  '.join(f"{banda}: {e['sem_gzip_ms']} -> {e['com_gzip_ms']} ms" for banda, e in estimativas.items()))
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE')
+
+    caminho = salvar_resultado('compressao', {
+        'parametros': vars(args), 'semente': SEMENTE, 'linhas': base['linhas'],
+        'estaticos': estaticos, 'rotas': rotas})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Tamanho do prompt do Agent3: contexto em prosa (formato anterior) x contexto empacotado.
+
+Para cada pergunta de benchmarks/perguntas_rag.json, recupera os candidatos reais em uma
+base sintética e mede o bloco DADOS e o prompt completo em tokens estimados
+(contexto.estimar_tokens):
+  - prosa: as 20 primeiras linhas "[movimentos:123] NF ...; Emissão ...", como antes;
+  - empacotado: contexto.empacotar com o orçamento de cada execução (--orcamentos).
+
+O interesse é a faixa (mín./mediana/máx.) e o desvio: o tempo de geração cresce com o
+prompt, então um prompt previsível dá latência previsível. As agregações
+(agregacoes.py) ficam de fora: aqui só se compara o formato das linhas recuperadas.
+
+Uso:
+    python -m benchmarks.bench_contexto --orcamentos 600 1000 2000
+"""
+import argparse
+import json
+import os
+import statistics
+
+from benchmarks.comum import RAIZ, conectar, recriar_schema, gerar_dados, aplicar_migracoes, criar_app_flask, salvar_resultado
+
+SCHEMA = 'bench_contexto'
+ARQUIVO_PERGUNTAS = os.path.join(RAIZ, 'benchmarks', 'perguntas_rag.json')
+LINHAS_PROSA = 20
+
+
+def resumo(valores):
+    return {
+        'min': min(valores),
+        'p50': statistics.median(valores),
+        'max': max(valores),
+        'desvio': round(statistics.pstdev(valores), 1),
+    }
+
+
+def medir(agente, perguntas, orcamento):
+    import agent3
+    from contexto import estimar_tokens
+    agent3.ORCAMENTO_CONTEXTO = orcamento
+    dados, prompts, linhas, descartadas = [], [], [], []
+    for pergunta in perguntas:
+        pacote = agente._prepare_context(pergunta, agente._extract_filters(pergunta), agregar=False)
+        texto = pacote['texto'] or '(sem dados)'
+        dados.append(estimar_tokens(texto))
+        prompts.append(estimar_tokens(agente._build_prompt(pergunta, texto)))
+        linhas.append(len(pacote['incluidos']))
+        descartadas.append(pacote['descartados'])
+    return {'tokens_dados': resumo(dados), 'tokens_prompt': resumo(prompts),
+            'linhas': resumo(linhas), 'descartadas': resumo(descartadas)}
+
+
+def medir_prosa(agente, perguntas):
+    from contexto import estimar_tokens
+    dados, prompts, linhas = [], [], []
+    for pergunta in perguntas:
+        candidatos = agente._prepare_context(pergunta, agente._extract_filters(pergunta), agregar=False)['candidatos']
+        prosa = [agente._context_line(r) for r in candidatos[:LINHAS_PROSA]]
+        texto = '\n'.join(prosa) or '(sem dados)'
+        dados.append(estimar_tokens(texto))
+        prompts.append(estimar_tokens(agente._build_prompt(pergunta, texto)))
+        linhas.append(len(prosa))
+    return {'tokens_dados': resumo(dados), 'tokens_prompt': resumo(prompts), 'linhas': resumo(linhas)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orcamentos', type=int, nargs='+', default=[600, 1000, 2000])
+    parser.add_argument('--movimentos', type=int, default=20_000)
+    args = parser.parse_args()
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+    with open(ARQUIVO_PERGUNTAS, encoding='utf-8') as f:
+        conjunto = json.load(f)
+    perguntas = [p for i in conjunto['intencoes'] for p in i['perguntas']]
+
+    with conectar(SCHEMA) as conn:
+        print(f'Gerando base sintética ({args.movimentos:,} movimentos)...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos, pessoas=2_000, classificacoes_extras=0, anos=2)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '008_rag_documentos.sql')
+
+    import agent3
+    app = criar_app_flask(SCHEMA)
+    resultados = {}
+    try:
+        with app.app_context():
+            agente = agent3.Agent3()
+            print(f'Medindo {len(perguntas)} perguntas...')
+            resultados['prosa'] = medir_prosa(agente, perguntas)
+            for orcamento in args.orcamentos:
+                resultados[f'empacotado_{orcamento}'] = medir(agente, perguntas, orcamento)
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'formato':18} {'linhas p50':>10} {'dados mín':>10} {'p50':>6} {'máx':>6} {'desvio':>7} "
+          f"{'prompt mín':>11} {'p50':>6} {'máx':>6}")
+    for nome, r in resultados.items():
+        d, p = r['tokens_dados'], r['tokens_prompt']
+        print(f"{nome:18} {r['linhas']['p50']:>10} {d['min']:>10} {d['p50']:>6} {d['max']:>6} {d['desvio']:>7} "
+              f"{p['min']:>11} {p['p50']:>6} {p['max']:>6}")
+
+    caminho = salvar_resultado('contexto', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
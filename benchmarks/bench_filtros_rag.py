@@ -0,0 +1,206 @@
+"""
+Recall e tempo dos filtros de classificação e emitente do Agent3: Python depois do LIMIT
+(antigo) x SQL (Agent3._retrieve_data sobre rag_documentos, documentos.consulta).
+
+Referência: o mesmo filtro em Python (classificação com descrição exata; nome contido na
+razão social ou fantasia do emitente) aplicado a TODOS os movimentos ativos do período,
+mais recentes primeiro, cortado nos `--top` primeiros. Para cada caso:
+  - recall = ids da referência presentes no resultado / ids da referência;
+  - vazio = resultado vazio com referência não vazia (a pergunta cairia na amostra genérica);
+  - linhas fora do filtro no resultado do SQL (devem ser zero).
+
+Casos: emitentes frequentes, medianos e raros (cauda longa do gerador), classificações
+padrão e raras, e emitente + classificação; cada um sem período e no ano atual.
+Também registra o plano (EXPLAIN ANALYZE) da consulta SQL de um caso de cada grupo.
+
+Uso:
+    python -m benchmarks.bench_filtros_rag --movimentos 200000 --casos 10
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import time
+from datetime import date
+
+from benchmarks.comum import conectar, recriar_schema, gerar_dados, aplicar_migracoes, criar_app_flask, explain_analyze, salvar_resultado
+
+SCHEMA = 'bench_filtros_rag'
+
+SQL_REFERENCIA = """
+    SELECT m."idMovimentoContas", p.razaosocial, p.fantasia,
+           array(SELECT c.descricao FROM "MovimentoContas_has_Classificacao" mc
+                 JOIN classificacao c ON c."idClassificacao" = mc."Classificacao_idClassificacao"
+                 WHERE mc."MovimentoContas_idMovimentoContas" = m."idMovimentoContas")
+    FROM movimento_contas m
+    JOIN pessoas p ON p."idPessoas" = m."Pessoas_idFornecedorCliente"
+    WHERE m.status = 'ATIVO' AND m.dataemissao >= %s
+    ORDER BY m.dataemissao DESC, m."idMovimentoContas" DESC
+"""
+
+
+def atende(razaosocial, fantasia, classificacoes, cls_in, pessoas_n):
+    """O filtro que o Agent3 aplicava em Python, linha a linha."""
+    if cls_in and not any(n in cls_in for n in classificacoes):
+        return False
+    if pessoas_n:
+        nm = ((razaosocial or '') + ' ' + (fantasia or '')).lower()
+        if not any(x.lower() in nm for x in pessoas_n):
+            return False
+    return True
+
+
+def casos(conn, quantidade):
+    """{grupo: [(cls_in, pessoas_n)]} a partir da distribuição real dos dados gerados."""
+    rnd = random.Random(42)
+    fornecedores = conn.execute("""
+        SELECT p.razaosocial, count(*) FROM movimento_contas m
+        JOIN pessoas p ON p."idPessoas" = m."Pessoas_idFornecedorCliente"
+        WHERE m.status = 'ATIVO' GROUP BY p.razaosocial ORDER BY count(*) DESC
+    """).fetchall()
+    n = len(fornecedores)
+    classificacoes = conn.execute("""
+        SELECT c.descricao, count(*) FROM "MovimentoContas_has_Classificacao" mc
+        JOIN classificacao c ON c."idClassificacao" = mc."Classificacao_idClassificacao"
+        GROUP BY c.descricao ORDER BY count(*) DESC
+    """).fetchall()
+    padrao = [d for d, _ in classificacoes[:13]]
+    raras = [d for d, _ in classificacoes[13:]]
+
+    def amostra(lista):
+        return rnd.sample(lista, min(quantidade, len(lista)))
+
+    frequentes = [r for r, _ in fornecedores[:max(quantidade, n // 100)]]
+    return {
+        'emitente_frequente': [([], [r]) for r in amostra(frequentes)],
+        'emitente_mediano': [([], [r]) for r, _ in amostra(fornecedores[n // 2 - quantidade:n // 2 + quantidade])],
+        'emitente_raro': [([], [r]) for r, _ in amostra(fornecedores[-quantidade * 5:])],
+        'classificacao_padrao': [([d], []) for d in amostra(padrao)],
+        'classificacao_rara': [([d], []) for d in amostra(raras)],
+        'emitente_e_classificacao': [([rnd.choice(padrao)], [r]) for r in amostra(frequentes)],
+    }
+
+
+def consulta_antiga(filtros, top):
+    """Reprodução do _retrieve_data anterior: LIMIT no SQL e filtro em Python (com lazy loads)."""
+    from database import MovimentoContas
+    cls_in = set(filtros['classificacoes_incluidas'])
+    pessoas_n = set(filtros['pessoas_nomes'])
+    q = MovimentoContas.query.filter(MovimentoContas.status == 'ATIVO')
+    if filtros['data_inicio']:
+        q = q.filter(MovimentoContas.dataemissao >= filtros['data_inicio'])
+    itens = q.order_by(MovimentoContas.dataemissao.desc(), MovimentoContas.idMovimentoContas.desc()).limit(top).all()
+    ids = []
+    for m in itens:
+        fc = m.fornecedor_cliente
+        if atende(fc.razaosocial if fc else '', fc.fantasia if fc else '',
+                  [c.descricao for c in m.classificacoes], cls_in, pessoas_n):
+            ids.append(f'movimentos:{m.idMovimentoContas}')
+    return ids
+
+
+def medir(agente, conn, grupos, top, periodos):
+    import documentos
+    from database import db
+    resultados = {}
+    referencias, linhas = {}, {}
+    for nome_periodo, inicio in periodos.items():
+        referencias[nome_periodo] = conn.execute(SQL_REFERENCIA, (inicio,)).fetchall()
+        linhas[nome_periodo] = {f'movimentos:{i}': (rs, fa, cl) for i, rs, fa, cl in referencias[nome_periodo]}
+
+    for grupo, lista in grupos.items():
+        for nome_periodo, inicio in periodos.items():
+            r = {'casos': 0, 'recall_antigo': [], 'recall_sql': [], 'vazios_antigo': 0, 'vazios_sql': 0,
+                 'fora_do_filtro_sql': 0, 'ms_antigo': [], 'ms_sql': []}
+            for cls_in, pessoas_n in lista:
+                filtros = {'alvo': 'movimentos', 'data_inicio': inicio, 'data_fim': None, 'min_valor': None,
+                           'max_valor': None, 'classificacoes_incluidas': cls_in, 'pessoas_nomes': pessoas_n}
+                referencia = [f'movimentos:{i}' for i, rs, fa, cl in referencias[nome_periodo]
+                              if atende(rs, fa, cl, set(cls_in), set(pessoas_n))][:top]
+                if not referencia:
+                    continue
+                db.session.expunge_all()
+                gc.collect()
+                t = time.perf_counter()
+                antigo = consulta_antiga(filtros, top)
+                r['ms_antigo'].append((time.perf_counter() - t) * 1000)
+                db.session.expunge_all()
+                gc.collect()
+                t = time.perf_counter()
+                novo = agente._retrieve_data('', filtros)
+                r['ms_sql'].append((time.perf_counter() - t) * 1000)
+
+                ids_novo = [x['id'] for x in novo]
+                r['casos'] += 1
+                r['recall_antigo'].append(len(set(antigo) & set(referencia)) / len(referencia))
+                r['recall_sql'].append(len(set(ids_novo) & set(referencia)) / len(referencia))
+                r['vazios_antigo'] += not antigo
+                r['vazios_sql'] += not ids_novo
+                r['fora_do_filtro_sql'] += sum(
+                    not atende(*linhas[nome_periodo][i], set(cls_in), set(pessoas_n)) for i in ids_novo)
+
+            if not r['casos']:
+                continue
+            for chave in ('recall_antigo', 'recall_sql'):
+                r[chave] = round(statistics.mean(r[chave]), 3)
+            for chave in ('ms_antigo', 'ms_sql'):
+                r[chave] = round(statistics.median(r[chave]), 2)
+            # Plano da consulta SQL do primeiro caso do grupo
+            cls_in, pessoas_n = lista[0]
+            filtros = {'data_inicio': inicio, 'classificacoes_incluidas': cls_in, 'pessoas_nomes': pessoas_n}
+            compilado = documentos.consulta('movimentos', filtros).limit(top).compile(
+                dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+            plano = explain_analyze(conn, str(compilado), compilado.params, repeticoes=3)
+            r['plano'] = {'tempo_ms': plano['tempo_ms'], 'indices': plano['indices']}
+            resultados[f'{grupo}/{nome_periodo}'] = r
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movimentos', type=int, default=200_000)
+    parser.add_argument('--pessoas', type=int, default=20_000)
+    parser.add_argument('--casos', type=int, default=10)
+    parser.add_argument('--top', type=int, default=50)
+    args = parser.parse_args()
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+    with conectar(SCHEMA) as conn:
+        print(f'Gerando base sintética ({args.movimentos:,} movimentos)...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos, pessoas=args.pessoas, classificacoes_extras=200, anos=3)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '002_indices_trigrama.sql', '008_rag_documentos.sql')
+        conn.execute('ANALYZE')
+
+    import agent3
+    agent3.CANDIDATOS_CONTEXTO = args.top
+    app = criar_app_flask(SCHEMA)
+    periodos = {'sem_periodo': date(1900, 1, 1), 'ano_atual': date(date.today().year, 1, 1)}
+    try:
+        with app.app_context(), conectar(SCHEMA) as conn:
+            agente = agent3.Agent3()
+            grupos = casos(conn, args.casos)
+            print(f"Medindo {sum(len(v) for v in grupos.values())} casos x {len(periodos)} períodos...")
+            resultados = medir(agente, conn, grupos, args.top, periodos)
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'grupo/período':40} {'casos':>5} {'recall ant.':>11} {'recall SQL':>10} {'vazios ant.':>11} "
+          f"{'vazios SQL':>10} {'ms ant.':>8} {'ms SQL':>7} {'ms plano':>8}  índices")
+    for nome, r in resultados.items():
+        print(f"{nome:40} {r['casos']:>5} {r['recall_antigo']:>11} {r['recall_sql']:>10} {r['vazios_antigo']:>11} "
+              f"{r['vazios_sql']:>10} {r['ms_antigo']:>8} {r['ms_sql']:>7} {r['plano']['tempo_ms']:>8}  "
+              f"{', '.join(r['plano']['indices'])}")
+
+    falhas = {n: r for n, r in resultados.items() if r['recall_sql'] < 1 or r['fora_do_filtro_sql']}
+    caminho = salvar_resultado('filtros_rag', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+    if falhas:
+        raise SystemExit(f'Recall abaixo de 1 ou linhas fora do filtro no SQL: {sorted(falhas)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Vazão da importação histórica (importacao.py) em linhas por minuto.
+
+Gera CSVs sintéticos no formato de planilha legada (datas DD/MM/AAAA, valores
+"1.234,56", fornecedores repetidos, ~1% de linhas inválidas) e importa
+movimentos e parcelas em um schema isolado com base pré-populada.
+
+Uso:
+    python -m benchmarks.bench_importacao --linhas 300000
+"""
+import argparse
+import csv
+import random
+import tempfile
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine
+
+from importacao import COLUNAS, importar_csv
+from benchmarks.comum import url_conexao, conectar, recriar_schema, gerar_dados, aplicar_migracoes, salvar_resultado
+
+SCHEMA = 'bench_importacao'
+CLASSIFICACOES = ['INSUMOS AGRÍCOLAS', 'MANUTENÇÃO E OPERAÇÃO', 'COMBUSTÍVEIS', 'HISTÓRICO LEGADO {}']
+
+
+def _valor_br(valor):
+    inteiro, centavos = f'{valor:.2f}'.split('.')
+    return f"{int(inteiro):,}".replace(',', '.') + ',' + centavos
+
+
+def escrever_csv(arquivo, tipo, linhas, fornecedores):
+    escritor = csv.writer(arquivo, delimiter=';')
+    escritor.writerow(COLUNAS[tipo] if tipo == 'parcelas' else
+                      [c for c in COLUNAS[tipo] if c not in ('status', 'faturado_razaosocial')])
+    inicio = date(2018, 1, 1)
+    for i in range(linhas):
+        data = inicio + timedelta(days=random.randint(0, 5 * 365))
+        valor = round(random.uniform(10, 50_000), 2)
+        invalida = random.random() < 0.01
+        if tipo == 'movimentos':
+            fornecedor = random.randint(1, fornecedores)
+            escritor.writerow([
+                random.choice(['DESPESA', 'DESPESA', 'RECEITA']),
+                f'LEG-{i}',
+                '31/02/2020' if invalida else data.strftime('%d/%m/%Y'),
+                'lançamento histórico',
+                _valor_br(valor),
+                f'{fornecedor:014d}',
+                f'FORNECEDOR LEGADO {fornecedor}',
+                '999.999.999-99',
+                ';'.join(c.format(i % 50) for c in random.sample(CLASSIFICACOES, random.randint(1, 2))),
+            ])
+        else:
+            escritor.writerow([
+                f'LEG-{i}-1', data.strftime('%d/%m/%Y'),
+                'abc' if invalida else _valor_br(valor), '0', '', 'PENDENTE',
+            ])
+
+
+def importar(engine, tipo, linhas, fornecedores):
+    with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as texto:
+        escrever_csv(texto, tipo, linhas, fornecedores)
+        texto.flush()
+        with open(texto.fileno(), 'rb', closefd=False) as binario:
+            binario.seek(0)
+            return importar_csv(engine, tipo, binario, f'{tipo}.csv', delimitador=';')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=300_000)
+    parser.add_argument('--movimentos-base', type=int, default=100_000,
+                        help='movimentos pré-existentes na base sintética')
+    parser.add_argument('--fornecedores', type=int, default=30_000,
+                        help='fornecedores distintos no CSV (parte já cadastrada)')
+    args = parser.parse_args()
+
+    with conectar(SCHEMA) as conn:
+        print('Preparando schema e base sintética...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos_base, pessoas=20_000, classificacoes_extras=0)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '003_pessoas_documento_unico.sql',
+                          '004_importacao_historica.sql')
+
+    engine = create_engine(url_conexao().replace('postgresql://', 'postgresql+psycopg://', 1),
+                           connect_args={'options': f'-c search_path={SCHEMA},public'})
+    random.seed(42)
+    resultados = {}
+    for tipo in ('movimentos', 'parcelas'):
+        print(f'Importando {args.linhas:,} {tipo}...')
+        resultados[tipo] = importar(engine, tipo, args.linhas, args.fornecedores)
+    engine.dispose()
+
+    with conectar() as conn:
+        conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'tipo':12} {'linhas':>10} {'importadas':>11} {'erros':>7} {'segundos':>9} {'linhas/min':>12}")
+    for tipo, r in resultados.items():
+        print(f"{tipo:12} {r['linhas_lidas']:>10,} {r['importadas']:>11,} {r['erros']:>7,} "
+              f"{r['segundos']:>9.2f} {r['linhas_por_minuto']:>12,}")
+
+    caminho = salvar_resultado('importacao', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark dos índices de migrations/001 e 002 sobre uma base sintética.
+
+Para cada padrão de consulta do código roda EXPLAIN (ANALYZE, BUFFERS) com os
+índices originais de database_schema.sql, aplica as migrações e repete a medição.
+Sem a extensão pg_trgm no servidor, a 002 não é aplicada e a consulta por trecho do
+nome fica fora da medição (em vez de aparecer como índice não usado).
+
+Uso:
+    python -m benchmarks.bench_indices                  # 1 milhão de movimentos
+    python -m benchmarks.bench_indices --movimentos 100000
+"""
+import argparse
+import time
+
+from benchmarks.comum import conectar, recriar_schema, gerar_dados, aplicar_migracoes, explain_analyze, salvar_resultado
+
+SCHEMA = 'bench_indices'
+
+# (nome, índice que justifica, SQL, função que sorteia parâmetros)
+CONSULTAS = [
+    (
+        'nota_fiscal_por_numero',
+        'idx_movimento_numeronotafiscal',
+        'SELECT * FROM movimento_contas WHERE numeronotafiscal = %s LIMIT 1',
+        lambda c: (c.execute('SELECT numeronotafiscal FROM movimento_contas ORDER BY random() LIMIT 1').fetchone()[0],),
+    ),
+    (
+        'agent3_ativos_recentes',
+        'idx_movimento_ativo_dataemissao',
+        "SELECT * FROM movimento_contas WHERE status = 'ATIVO' "
+        'ORDER BY dataemissao DESC, "idMovimentoContas" DESC LIMIT 20',
+        lambda c: None,
+    ),
+    (
+        'agent3_ativos_periodo',
+        'idx_movimento_ativo_dataemissao',
+        "SELECT * FROM movimento_contas WHERE status = 'ATIVO' AND dataemissao >= current_date - 30 "
+        'AND dataemissao <= current_date ORDER BY dataemissao DESC, "idMovimentoContas" DESC LIMIT 20',
+        lambda c: None,
+    ),
+    (
+        'movimentos_por_fornecedor',
+        'idx_movimento_fornecedor',
+        'SELECT * FROM movimento_contas WHERE "Pessoas_idFornecedorCliente" = %s',
+        lambda c: (c.execute('SELECT (random() * 5000)::int + 100').fetchone()[0],),
+    ),
+    (
+        'movimentos_por_faturado',
+        'idx_movimento_faturado',
+        'SELECT * FROM movimento_contas WHERE "Pessoas_idFaturado" = %s',
+        lambda c: (c.execute('SELECT (random() * 5000)::int + 100').fetchone()[0],),
+    ),
+    (
+        'classificacao_por_descricao_tipo',
+        'idx_classificacao_descricao_tipo',
+        "SELECT * FROM classificacao WHERE descricao = %s AND tipo = 'DESPESA' LIMIT 1",
+        lambda c: ('CLASSIFICACAO AUTOMATICA 1500',),
+    ),
+    (
+        'movimentos_da_classificacao',
+        'idx_mov_classificacao_classificacao',
+        'SELECT "MovimentoContas_idMovimentoContas" FROM "MovimentoContas_has_Classificacao" '
+        'WHERE "Classificacao_idClassificacao" = %s',
+        lambda c: (500,),
+    ),
+    (
+        'pessoas_por_trecho_do_nome',
+        'idx_pessoas_razaosocial_trgm',
+        'SELECT * FROM pessoas WHERE razaosocial ILIKE %s',
+        lambda c: ('%SOUZA 123%',),
+    ),
+]
+
+
+def medir(conn, consultas, params_por_consulta):
+    return {
+        nome: explain_analyze(conn, sql, params_por_consulta[nome])
+        for nome, _, sql, _ in consultas
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movimentos', type=int, default=1_000_000)
+    parser.add_argument('--pessoas', type=int, default=50_000)
+    parser.add_argument('--manter-schema', action='store_true', help='não remove o schema ao final')
+    args = parser.parse_args()
+
+    with conectar(SCHEMA) as conn:
+        print(f'Gerando base sintética ({args.movimentos:,} movimentos)...')
+        inicio = time.time()
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos, pessoas=args.pessoas)
+        print(f'  pronto em {time.time() - inicio:.1f}s')
+
+        trigram = conn.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").fetchone() is not None
+        consultas = [c for c in CONSULTAS if trigram or not c[1].endswith('_trgm')]
+        migracoes = ['001_indices_padroes_consulta.sql'] + (['002_indices_trigrama.sql'] if trigram else [])
+        if not trigram:
+            print('pg_trgm indisponível: a consulta por trecho do nome não será medida')
+
+        # Mesmos parâmetros antes e depois, para comparar planos equivalentes
+        params = {nome: sorteio(conn) for nome, _, _, sorteio in consultas}
+
+        print('Medindo com os índices originais...')
+        antes = medir(conn, consultas, params)
+        print(f"Aplicando {', '.join(migracoes)}...")
+        aplicar_migracoes(conn, *migracoes)
+        print('Medindo com os novos índices...')
+        depois = medir(conn, consultas, params)
+        if not args.manter_schema:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    resultados = []
+    print()
+    print(f"{'consulta':34} {'índice':38} {'antes ms':>10} {'depois ms':>10} {'ganho':>8}  plano depois")
+    for nome, indice, _, _ in consultas:
+        a, d = antes[nome], depois[nome]
+        ganho = a['tempo_ms'] / d['tempo_ms'] if d['tempo_ms'] else float('inf')
+        usado = indice in d['indices']
+        print(f"{nome:34} {indice:38} {a['tempo_ms']:>10.3f} {d['tempo_ms']:>10.3f} {ganho:>7.1f}x  "
+              f"{'/'.join(d['nos'][:3])}{'' if usado else '  (índice não usado)'}")
+        resultados.append({'consulta': nome, 'indice': indice, 'indice_usado': usado,
+                           'antes': a, 'depois': d, 'ganho': round(ganho, 2)})
+
+    caminho = salvar_resultado('indices', {
+        'parametros': {'movimentos': args.movimentos, 'pessoas': args.pessoas, 'pg_trgm': trigram},
+        'resultados': resultados,
+    })
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Perfil de cold start do backend: imports, create_app, primeira requisição e reinício de worker.
+
+1. Roda `python -X importtime` sobre `from app import create_app; create_app()`
+   e resume o custo por módulo (cumulativo, níveis 0 e 1 da árvore de imports)
+   e por pacote (soma do tempo próprio).
+2. Em subprocessos novos, mede import de app.py, create_app, a primeira e a
+   segunda requisição a /healthz e o custo adiado pelos imports sob demanda
+   (app.aquecer com modulos=True e a primeira chamada a cliente_genai).
+3. Sobe o gunicorn (gunicorn.conf.py) com um único worker, mata o worker com
+   SIGKILL e mede quanto tempo /healthz fica sem responder até o novo worker
+   (criado por fork do mestre já carregado) atender.
+
+Uso:
+    python -m benchmarks.bench_inicializacao --repeticoes 5 --reinicios 5
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.comum import RAIZ, ambiente_app, conectar, salvar_resultado
+
+SCHEMA = 'bench_inicializacao'
+PORTA = 5078
+
+CODIGO_CREATE_APP = 'from app import create_app; create_app()'
+
+MEDIR_PROCESSO = '''
+import json, time
+t0 = time.perf_counter()
+import app as modulo
+t1 = time.perf_counter()
+aplicacao = modulo.create_app()
+t2 = time.perf_counter()
+cliente = aplicacao.test_client()
+assert cliente.get('/healthz').status_code == 200
+t3 = time.perf_counter()
+cliente.get('/healthz')
+t4 = time.perf_counter()
+modulos = modulo.aquecer(aplicacao, conexoes=False)['modulos']
+t5 = time.perf_counter()
+modulo.cliente_genai()
+t6 = time.perf_counter()
+print(json.dumps({
+    'ms_import_app': (t1 - t0) * 1000,
+    'ms_create_app': (t2 - t1) * 1000,
+    'ms_primeira_healthz': (t3 - t2) * 1000,
+    'ms_segunda_healthz': (t4 - t3) * 1000,
+    'ms_aquecer_modulos': modulos,
+    'ms_primeiro_cliente_genai': (t6 - t5) * 1000,
+}))
+'''
+
+
+def perfil_importacao(repeticoes, top):
+    """Mediana, entre execuções, do -X importtime por módulo e por pacote."""
+    por_modulo, por_pacote, totais = {}, {}, []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', CODIGO_CREATE_APP], cwd=RAIZ,
+                               env=ambiente_app(SCHEMA), capture_output=True, text=True, check=True).stderr
+        pacotes, total = {}, 0
+        for linha in saida.splitlines():
+            if not linha.startswith('import time:') or 'self [us]' in linha:
+                continue
+            proprio, cumulativo, nome = linha[len('import time:'):].split('|')
+            nivel = (len(nome) - len(nome.lstrip()) - 1) // 2
+            nome = nome.strip()
+            proprio, cumulativo = int(proprio) / 1000, int(cumulativo) / 1000
+            if nivel == 0:
+                total += cumulativo
+            if nivel <= 1:
+                por_modulo.setdefault((nome, nivel), []).append(cumulativo)
+            pacote = nome.split('.')[0]
+            pacotes[pacote] = pacotes.get(pacote, 0) + proprio
+        for pacote, ms in pacotes.items():
+            por_pacote.setdefault(pacote, []).append(ms)
+        totais.append(total)
+
+    modulos = sorted(
+        ({'modulo': nome, 'nivel': nivel, 'ms_cumulativo': round(statistics.median(v), 1)}
+         for (nome, nivel), v in por_modulo.items()),
+        key=lambda m: -m['ms_cumulativo'])
+    pacotes = sorted(
+        ({'pacote': nome, 'ms_proprio': round(statistics.median(v), 1)} for nome, v in por_pacote.items()),
+        key=lambda p: -p['ms_proprio'])
+    return {
+        'ms_total_imports': round(statistics.median(totais), 1),
+        'modulos': modulos[:top],
+        'pacotes': pacotes[:top],
+    }
+
+
+def tempos_processo(repeticoes):
+    medicoes = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', MEDIR_PROCESSO], cwd=RAIZ, env=ambiente_app(SCHEMA),
+                               capture_output=True, text=True, check=True).stdout
+        medicoes.append(json.loads(saida.strip().splitlines()[-1]))
+    return {chave: round(statistics.median(m[chave] for m in medicoes), 1) for chave in medicoes[0]}
+
+
+def healthz_ok(timeout=1):
+    try:
+        conexao = http.client.HTTPConnection('127.0.0.1', PORTA, timeout=timeout)
+        conexao.request('GET', '/healthz')
+        return conexao.getresponse().status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+
+
+def aguardar(condicao, limite=60, intervalo=0.005):
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        if condicao():
+            return (time.perf_counter() - inicio) * 1000
+        time.sleep(intervalo)
+    raise RuntimeError('tempo esgotado aguardando o servidor')
+
+
+def workers(mestre):
+    saida = subprocess.run(['pgrep', '-P', str(mestre)], capture_output=True, text=True).stdout
+    return {int(pid) for pid in saida.split()}
+
+
+def reinicio_worker(reinicios):
+    """Downtime de /healthz (1 worker) entre o SIGKILL do worker e a primeira resposta do substituto."""
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{PORTA}',
+         '--workers', '1', 'app:create_app()'],
+        cwd=RAIZ, env=ambiente_app(SCHEMA), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        aguardar(healthz_ok)
+        resultado = {'ms_gunicorn_ate_primeiro_healthz': round((time.perf_counter() - inicio) * 1000, 1)}
+        downtimes = []
+        for _ in range(reinicios):
+            antigo, = workers(processo.pid)
+            os.kill(antigo, signal.SIGKILL)
+            aguardar(lambda: antigo not in workers(processo.pid))
+            downtimes.append(aguardar(lambda: healthz_ok(timeout=0.5)))
+            time.sleep(0.2)
+        resultado['ms_downtime_reinicio_worker'] = {
+            'mediana': round(statistics.median(downtimes), 1),
+            'max': round(max(downtimes), 1),
+            'amostras': [round(d, 1) for d in downtimes],
+        }
+        return resultado
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--reinicios', type=int, default=5)
+    parser.add_argument('--top', type=int, default=20, help='módulos e pacotes listados no relatório')
+    args = parser.parse_args()
+
+    # Schema vazio: preparar_banco (gunicorn on_starting) cria as tabelas
+    with conectar() as conn:
+        conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        conn.execute(f'CREATE SCHEMA {SCHEMA}')
+
+    try:
+        print('Reinício de worker no gunicorn...')
+        gunicorn = reinicio_worker(args.reinicios)
+        print('Perfil de imports (-X importtime)...')
+        imports = perfil_importacao(args.repeticoes, args.top)
+        print('Tempos por processo...')
+        processo = tempos_processo(args.repeticoes)
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"imports (soma do nível 0): {imports['ms_total_imports']} ms")
+    print(f"{'módulo':48} {'ms cumulativo':>14}")
+    for m in imports['modulos']:
+        print(f"{'  ' * m['nivel'] + m['modulo']:48} {m['ms_cumulativo']:>14}")
+    print(f"\n{'pacote':30} {'ms próprio':>11}")
+    for p in imports['pacotes']:
+        print(f"{p['pacote']:30} {p['ms_proprio']:>11}")
+    print()
+    for chave, valor in {**processo, **gunicorn}.items():
+        print(f'{chave:36} {valor}')
+
+    caminho = salvar_resultado('inicializacao', {
+        'parametros': vars(args),
+        'resultados': {'processo': processo, 'gunicorn': gunicorn, 'imports': imports},
+    })
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
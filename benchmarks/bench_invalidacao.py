@@ -0,0 +1,187 @@
+"""
+Barramento de invalidação (migração 009 + invalidacao.py): custo na escrita e propagação.
+
+Mede, em uma base sintética:
+  - escrita: transação de upload (1 movimento, 1 parcela, 2 vínculos) e UPDATE em massa,
+    com os triggers de NOTIFY habilitados e desabilitados, em rodadas alternadas (a base
+    tem também os triggers das migrações 006 e 008);
+  - propagação: `processos` workers com o ouvinte conectado; a cada escrita, o tempo do
+    envio do comando (autocommit) até o evento chegar a cada worker (callback registrado);
+  - leitura da versão dos dados: cache.versao_dados com o ouvinte (memória) x sem ele
+    (consulta à sequência no primário, o caminho de antes);
+  - ids das pessoas citadas na pergunta (ILIKE): consulta x cache de referência.
+
+Uso:
+    python -m benchmarks.bench_invalidacao --movimentos 200000 --processos 4
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import time
+
+from benchmarks.comum import conectar, recriar_schema, gerar_dados, aplicar_migracoes, criar_app_flask, salvar_resultado
+
+SCHEMA = 'bench_invalidacao'
+
+SQL_UPLOAD = """
+    WITH m AS (
+        INSERT INTO movimento_contas (tipo, numeronotafiscal, dataemissao, descricao, valortotal,
+                                      "Pessoas_idFornecedorCliente", "Pessoas_idFaturado")
+        VALUES ('DESPESA', %(nf)s, current_date, 'ITEM bench - óleo diesel', 1234.56, 1, 2)
+        RETURNING "idMovimentoContas" AS id
+    ), p AS (
+        INSERT INTO parcelas_contas (identificacao, datavencimento, valorparcela, valorsaldo)
+        VALUES (%(nf)s || '-1', current_date + 30, 1234.56, 1234.56)
+    )
+    INSERT INTO "MovimentoContas_has_Classificacao"
+    SELECT m.id, c FROM m, unnest(ARRAY[1, 2]) c
+"""
+
+
+def alternar_notify(conn, acao):
+    for tabela in ('movimento_contas', 'parcelas_contas', 'pessoas', 'classificacao',
+                   'MovimentoContas_has_Classificacao'):
+        for evento in ('insert', 'update', 'delete', 'truncate'):
+            conn.execute(f'ALTER TABLE "{tabela}" {acao} TRIGGER trg_dados_alterados_{evento}')
+
+
+def medir_escrita(conn, repeticoes, em_massa):
+    tempos = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        with conn.transaction():
+            conn.execute(SQL_UPLOAD, {'nf': f'B{time.monotonic_ns()}-{i}'})
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    inicio = time.perf_counter()
+    with conn.transaction():
+        conn.execute('UPDATE movimento_contas SET status = status WHERE "idMovimentoContas" <= %s', (em_massa,))
+    return {'upload_p50_ms': round(statistics.median(tempos), 3),
+            'upload_p95_ms': round(sorted(tempos)[int(len(tempos) * 0.95)], 3),
+            'update_em_massa_ms': round((time.perf_counter() - inicio) * 1000, 1)}
+
+
+def worker(pronto, fila, parar):
+    import invalidacao
+    from database import db
+    app = criar_app_flask(SCHEMA)
+    with app.app_context():
+        invalidacao.registrar('bench', lambda evento: fila.put((os.getpid(), evento['tabela'], evento['ids'],
+                                                                 time.time())))
+        invalidacao.iniciar(db.engine)
+        while not invalidacao.conectado():
+            time.sleep(0.01)
+        pronto.release()
+        parar.wait()
+        invalidacao.parar()
+
+
+def medir_propagacao(processos, escritas):
+    contexto = multiprocessing.get_context('fork')
+    pronto, fila, parar = contexto.Semaphore(0), contexto.Queue(), contexto.Event()
+    ps = [contexto.Process(target=worker, args=(pronto, fila, parar)) for _ in range(processos)]
+    for p in ps:
+        p.start()
+    for _ in ps:
+        pronto.acquire()
+    while not fila.empty():
+        fila.get()  # ressincronização da conexão
+
+    latencias = []
+    with conectar(SCHEMA) as conn:
+        for i in range(escritas):
+            # Do envio do comando (autocommit) ao evento no worker: inclui o próprio COMMIT
+            enviado = time.time()
+            conn.execute('UPDATE pessoas SET fantasia = %s WHERE "idPessoas" = %s', (f'BENCH {i}', i + 1))
+            recebidos = [fila.get(timeout=10) for _ in ps]
+            assert all(ids == [i + 1] and tabela == 'pessoas' for _, tabela, ids, _ in recebidos)
+            latencias += [(recebido - enviado) * 1000 for *_, recebido in recebidos]
+            time.sleep(0.005)
+    parar.set()
+    for p in ps:
+        p.join()
+    latencias.sort()
+    return {'eventos': len(latencias), 'p50_ms': round(statistics.median(latencias), 3),
+            'p95_ms': round(latencias[int(len(latencias) * 0.95)], 3), 'max_ms': round(latencias[-1], 3)}
+
+
+def medir_leituras(repeticoes):
+    import cache
+    import documentos
+    import invalidacao
+    from database import db
+    app = criar_app_flask(SCHEMA)
+
+    def cronometrar(funcao):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao()
+        return round((time.perf_counter() - inicio) * 1000 / repeticoes, 4)
+
+    with app.app_context():
+        nome = db.session.execute(db.text('SELECT razaosocial FROM pessoas ORDER BY "idPessoas" DESC LIMIT 1')).scalar()
+        db.session.rollback()
+        ler_sequencia = db.text('SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM versao_dados_seq')
+
+        def versao_banco():
+            with db.engine.connect() as conexao:
+                return conexao.execute(ler_sequencia).scalar()
+
+        # Leitura direta da sequência (como antes do ouvinte), só para comparação
+        r = {'versao_banco_ms': cronometrar(versao_banco),
+             'ids_pessoas_banco_ms': cronometrar(lambda: documentos.ids_pessoas([nome]))}
+        invalidacao.iniciar(db.engine)
+        while not invalidacao.conectado():
+            time.sleep(0.01)
+        while cache.versao_dados() is None:
+            time.sleep(0.01)
+        r['versao_ouvinte_ms'] = cronometrar(cache.versao_dados)
+        r['ids_pessoas_cache_ms'] = cronometrar(lambda: documentos.ids_pessoas([nome]))
+        invalidacao.parar()
+    return r
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movimentos', type=int, default=200_000)
+    parser.add_argument('--processos', type=int, default=4)
+    parser.add_argument('--escritas', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=300)
+    parser.add_argument('--em-massa', type=int, default=20_000, help='linhas do UPDATE em massa')
+    parser.add_argument('--rodadas', type=int, default=3)
+    args = parser.parse_args()
+
+    resultados = {}
+    try:
+        with conectar(SCHEMA) as conn:
+            print(f'Gerando base sintética ({args.movimentos:,} movimentos)...')
+            recriar_schema(conn, SCHEMA)
+            gerar_dados(conn, movimentos=args.movimentos, pessoas=20_000, classificacoes_extras=200, anos=3)
+            aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '006_versao_dados.sql',
+                              '008_rag_documentos.sql', '009_notificacoes_dados.sql')
+            rodadas = {'escrita_sem_notify': [], 'escrita_com_notify': []}
+            for rodada in range(args.rodadas):
+                for nome, acao in (('escrita_sem_notify', 'DISABLE'), ('escrita_com_notify', 'ENABLE')):
+                    print(f'Rodada {rodada + 1}: {nome}...')
+                    alternar_notify(conn, acao)
+                    rodadas[nome].append(medir_escrita(conn, args.repeticoes, args.em_massa))
+            for nome, medidas in rodadas.items():
+                resultados[nome] = {k: statistics.median(m[k] for m in medidas) for k in medidas[0]}
+
+        print(f'Propagação para {args.processos} workers ({args.escritas} escritas)...')
+        resultados['propagacao'] = medir_propagacao(args.processos, args.escritas)
+        print('Leituras da versão e dos ids de referência...')
+        resultados['leituras'] = medir_leituras(args.repeticoes)
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+
+    print()
+    for nome, r in resultados.items():
+        print(f'{nome:20} {r}')
+    caminho = salvar_resultado('invalidacao', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
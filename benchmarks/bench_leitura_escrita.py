@@ -0,0 +1,109 @@
+"""
+Latência do salvamento de notas durante um pico de consultas de leitura.
+
+Simula leitores concorrentes (RAG/relatórios) ocupando conexões enquanto um
+escritor salva notas com salvar_dados_banco. Compara o pool único (leituras e
+escritas disputando as mesmas conexões) com o bind de leitura separado.
+
+Uso:
+    python -m benchmarks.bench_leitura_escrita --leitores 20 --notas 50
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from sqlalchemy import text
+
+from database import db, somente_leitura
+from notas_fiscais import salvar_dados_banco
+from benchmarks.bench_salvar_dados import gerar_notas
+from benchmarks.comum import conectar, recriar_schema, gerar_dados, aplicar_migracoes, criar_app_flask, salvar_resultado
+
+SCHEMA = 'bench_leitura_escrita'
+CONSULTA_PESADA = text('SELECT pg_sleep(:s), count(*) FROM movimento_contas WHERE valortotal > 100')
+
+
+def executar(app, leitores, notas, duracao_leitura):
+    parar = threading.Event()
+    leituras = [0]
+
+    def leitor():
+        with app.app_context():
+            while not parar.is_set():
+                with somente_leitura():
+                    db.session.execute(CONSULTA_PESADA, {'s': duracao_leitura}).all()
+                leituras[0] += 1
+
+    threads = [threading.Thread(target=leitor, daemon=True) for _ in range(leitores)]
+    for t in threads:
+        t.start()
+    time.sleep(duracao_leitura * 2)  # pico já estabelecido
+
+    latencias = []
+    falhas = 0
+    with app.app_context():
+        for nota in notas:
+            inicio = time.perf_counter()
+            resultado = salvar_dados_banco(nota)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            # Falha esperada sem o bind de leitura: timeout esperando conexão do pool
+            if not resultado['sucesso']:
+                falhas += 1
+    parar.set()
+    for t in threads:
+        t.join()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    latencias.sort()
+    return {
+        'notas': len(latencias),
+        'falhas': falhas,
+        'leituras_concluidas': leituras[0],
+        'latencia_p50_ms': round(statistics.median(latencias), 2),
+        'latencia_p95_ms': round(latencias[int(len(latencias) * 0.95) - 1], 2),
+        'latencia_max_ms': round(latencias[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leitores', type=int, default=20)
+    parser.add_argument('--notas', type=int, default=50)
+    parser.add_argument('--pool-timeout', type=float, default=5, help='segundos de espera por conexão do pool')
+    parser.add_argument('--duracao-leitura', type=float, default=0.2, help='segundos de cada consulta pesada')
+    args = parser.parse_args()
+
+    with conectar(SCHEMA) as conn:
+        print('Preparando schema e base sintética...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=50_000, pessoas=5_000, classificacoes_extras=0)
+        aplicar_migracoes(conn, '003_pessoas_documento_unico.sql')
+
+    # Mesmo pool principal nos dois cenários (padrão do SQLAlchemy: 5 + 10 de overflow)
+    random.seed(42)
+    resultados = {}
+    for nome, bind_leitura in (('pool_unico', False), ('bind_leitura', True)):
+        print(f'Cenário {nome}: {args.leitores} leitores, {args.notas} notas...')
+        app = criar_app_flask(SCHEMA, bind_leitura=bind_leitura, pool_timeout=args.pool_timeout)
+        resultados[nome] = executar(app, args.leitores, gerar_notas(args.notas, nome.upper()[:3], 5_000),
+                                    args.duracao_leitura)
+
+    with conectar() as conn:
+        conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'cenário':14} {'p50 ms':>9} {'p95 ms':>9} {'máx ms':>9} {'falhas':>7} {'leituras':>9}")
+    for nome, r in resultados.items():
+        print(f"{nome:14} {r['latencia_p50_ms']:>9.2f} {r['latencia_p95_ms']:>9.2f} "
+              f"{r['latencia_max_ms']:>9.2f} {r['falhas']:>7} {r['leituras_concluidas']:>9}")
+
+    caminho = salvar_resultado('leitura_escrita', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
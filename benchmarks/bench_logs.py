@@ -0,0 +1,146 @@
+"""
+Custo do logging na thread que registra: FileHandler síncrono (configuração antiga) x fila (logs.py).
+
+Para cada configuração, `--threads` threads fazem `--repeticoes` chamadas a logger.info cada uma
+(como as threads de um worker gthread) e medimos, na thread que registra, a latência de cada
+chamada (p50, p99 e máxima, em µs), as chamadas por segundo, quantas linhas chegaram ao arquivo
+e quanto tempo a fila levou para esvaziar depois da última chamada. Cada configuração roda com o
+disco normal e com um disco lento simulado (`--atraso-ms` de espera antes de cada escrita, como
+um fsync ou um volume de rede travado). No síncrono, a espera cai na requisição; na fila, na
+thread de gravação (e, se a fila enche, os registros são descartados em vez de segurar a
+requisição).
+
+Uso:
+    python -m benchmarks.bench_logs --repeticoes 2000 --threads 4 --atraso-ms 1
+"""
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.comum import salvar_resultado
+
+
+class Atraso(logging.Filter):
+    """Espera antes de cada escrita (disco lento simulado)."""
+
+    def __init__(self, segundos):
+        super().__init__()
+        self.segundos = segundos
+
+    def filter(self, record):
+        time.sleep(self.segundos)
+        return True
+
+
+def contar_linhas(diretorio):
+    total = 0
+    for nome in os.listdir(diretorio):
+        if nome.startswith('app.log') and not nome.endswith('.trava'):
+            with open(os.path.join(diretorio, nome), 'rb') as f:
+                total += sum(1 for _ in f)
+    return total
+
+
+def configurar_sincrono(arquivo, terminal, atraso):
+    """A configuração de antes: basicConfig com StreamHandler e FileHandler."""
+    handler = logging.FileHandler(arquivo, delay=True)
+    if atraso:
+        handler.addFilter(Atraso(atraso))
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        handlers=[logging.StreamHandler(terminal), handler], force=True)
+    return lambda: None
+
+
+def configurar_fila(arquivo, terminal, atraso):
+    import logs
+    logs.ARQUIVO = arquivo
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+        handler.close()
+    logs._fila_handler = None
+    logs.configurar()
+    destino_terminal, destino_arquivo = logs._fila_handler.destinos
+    destino_terminal.setStream(terminal)
+    if atraso:
+        destino_arquivo.addFilter(Atraso(atraso))
+    return logs.parar
+
+
+def rodar(configurar, atraso, repeticoes, threads):
+    diretorio = tempfile.mkdtemp(prefix='bench_logs_')
+    terminal = open(os.devnull, 'w')
+    try:
+        esvaziar = configurar(os.path.join(diretorio, 'app.log'), terminal, atraso)
+        logger = logging.getLogger('bench')
+        logger.info("aquecimento")
+        latencias = [[] for _ in range(threads)]
+        barreira = threading.Barrier(threads + 1)
+
+        def trabalhar(indice):
+            medidas = latencias[indice]
+            barreira.wait()
+            for i in range(repeticoes):
+                inicio = time.perf_counter()
+                logger.info("Requisição %s processada em %.1f ms", i, 12.5)
+                medidas.append(time.perf_counter() - inicio)
+
+        trabalhadores = [threading.Thread(target=trabalhar, args=(i,)) for i in range(threads)]
+        for thread in trabalhadores:
+            thread.start()
+        barreira.wait()
+        inicio = time.perf_counter()
+        for thread in trabalhadores:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        esvaziar()
+        esvaziamento = time.perf_counter() - inicio
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+        todas = sorted(m for medidas in latencias for m in medidas)
+        emitidas = len(todas) + 1
+        escritas = contar_linhas(diretorio)
+        return {
+            'p50_us': round(statistics.median(todas) * 1e6, 1),
+            'p99_us': round(todas[int(len(todas) * 0.99)] * 1e6, 1),
+            'max_us': round(todas[-1] * 1e6, 1),
+            'chamadas_por_s': round(len(todas) / duracao),
+            'linhas_escritas': escritas,
+            'descartadas': emitidas - escritas,
+            'esvaziamento_ms': round(esvaziamento * 1000, 1),
+        }
+    finally:
+        for handler in logging.getLogger().handlers[:]:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+        terminal.close()
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=2000, help='chamadas por thread')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--atraso-ms', type=float, default=1.0, help='espera por escrita no disco lento')
+    args = parser.parse_args()
+
+    resultados = {}
+    for disco, atraso in (('disco_normal', 0), ('disco_lento', args.atraso_ms / 1000)):
+        for nome, configurar in (('sincrono', configurar_sincrono), ('fila', configurar_fila)):
+            r = resultados[f'{nome}_{disco}'] = rodar(configurar, atraso, args.repeticoes, args.threads)
+            print(f"{nome + ' ' + disco:22} p50 {r['p50_us']:>8} µs  p99 {r['p99_us']:>9} µs  "
+                  f"max {r['max_us']:>10} µs  {r['chamadas_por_s']:>7}/s  "
+                  f"descartadas {r['descartadas']:>6}  esvaziamento {r['esvaziamento_ms']} ms")
+
+    caminho = salvar_resultado('logs', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Regressão de memória: pico de alocação Python (tracemalloc) de uma carga padrão pelas rotas.
+
+Sobe o app completo (como bench_suite, com LLM_BACKEND=simulador) sobre uma base sintética
+gerada com semente fixa e mede, para cada caso, o pico de memória alocada acima do que havia
+antes da requisição (tracemalloc.reset_peak) e o que ficou retido depois dela (vazamentos).
+Casos:
+  - upload_pdf_grande:     POST /upload de um PDF com ~3000 linhas de itens;
+  - analisar_fluxo_caixa:  GET /agente-ia/analisar-fluxo-caixa?periodo=365 (to_dict de todos
+                           os movimentos do ano e o JSON indentado do prompt);
+  - relatorio_categorias:  GET /agente-ia/relatorio-categorias;
+  - exportar_movimentos:   exportação CSV completa (transmitida: o pico não deve crescer com a base);
+  - admin_movimentos_500:  GET /admin/api/movimentos?limite=500;
+  - rag_query:             POST /rag/query.
+
+Compara os picos com benchmarks/memoria_limites.json e sai com código 1 se algum passou do
+limite mais a --tolerancia. --atualizar grava os picos desta execução como os novos limites
+(depois de uma mudança que aumenta a memória de propósito, ou ao mudar a carga).
+
+Uso:
+    python -m benchmarks.bench_memoria
+    python -m benchmarks.bench_memoria --tolerancia 0.1
+    python -m benchmarks.bench_memoria --atualizar
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import statistics
+import sys
+import tracemalloc
+from io import BytesIO
+
+from benchmarks.comum import RAIZ, conectar, criar_app_completo, salvar_resultado
+from benchmarks.gerar import preparar_base
+from benchmarks.bench_suite import AMBIENTE_SUITE, linhas_nota, pdf_nota
+
+SCHEMA = 'bench_memoria'
+LIMITES = os.path.join(RAIZ, 'benchmarks', 'memoria_limites.json')
+SEMENTE = 0.42
+
+
+def casos():
+    """[(nome, executar(cliente) -> resposta)]"""
+    linhas = linhas_nota(1, execucao='777777') + [
+        f'ITEM {i:04d} - PARAFUSO SEXTAVADO ZINCADO M{8 + i % 12} X {20 + i % 80}   QTD {1 + i % 50}   VALOR {i % 900 + 10},00'
+        for i in range(3000)]
+    pdf = pdf_nota(linhas)
+    return [
+        ('upload_pdf_grande', lambda cliente: cliente.post(
+            '/upload', data={'pdf': (BytesIO(pdf), 'nota-grande.pdf')}, content_type='multipart/form-data')),
+        ('analisar_fluxo_caixa', lambda cliente: cliente.get('/agente-ia/analisar-fluxo-caixa?periodo=365')),
+        ('relatorio_categorias', lambda cliente: cliente.get('/agente-ia/relatorio-categorias')),
+        ('exportar_movimentos', lambda cliente: cliente.get('/exportar/movimentos?formato=csv')),
+        ('admin_movimentos_500', lambda cliente: cliente.get('/admin/api/movimentos?limite=500')),
+        ('rag_query', lambda cliente: cliente.post(
+            '/rag/query', json={'pergunta': 'quais foram as maiores despesas com diesel no último ano?'})),
+    ]
+
+
+def medir(cliente, executar, repeticoes):
+    """Pico e retenção em bytes de cada repetição, acima da memória alocada antes da requisição."""
+    picos, retidos, status = [], [], set()
+    for _ in range(repeticoes):
+        gc.collect()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        resposta = executar(cliente)
+        resposta.get_data()  # consome respostas transmitidas
+        picos.append(tracemalloc.get_traced_memory()[1] - base)
+        status.add(resposta.status_code)
+        del resposta
+        gc.collect()
+        retidos.append(tracemalloc.get_traced_memory()[0] - base)
+    return {
+        'pico_bytes': max(picos),
+        'pico_mediano_bytes': int(statistics.median(picos)),
+        'retido_bytes': int(statistics.median(retidos)),
+        'status': sorted(status),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escala', default='10k')
+    parser.add_argument('--schema', default=SCHEMA)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--tolerancia', type=float, default=0.15,
+                        help='crescimento aceito sobre o limite gravado (fração; padrão 0.15)')
+    parser.add_argument('--atualizar', action='store_true', help='grava os picos desta execução como limites')
+    args = parser.parse_args()
+
+    for variavel, valor in AMBIENTE_SUITE.items():
+        os.environ.setdefault(variavel, valor)
+    logging.basicConfig(level=logging.ERROR)
+
+    with conectar(args.schema) as conn:
+        print(f'Gerando a escala {args.escala} (semente {SEMENTE}) no schema {args.schema}...')
+        base = preparar_base(conn, args.schema, args.escala, semente=SEMENTE)
+
+    resultados = {}
+    try:
+        app = criar_app_completo(args.schema)
+        cliente = app.test_client()
+        tracemalloc.start(1)
+        for nome, executar in casos():
+            executar(cliente).get_data()  # aquecimento: imports e caches de módulo fora da medição
+            resultados[nome] = medir(cliente, executar, args.repeticoes)
+            r = resultados[nome]
+            print(f"{nome:24} pico {r['pico_bytes'] / 1024:>10.0f} KiB  retido {r['retido_bytes'] / 1024:>8.0f} KiB  "
+                  f"status {r['status']}")
+        tracemalloc.stop()
+    finally:
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE')
+
+    import memoria
+    caminho = salvar_resultado('memoria', {
+        'parametros': vars(args), 'semente': SEMENTE, 'linhas': base['linhas'],
+        'rss_maximo_bytes': memoria.rss_maximo_bytes(), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+    if args.atualizar:
+        with open(LIMITES, 'w', encoding='utf-8') as f:
+            json.dump({'escala': args.escala, 'semente': SEMENTE,
+                       'pico_bytes': {nome: r['pico_bytes'] for nome, r in resultados.items()}}, f, indent=2)
+            f.write('\n')
+        print(f'Limites atualizados em {LIMITES}')
+        return
+
+    try:
+        with open(LIMITES, encoding='utf-8') as f:
+            limites = json.load(f)
+    except FileNotFoundError:
+        sys.exit(f'Sem {LIMITES}: rode com --atualizar para gravar os limites')
+    if limites.get('escala') != args.escala:
+        sys.exit(f"Os limites são da escala {limites.get('escala')}; rode com --escala {limites.get('escala')}")
+    excedidos = []
+    for nome, r in resultados.items():
+        limite = limites['pico_bytes'].get(nome)
+        if limite is not None and r['pico_bytes'] > limite * (1 + args.tolerancia):
+            excedidos.append(f"  {nome}: {r['pico_bytes'] / 1024:.0f} KiB > {limite / 1024:.0f} KiB "
+                             f"+ {args.tolerancia:.0%} ({(r['pico_bytes'] / limite - 1):+.0%})")
+    if excedidos:
+        print('\nPico de memória acima do limite:\n' + '\n'.join(excedidos))
+        sys.exit(1)
+    print(f'\nTodos os picos dentro dos limites (+{args.tolerancia:.0%}).')
+
+
+if __name__ == '__main__':
+    main()
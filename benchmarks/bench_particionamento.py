@@ -0,0 +1,123 @@
+"""
+Consultas por janela de datas com as tabelas normais e particionadas (particionamento.py).
+
+Gera uma base sintética de vários anos, mede EXPLAIN (ANALYZE, BUFFERS) das
+janelas usadas pela aplicação (mês atual, últimos 30 dias do Agent3, fluxo de
+caixa de parcelas, ano fechado), converte para o layout particionado e repete.
+Também mede a busca por id, que deixa de ter partition pruning.
+
+Uso:
+    python -m benchmarks.bench_particionamento --movimentos 1000000 --anos 5
+    python -m benchmarks.bench_particionamento --granularidade ano
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine
+
+from particionamento import converter
+from benchmarks.comum import (url_conexao, conectar, recriar_schema, gerar_dados, aplicar_migracoes,
+                              explain_analyze, salvar_resultado)
+
+SCHEMA = 'bench_particionamento'
+
+# (nome, SQL, parâmetros)
+CONSULTAS = [
+    (
+        'movimentos_mes_atual_total',
+        "SELECT tipo, sum(valortotal) FROM movimento_contas "
+        "WHERE dataemissao >= date_trunc('month', current_date)::date AND dataemissao <= current_date "
+        "GROUP BY tipo",
+        None,
+    ),
+    (
+        'agent3_ultimos_30_dias',
+        "SELECT * FROM movimento_contas WHERE status = 'ATIVO' AND dataemissao >= current_date - 30 "
+        'AND dataemissao <= current_date ORDER BY dataemissao DESC, "idMovimentoContas" DESC LIMIT 20',
+        None,
+    ),
+    (
+        'movimentos_periodo_parametrizado',
+        'SELECT count(*), sum(valortotal) FROM movimento_contas WHERE dataemissao >= %s AND dataemissao <= %s',
+        ('2024-03-01', '2024-05-31'),
+    ),
+    (
+        'movimentos_ano_fechado',
+        "SELECT date_trunc('month', dataemissao), sum(valortotal) FROM movimento_contas "
+        "WHERE dataemissao >= (date_trunc('year', current_date) - interval '1 year')::date "
+        "AND dataemissao < date_trunc('year', current_date)::date GROUP BY 1",
+        None,
+    ),
+    (
+        'fluxo_caixa_parcelas_30_dias',
+        "SELECT datavencimento, sum(valorsaldo) FROM parcelas_contas WHERE statusparcela = 'PENDENTE' "
+        'AND datavencimento BETWEEN current_date AND current_date + 30 GROUP BY datavencimento',
+        None,
+    ),
+    (
+        'movimento_por_id',
+        'SELECT * FROM movimento_contas WHERE "idMovimentoContas" = %s',
+        (123456,),
+    ),
+]
+
+
+def medir(conn):
+    return {nome: explain_analyze(conn, sql, params) for nome, sql, params in CONSULTAS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movimentos', type=int, default=1_000_000)
+    parser.add_argument('--anos', type=int, default=5)
+    parser.add_argument('--granularidade', choices=['mes', 'ano'], default='mes')
+    parser.add_argument('--manter-schema', action='store_true', help='não remove o schema ao final')
+    args = parser.parse_args()
+
+    with conectar(SCHEMA) as conn:
+        print(f'Gerando base sintética ({args.movimentos:,} movimentos em {args.anos} anos)...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos, pessoas=50_000, classificacoes_extras=0, anos=args.anos)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql')
+        print('Medindo com as tabelas normais...')
+        antes = medir(conn)
+
+    engine = create_engine(url_conexao().replace('postgresql://', 'postgresql+psycopg://', 1),
+                           connect_args={'options': f'-c search_path={SCHEMA},public'})
+    print(f'Convertendo para partições ({args.granularidade})...')
+    inicio = time.time()
+    converter(engine, granularidade=args.granularidade, log=lambda m: print(m))
+    duracao_conversao = time.time() - inicio
+    engine.dispose()
+
+    with conectar(SCHEMA) as conn:
+        conn.execute('ANALYZE')
+        print('Medindo com as tabelas particionadas...')
+        depois = medir(conn)
+        particoes = conn.execute(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = 'movimento_contas'::regclass"
+        ).fetchone()[0]
+        if not args.manter_schema:
+            conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    resultados = []
+    print()
+    print(f"{'consulta':34} {'antes ms':>10} {'depois ms':>10} {'ganho':>8} {'blocos antes':>13} {'blocos depois':>14}")
+    for nome, _, _ in CONSULTAS:
+        a, d = antes[nome], depois[nome]
+        ganho = a['tempo_ms'] / d['tempo_ms'] if d['tempo_ms'] else float('inf')
+        print(f"{nome:34} {a['tempo_ms']:>10.3f} {d['tempo_ms']:>10.3f} {ganho:>7.1f}x "
+              f"{a['blocos_lidos']:>13,} {d['blocos_lidos']:>14,}")
+        resultados.append({'consulta': nome, 'antes': a, 'depois': d, 'ganho': round(ganho, 2)})
+    print(f'\nConversão: {duracao_conversao:.1f}s, {particoes} partições de movimento_contas')
+
+    caminho = salvar_resultado('particionamento', {
+        'parametros': {**vars(args), 'particoes_movimento_contas': particoes,
+                       'segundos_conversao': round(duracao_conversao, 1)},
+        'resultados': resultados,
+    })
+    print(f'Resultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Vazão de salvar_dados_banco em notas/segundo.
+
+Compara o salvamento atual (um único comando SQL com upsert) com o fluxo
+anterior pelo ORM (SELECT por pessoa e por classificação, vários flush() e
+um INSERT por parcela), contando também comandos SQL por nota.
+
+Uso:
+    python -m benchmarks.bench_salvar_dados --notas 2000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from database import db, Pessoas, Classificacao, MovimentoContas, ParcelasContas
+from notas_fiscais import salvar_dados_banco
+from benchmarks.comum import conectar, recriar_schema, gerar_dados, aplicar_migracoes, criar_app_flask, salvar_resultado
+
+SCHEMA = 'bench_salvar'
+CLASSIFICACOES = ['INSUMOS AGRÍCOLAS', 'MANUTENÇÃO E OPERAÇÃO', 'SERVIÇOS OPERACIONAIS', 'ADMINISTRATIVAS']
+
+
+def salvar_orm_legado(dados_extraidos):
+    """Fluxo de salvamento anterior (referência), um comando por entidade."""
+    try:
+        emitente_data = dados_extraidos.get('emitente', {})
+        emitente = Pessoas.query.filter_by(documento=emitente_data.get('cnpj', '')).first()
+        if not emitente:
+            emitente = Pessoas(tipo='FORNECEDOR', razaosocial=emitente_data.get('razao_social', ''),
+                               fantasia=emitente_data.get('nome_fantasia', ''),
+                               documento=emitente_data.get('cnpj', ''), status='ATIVO')
+            db.session.add(emitente)
+            db.session.flush()
+
+        remetente_data = dados_extraidos.get('remetente', {})
+        remetente = Pessoas.query.filter_by(documento=remetente_data.get('cpf_ou_cnpj', '')).first()
+        if not remetente:
+            remetente = Pessoas(tipo='CLIENTE', razaosocial=remetente_data.get('nome_completo', ''),
+                                fantasia=remetente_data.get('nome_completo', ''),
+                                documento=remetente_data.get('cpf_ou_cnpj', ''), status='ATIVO')
+            db.session.add(remetente)
+            db.session.flush()
+
+        nota_fiscal_data = dados_extraidos.get('nota_fiscal', {})
+        itens_data = dados_extraidos.get('itens', {})
+        data_emissao = datetime.strptime(nota_fiscal_data.get('data_emissao', ''), '%d/%m/%Y').date()
+
+        movimento = MovimentoContas(tipo='DESPESA', numeronotafiscal=nota_fiscal_data.get('numero', ''),
+                                    dataemissao=data_emissao, descricao=itens_data.get('descricao_produtos', ''),
+                                    status='ATIVO', valortotal=itens_data.get('valor_total', 0),
+                                    Pessoas_idFornecedorCliente=emitente.idPessoas,
+                                    Pessoas_idFaturado=remetente.idPessoas)
+        db.session.add(movimento)
+        db.session.flush()
+
+        for classificacao_nome in dados_extraidos.get('classificacoes', []):
+            classificacao = Classificacao.query.filter_by(descricao=classificacao_nome, tipo='DESPESA').first()
+            if classificacao:
+                movimento.classificacoes.append(classificacao)
+
+        num_parcelas = itens_data.get('parcelas', 1)
+        valor_parcela = float(itens_data.get('valor_total', 0)) / num_parcelas
+        for i in range(num_parcelas):
+            db.session.add(ParcelasContas(identificacao=f"{nota_fiscal_data.get('numero', '')}-{i+1}",
+                                          datavencimento=data_emissao, valorparcela=valor_parcela,
+                                          valorpago=0.00, valorsaldo=valor_parcela, statusparcela='PENDENTE'))
+        db.session.commit()
+        return {'sucesso': True}
+    except Exception as e:
+        db.session.rollback()
+        return {'sucesso': False, 'erro': str(e)}
+
+
+def gerar_notas(quantidade, prefixo, pessoas_existentes):
+    """Notas sintéticas: metade com emitente já cadastrado, 1 a 4 parcelas, 1 a 2 classificações."""
+    notas = []
+    for i in range(quantidade):
+        if i % 2 == 0:
+            doc_emitente = str(random.randint(1, pessoas_existentes)).zfill(14)
+        else:
+            doc_emitente = f'{prefixo}{i:012d}'
+        notas.append({
+            'nota_fiscal': {'numero': f'{prefixo}-{i}', 'data_emissao': '15/01/2024'},
+            'emitente': {'razao_social': f'EMITENTE {i}', 'cnpj': doc_emitente},
+            'remetente': {'nome_completo': 'FAZENDA BENCH', 'cpf_ou_cnpj': '999.999.999-99'},
+            'itens': {'descricao_produtos': 'diesel', 'parcelas': random.randint(1, 4),
+                      'valor_total': round(random.uniform(100, 10000), 2)},
+            'classificacoes': random.sample(CLASSIFICACOES, random.randint(1, 2)),
+        })
+    return notas
+
+
+def medir(app, funcao, notas):
+    comandos = [0]
+
+    def contar(*_):
+        comandos[0] += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', contar)
+        try:
+            inicio = time.perf_counter()
+            for nota in notas:
+                resultado = funcao(nota)
+                if not resultado['sucesso']:
+                    raise RuntimeError(resultado['erro'])
+            duracao = time.perf_counter() - inicio
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', contar)
+    return {
+        'notas': len(notas),
+        'segundos': round(duracao, 3),
+        'notas_por_segundo': round(len(notas) / duracao, 1),
+        'comandos_sql_por_nota': round(comandos[0] / len(notas), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notas', type=int, default=2000)
+    parser.add_argument('--movimentos-base', type=int, default=100_000,
+                        help='movimentos pré-existentes na base sintética')
+    args = parser.parse_args()
+
+    pessoas = 20_000
+    with conectar(SCHEMA) as conn:
+        print('Preparando schema e base sintética...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=args.movimentos_base, pessoas=pessoas, classificacoes_extras=0)
+        aplicar_migracoes(conn, '001_indices_padroes_consulta.sql', '003_pessoas_documento_unico.sql')
+
+    app = criar_app_flask(SCHEMA)
+    random.seed(42)
+    resultados = {
+        'orm_legado': medir(app, salvar_orm_legado, gerar_notas(args.notas, 'LEG', pessoas)),
+        'upsert': medir(app, salvar_dados_banco, gerar_notas(args.notas, 'UPS', pessoas)),
+    }
+
+    with app.app_context():
+        db.engine.dispose()
+    with conectar() as conn:
+        conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"{'fluxo':12} {'notas/s':>10} {'comandos/nota':>14}")
+    for nome, r in resultados.items():
+        print(f"{nome:12} {r['notas_por_segundo']:>10.1f} {r['comandos_sql_por_nota']:>14.2f}")
+
+    caminho = salvar_resultado('salvar_dados', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
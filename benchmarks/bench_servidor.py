@@ -0,0 +1,169 @@
+"""
+Inicialização e vazão do backend: servidor de desenvolvimento vs. gunicorn (gunicorn.conf.py).
+
+Mede o tempo de import + create_app (custo pago por processo), o tempo de
+preparar_banco (pago uma vez por implantação), o tempo até o primeiro /healthz
+respondido e requisições/segundo de /healthz e de uma listagem paginada com
+clientes concorrentes. Os servidores apontam para um schema isolado.
+
+Uso:
+    python -m benchmarks.bench_servidor --workers 4 --clientes 16 --segundos 10
+"""
+import argparse
+import http.client
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.comum import RAIZ, ambiente_app, conectar, recriar_schema, gerar_dados, salvar_resultado
+
+SCHEMA = 'bench_servidor'
+PORTA = 5077
+ROTAS = ['/healthz', '/movimentos?limite=20']
+
+MEDIR_CREATE_APP = (
+    'import time; t = time.perf_counter(); from app import create_app; create_app(); '
+    'print(time.perf_counter() - t)'
+)
+MEDIR_PREPARAR_BANCO = (
+    'import time; from app import create_app; from database import preparar_banco; app = create_app(); '
+    't = time.perf_counter(); preparar_banco(app); print(time.perf_counter() - t)'
+)
+
+
+def tempo_subprocesso(codigo, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=ambiente_app(SCHEMA),
+                               capture_output=True, text=True, check=True).stdout
+        tempos.append(float(saida.strip().splitlines()[-1]) * 1000)
+    return round(statistics.median(tempos), 1)
+
+
+def aguardar_pronto(processo, limite=60):
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        if processo.poll() is not None:
+            raise RuntimeError('servidor terminou durante a inicialização')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', PORTA, timeout=1)
+            conexao.request('GET', '/healthz')
+            if conexao.getresponse().status == 200:
+                return round((time.perf_counter() - inicio) * 1000, 1)
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('servidor não ficou pronto')
+
+
+def carga(rota, clientes, segundos):
+    """Clientes com conexão keep-alive repetindo a mesma rota pelo tempo indicado."""
+    latencias = []
+    erros = [0]
+    fim = time.perf_counter() + segundos
+    trava = threading.Lock()
+
+    def cliente():
+        conexao = http.client.HTTPConnection('127.0.0.1', PORTA, timeout=30)
+        locais = []
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                conexao.request('GET', rota)
+                resposta = conexao.getresponse()
+                resposta.read()
+                if resposta.status != 200:
+                    erros[0] += 1
+            except (OSError, http.client.HTTPException):
+                erros[0] += 1
+                conexao.close()
+                conexao = http.client.HTTPConnection('127.0.0.1', PORTA, timeout=30)
+                continue
+            locais.append((time.perf_counter() - inicio) * 1000)
+        with trava:
+            latencias.extend(locais)
+
+    threads = [threading.Thread(target=cliente) for _ in range(clientes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencias.sort()
+    return {
+        'requisicoes_por_segundo': round(len(latencias) / segundos, 1),
+        'latencia_p50_ms': round(statistics.median(latencias), 2) if latencias else None,
+        'latencia_p95_ms': round(latencias[int(len(latencias) * 0.95)], 2) if latencias else None,
+        'erros': erros[0],
+    }
+
+
+def medir_servidor(comando, clientes, segundos):
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente_app(SCHEMA),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        aguardar_pronto(processo)
+        resultado = {'ms_ate_primeiro_healthz': round((time.perf_counter() - inicio) * 1000, 1)}
+        for rota in ROTAS:
+            carga(rota, clientes, 1)  # aquecimento (pools e caches de cada worker)
+            resultado[rota] = carga(rota, clientes, segundos)
+        return resultado
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=10)
+    args = parser.parse_args()
+
+    with conectar(SCHEMA) as conn:
+        print('Preparando schema e base sintética...')
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=100_000, pessoas=10_000, classificacoes_extras=0)
+
+    print('Medindo inicialização...')
+    resultados = {
+        'ms_preparar_banco_primeira_vez': tempo_subprocesso(MEDIR_PREPARAR_BANCO, 1),
+        'ms_preparar_banco_sem_pendencias': tempo_subprocesso(MEDIR_PREPARAR_BANCO, 3),
+        'ms_import_create_app': tempo_subprocesso(MEDIR_CREATE_APP, 5),
+    }
+
+    servidores = {
+        'flask_dev': [sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'run',
+                      '--port', str(PORTA), '--with-threads', '--no-reload', '--no-debugger'],
+        f'gunicorn_{args.workers}x{args.threads}': [
+            sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{PORTA}',
+            '--workers', str(args.workers), '--threads', str(args.threads),
+            'app:create_app()'],
+    }
+    for nome, comando in servidores.items():
+        print(f'Servidor {nome}...')
+        resultados[nome] = medir_servidor(comando, args.clientes, args.segundos)
+
+    with conectar() as conn:
+        conn.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    print()
+    print(f"import + create_app: {resultados['ms_import_create_app']} ms | preparar_banco: "
+          f"{resultados['ms_preparar_banco_primeira_vez']} ms (1ª vez), "
+          f"{resultados['ms_preparar_banco_sem_pendencias']} ms (sem pendências)")
+    print(f"{'servidor':16} {'pronto ms':>10} {'rota':24} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'erros':>6}")
+    for nome in servidores:
+        r = resultados[nome]
+        for rota in ROTAS:
+            m = r[rota]
+            print(f"{nome:16} {r['ms_ate_primeiro_healthz']:>10} {rota:24} {m['requisicoes_por_segundo']:>9} "
+                  f"{m['latencia_p50_ms']:>8} {m['latencia_p95_ms']:>8} {m['erros']:>6}")
+
+    caminho = salvar_resultado('servidor', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Suíte dos caminhos quentes pelas rotas de app.py, em uma base sintética de escala fixa.
+
+Sobe o app completo (create_app, com telemetria) no processo e chama as rotas pelo cliente
+de teste do Flask, com o Gemini substituído pelo simulador de llm.py (LLM_BACKEND=simulador:
+sem rede; latência 0 ou a de --latencia-llm-ms). Os caches de resposta do RAG, o cache semântico, a
+coalescência entre workers e o ouvinte de invalidação ficam desligados: cada requisição
+percorre o caminho completo.
+
+Grupos de casos:
+  - upload:     POST /upload (uma nota diferente por requisição, metade de fornecedores já
+                cadastrados: PyPDF2, extração simulada, verificação no banco),
+                POST /salvar-dados e salvar_dados_banco direto, com notas extraídas antes;
+  - rag:        /rag/query (Agent3), /rag/query-simples e /rag/query-embeddings, com as
+                perguntas de perguntas_rag.json;
+  - admin:      listagens paginadas de /admin/api/* e /parcelas;
+  - relatorios: análise de fluxo de caixa e relatório por categorias do /agente-ia e
+                exportação CSV dos últimos 30 dias.
+
+Por caso grava p50/p95/média/mín/máx em ms, os status HTTP e a mediana de cada estágio do
+cabeçalho Server-Timing (db_query, retrieval, llm_generate...), junto com a escala, as
+contagens das tabelas e o commit. Dois resultados se comparam com benchmarks.comparar.
+
+Uso:
+    python -m benchmarks.bench_suite --escala 10k --repeticoes 30
+    python -m benchmarks.gerar --escala 10m --schema nf_sintetico_10m
+    python -m benchmarks.bench_suite --schema nf_sintetico_10m --reusar --grupos rag admin
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import date, timedelta
+from io import BytesIO
+
+from benchmarks.comum import RAIZ, ITENS_SINTETICOS, ESCALAS, conectar, criar_app_completo, salvar_resultado
+from benchmarks.gerar import preparar_base, contar_linhas
+
+SCHEMA = 'bench_suite'
+GRUPOS = ['upload', 'rag', 'admin', 'relatorios']
+
+# Caminho completo em cada requisição (valem só se não definidas no ambiente)
+AMBIENTE_SUITE = {
+    'LLM_BACKEND': 'simulador',
+    'LLM_SIM_LATENCIA_MS': '0',
+    'LLM_SIM_LATENCIA_EMBED_MS': '0',
+    'RAG_CACHE_TAMANHO': '0',
+    'RAG_CACHE_SEMANTICO_TAMANHO': '0',
+    'RAG_CACHE_SEMANTICO_EMBEDDINGS': 'lexical',
+    'COALESCENCIA_ENTRE_WORKERS': '0',
+    'INVALIDACAO_OUVINTE': '0',
+    'LOG_ARQUIVO': '',
+}
+
+
+def pdf_nota(linhas):
+    """PDF mínimo de uma página com as linhas em Helvetica (texto extraível pelo PyPDF2)."""
+    texto = ' '.join('({}) Tj T*'.format(l.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)'))
+                     for l in linhas)
+    conteudo = f'BT /F1 10 Tf 14 TL 40 800 Td {texto} ET'
+    objetos = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R '
+        '/Resources << /Font << /F1 5 0 R >> >> >>',
+        f'<< /Length {len(conteudo)} >>\nstream\n{conteudo}\nendstream',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    saida = b'%PDF-1.4\n'
+    posicoes = []
+    for numero, objeto in enumerate(objetos, 1):
+        posicoes.append(len(saida))
+        saida += f'{numero} 0 obj\n{objeto}\nendobj\n'.encode('latin-1')
+    xref = len(saida)
+    saida += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode()
+    saida += ''.join(f'{p:010d} 00000 n \n' for p in posicoes).encode()
+    saida += f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return saida
+
+
+def linhas_nota(n, documentos=(), execucao=''):
+    """
+    Texto de uma nota fiscal distinta por `n`: número único, um item de despesa do catálogo
+    sintético e, em metade das notas, o CNPJ de um fornecedor já cadastrado (`documentos`).
+    """
+    despesas = [item for item in ITENS_SINTETICOS if item[1] == 'DESPESA']
+    item, _, _, mediana, _ = despesas[n % len(despesas)]
+    documento = (documentos[n % len(documentos)] if documentos and n % 2 == 0
+                 else f'9{execucao}{n:07d}'.rjust(14, '0')[-14:])
+    cnpj = f'{documento[:2]}.{documento[2:5]}.{documento[5:8]}/{documento[8:12]}-{documento[12:14]}'
+    valor = f'{float(mediana) * (1 + n % 20) / 10:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+    return [
+        'DANFE - DOCUMENTO AUXILIAR DA NOTA FISCAL ELETRONICA',
+        f'NF-e No {execucao}.{n:06d} SERIE 1   EMISSAO {date.today():%d/%m/%Y}',
+        f'EMITENTE: FORNECEDOR SUITE {n} LTDA   CNPJ {cnpj}',
+        'DESTINATARIO: FAZENDA SANTA MARIA   CPF 123.456.789-00',
+        f'PRODUTO: {item}   QTD {1 + n % 20}   VALOR {valor}',
+        f'FATURA: {1 + n % 3} PARCELAS',
+    ]
+
+
+def ler_perguntas():
+    with open(os.path.join(RAIZ, 'benchmarks', 'perguntas_rag.json'), encoding='utf-8') as f:
+        return [p for intencao in json.load(f)['intencoes'] for p in intencao['perguntas']]
+
+
+def casos(grupos, app, documentos):
+    """[(grupo, nome, executar(cliente, i) -> resposta ou None)]"""
+    import app as aplicacao
+    from notas_fiscais import salvar_dados_banco
+    perguntas = ler_perguntas()
+    inicio_30d = (date.today() - timedelta(days=30)).isoformat()
+    execucao = time.strftime('%H%M%S')
+
+    def nota(serie):
+        # Extração pelo simulador, fora da medição; cada caso numera as suas notas
+        def preparar(i):
+            with app.app_context():
+                return aplicacao.processar_nota_fiscal_gemini(
+                    '\n'.join(linhas_nota(serie + i, documentos, execucao)))
+        return preparar
+
+    def upload(cliente, i):
+        pdf = pdf_nota(linhas_nota(i, documentos, execucao))
+        resposta = cliente.post('/upload', data={'pdf': (BytesIO(pdf), f'nota-{i}.pdf')},
+                                content_type='multipart/form-data')
+        return resposta
+
+    def salvar_dados(cliente, i, dados):
+        return cliente.post('/salvar-dados', json={'dados_originais': dados})
+
+    def salvar_direto(cliente, i, dados):
+        with app.app_context():
+            resultado = salvar_dados_banco(dados)
+        if not resultado.get('sucesso'):
+            raise RuntimeError(resultado)
+
+    def rag(rota):
+        return lambda cliente, i: cliente.post(rota, json={'pergunta': perguntas[i % len(perguntas)]})
+
+    def get(rota):
+        return lambda cliente, i: cliente.get(rota)
+
+    def preparado(preparar, executar):
+        """Caso cuja entrada é preparada fora do tempo medido."""
+        executar.preparar = preparar
+        return executar
+
+    todos = [
+        ('upload', 'upload', upload),
+        ('upload', 'salvar_dados', preparado(nota(100_000), salvar_dados)),
+        ('upload', 'salvar_dados_banco', preparado(nota(200_000), salvar_direto)),
+        ('rag', 'rag_hibrido', rag('/rag/query')),
+        ('rag', 'rag_simples', rag('/rag/query-simples')),
+        ('rag', 'rag_embeddings', rag('/rag/query-embeddings')),
+        ('admin', 'admin_pessoas', get('/admin/api/pessoas?limite=50')),
+        ('admin', 'admin_movimentos', get('/admin/api/movimentos?limite=50')),
+        ('admin', 'admin_movimentos_classificacao', get('/admin/api/movimentos?limite=50&classificacao=2')),
+        ('admin', 'admin_classificacoes', get('/admin/api/classificacoes?limite=50')),
+        ('admin', 'parcelas_pendentes', get('/parcelas?status=PENDENTE&limite=50')),
+        ('relatorios', 'analisar_fluxo_caixa', get('/agente-ia/analisar-fluxo-caixa?periodo=30')),
+        ('relatorios', 'relatorio_categorias', get('/agente-ia/relatorio-categorias')),
+        ('relatorios', 'exportar_movimentos_30d',
+         get(f'/exportar/movimentos?formato=csv&data_inicio={inicio_30d}')),
+    ]
+    return [caso for caso in todos if caso[0] in grupos]
+
+
+def estagios_server_timing(cabecalho):
+    """'db_query;dur=1.2, total;dur=3.4' -> {'db_query': 1.2, 'total': 3.4}"""
+    estagios = {}
+    for item in filter(None, (parte.strip() for parte in (cabecalho or '').split(','))):
+        nome, _, duracao = item.partition(';dur=')
+        if duracao:
+            estagios[nome] = float(duracao)
+    return estagios
+
+
+def chamadas_llm():
+    import llm
+    return sum(v for k, v in llm.metricas().items()
+               if k in ('simulador_geracoes', 'simulador_geracoes_stream', 'simulador_embeddings'))
+
+
+def medir(cliente, executar, repeticoes, aquecimento):
+    """Tempos de `executar`; a entrada de executar.preparar(i), quando existe, fica fora da medição."""
+    preparar = getattr(executar, 'preparar', None)
+
+    def argumentos(i):
+        return (cliente, i) if preparar is None else (cliente, i, preparar(i))
+
+    for i in range(aquecimento):
+        resposta = executar(*argumentos(i))
+        if resposta is not None:
+            resposta.get_data()
+    tempos, status, estagios = [], {}, {}
+    tamanho = None
+    chamadas = 0
+    for i in range(aquecimento, aquecimento + repeticoes):
+        args = argumentos(i)
+        antes = chamadas_llm()
+        inicio = time.perf_counter()
+        resposta = executar(*args)
+        if resposta is not None:
+            tamanho = len(resposta.get_data())  # consome respostas transmitidas (exportação)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        chamadas += chamadas_llm() - antes
+        codigo = str(resposta.status_code) if resposta is not None else 'ok'
+        status[codigo] = status.get(codigo, 0) + 1
+        if resposta is not None:
+            for nome, ms in estagios_server_timing(resposta.headers.get('Server-Timing')).items():
+                estagios.setdefault(nome, []).append(ms)
+    tempos.sort()
+    return {
+        'p50_ms': round(statistics.median(tempos), 2),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 2),
+        'media_ms': round(statistics.fmean(tempos), 2),
+        'min_ms': round(tempos[0], 2),
+        'max_ms': round(tempos[-1], 2),
+        'status': status,
+        'bytes_resposta': tamanho,
+        'estagios_p50_ms': {nome: round(statistics.median(v), 2) for nome, v in sorted(estagios.items())},
+        'chamadas_llm_por_requisicao': round(chamadas / repeticoes, 2),
+    }
+
+
+def ambiente_execucao(conn):
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'alteracoes_locais': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'postgres': conn.execute('SHOW server_version').fetchone()[0],
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='10k')
+    parser.add_argument('--schema', default=SCHEMA)
+    parser.add_argument('--reusar', action='store_true',
+                        help='usa a base já gerada no schema (benchmarks.gerar) e não a apaga no fim')
+    parser.add_argument('--manter', action='store_true', help='não apaga o schema no fim')
+    parser.add_argument('--grupos', nargs='+', choices=GRUPOS, default=GRUPOS)
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--aquecimento', type=int, default=3)
+    parser.add_argument('--latencia-llm-ms',
+                        help='latência do simulador de LLM em ms ou distribuição (ver llm.distribuicao); padrão 0')
+    args = parser.parse_args()
+
+    if args.latencia_llm_ms is not None:
+        os.environ['LLM_SIM_LATENCIA_MS'] = args.latencia_llm_ms
+    for variavel, valor in AMBIENTE_SUITE.items():
+        os.environ.setdefault(variavel, valor)
+    # Antes de create_app: sem o log INFO de cada pergunta do Agent3 no meio da tabela
+    logging.basicConfig(level=logging.WARNING)
+
+    with conectar(args.schema) as conn:
+        if args.reusar:
+            base = {'escala': None, 'linhas': contar_linhas(conn)}
+            print(f"Reusando o schema {args.schema} ({base['linhas']['movimento_contas']:,} movimentos)")
+        else:
+            print(f'Gerando a escala {args.escala} no schema {args.schema}...')
+            base = preparar_base(conn, args.schema, args.escala)
+        documentos = [d for (d,) in conn.execute(
+            'SELECT documento FROM pessoas WHERE tipo = %s ORDER BY "idPessoas" LIMIT 100', ('FORNECEDOR',))]
+        ambiente = ambiente_execucao(conn)
+
+    resultados = {}
+    try:
+        app = criar_app_completo(args.schema)
+        cliente = app.test_client()
+
+        for grupo, nome, executar in casos(args.grupos, app, documentos):
+            print(f'{grupo:10} {nome:32}', end=' ', flush=True)
+            resultados[nome] = {'grupo': grupo, **medir(cliente, executar, args.repeticoes, args.aquecimento)}
+            r = resultados[nome]
+            print(f"p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  {r['status']}")
+    finally:
+        if not (args.reusar or args.manter):
+            with conectar() as conn:
+                conn.execute(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE')
+
+    caminho = salvar_resultado('suite', {'parametros': vars(args), 'ambiente': ambiente, 'base': base,
+                                         'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Custo da telemetria (telemetria.py): observação, comandos SQL medidos, requisições e GET /metrics.
+
+Mede:
+  - observar()/contar() isolados (µs por chamada, com a trava);
+  - SELECT 1 pelo SQLAlchemy com e sem os listeners de db_query;
+  - GET /healthz pelo cliente de teste do Flask com e sem instrumentar(app) (Server-Timing,
+    histograma da requisição e do db_query);
+  - renderização de /metrics somando os retratos de `--processos` workers simulados.
+
+Uso:
+    python -m benchmarks.bench_telemetria --repeticoes 5000 --processos 8
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.comum import conectar, criar_app_flask, salvar_resultado
+
+SCHEMA = 'bench_telemetria'
+
+
+def cronometrar(funcao, repeticoes, rodadas=5):
+    """Mediana, entre rodadas, do tempo médio por chamada em µs."""
+    medias = []
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao()
+        medias.append((time.perf_counter() - inicio) * 1e6 / repeticoes)
+    return round(statistics.median(medias), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=5000)
+    parser.add_argument('--processos', type=int, default=8)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='bench_telemetria_')
+    os.environ['METRICAS_DIRETORIO'] = diretorio
+    import telemetria
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from database import db
+
+    resultados = {}
+    with conectar() as conn:
+        conn.execute(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}')
+    try:
+        resultados['observar_us'] = cronometrar(
+            lambda: telemetria.observar('nf_estagio_segundos', 0.003, estagio='db_query', rota='/x', modelo=''),
+            args.repeticoes)
+        resultados['contar_us'] = cronometrar(
+            lambda: telemetria.contar('nf_cache_total', cache='rag_respostas', resultado='acerto'), args.repeticoes)
+
+        app = criar_app_flask(SCHEMA)
+        with app.app_context():
+            def select_1():
+                with db.engine.connect() as conexao:
+                    conexao.exec_driver_sql('SELECT 1')
+            select_1()
+            resultados['select_1_com_listeners_us'] = cronometrar(select_1, args.repeticoes // 5)
+            event.remove(Engine, 'before_cursor_execute', telemetria._antes_comando)
+            event.remove(Engine, 'after_cursor_execute', telemetria._depois_comando)
+            resultados['select_1_sem_listeners_us'] = cronometrar(select_1, args.repeticoes // 5)
+            event.listen(Engine, 'before_cursor_execute', telemetria._antes_comando)
+            event.listen(Engine, 'after_cursor_execute', telemetria._depois_comando)
+
+        for nome, instrumentado in (('requisicao_sem_telemetria_us', False), ('requisicao_com_telemetria_us', True)):
+            app = criar_app_flask(SCHEMA)
+            if instrumentado:
+                telemetria.instrumentar(app)
+
+            @app.route('/healthz')
+            def healthz():
+                with db.engine.connect() as conexao:
+                    conexao.exec_driver_sql('SELECT 1')
+                return {'status': 'ok'}
+            cliente = app.test_client()
+            cliente.get('/healthz')
+            resultados[nome] = cronometrar(lambda: cliente.get('/healthz'), args.repeticoes // 5)
+
+        # Retratos de outros workers: as mesmas séries deste processo, com pids de processos vivos
+        # (o do próprio benchmark e o do pai) para não serem consolidados como mortos
+        telemetria.gravar_retrato()
+        retrato = telemetria._retrato()
+        for i in range(args.processos - 1):
+            with open(os.path.join(diretorio, f'{os.getppid()}-{i}.json'), 'w', encoding='utf-8') as f:
+                json.dump(retrato, f)
+        texto = telemetria.exposicao()
+        resultados['metrics_series'] = sum(1 for linha in texto.splitlines() if linha and not linha.startswith('#'))
+        resultados['metrics_bytes'] = len(texto.encode())
+        resultados['metrics_ms'] = round(cronometrar(telemetria.exposicao, 20, rodadas=3) / 1000, 2)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+        with conectar() as conn:
+            conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+
+    print()
+    for nome, valor in resultados.items():
+        print(f'{nome:34} {valor}')
+    caminho = salvar_resultado('telemetria', {'parametros': vars(args), 'resultados': resultados})
+    print(f'\nResultados gravados em {caminho}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Compara dois resultados de benchmarks/resultados (o mesmo benchmark em execuções diferentes).
+
+Percorre os números de `resultados` dos dois arquivos (chaves aninhadas viram
+caminho.com.pontos) e mostra antes, depois e a variação. Por padrão só as chaves de tempo
+(terminadas em _ms, _us ou _s); --todas inclui contagens, bytes etc. Sem arquivos, usa as
+duas execuções mais recentes do benchmark de --benchmark.
+
+Uso:
+    python -m benchmarks.comparar benchmarks/resultados/suite-A.json benchmarks/resultados/suite-B.json
+    python -m benchmarks.comparar --benchmark suite --limiar 10
+"""
+import argparse
+import glob
+import json
+import os
+
+from benchmarks.comum import DIRETORIO_RESULTADOS
+
+SUFIXOS_TEMPO = ('_ms', '_us', '_s')
+
+
+def achatar(dados, prefixo=''):
+    """{'a': {'b_ms': 1}} -> {'a.b_ms': 1} (só números; bool fica de fora)"""
+    valores = {}
+    for chave, valor in dados.items():
+        caminho = f'{prefixo}{chave}'
+        if isinstance(valor, dict):
+            valores.update(achatar(valor, caminho + '.'))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            valores[caminho] = valor
+    return valores
+
+
+def comparar(antes, depois, todas=False):
+    """[(chave, antes, depois, variação em % ou None)] das chaves presentes nos dois."""
+    a, d = achatar(antes.get('resultados', {})), achatar(depois.get('resultados', {}))
+    linhas = []
+    for chave in sorted(a.keys() & d.keys()):
+        if not todas and not chave.endswith(SUFIXOS_TEMPO):
+            continue
+        variacao = (d[chave] - a[chave]) * 100 / a[chave] if a[chave] else None
+        linhas.append((chave, a[chave], d[chave], variacao))
+    return linhas
+
+
+def ler(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def mais_recentes(benchmark):
+    arquivos = sorted(glob.glob(os.path.join(DIRETORIO_RESULTADOS, f'{benchmark}-*.json')))
+    if len(arquivos) < 2:
+        raise SystemExit(f'Menos de dois resultados de {benchmark} em {DIRETORIO_RESULTADOS}')
+    return arquivos[-2:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('arquivos', nargs='*', help='resultado de antes e de depois')
+    parser.add_argument('--benchmark', default='suite')
+    parser.add_argument('--todas', action='store_true', help='inclui os números que não são tempos')
+    parser.add_argument('--limiar', type=float, default=0,
+                        help='mostra só variações de pelo menos LIMIAR %% (para mais ou para menos)')
+    args = parser.parse_args()
+
+    caminhos = args.arquivos or mais_recentes(args.benchmark)
+    if len(caminhos) != 2:
+        parser.error('informe dois arquivos (antes e depois)')
+    antes, depois = (ler(caminho) for caminho in caminhos)
+    for rotulo, dados in (('antes', antes), ('depois', depois)):
+        ambiente = dados.get('ambiente', {})
+        print(f"{rotulo:7} {dados.get('executado_em')}  commit {ambiente.get('commit', '?')}  "
+              f"escala {dados.get('base', {}).get('escala', '?')}")
+    print()
+    for chave, a, d, variacao in comparar(antes, depois, args.todas):
+        if variacao is not None and abs(variacao) < args.limiar:
+            continue
+        texto = f'{variacao:+8.1f}%' if variacao is not None else '        -'
+        print(f'{chave:60} {a:>12g} {d:>12g} {texto}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Base sintética completa em um schema próprio, nas escalas de comum.ESCALAS (10k, 1m, 10m).
+
+Recria o schema com database_schema.sql, preenche pessoas, classificações, movimentos,
+parcelas e vínculos (comum.gerar_dados) e aplica todas as migrações de migrations/ por
+último (índices, versão dos dados, rag_documentos e triggers, mais rápido que mantê-los
+durante a carga). O schema fica no banco para os benchmarks (bench_suite --reusar) ou
+para apontar a aplicação (DATABASE_URL com options=-c search_path=<schema>,public).
+
+Uso:
+    python -m benchmarks.gerar --escala 1m --schema nf_sintetico
+    python -m benchmarks.gerar --escala 10m --schema nf_sintetico_10m
+"""
+import argparse
+import os
+import time
+
+from benchmarks.comum import ESCALAS, conectar, recriar_schema, gerar_dados, aplicar_migracoes
+
+TABELAS = ['pessoas', 'classificacao', 'movimento_contas', 'parcelas_contas', 'MovimentoContas_has_Classificacao']
+
+
+def contar_linhas(conn):
+    return {t: conn.execute(f'SELECT count(*) FROM "{t}"').fetchone()[0] for t in TABELAS}
+
+
+def preparar_base(conn, schema, escala, semente=None):
+    """Recria `schema` com a base sintética da `escala` e as migrações; retorna tempos e contagens."""
+    from migracoes import listar_migracoes
+    inicio = time.perf_counter()
+    recriar_schema(conn, schema)
+    gerar_dados(conn, **ESCALAS[escala], semente=semente)
+    gerado = time.perf_counter()
+    aplicar_migracoes(conn, *(os.path.basename(caminho) for _, caminho in listar_migracoes()))
+    return {
+        'escala': escala,
+        'segundos_geracao': round(gerado - inicio, 1),
+        'segundos_migracoes': round(time.perf_counter() - gerado, 1),
+        'linhas': contar_linhas(conn),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='10k')
+    parser.add_argument('--schema', default='nf_sintetico')
+    args = parser.parse_args()
+
+    print(f'Gerando a escala {args.escala} no schema {args.schema}...')
+    with conectar(args.schema) as conn:
+        base = preparar_base(conn, args.schema, args.escala)
+    print(f"Geração: {base['segundos_geracao']} s | migrações: {base['segundos_migracoes']} s")
+    for tabela, linhas in base['linhas'].items():
+        print(f'  {tabela:36} {linhas:>12,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Cache em memória com expiração (TTL) e descarte LRU, e a versão dos dados do banco.
+
+Cada processo (worker do gunicorn) tem os seus caches. As entradas usam a versão
+dos dados na chave (versao_dados, migração 006). Ela muda a cada transação que
+escreve em movimentos, parcelas, vínculos, pessoas ou classificações. Por isso uma
+resposta calculada antes de uma escrita nunca é servida depois dela. A versão vem do
+barramento de invalidação (invalidacao.py), que também esvazia os caches registrados a
+cada escrita; sem ele, os caches que dependem da versão ficam desligados.
+
+Métricas de todos os caches: metricas() (exposta em GET /admin/api/cache), e os
+acertos/falhas somados entre workers em GET /metrics (telemetria.py).
+"""
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import invalidacao
+import telemetria
+
+_caches = {}
+
+
+class CacheTTL:
+    """Dicionário limitado a `tamanho_maximo` entradas, cada uma válida por `ttl_segundos`. Thread-safe."""
+
+    def __init__(self, nome, tamanho_maximo, ttl_segundos):
+        self.nome = nome
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = self.falhas = self.expirados = self.descartados = 0
+        _caches[nome] = self
+
+    @property
+    def ativo(self):
+        return self.tamanho_maximo > 0 and self.ttl_segundos > 0
+
+    def obter(self, chave):
+        """Valor guardado ou None (ausente ou expirado)."""
+        with self._trava:
+            valor = self._obter(chave)
+            if valor is None:
+                self.falhas += 1
+            else:
+                self.acertos += 1
+        telemetria.contar('nf_cache_total', cache=self.nome, resultado='falha' if valor is None else 'acerto')
+        return valor
+
+    def _obter(self, chave):
+        # Chamado com a trava; não conta acerto/falha
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return None
+        expira_em, valor = entrada
+        if expira_em <= time.monotonic():
+            del self._entradas[chave]
+            self.expirados += 1
+            return None
+        self._entradas.move_to_end(chave)
+        return valor
+
+    def gravar(self, chave, valor):
+        if not self.ativo:
+            return
+        with self._trava:
+            self._gravar(chave, valor)
+
+    def _gravar(self, chave, valor):
+        self._entradas[chave] = (time.monotonic() + self.ttl_segundos, valor)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.tamanho_maximo:
+            self._entradas.popitem(last=False)
+            self.descartados += 1
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+
+    def metricas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'tamanho': len(self._entradas),
+                'tamanho_maximo': self.tamanho_maximo,
+                'ttl_segundos': self.ttl_segundos,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'expirados': self.expirados,
+                'descartados': self.descartados,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else None,
+            }
+
+
+class CacheSemantico(CacheTTL):
+    """
+    Respostas reaproveitadas para perguntas parecidas, não só idênticas.
+
+    As entradas são agrupadas por uma assinatura exata (ex.: versão dos dados,
+    filtros resolvidos e ids do contexto recuperado). Dentro do grupo, vale a
+    resposta cuja pergunta tem similaridade de cosseno >= `limiar` com a nova.
+    Perguntas diferentes com o mesmo contexto ("total" vs. "maior fornecedor")
+    ficam abaixo do limiar. Paráfrases com outro período ou outro contexto nunca
+    chegam a ser comparadas.
+
+    tamanho_maximo limita o número de assinaturas (LRU); cada uma guarda até
+    `por_assinatura` perguntas, cada uma com o seu TTL.
+    """
+
+    def __init__(self, nome, tamanho_maximo, ttl_segundos, limiar, por_assinatura=8):
+        super().__init__(nome, tamanho_maximo, ttl_segundos)
+        self.limiar = limiar
+        self.por_assinatura = por_assinatura
+        self.abaixo_limiar = 0
+
+    def buscar(self, assinatura, vetor):
+        """(valor, similaridade) da pergunta mais parecida do grupo, ou (None, melhor similaridade)."""
+        consulta = _normalizar_vetor(vetor)
+        with self._trava:
+            grupo = self._obter(assinatura) or []
+            agora = time.monotonic()
+            grupo[:] = [item for item in grupo if item[0] > agora]
+            melhor, melhor_valor = None, None
+            for _, vetor_item, valor in grupo:
+                similaridade = sum(a * b for a, b in zip(consulta, vetor_item))
+                if melhor is None or similaridade > melhor:
+                    melhor, melhor_valor = similaridade, valor
+            acerto = melhor is not None and melhor >= self.limiar
+            if acerto:
+                self.acertos += 1
+            else:
+                self.falhas += 1
+                if melhor is not None:
+                    self.abaixo_limiar += 1
+        telemetria.contar('nf_cache_total', cache=self.nome, resultado='acerto' if acerto else 'falha')
+        return (melhor_valor, melhor) if acerto else (None, melhor)
+
+    def gravar(self, assinatura, vetor, valor):
+        if not self.ativo or not vetor:
+            return
+        with self._trava:
+            grupo = self._obter(assinatura) or []
+            grupo.append((time.monotonic() + self.ttl_segundos, _normalizar_vetor(vetor), valor))
+            del grupo[:-self.por_assinatura]
+            self._gravar(assinatura, grupo)
+
+    def metricas(self):
+        dados = super().metricas()
+        with self._trava:
+            dados.update({'limiar': self.limiar, 'abaixo_limiar': self.abaixo_limiar,
+                          'perguntas': sum(len(grupo) for _, grupo in self._entradas.values())})
+        return dados
+
+
+def _normalizar_vetor(vetor):
+    norma = math.sqrt(sum(v * v for v in vetor)) or 1.0
+    return [v / norma for v in vetor]
+
+
+def embedding_lexical(texto, dimensoes=512):
+    """
+    Embedding local e determinístico (palavras e trigramas de caracteres com hashing).
+
+    Não entende sinônimos como um modelo de embeddings, mas não depende de rede.
+    Serve ao cache semântico quando o Gemini não está disponível, e ao benchmark
+    reproduzível.
+    """
+    vetor = [0.0] * dimensoes
+    palavras = re.findall(r'\w+', texto)
+    for palavra in palavras:
+        vetor[zlib.crc32(palavra.encode()) % dimensoes] += 1.0
+        marcada = f' {palavra} '
+        for i in range(len(marcada) - 2):
+            vetor[zlib.crc32(marcada[i:i + 3].encode()) % dimensoes] += 0.5
+    return vetor
+
+
+def metricas():
+    return {nome: cache.metricas() for nome, cache in _caches.items()}
+
+
+def limpar_todos():
+    for cache in _caches.values():
+        cache.limpar()
+
+
+def versao_dados():
+    """
+    Versão atual dos dados (versao_dados_seq), como entregue pelo ouvinte de invalidação.
+
+    O nextval da migração 006 roda antes do COMMIT: lida direto na sequência, a versão nova
+    pode aparecer antes dos dados dela, e uma resposta calculada com os dados antigos ficaria
+    guardada sob ela. Por isso só vale a versão do ouvinte (notificada depois do COMMIT).
+    Retorna None sem o ouvinte conectado, com a versão ainda não confirmada ou sem a
+    migração 006; quem chama não deve usar o cache nesses casos.
+    """
+    return invalidacao.versao()
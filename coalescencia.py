@@ -0,0 +1,214 @@
+"""
+Coalescência de requisições idênticas simultâneas (single-flight).
+
+Quando várias requisições com a mesma impressão digital (rota + parâmetros
+canônicos + versão dos dados) chegam ao mesmo tempo, só a primeira (líder)
+executa as consultas e a chamada ao Gemini. As demais esperam e recebem o mesmo
+resultado:
+
+- entre threads do mesmo worker: um threading.Event por impressão digital;
+- entre workers (opcional, migrações 007 e 013): o líder de cada worker tenta reservar
+  a impressão digital em resultados_compartilhados (uma linha com resultado NULL,
+  gravada num INSERT curto). Quem reserva calcula sem segurar conexão nem transação e
+  depois grava o resultado na linha. Os outros consultam a linha em intervalos
+  crescentes (ESPERA_INICIAL_S até ESPERA_MAXIMA_S) até o resultado aparecer.
+
+Uma reserva sem resultado vale por espera_segundos: se o líder morre no meio do cálculo,
+a linha vence e o próximo worker a reserva. Se o líder falha, apaga a reserva e quem
+esperava reserva em seguida.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+_coalescedores = {}
+
+# Intervalo entre consultas de um worker que espera o resultado de outro (dobra a cada volta)
+ESPERA_INICIAL_S = 0.05
+ESPERA_MAXIMA_S = 0.5
+
+
+def impressao_digital(*partes):
+    """SHA-256 da representação JSON canônica das partes (chaves ordenadas)."""
+    return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _compartilhavel(resultado):
+    # Respostas de erro dos agentes ({'sucesso': False, ...}) não são reaproveitadas por outros workers
+    return not (isinstance(resultado, dict) and resultado.get('sucesso') is False)
+
+
+class _Voo:
+    __slots__ = ('evento', 'resultado', 'erro')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class Coalescedor:
+    """
+    executar(partes, funcao, engine) -> (resultado, coalescida).
+
+    espera_segundos limita a espera de um seguidor (no Event e nas consultas a
+    resultados_compartilhados) e a validade de uma reserva. Se o limite estoura, o
+    seguidor executa a função ele mesmo. janela_segundos é a validade de um resultado
+    em resultados_compartilhados.
+    """
+
+    def __init__(self, nome, espera_segundos=60, janela_segundos=30, entre_workers=True):
+        self.nome = nome
+        self.espera_segundos = espera_segundos
+        self.janela_segundos = janela_segundos
+        self.entre_workers = entre_workers
+        self._voos = {}
+        self._trava = threading.Lock()
+        self._tabela_existe = None
+        self.lideres = self.coalescidas_local = self.coalescidas_entre_workers = self.esperas_esgotadas = 0
+        _coalescedores[nome] = self
+
+    def executar(self, partes, funcao, engine=None):
+        chave = impressao_digital(self.nome, *partes)
+        with self._trava:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+
+        if not lider:
+            if not voo.evento.wait(self.espera_segundos):
+                with self._trava:
+                    self.esperas_esgotadas += 1
+                return funcao(), False
+            if voo.erro is not None:
+                raise voo.erro
+            with self._trava:
+                self.coalescidas_local += 1
+            return voo.resultado, True
+
+        try:
+            voo.resultado, coalescida = self._executar_lider(chave, funcao, engine)
+            return voo.resultado, coalescida
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._trava:
+                del self._voos[chave]
+            voo.evento.set()
+
+    def _executar_lider(self, chave, funcao, engine):
+        with self._trava:
+            self.lideres += 1
+        if not self.entre_workers or engine is None or not self._tabela_disponivel(engine):
+            return funcao(), False
+
+        limite = time.monotonic() + self.espera_segundos
+        intervalo = ESPERA_INICIAL_S
+        while True:
+            try:
+                reservou, pronto = self._reservar(engine, chave)
+            except Exception as e:
+                logger.warning("Coalescência entre workers indisponível (%s): executando sem coordenação", e)
+                return funcao(), False
+            if reservou:
+                return self._calcular_e_publicar(engine, chave, funcao), False
+            if pronto is not None:
+                with self._trava:
+                    self.coalescidas_entre_workers += 1
+                return pronto, True
+            if time.monotonic() >= limite:
+                # Outro worker preso no mesmo cálculo: executa sem coordenação
+                with self._trava:
+                    self.esperas_esgotadas += 1
+                return funcao(), False
+            time.sleep(intervalo)
+            intervalo = min(intervalo * 2, ESPERA_MAXIMA_S)
+
+    def _reservar(self, engine, chave):
+        """
+        (reservou, resultado): reserva a chave se ninguém a tem (ou se a linha venceu);
+        senão, devolve o resultado já gravado (None enquanto o líder calcula).
+        """
+        with engine.begin() as conexao:
+            reservou = conexao.execute(text("""
+                INSERT INTO resultados_compartilhados (chave, resultado) VALUES (:c, NULL)
+                ON CONFLICT (chave) DO UPDATE SET resultado = NULL, criado_em = now()
+                WHERE resultados_compartilhados.criado_em < now() - make_interval(secs =>
+                    CASE WHEN resultados_compartilhados.resultado IS NULL THEN :espera ELSE :janela END)
+                RETURNING true
+            """), {'c': chave, 'espera': self.espera_segundos, 'janela': self.janela_segundos}).scalar()
+            if reservou:
+                return True, None
+            return False, conexao.execute(text("""
+                SELECT resultado FROM resultados_compartilhados
+                WHERE chave = :c AND criado_em > now() - make_interval(secs => :janela)
+            """), {'c': chave, 'janela': self.janela_segundos}).scalar()
+
+    def _calcular_e_publicar(self, engine, chave, funcao):
+        try:
+            resultado = funcao()
+        except BaseException:
+            self._publicar(engine, chave, None)
+            raise
+        self._publicar(engine, chave, resultado if _compartilhavel(resultado) else None)
+        return resultado
+
+    def _publicar(self, engine, chave, resultado):
+        """Grava o resultado na reserva ou, sem resultado compartilhável, a apaga (quem espera reserva em seguida)."""
+        try:
+            with engine.begin() as conexao:
+                if resultado is None:
+                    conexao.execute(text("""
+                        DELETE FROM resultados_compartilhados WHERE chave = :c AND resultado IS NULL
+                    """), {'c': chave})
+                    return
+                conexao.execute(text("""
+                    DELETE FROM resultados_compartilhados
+                    WHERE criado_em < now() - make_interval(secs =>
+                        CASE WHEN resultado IS NULL THEN :espera ELSE :janela END)
+                """), {'espera': self.espera_segundos, 'janela': self.janela_segundos})
+                conexao.execute(text("""
+                    INSERT INTO resultados_compartilhados (chave, resultado) VALUES (:c, CAST(:r AS JSONB))
+                    ON CONFLICT (chave) DO UPDATE SET resultado = EXCLUDED.resultado, criado_em = now()
+                """), {'c': chave, 'r': json.dumps(resultado, default=str)})
+        except Exception as e:
+            # Os outros workers esperam a reserva vencer e executam sozinhos
+            logger.warning("Falha ao publicar o resultado coalescido: %s", e)
+
+    def _tabela_disponivel(self, engine):
+        if self._tabela_existe is None:
+            try:
+                with engine.connect() as conexao:
+                    # A reserva (resultado NULL) precisa da migração 013
+                    self._tabela_existe = bool(conexao.execute(text("""
+                        SELECT NOT attnotnull FROM pg_attribute
+                        WHERE attrelid = to_regclass('resultados_compartilhados') AND attname = 'resultado'
+                    """)).scalar())
+            except Exception:
+                return False
+            if not self._tabela_existe:
+                logger.warning("resultados_compartilhados ausente ou sem a migração 013: coalescência só dentro do worker")
+        return self._tabela_existe
+
+    def metricas(self):
+        with self._trava:
+            return {
+                'em_voo': len(self._voos),
+                'lideres': self.lideres,
+                'coalescidas_local': self.coalescidas_local,
+                'coalescidas_entre_workers': self.coalescidas_entre_workers,
+                'esperas_esgotadas': self.esperas_esgotadas,
+                'entre_workers': self.entre_workers,
+            }
+
+
+def metricas():
+    return {nome: c.metricas() for nome, c in _coalescedores.items()}
@@ -0,0 +1,89 @@
+"""
+Compressão gzip das respostas JSON grandes (e das exportações transmitidas).
+
+Respostas de TIPOS com pelo menos COMPRESSAO_MIN_BYTES, para clientes que aceitam gzip
+(Accept-Encoding), saem com Content-Encoding: gzip. O corpo já montado (jsonify das listagens
+e relatórios) é comprimido de uma vez, medido como estágio `compression` em
+nf_estagio_segundos. As respostas transmitidas (exportação NDJSON/CSV) são comprimidas pedaço
+a pedaço, sem acumular o corpo: o compressor devolve o que já tem a cada
+COMPRESSAO_DESCARGA_KB de entrada (Z_SYNC_FLUSH), para o cliente continuar recebendo as linhas
+aos poucos. Bytes antes e depois vão para nf_compressao_bytes_total{estado}.
+
+instrumentar(app) deve ser chamado antes dos demais ganchos de resposta: os after_request rodam
+na ordem inversa do registro, e a compressão precisa ser a última (depois do campo `timings`
+de telemetria.py). Por isso o estágio não entra no Server-Timing, que já foi escrito.
+COMPRESSAO_JSON=0 desativa (por exemplo, com um proxy que já comprime).
+"""
+import gzip
+import os
+import zlib
+
+from flask import request
+
+import telemetria
+
+ATIVA = os.getenv('COMPRESSAO_JSON', '1').lower() in ('1', 'true')
+MIN_BYTES = int(os.getenv('COMPRESSAO_MIN_BYTES', '1024'))
+NIVEL = int(os.getenv('COMPRESSAO_NIVEL', '6'))
+DESCARGA_BYTES = int(os.getenv('COMPRESSAO_DESCARGA_KB', '64')) * 1024
+TIPOS = ('application/json', 'application/x-ndjson', 'text/csv')
+
+
+def aceita_gzip():
+    return request.accept_encodings.quality('gzip') > 0
+
+
+def comprimir_transmissao(pedacos, nivel=NIVEL, descarga_bytes=DESCARGA_BYTES):
+    """Gera o gzip de um iterável de pedaços (str ou bytes) sem acumular o corpo."""
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31: cabeçalho e rodapé gzip
+    original = comprimido = pendente = 0
+    try:
+        for pedaco in pedacos:
+            if isinstance(pedaco, str):
+                pedaco = pedaco.encode('utf-8')
+            original += len(pedaco)
+            pendente += len(pedaco)
+            saida = compressor.compress(pedaco)
+            if pendente >= descarga_bytes:
+                saida += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pendente = 0
+            if saida:
+                comprimido += len(saida)
+                yield saida
+        saida = compressor.flush()
+        comprimido += len(saida)
+        yield saida
+    finally:
+        # Cliente que desconecta: fecha o gerador original (cursor do servidor, conexão)
+        fechar = getattr(pedacos, 'close', None)
+        if fechar is not None:
+            fechar()
+        telemetria.contar('nf_compressao_bytes_total', original, estado='original')
+        telemetria.contar('nf_compressao_bytes_total', comprimido, estado='comprimido')
+
+
+def instrumentar(app):
+    """Comprime as respostas elegíveis; registrar antes dos outros after_request."""
+
+    @app.after_request
+    def _comprimir(resposta):
+        if not ATIVA or resposta.mimetype not in TIPOS:
+            return resposta
+        resposta.vary.add('Accept-Encoding')
+        if (request.method == 'HEAD' or resposta.status_code < 200 or resposta.status_code in (204, 304)
+                or 'Content-Encoding' in resposta.headers or not aceita_gzip()):
+            return resposta
+        if resposta.is_streamed:
+            resposta.response = comprimir_transmissao(resposta.response)
+            resposta.headers.pop('Content-Length', None)
+        else:
+            dados = resposta.get_data()
+            if len(dados) < MIN_BYTES:
+                return resposta
+            with telemetria.estagio('compression'):
+                comprimido = gzip.compress(dados, compresslevel=NIVEL, mtime=0)
+            telemetria.contar('nf_compressao_bytes_total', len(dados), estado='original')
+            telemetria.contar('nf_compressao_bytes_total', len(comprimido), estado='comprimido')
+            resposta.set_data(comprimido)
+        resposta.headers['Content-Encoding'] = 'gzip'
+        return resposta
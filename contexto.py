@@ -0,0 +1,141 @@
+"""
+Empacotamento do contexto dos prompts do RAG dentro de um orçamento de tokens.
+
+As linhas recuperadas (dicionários de Agent3._retrieve_data) são ranqueadas pela
+pergunta e renderizadas em formato tabular: cabeçalho uma vez e linhas separadas
+por "|". Nomes de pessoas e classificações viram códigos (P1, C1...) definidos uma
+única vez em legendas. Linhas entram em ordem de relevância enquanto o prompt couber
+no orçamento; as que não cabem são descartadas e contadas.
+
+Tokens são estimados por caracteres (CARACTERES_POR_TOKEN), sem chamada ao modelo.
+O número real vem na resposta do Gemini (usage_metadata) e é reportado junto.
+"""
+import re
+import unicodedata
+
+CARACTERES_POR_TOKEN = 4
+TAMANHO_DESCRICAO = 80
+
+COLUNAS = {
+    'movimentos': ('id', 'nf', 'emissao', 'valor', 'emitente', 'destinatario', 'classificacoes', 'descricao'),
+    'parcelas': ('id', 'parcela', 'vencimento', 'valor', 'pago', 'saldo', 'status'),
+}
+# Colunas com nomes repetidos entre linhas, trocados por códigos da legenda
+LEGENDAS = {'emitente': 'P', 'destinatario': 'P', 'classificacoes': 'C'}
+TITULOS_LEGENDA = {'P': 'PESSOAS', 'C': 'CLASSIFICACOES'}
+
+PALAVRAS_VALOR = ('maior', 'maiores', 'top', 'mais alt', 'mais car', 'principais')
+PALAVRAS_IGNORADAS = {
+    'que', 'qual', 'quais', 'quanto', 'quantos', 'com', 'para', 'dos', 'das', 'nos', 'nas', 'por', 'mes', 'ano',
+    'atual', 'este', 'esta', 'deste', 'desta', 'semana', 'trimestre', 'ultimo', 'ultima', 'ultimos', 'acima',
+    'menor', 'maior', 'maiores', 'despesas', 'despesa', 'notas', 'nota', 'fiscais', 'fiscal', 'parcelas',
+}
+
+
+def estimar_tokens(texto):
+    return (len(texto) + CARACTERES_POR_TOKEN - 1) // CARACTERES_POR_TOKEN
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _celula(valor):
+    if isinstance(valor, float):
+        return f'{valor:.2f}'
+    return re.sub(r'\s+', ' ', str(valor if valor is not None else '-')).replace('|', '/').strip() or '-'
+
+
+def ranquear(registros, pergunta):
+    """
+    Ordena por relevância para a pergunta, de forma estável.
+
+    Critério 1: termos da pergunta presentes na descrição, pessoas ou classificações.
+    Critério 2: valor decrescente se a pergunta pede maiores/top; senão a ordem da
+    recuperação (mais recentes primeiro).
+    """
+    q = _normalizar(pergunta)
+    termos = {t for t in re.findall(r'\w{3,}', q) if t not in PALAVRAS_IGNORADAS}
+    por_valor = any(p in q for p in PALAVRAS_VALOR)
+
+    def chave(par):
+        posicao, r = par
+        texto = _normalizar(' '.join(str(r.get(c) or '') for c in ('descricao', 'emitente', 'destinatario', 'classificacoes')))
+        acertos = sum(1 for t in termos if t in texto)
+        return (-acertos, -(r.get('valor') or 0) if por_valor else posicao)
+
+    return [r for _, r in sorted(enumerate(registros), key=chave)]
+
+
+def tabela(titulo, colunas, linhas):
+    """Tabela no mesmo formato das recuperadas (título, cabeçalho, linhas com "|"), para resultados agregados."""
+    corpo = '\n'.join('|'.join(_celula(v) for v in linha) for linha in linhas)
+    return f"{titulo}\n{'|'.join(colunas)}\n{corpo}" if linhas else f"{titulo}\n(sem registros no recorte)"
+
+
+def empacotar(registros, pergunta, orcamento_tokens, prefixo=''):
+    """
+    Retorna {'texto', 'incluidos', 'descartados', 'tokens'}.
+
+    `orcamento_tokens` vale para o texto do contexto (legendas + tabelas). Registros
+    de tipos diferentes (movimentos e parcelas) geram uma tabela por tipo.
+    """
+    ordenados = ranquear(registros, pergunta)
+    codigos = {}       # (prefixo, nome) -> código
+    legenda = []       # linhas "P1=NOME", na ordem de criação
+    linhas = {}        # tipo -> linhas da tabela
+    incluidos = []
+    descartados = 0
+    usados = estimar_tokens(prefixo)
+
+    for r in ordenados:
+        tipo = r['tipo']
+        novos_codigos = []
+        celulas = []
+        for coluna in COLUNAS[tipo]:
+            valor = r.get(coluna)
+            letra = LEGENDAS.get(coluna)
+            if letra and valor:
+                nomes = valor if isinstance(valor, list) else [valor]
+                refs = []
+                for nome in nomes:
+                    codigo = codigos.get((letra, nome)) or next(
+                        (c for (l, n), c in novos_codigos if l == letra and n == nome), None)
+                    if codigo is None:
+                        contagem = sum(1 for (l, _) in codigos if l == letra) + \
+                            sum(1 for (l, _), _ in novos_codigos if l == letra)
+                        codigo = f'{letra}{contagem + 1}'
+                        novos_codigos.append(((letra, nome), codigo))
+                    refs.append(codigo)
+                celulas.append(';'.join(refs))
+            elif coluna == 'descricao':
+                celulas.append(_celula((valor or '')[:TAMANHO_DESCRICAO]))
+            else:
+                celulas.append(_celula(valor))
+        linha = '|'.join(celulas)
+
+        custo = estimar_tokens(linha) + 1
+        if tipo not in linhas:
+            custo += estimar_tokens(f'{tipo.upper()}\n' + '|'.join(COLUNAS[tipo])) + 1
+        custo += sum(estimar_tokens(f'{codigo}={_celula(nome)}; ') for (_, nome), codigo in novos_codigos)
+        if usados + custo > orcamento_tokens:
+            descartados += 1
+            continue
+
+        usados += custo
+        for chave, codigo in novos_codigos:
+            codigos[chave] = codigo
+            legenda.append((chave[0], f'{codigo}={_celula(chave[1])}'))
+        linhas.setdefault(tipo, []).append(linha)
+        incluidos.append(r)
+
+    partes = [prefixo] if prefixo else []
+    for letra, titulo in TITULOS_LEGENDA.items():
+        itens = [texto for l, texto in legenda if l == letra]
+        if itens:
+            partes.append(f"{titulo}: {'; '.join(itens)}")
+    for tipo, tabela in linhas.items():
+        partes.append(f"{tipo.upper()}\n{'|'.join(COLUNAS[tipo])}\n" + '\n'.join(tabela))
+    texto = '\n'.join(partes) if incluidos else ''
+    return {'texto': texto, 'incluidos': incluidos, 'descartados': descartados, 'tokens': estimar_tokens(texto)}
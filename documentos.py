@@ -0,0 +1,163 @@
+"""
+Documentos do RAG: a tabela rag_documentos (migração 008) guarda, para cada movimento,
+parcela, pessoa e classificação, o texto legível no formato canônico, os campos do
+registro (`dados`, colunas de contexto.COLUNAS) e metadados para filtrar e ordenar.
+
+Triggers mantêm os documentos a cada escrita; a recuperação dos três modos do RAG
+(Agent3, simples e embeddings) é um SELECT indexado nessa tabela, sem juntar pessoas e
+classificações nem montar texto por requisição.
+"""
+import os
+import re
+
+from sqlalchemy import Column, Date, Integer, MetaData, Numeric, String, Table, Text, false, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, array
+
+import invalidacao
+from cache import CacheTTL
+from database import db, Pessoas, Classificacao
+
+TIPOS = ('movimentos', 'parcelas', 'pessoas', 'classificacoes')
+
+# Nomes citados na pergunta -> ids, por worker; valem enquanto o ouvinte de invalidação
+# está conectado e são esvaziados a cada escrita em pessoas/classificacao.
+# RAG_CACHE_REFERENCIAS_TAMANHO=0 desativa.
+CACHE_IDS_PESSOAS = CacheTTL(
+    'rag_ids_pessoas',
+    tamanho_maximo=int(os.getenv('RAG_CACHE_REFERENCIAS_TAMANHO', '1024')),
+    ttl_segundos=int(os.getenv('RAG_CACHE_REFERENCIAS_TTL_S', '3600')),
+)
+CACHE_IDS_CLASSIFICACOES = CacheTTL(
+    'rag_ids_classificacoes',
+    tamanho_maximo=int(os.getenv('RAG_CACHE_REFERENCIAS_TAMANHO', '1024')),
+    ttl_segundos=int(os.getenv('RAG_CACHE_REFERENCIAS_TTL_S', '3600')),
+)
+# Nomes de todas as pessoas e classificações, procurados no texto de cada pergunta (uma
+# entrada por cache, esvaziada a cada escrita na tabela)
+CACHE_NOMES_PESSOAS = CacheTTL(
+    'rag_nomes_pessoas',
+    tamanho_maximo=min(int(os.getenv('RAG_CACHE_REFERENCIAS_TAMANHO', '1024')), 1),
+    ttl_segundos=int(os.getenv('RAG_CACHE_REFERENCIAS_TTL_S', '3600')),
+)
+CACHE_NOMES_CLASSIFICACOES = CacheTTL(
+    'rag_nomes_classificacoes',
+    tamanho_maximo=min(int(os.getenv('RAG_CACHE_REFERENCIAS_TAMANHO', '1024')), 1),
+    ttl_segundos=int(os.getenv('RAG_CACHE_REFERENCIAS_TTL_S', '3600')),
+)
+invalidacao.registrar_cache(CACHE_IDS_PESSOAS, ['pessoas'])
+invalidacao.registrar_cache(CACHE_IDS_CLASSIFICACOES, ['classificacao'])
+invalidacao.registrar_cache(CACHE_NOMES_PESSOAS, ['pessoas'])
+invalidacao.registrar_cache(CACHE_NOMES_CLASSIFICACOES, ['classificacao'])
+
+# Tabela criada e mantida pela migração 008 (fora do db.Model.metadata: o create_all não a toca)
+rag_documentos = Table(
+    'rag_documentos', MetaData(),
+    Column('tipo', String(20), primary_key=True),
+    Column('id_origem', Integer, primary_key=True),
+    Column('texto', Text),
+    Column('hash_texto', String(32)),
+    Column('dados', JSONB),
+    Column('data', Date),
+    Column('valor', Numeric(10, 2)),
+    Column('situacao', String(45)),
+    Column('categoria', String(45)),
+    Column('pessoa_id', Integer),
+    Column('classificacao_ids', ARRAY(Integer)),
+)
+
+
+def pessoas_citadas(texto):
+    """Razões sociais e fantasias que aparecem em `texto` (minúsculas), na ordem do cadastro."""
+    nomes = invalidacao.obter_ou_calcular(CACHE_NOMES_PESSOAS, 'todas', lambda: [
+        (nome, nome.lower()) for linha in db.session.execute(
+            select(Pessoas.razaosocial, Pessoas.fantasia).order_by(Pessoas.idPessoas))
+        for nome in linha if nome])
+    return [nome for nome, minusculo in nomes if minusculo in texto]
+
+
+def classificacoes_citadas(texto):
+    """Descrições de classificação que aparecem em `texto` (minúsculas), na ordem do cadastro."""
+    descricoes = invalidacao.obter_ou_calcular(CACHE_NOMES_CLASSIFICACOES, 'todas', lambda: [
+        (descricao, descricao.lower()) for descricao in db.session.scalars(
+            select(Classificacao.descricao).order_by(Classificacao.idClassificacao)) if descricao])
+    return [descricao for descricao, minusculo in descricoes if minusculo in texto]
+
+
+def ids_pessoas(nomes):
+    """Ids das pessoas cuja razão social ou fantasia contém algum dos nomes (ILIKE; trigramas da migração 002)."""
+    nomes = tuple(sorted(set(nomes)))
+    if not nomes:
+        return []
+
+    def consultar():
+        condicoes = []
+        for nome in nomes:
+            padrao = '%' + re.sub(r'([/%_])', r'/\1', nome) + '%'
+            condicoes.append(Pessoas.razaosocial.ilike(padrao, escape='/'))
+            condicoes.append(Pessoas.fantasia.ilike(padrao, escape='/'))
+        return db.session.scalars(select(Pessoas.idPessoas).where(or_(*condicoes))).all()
+    return invalidacao.obter_ou_calcular(CACHE_IDS_PESSOAS, nomes, consultar)
+
+
+def ids_classificacoes(descricoes):
+    """Ids das classificações com uma das descrições (exata)."""
+    descricoes = tuple(sorted(set(descricoes)))
+    if not descricoes:
+        return []
+    return invalidacao.obter_ou_calcular(CACHE_IDS_CLASSIFICACOES, descricoes, lambda: db.session.scalars(
+        select(Classificacao.idClassificacao).where(Classificacao.descricao.in_(descricoes))).all())
+
+
+def consulta(tipo, filtros, por_valor=False, crescente=False):
+    """
+    SELECT dos documentos de `tipo` que atendem aos filtros da pergunta, mais recentes
+    (ou de maior valor, com `por_valor`; de menor, com `crescente` também) primeiro, sem LIMIT.
+
+    Filtros: data_inicio/data_fim e min_valor/max_valor (movimentos e parcelas), tipo do
+    movimento, status da parcela (PENDENTE/PAGA), classificacoes_incluidas e pessoas_nomes.
+    Nomes viram ids em consultas pequenas antes da principal; sem id, nenhuma linha.
+    """
+    d = rag_documentos.c
+    q = select(d.tipo, d.id_origem, d.texto, d.dados).where(d.tipo == tipo)
+    if tipo == 'movimentos':
+        q = q.where(d.situacao == 'ATIVO')
+        if filtros.get('tipo'):
+            q = q.where(d.categoria == filtros['tipo'])
+    if tipo == 'parcelas' and filtros.get('status') == 'PENDENTE':
+        q = q.where(d.situacao == 'PENDENTE')
+    elif tipo == 'parcelas' and filtros.get('status') == 'PAGA':
+        q = q.where(d.situacao != 'PENDENTE')
+    if tipo in ('movimentos', 'parcelas'):
+        if filtros.get('data_inicio'):
+            q = q.where(d.data >= filtros['data_inicio'])
+        if filtros.get('data_fim'):
+            q = q.where(d.data <= filtros['data_fim'])
+        if filtros.get('min_valor') is not None:
+            q = q.where(d.valor >= filtros['min_valor'])
+        if filtros.get('max_valor') is not None:
+            q = q.where(d.valor <= filtros['max_valor'])
+    if tipo in ('movimentos', 'pessoas') and filtros.get('pessoas_nomes'):
+        q = q.where(d.pessoa_id.in_(ids_pessoas(filtros['pessoas_nomes'])))
+    if tipo in ('movimentos', 'classificacoes') and filtros.get('classificacoes_incluidas'):
+        # Ids no texto do SQL, não como parâmetro: com o valor à vista o planejador escolhe entre o
+        # índice GIN (classificação rara) e percorrer idx_rag_documentos_data (frequente); um plano
+        # genérico de statement preparado usaria o mesmo caminho para todas
+        ids = ids_classificacoes(filtros['classificacoes_incluidas'])
+        q = q.where(d.classificacao_ids.overlap(array([literal_column(str(int(i))) for i in ids], type_=Integer))
+                    if ids else false())
+    if por_valor and crescente:
+        return q.order_by(d.valor.asc().nulls_last(), d.id_origem.desc())
+    if por_valor:
+        return q.order_by(d.valor.desc().nulls_last(), d.id_origem.desc())
+    if tipo in ('movimentos', 'parcelas'):
+        return q.order_by(d.data.desc(), d.id_origem.desc())
+    return q.order_by(d.id_origem)
+
+
+def buscar(tipo, filtros, limite, por_valor=False, crescente=False):
+    """
+    Documentos como registros: {'tipo', 'id' ("movimentos:123"), 'texto', **dados}.
+    Valores numéricos de `dados` chegam como float.
+    """
+    linhas = db.session.execute(consulta(tipo, filtros, por_valor, crescente).limit(limite)).all()
+    return [{**dados, 'tipo': t, 'id': f'{t}:{id_origem}', 'texto': texto} for t, id_origem, texto, dados in linhas]
@@ -0,0 +1,117 @@
+"""
+Arquivos estáticos com impressão digital no nome, pré-comprimidos para o nginx.
+
+    python estaticos.py
+
+copia cada arquivo de static/css e static/js para static/dist/<caminho>.<hash>.<ext> (hash do
+conteúdo), grava ao lado as variantes .gz e, com o pacote brotli instalado, .br (só quando
+ficam menores que o original) e escreve static/dist/manifesto.json com {original: com hash}.
+Roda no build das imagens (Dockerfile.frontend e Dockerfile.backend); o conteúdo igual gera o
+mesmo nome nas duas.
+
+Nos templates, {{ estatico('css/admin.css') }} vira /static/dist/css/admin.<hash>.css quando o
+manifesto existe e a aplicação não está em debug; sem ele, aponta para o arquivo original (assim
+o desenvolvimento não depende do build). Como o nome muda junto com o conteúdo, os arquivos de
+static/dist são servidos com Cache-Control immutable de um ano: pelo nginx (gzip_static) e, sem
+nginx na frente, pelo próprio Flask.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+
+from flask import current_app, request, url_for
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só as variantes .gz
+    brotli = None
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+ORIGEM = os.path.join(RAIZ, 'static')
+PASTAS = ('css', 'js')
+DESTINO = 'dist'
+MANIFESTO = os.getenv('ESTATICOS_MANIFESTO') or os.path.join(ORIGEM, DESTINO, 'manifesto.json')
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+def _comprimidos(conteudo):
+    """{extensão: bytes} das variantes menores que o original."""
+    variantes = {'.gz': gzip.compress(conteudo, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes['.br'] = brotli.compress(conteudo, quality=11)
+    return {extensao: dados for extensao, dados in variantes.items() if len(dados) < len(conteudo)}
+
+
+def construir(origem=ORIGEM, pastas=PASTAS):
+    """Gera static/dist do zero e retorna o manifesto."""
+    destino = os.path.join(origem, DESTINO)
+    shutil.rmtree(destino, ignore_errors=True)
+    manifesto = {}
+    for pasta in pastas:
+        for diretorio, _, arquivos in os.walk(os.path.join(origem, pasta)):
+            for arquivo in sorted(arquivos):
+                caminho = os.path.join(diretorio, arquivo)
+                relativo = os.path.relpath(caminho, origem).replace(os.sep, '/')
+                with open(caminho, 'rb') as f:
+                    conteudo = f.read()
+                base, extensao = os.path.splitext(relativo)
+                com_hash = f'{base}.{hashlib.sha256(conteudo).hexdigest()[:12]}{extensao}'
+                saida = os.path.join(destino, com_hash)
+                os.makedirs(os.path.dirname(saida), exist_ok=True)
+                with open(saida, 'wb') as f:
+                    f.write(conteudo)
+                for sufixo, dados in _comprimidos(conteudo).items():
+                    with open(saida + sufixo, 'wb') as f:
+                        f.write(dados)
+                manifesto[relativo] = com_hash
+    with open(os.path.join(destino, 'manifesto.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return manifesto
+
+
+@lru_cache(maxsize=1)
+def manifesto():
+    """Manifesto do último build ({} sem build)."""
+    try:
+        with open(MANIFESTO, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def estatico(caminho):
+    """URL de um arquivo de static/: a versão com hash do build, ou o original em debug/sem build."""
+    com_hash = None if current_app.debug else manifesto().get(caminho)
+    if com_hash:
+        return url_for('static', filename=f'{DESTINO}/{com_hash}')
+    return url_for('static', filename=caminho)
+
+
+def instrumentar(app):
+    """estatico() nos templates e cache imutável para static/dist quando o Flask serve os arquivos."""
+    app.jinja_env.globals['estatico'] = estatico
+    prefixo = f'{app.static_url_path}/{DESTINO}/'
+
+    @app.after_request
+    def _cache(resposta):
+        if request.path.startswith(prefixo) and resposta.status_code in (200, 304):
+            resposta.headers['Cache-Control'] = CACHE_IMUTAVEL
+        return resposta
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera static/dist: arquivos com hash, .gz/.br e manifesto.json')
+    parser.add_argument('--origem', default=ORIGEM)
+    args = parser.parse_args()
+    gerado = construir(args.origem)
+    print(f"✅ {len(gerado)} arquivo(s) em {os.path.join(args.origem, DESTINO)} "
+          f"({'gzip e brotli' if brotli is not None else 'gzip; instale brotli para .br'})")
+
+
+if __name__ == '__main__':
+    main()
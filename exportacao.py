@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select, func
+
+from database import db, Pessoas, Classificacao, MovimentoContas, ParcelasContas, movimento_classificacao
+
+# Linhas buscadas por ida ao banco no cursor do servidor
+LOTE_CURSOR = 2000
+# Linhas acumuladas antes de enviar um pedaço ao cliente
+LINHAS_POR_PEDACO = 500
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def consulta_movimentos(data_inicio=None, data_fim=None, tipo=None, status=None, classificacao_id=None, classificacao_nome=None):
+    """
+    Monta o SELECT plano de movimentos para exportação (sem objetos do ORM).
+    Emitente, destinatário e classificações vêm na mesma linha.
+    """
+    fornecedor = Pessoas.__table__.alias('fornecedor')
+    faturado = Pessoas.__table__.alias('faturado')
+    assoc = movimento_classificacao
+    cls = Classificacao.__table__
+
+    classificacoes = (
+        select(func.string_agg(cls.c.descricao, ';'))
+        .select_from(assoc.join(cls, cls.c.idClassificacao == assoc.c.Classificacao_idClassificacao))
+        .where(assoc.c.MovimentoContas_idMovimentoContas == MovimentoContas.idMovimentoContas)
+        .scalar_subquery()
+    )
+
+    stmt = (
+        select(
+            MovimentoContas.idMovimentoContas.label('id'),
+            MovimentoContas.tipo,
+            MovimentoContas.numeronotafiscal,
+            MovimentoContas.dataemissao,
+            MovimentoContas.descricao,
+            MovimentoContas.status,
+            MovimentoContas.valortotal,
+            fornecedor.c.idPessoas.label('fornecedor_id'),
+            fornecedor.c.razaosocial.label('fornecedor_razaosocial'),
+            fornecedor.c.documento.label('fornecedor_documento'),
+            faturado.c.idPessoas.label('faturado_id'),
+            faturado.c.razaosocial.label('faturado_razaosocial'),
+            faturado.c.documento.label('faturado_documento'),
+            classificacoes.label('classificacoes'),
+        )
+        .select_from(MovimentoContas.__table__)
+        .outerjoin(fornecedor, fornecedor.c.idPessoas == MovimentoContas.Pessoas_idFornecedorCliente)
+        .outerjoin(faturado, faturado.c.idPessoas == MovimentoContas.Pessoas_idFaturado)
+    )
+
+    if data_inicio:
+        stmt = stmt.where(MovimentoContas.dataemissao >= data_inicio)
+    if data_fim:
+        stmt = stmt.where(MovimentoContas.dataemissao <= data_fim)
+    if tipo:
+        stmt = stmt.where(MovimentoContas.tipo == tipo)
+    if status:
+        stmt = stmt.where(MovimentoContas.status == status)
+    if classificacao_id or classificacao_nome:
+        filtro_cls = select(assoc.c.MovimentoContas_idMovimentoContas).select_from(
+            assoc.join(cls, cls.c.idClassificacao == assoc.c.Classificacao_idClassificacao)
+        )
+        if classificacao_id:
+            filtro_cls = filtro_cls.where(cls.c.idClassificacao == classificacao_id)
+        if classificacao_nome:
+            filtro_cls = filtro_cls.where(cls.c.descricao == classificacao_nome)
+        stmt = stmt.where(MovimentoContas.idMovimentoContas.in_(filtro_cls))
+
+    return stmt.order_by(MovimentoContas.dataemissao, MovimentoContas.idMovimentoContas)
+
+
+def consulta_parcelas(data_inicio=None, data_fim=None, status=None):
+    """Monta o SELECT plano de parcelas para exportação."""
+    stmt = select(
+        ParcelasContas.idParcelasContas.label('id'),
+        ParcelasContas.identificacao,
+        ParcelasContas.datavencimento,
+        ParcelasContas.valorparcela,
+        ParcelasContas.valorpago,
+        ParcelasContas.valorsaldo,
+        ParcelasContas.statusparcela,
+    )
+    if data_inicio:
+        stmt = stmt.where(ParcelasContas.datavencimento >= data_inicio)
+    if data_fim:
+        stmt = stmt.where(ParcelasContas.datavencimento <= data_fim)
+    if status:
+        stmt = stmt.where(ParcelasContas.statusparcela == status)
+    return stmt.order_by(ParcelasContas.datavencimento, ParcelasContas.idParcelasContas)
+
+
+def _valor_texto(valor):
+    """Datas em ISO e decimais como texto exato (sem passar por float)."""
+    if valor is None:
+        return None
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def gerar_exportacao(stmt, formato, engine=None):
+    """
+    Gerador que transmite o resultado de stmt em NDJSON ou CSV.
+
+    Usa um cursor do lado do servidor (stream_results + yield_per), então a memória
+    do processo fica constante independente do número de linhas. O cabeçalho CSV
+    é enviado antes da primeira ida ao banco e a primeira linha é enviada sozinha,
+    para o primeiro byte sair imediatamente.
+    """
+    engine = engine or db.engine
+    colunas = [c.name for c in stmt.selected_columns]
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n') if formato == 'csv' else None
+
+    def esvaziar():
+        pedaco = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return pedaco
+
+    if escritor:
+        escritor.writerow(colunas)
+        yield esvaziar()
+
+    with engine.connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=LOTE_CURSOR).execute(stmt)
+        pendentes = 0
+        primeira = True
+        for linha in resultado:
+            valores = [_valor_texto(v) for v in linha]
+            if escritor:
+                escritor.writerow(valores)
+            else:
+                buffer.write(json.dumps(dict(zip(colunas, valores)), ensure_ascii=False))
+                buffer.write('\n')
+            pendentes += 1
+            # A primeira linha sai sozinha; as demais em pedaços de LINHAS_POR_PEDACO
+            if primeira or pendentes >= LINHAS_POR_PEDACO:
+                yield esvaziar()
+                pendentes = 0
+                primeira = False
+        if pendentes:
+            yield esvaziar()
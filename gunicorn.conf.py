@@ -0,0 +1,66 @@
+"""
+Perfil de produção do backend (gunicorn com workers gthread).
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+A aplicação é carregada uma vez no processo mestre (preload_app) e herdada pelos
+workers via fork. create_app não abre conexões; a preparação do banco e o import
+dos módulos pesados (app.aquecer) rodam uma única vez em on_starting. Cada worker
+descarta as conexões herdadas e abre as suas em post_fork, antes de aceitar
+requisições. GUNICORN_AQUECER=0 desativa o aquecimento.
+
+Conexões por worker: pool principal (5 + 10 de overflow) + pool de leitura
+(LEITURA_POOL_SIZE + LEITURA_MAX_OVERFLOW). Ajuste workers x pools ao
+max_connections do PostgreSQL.
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+preload_app = True
+
+# Chamadas ao Gemini (upload de PDF, RAG) podem levar dezenas de segundos
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla workers periodicamente (limita crescimento de memória)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = 200
+
+aquecer = os.getenv('GUNICORN_AQUECER', '1').lower() in ('1', 'true')
+
+# GUNICORN_ACCESSLOG vazio desativa o log de acesso
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-') or None
+
+# GET /metrics soma as séries de todos os workers pelos retratos gravados neste diretório
+# (telemetria.py); definido antes do carregamento da aplicação
+os.environ.setdefault('METRICAS_DIRETORIO', os.path.join(tempfile.gettempdir(), 'nf_ai_metricas'))
+
+
+def on_starting(server):
+    """No mestre, antes dos workers: tabelas, migrações, seed, partições futuras e imports pesados."""
+    from database import preparar_banco
+    from telemetria import limpar_diretorio
+    limpar_diretorio()  # séries de uma execução anterior não entram nos contadores desta
+    app = server.app.wsgi()
+    preparar_banco(app)
+    if aquecer:
+        from app import aquecer as aquecer_app
+        server.log.info("Aquecimento no mestre: %s", aquecer_app(app, conexoes=False))
+
+
+def post_fork(server, worker):
+    """Conexões abertas no mestre não podem ser compartilhadas entre processos."""
+    from database import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    if aquecer:
+        from app import aquecer as aquecer_app
+        server.log.info("Aquecimento do worker %s: %s", worker.pid, aquecer_app(app, modulos=False))
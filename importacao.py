@@ -0,0 +1,431 @@
+"""
+Importação histórica em massa (planilhas de fazendas novas) via COPY.
+
+O CSV é transmitido para uma tabela temporária com COPY, validado e
+convertido com SQL set-based e então mesclado em pessoas, classificacao,
+movimento_contas, parcelas_contas e MovimentoContas_has_Classificacao.
+Linhas inválidas vão para importacao_erros em vez de abortar a carga: as que
+o CSV não consegue ler (bytes fora da codificação, número errado de campos,
+aspas sem fechamento) já na leitura em Python, com o texto original; as de
+conteúdo inválido (data, valor, documento...) na validação em SQL. O número
+gravado é o da linha física do arquivo em que o registro começa.
+
+Uso:
+    python importacao.py movimentos ledger.csv
+    python importacao.py parcelas parcelas.csv --delimitador ';' --encoding latin1
+    python importacao.py pessoas fornecedores.csv
+"""
+import argparse
+import csv
+import os
+import time
+
+from dotenv import load_dotenv
+from psycopg import sql
+
+# Colunas aceitas no cabeçalho do CSV por tipo de importação
+COLUNAS = {
+    'pessoas': ['tipo', 'razaosocial', 'fantasia', 'documento', 'status'],
+    'movimentos': [
+        'tipo', 'numeronotafiscal', 'dataemissao', 'descricao', 'status', 'valortotal',
+        'fornecedor_documento', 'fornecedor_razaosocial', 'faturado_documento', 'faturado_razaosocial',
+        'classificacoes',
+    ],
+    'parcelas': ['identificacao', 'datavencimento', 'valorparcela', 'valorpago', 'valorsaldo', 'statusparcela'],
+}
+
+OBRIGATORIAS = {
+    'pessoas': {'razaosocial', 'documento'},
+    'movimentos': {'dataemissao', 'valortotal', 'fornecedor_documento', 'faturado_documento'},
+    'parcelas': {'identificacao', 'datavencimento', 'valorparcela'},
+}
+
+# Nome da codificação aceito na API -> codec do Python
+ENCODINGS = {'utf8': 'utf-8-sig', 'latin1': 'latin-1'}
+
+CHAVE_DOCUMENTO = "regexp_replace(coalesce({0}, ''), '[^0-9A-Za-z]', '', 'g')"
+
+
+class ErroImportacao(ValueError):
+    """Arquivo ou parâmetros de importação inválidos (nada foi gravado)."""
+
+
+def _ler_cabecalho(arquivo, tipo, delimitador, encoding):
+    linha = arquivo.readline()
+    if isinstance(linha, bytes):
+        linha = linha.decode(ENCODINGS[encoding])
+    colunas = [c.strip().lower() for c in next(csv.reader([linha.lstrip('﻿')], delimiter=delimitador), [])]
+    desconhecidas = [c for c in colunas if c not in COLUNAS[tipo]]
+    if desconhecidas:
+        raise ErroImportacao(f"Colunas desconhecidas para {tipo}: {', '.join(desconhecidas)}")
+    faltando = OBRIGATORIAS[tipo] - set(colunas)
+    if faltando:
+        raise ErroImportacao(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+    if len(set(colunas)) != len(colunas):
+        raise ErroImportacao('Colunas repetidas no cabeçalho')
+    return colunas
+
+
+# --- SQL de validação e mescla por tipo -------------------------------------------------
+# Todos os comandos rodam na mesma transação, sobre a tabela temporária stg
+# (colunas texto + "linha"); %(imp)s é o id da importação.
+
+SQL_PESSOAS = [
+    f"""
+    CREATE TEMP TABLE stg_tipado ON COMMIT DROP AS
+    SELECT t.*,
+           CASE
+               WHEN t.razaosocial = '' THEN 'razaosocial obrigatória'
+               WHEN t.chave = '' THEN 'documento obrigatório'
+               WHEN length(t.documento) > 45 THEN 'documento com mais de 45 caracteres'
+               WHEN t.ordem > 1 THEN 'documento repetido no arquivo'
+               WHEN EXISTS (SELECT 1 FROM pessoas p WHERE {CHAVE_DOCUMENTO.format('p.documento')} = t.chave)
+                   THEN 'documento já cadastrado'
+           END AS motivo
+    FROM (
+        SELECT s.linha,
+               upper(coalesce(nullif(btrim(s.tipo), ''), 'FORNECEDOR')) AS tipo,
+               left(btrim(coalesce(s.razaosocial, '')), 150) AS razaosocial,
+               left(nullif(btrim(s.fantasia), ''), 150) AS fantasia,
+               btrim(coalesce(s.documento, '')) AS documento,
+               {CHAVE_DOCUMENTO.format('s.documento')} AS chave,
+               upper(coalesce(nullif(btrim(s.status), ''), 'ATIVO')) AS status,
+               row_number() OVER (PARTITION BY {CHAVE_DOCUMENTO.format('s.documento')} ORDER BY s.linha) AS ordem,
+               to_jsonb(s) - 'linha' AS dados
+        FROM stg s
+    ) t
+    """,
+    """
+    INSERT INTO pessoas (tipo, razaosocial, fantasia, documento, status)
+    SELECT tipo, razaosocial, fantasia, documento, status FROM stg_tipado WHERE motivo IS NULL
+    ON CONFLICT ((regexp_replace(documento, '[^0-9A-Za-z]', '', 'g')))
+        WHERE regexp_replace(documento, '[^0-9A-Za-z]', '', 'g') <> '' DO NOTHING
+    """,
+]
+
+SQL_MOVIMENTOS = [
+    f"""
+    CREATE TEMP TABLE stg_tipado ON COMMIT DROP AS
+    SELECT t.*,
+           CASE
+               WHEN t.tipo NOT IN ('DESPESA', 'RECEITA') THEN 'tipo inválido (use DESPESA ou RECEITA)'
+               WHEN t.dataemissao IS NULL THEN 'dataemissao inválida'
+               WHEN t.valortotal IS NULL THEN 'valortotal inválido'
+               WHEN abs(t.valortotal) >= 100000000 THEN 'valortotal acima do limite de numeric(10,2)'
+               WHEN t.fornecedor_chave = '' THEN 'fornecedor_documento obrigatório'
+               WHEN t.faturado_chave = '' THEN 'faturado_documento obrigatório'
+               WHEN length(t.numeronotafiscal) > 45 THEN 'numeronotafiscal com mais de 45 caracteres'
+               WHEN t.numeronotafiscal IS NOT NULL AND t.ordem > 1 THEN 'nota fiscal repetida no arquivo'
+           END AS motivo,
+           NULL::int AS novo_id
+    FROM (
+        SELECT s.linha,
+               upper(coalesce(nullif(btrim(s.tipo), ''), 'DESPESA')) AS tipo,
+               nullif(btrim(s.numeronotafiscal), '') AS numeronotafiscal,
+               importacao_data(s.dataemissao) AS dataemissao,
+               left(nullif(btrim(s.descricao), ''), 300) AS descricao,
+               upper(coalesce(nullif(btrim(s.status), ''), 'ATIVO')) AS status,
+               round(importacao_numero(s.valortotal), 2) AS valortotal,
+               btrim(coalesce(s.fornecedor_documento, '')) AS fornecedor_documento,
+               {CHAVE_DOCUMENTO.format('s.fornecedor_documento')} AS fornecedor_chave,
+               left(coalesce(nullif(btrim(s.fornecedor_razaosocial), ''), btrim(s.fornecedor_documento)), 150)
+                   AS fornecedor_razaosocial,
+               btrim(coalesce(s.faturado_documento, '')) AS faturado_documento,
+               {CHAVE_DOCUMENTO.format('s.faturado_documento')} AS faturado_chave,
+               left(coalesce(nullif(btrim(s.faturado_razaosocial), ''), btrim(s.faturado_documento)), 150)
+                   AS faturado_razaosocial,
+               s.classificacoes,
+               row_number() OVER (
+                   PARTITION BY nullif(btrim(s.numeronotafiscal), ''), {CHAVE_DOCUMENTO.format('s.fornecedor_documento')}
+                   ORDER BY s.linha
+               ) AS ordem,
+               to_jsonb(s) - 'linha' AS dados
+        FROM stg s
+    ) t
+    """,
+    # Nota já existente para o mesmo fornecedor (o número sozinho se repete entre fornecedores)
+    f"""
+    UPDATE stg_tipado t SET motivo = 'nota fiscal já existe para este fornecedor'
+    WHERE t.motivo IS NULL AND t.numeronotafiscal IS NOT NULL AND EXISTS (
+        SELECT 1 FROM movimento_contas m
+        JOIN pessoas p ON p."idPessoas" = m."Pessoas_idFornecedorCliente"
+        WHERE m.numeronotafiscal = t.numeronotafiscal
+          AND {CHAVE_DOCUMENTO.format('p.documento')} = t.fornecedor_chave
+    )
+    """,
+    # Fornecedores/clientes novos (um por documento normalizado)
+    """
+    INSERT INTO pessoas (tipo, razaosocial, fantasia, documento, status)
+    SELECT DISTINCT ON (chave) tipo, razaosocial, razaosocial, documento, 'ATIVO'
+    FROM (
+        SELECT fornecedor_chave AS chave, CASE WHEN tipo = 'RECEITA' THEN 'CLIENTE' ELSE 'FORNECEDOR' END AS tipo,
+               fornecedor_razaosocial AS razaosocial, fornecedor_documento AS documento, linha
+        FROM stg_tipado WHERE motivo IS NULL
+        UNION ALL
+        SELECT faturado_chave, 'CLIENTE', faturado_razaosocial, faturado_documento, linha
+        FROM stg_tipado WHERE motivo IS NULL
+    ) p
+    ORDER BY chave, linha
+    ON CONFLICT ((regexp_replace(documento, '[^0-9A-Za-z]', '', 'g')))
+        WHERE regexp_replace(documento, '[^0-9A-Za-z]', '', 'g') <> '' DO NOTHING
+    """,
+    f"""
+    CREATE TEMP TABLE stg_pessoas ON COMMIT DROP AS
+    SELECT {CHAVE_DOCUMENTO.format('p.documento')} AS chave, p."idPessoas"
+    FROM pessoas p
+    WHERE {CHAVE_DOCUMENTO.format('p.documento')} IN (
+        SELECT fornecedor_chave FROM stg_tipado WHERE motivo IS NULL
+        UNION SELECT faturado_chave FROM stg_tipado WHERE motivo IS NULL
+    )
+    """,
+    # Classificações (separadas por ';'), criando as que não existem
+    """
+    CREATE TEMP TABLE stg_classificacoes ON COMMIT DROP AS
+    SELECT DISTINCT t.linha, t.tipo, left(btrim(c), 300) AS descricao
+    FROM stg_tipado t, unnest(string_to_array(t.classificacoes, ';')) AS c
+    WHERE t.motivo IS NULL AND btrim(c) <> ''
+    """,
+    """
+    INSERT INTO classificacao (tipo, descricao, status)
+    SELECT DISTINCT s.tipo, s.descricao, 'ATIVO' FROM stg_classificacoes s
+    WHERE NOT EXISTS (SELECT 1 FROM classificacao c WHERE c.descricao = s.descricao AND c.tipo = s.tipo)
+    """,
+    # Ids reservados antes do INSERT para ligar as classificações sem depender do RETURNING
+    """
+    UPDATE stg_tipado SET novo_id = nextval(pg_get_serial_sequence('movimento_contas', 'idMovimentoContas'))
+    WHERE motivo IS NULL
+    """,
+    """
+    INSERT INTO movimento_contas ("idMovimentoContas", tipo, numeronotafiscal, dataemissao, descricao, status,
+                                  valortotal, "Pessoas_idFornecedorCliente", "Pessoas_idFaturado")
+    SELECT t.novo_id, t.tipo, t.numeronotafiscal, t.dataemissao, t.descricao, t.status, t.valortotal,
+           pf."idPessoas", pt."idPessoas"
+    FROM stg_tipado t
+    JOIN stg_pessoas pf ON pf.chave = t.fornecedor_chave
+    JOIN stg_pessoas pt ON pt.chave = t.faturado_chave
+    WHERE t.motivo IS NULL
+    """,
+    """
+    INSERT INTO "MovimentoContas_has_Classificacao" ("MovimentoContas_idMovimentoContas", "Classificacao_idClassificacao")
+    SELECT DISTINCT t.novo_id, c.id
+    FROM stg_classificacoes s
+    JOIN stg_tipado t ON t.linha = s.linha
+    JOIN (SELECT tipo, descricao, min("idClassificacao") AS id FROM classificacao GROUP BY tipo, descricao) c
+      ON c.descricao = s.descricao AND c.tipo = s.tipo
+    """,
+]
+
+SQL_PARCELAS = [
+    """
+    CREATE TEMP TABLE stg_tipado ON COMMIT DROP AS
+    SELECT t.*,
+           CASE
+               WHEN t.identificacao = '' THEN 'identificacao obrigatória'
+               WHEN length(t.identificacao) > 45 THEN 'identificacao com mais de 45 caracteres'
+               WHEN t.datavencimento IS NULL THEN 'datavencimento inválida'
+               WHEN t.valorparcela IS NULL THEN 'valorparcela inválido'
+               WHEN t.valorpago IS NULL THEN 'valorpago inválido'
+               WHEN t.valorsaldo IS NULL THEN 'valorsaldo inválido'
+               WHEN greatest(abs(t.valorparcela), abs(t.valorpago), abs(t.valorsaldo)) >= 100000000
+                   THEN 'valor acima do limite de numeric(10,2)'
+               WHEN t.ordem > 1 THEN 'identificacao repetida no arquivo'
+               WHEN p.identificacao IS NOT NULL THEN 'parcela já cadastrada'
+           END AS motivo
+    FROM (
+        SELECT s.linha,
+               btrim(coalesce(s.identificacao, '')) AS identificacao,
+               importacao_data(s.datavencimento) AS datavencimento,
+               round(importacao_numero(s.valorparcela), 2) AS valorparcela,
+               round(coalesce(importacao_numero(nullif(btrim(s.valorpago), '')), 0), 2) AS valorpago,
+               round(coalesce(importacao_numero(nullif(btrim(s.valorsaldo), '')),
+                              importacao_numero(s.valorparcela) - coalesce(importacao_numero(nullif(btrim(s.valorpago), '')), 0)),
+                     2) AS valorsaldo,
+               upper(coalesce(nullif(btrim(s.statusparcela), ''), 'PENDENTE')) AS statusparcela,
+               row_number() OVER (PARTITION BY btrim(s.identificacao) ORDER BY s.linha) AS ordem,
+               to_jsonb(s) - 'linha' AS dados
+        FROM stg s
+    ) t
+    -- identificacao não tem índice: uma junção (uma leitura de parcelas_contas) em vez de um
+    -- EXISTS, que o planejador executa como uma varredura da tabela por linha do arquivo
+    LEFT JOIN (SELECT DISTINCT identificacao FROM parcelas_contas) p ON p.identificacao = t.identificacao
+    """,
+    """
+    INSERT INTO parcelas_contas (identificacao, datavencimento, valorparcela, valorpago, valorsaldo, statusparcela)
+    SELECT identificacao, datavencimento, valorparcela, valorpago, valorsaldo, statusparcela
+    FROM stg_tipado WHERE motivo IS NULL
+    """,
+]
+
+SQL_POR_TIPO = {'pessoas': SQL_PESSOAS, 'movimentos': SQL_MOVIMENTOS, 'parcelas': SQL_PARCELAS}
+
+
+class _Linhas:
+    """
+    Linhas físicas do arquivo (a partir da 2ª, depois do cabeçalho) decodificadas para o
+    csv.reader. Uma linha que não decodifica vai para `rejeitadas` e não chega ao leitor;
+    `numeros` e `textos` guardam as linhas do registro que o leitor está montando.
+    """
+
+    def __init__(self, arquivo, encoding, rejeitadas):
+        self.arquivo = arquivo
+        self.codec = ENCODINGS[encoding]
+        self.rejeitadas = rejeitadas
+        self.numeros = []
+        self.textos = []
+
+    def __iter__(self):
+        for numero, bruta in enumerate(self.arquivo, start=2):
+            try:
+                texto = bruta.decode(self.codec)
+            except UnicodeDecodeError as e:
+                self.rejeitadas.append((numero, f'bytes inválidos para {self.codec} na posição {e.start}',
+                                        bruta.decode(self.codec, errors='replace')))
+                continue
+            self.numeros.append(numero)
+            self.textos.append(texto)
+            yield texto
+
+    def registro(self):
+        """(linha em que o registro começou, texto original) e recomeça para o próximo."""
+        numero, texto = self.numeros[0], ''.join(self.textos)
+        self.numeros, self.textos = [], []
+        return numero, texto.rstrip('\r\n')
+
+
+def _registros(arquivo, colunas, delimitador, encoding, rejeitadas):
+    """
+    (linha, campos) dos registros bem formados, na ordem do arquivo. Os demais vão para
+    `rejeitadas` como (linha, motivo, texto). Campos vazios sobrando no fim (delimitador no
+    fim da linha, comum em planilhas exportadas) são ignorados; linhas em branco, puladas.
+    """
+    linhas = _Linhas(arquivo, encoding, rejeitadas)
+    leitor = csv.reader(linhas, delimiter=delimitador, strict=True)
+    while True:
+        try:
+            campos = next(leitor)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            numero, texto = linhas.registro()
+            rejeitadas.append((numero, f'CSV inválido: {e}', texto))
+            continue
+        numero, texto = linhas.registro()
+        while len(campos) > len(colunas) and campos[-1] == '':
+            campos.pop()
+        if not campos or campos == ['']:
+            continue
+        if len(campos) != len(colunas):
+            rejeitadas.append((numero, f'{len(campos)} campos; o cabeçalho tem {len(colunas)}', texto))
+        elif any('\x00' in campo for campo in campos):
+            rejeitadas.append((numero, 'caractere NUL no registro', texto.replace('\x00', '')))
+        else:
+            yield numero, campos
+
+
+def importar_csv(engine, tipo, arquivo, nome_arquivo=None, delimitador=',', encoding='utf8'):
+    """
+    Importa um CSV (arquivo binário aberto) e retorna o resumo da carga.
+
+    O arquivo é lido linha a linha pelo csv do Python e cada registro bem formado segue
+    para o COPY, sem carregar tudo em memória. A carga inteira é uma transação: ou todas as
+    linhas válidas entram, ou nada entra (linhas inválidas nunca abortam a carga; ficam em
+    importacao_erros).
+    """
+    if tipo not in COLUNAS:
+        raise ErroImportacao(f"Tipo inválido. Use: {', '.join(COLUNAS)}")
+    if encoding not in ENCODINGS:
+        raise ErroImportacao(f"Encoding inválido. Use: {', '.join(ENCODINGS)}")
+    if len(delimitador) != 1 or delimitador in '"\r\n':
+        raise ErroImportacao('O delimitador deve ter um único caractere (sem aspas ou quebra de linha)')
+
+    colunas = _ler_cabecalho(arquivo, tipo, delimitador, encoding)
+    inicio = time.perf_counter()
+    rejeitadas = []
+
+    conexao_pool = engine.raw_connection()
+    try:
+        conn = conexao_pool.driver_connection
+        with conn.cursor() as cur:
+            cur.execute(
+                'INSERT INTO importacoes (tipo, arquivo) VALUES (%s, %s) RETURNING id',
+                (tipo, (nome_arquivo or '')[:300])
+            )
+            importacao_id = cur.fetchone()[0]
+
+            cur.execute(sql.SQL('CREATE TEMP TABLE stg (linha BIGINT, {}) ON COMMIT DROP').format(
+                sql.SQL(', ').join(sql.SQL('{} TEXT').format(sql.Identifier(c)) for c in COLUNAS[tipo])
+            ))
+            comando_copy = sql.SQL('COPY stg (linha, {}) FROM STDIN').format(
+                sql.SQL(', ').join(sql.Identifier(c) for c in colunas))
+            with cur.copy(comando_copy) as copy:
+                for numero, campos in _registros(arquivo, colunas, delimitador, encoding, rejeitadas):
+                    copy.write_row((numero, *campos))
+
+            for comando in SQL_POR_TIPO[tipo]:
+                cur.execute(comando)
+
+            cur.execute('SELECT count(*) FILTER (WHERE motivo IS NULL) FROM stg_tipado')
+            importadas = cur.fetchone()[0]
+
+            cur.execute("""
+                INSERT INTO importacao_erros (importacao_id, linha, motivo, dados)
+                SELECT %(imp)s, linha, motivo, dados FROM stg_tipado WHERE motivo IS NOT NULL
+            """, {'imp': importacao_id})
+            erros = cur.rowcount
+            if rejeitadas:
+                cur.executemany("""
+                    INSERT INTO importacao_erros (importacao_id, linha, motivo, dados)
+                    VALUES (%s, %s, %s, jsonb_build_object('texto', %s::text))
+                """, [(importacao_id, numero, motivo[:300], texto) for numero, motivo, texto in rejeitadas])
+                erros += len(rejeitadas)
+
+            cur.execute('SELECT count(*) FROM stg')
+            linhas_lidas = cur.fetchone()[0] + len(rejeitadas)
+            cur.execute("""
+                UPDATE importacoes SET concluida_em = now(), linhas_lidas = %s, importadas = %s, erros = %s
+                WHERE id = %s
+            """, (linhas_lidas, importadas, erros, importacao_id))
+        conn.commit()
+    except Exception:
+        conexao_pool.rollback()
+        raise
+    finally:
+        conexao_pool.close()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'importacao_id': importacao_id,
+        'tipo': tipo,
+        'linhas_lidas': linhas_lidas,
+        'importadas': importadas,
+        'erros': erros,
+        'segundos': round(segundos, 3),
+        'linhas_por_minuto': round(linhas_lidas / segundos * 60) if segundos else None,
+    }
+
+
+def main():
+    load_dotenv()
+    from sqlalchemy import create_engine
+    from database import resolver_database_url
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tipo', choices=sorted(COLUNAS))
+    parser.add_argument('arquivo')
+    parser.add_argument('--delimitador', default=',')
+    parser.add_argument('--encoding', default='utf8', choices=sorted(ENCODINGS))
+    args = parser.parse_args()
+
+    engine = create_engine(resolver_database_url())
+    with open(args.arquivo, 'rb') as f:
+        resumo = importar_csv(engine, args.tipo, f, os.path.basename(args.arquivo), args.delimitador, args.encoding)
+
+    print(f"✅ Importação {resumo['importacao_id']} ({resumo['tipo']}): {resumo['importadas']} importadas, "
+          f"{resumo['erros']} com erro de {resumo['linhas_lidas']} linhas em {resumo['segundos']}s "
+          f"(~{resumo['linhas_por_minuto']} linhas/min)")
+    if resumo['erros']:
+        print(f"   Consulte: SELECT linha, motivo FROM importacao_erros WHERE importacao_id = {resumo['importacao_id']} ORDER BY linha;")
+
+
+if __name__ == '__main__':
+    main()
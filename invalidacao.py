@@ -0,0 +1,251 @@
+"""
+Barramento de invalidação entre workers, sobre LISTEN/NOTIFY do PostgreSQL.
+
+Triggers da migração 009 publicam no canal dados_alterados um evento por comando que
+escreve em movimentos, parcelas, vínculos de classificação, pessoas ou classificações
+({"tabela", "operacao", "ids"}; ids None = a tabela inteira) e, no COMMIT, a nova versão
+dos dados ({"versao": n}, migração 006). Como os triggers cobrem todos os caminhos de
+escrita (upload, importação em massa, admin, reclassificação), nenhum deles publica nada.
+
+Cada worker tem uma thread ouvinte com uma conexão própria, fora dos pools. Ela repassa
+os eventos aos caches registrados (registrar) e guarda a última versão recebida:
+versao() não consulta o banco enquanto o ouvinte está conectado. Ao (re)conectar, o
+ouvinte manda todos os caches se esvaziarem, porque os eventos enviados enquanto estava
+desconectado se perderam, e relê a versão na sequência. O nextval da migração 006 roda
+antes do COMMIT, então o valor lido pode ser de uma transação que ainda não terminou:
+ele só passa a valer quando todas as transações em andamento no momento da leitura
+terminam (ou quando chega a próxima versão notificada, que só é entregue após o COMMIT);
+até lá versao() devolve None.
+
+Caches de dados de referência (sem a versão na chave) usam obter_ou_calcular: sem o
+ouvinte conectado o cache é ignorado, e um valor calculado enquanto chegava um evento das
+suas tabelas não é gravado (a leitura pode ter visto os dados de antes do COMMIT). Caches
+com a versão na chave fazem a mesma conferência com geracao().
+
+INVALIDACAO_OUVINTE=0 desativa o ouvinte: versao() devolve None e os caches que dependem
+da versão ficam desligados. LISTEN não funciona através de um pgbouncer em modo
+transaction: a conexão do ouvinte precisa ser direta (ou em modo session).
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'dados_alterados'
+ATIVO = os.getenv('INVALIDACAO_OUVINTE', '1').lower() in ('1', 'true')
+
+# Evento entregue a todos os registrados quando eventos podem ter sido perdidos
+RESSINCRONIZAR = {'tabela': None, 'operacao': 'ressincronizar', 'ids': None}
+
+_registrados = []
+_geracoes = {}  # tabela -> eventos recebidos (None: ressincronizações; '*': todos)
+_ouvinte = None
+_trava = threading.Lock()
+
+
+def registrar(nome, ao_alterar, tabelas=None):
+    """
+    ao_alterar(evento) é chamada, na thread do ouvinte, a cada evento de uma das `tabelas`
+    (nomes das tabelas do banco; None = todas) e em toda ressincronização (tabela None).
+    """
+    _registrados.append((nome, ao_alterar, frozenset(tabelas) if tabelas else None))
+
+
+def registrar_cache(cache, tabelas=None):
+    """Esvazia `cache` (qualquer objeto com limpar(), ex.: cache.CacheTTL) a cada evento das tabelas."""
+    cache.tabelas_invalidacao = tabelas
+    registrar(cache.nome, lambda evento: cache.limpar(), tabelas)
+
+
+def _geracao(tabelas):
+    return (_geracoes.get(None, 0),) + tuple(_geracoes.get(t, 0) for t in tabelas or ('*',))
+
+
+def geracao(tabelas=None):
+    """
+    Marca dos eventos recebidos das `tabelas` (None = todas). Se ela mudou entre o início e o
+    fim de um cálculo, o resultado pode ter visto dados de antes de um COMMIT e não deve ser
+    gravado em cache.
+    """
+    return _geracao(tabelas)
+
+
+def obter_ou_calcular(cache, chave, calcular):
+    """
+    Valor de `chave` em `cache` (registrado com registrar_cache) ou calcular().
+
+    O valor calculado só é gravado se o ouvinte está conectado e nenhum evento das tabelas
+    do cache chegou durante o cálculo; do contrário o evento poderia ter esvaziado o cache
+    antes da gravação de um valor já desatualizado.
+    """
+    if not conectado():
+        return calcular()
+    valor = cache.obter(chave)
+    if valor is None:
+        geracao = _geracao(cache.tabelas_invalidacao)
+        valor = calcular()
+        if conectado() and _geracao(cache.tabelas_invalidacao) == geracao:
+            cache.gravar(chave, valor)
+    return valor
+
+
+class Ouvinte:
+    """Thread que escuta o canal e aplica os eventos; reconecta com espera exponencial (1 s a 60 s)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.pid = os.getpid()
+        self.conectado = False
+        self.versao = None
+        self._provisoria = None  # (versão lida na conexão, xid tirado depois da leitura) ainda não confirmada
+        self.eventos = self.reconexoes = self.erros_aplicacao = 0
+        self.ultimo_evento_em = None
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='invalidacao', daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join(timeout=10)
+
+    def _conectar(self):
+        # Conexão do engine principal (mesmos connect_args, ex.: search_path), desligada do pool
+        proxy = self.engine.raw_connection()
+        conexao = proxy.driver_connection
+        proxy.detach()
+        conexao.rollback()
+        conexao.autocommit = True
+        return conexao
+
+    def _executar(self):
+        espera = 1
+        while not self._parar.is_set():
+            conexao = None
+            try:
+                conexao = self._conectar()
+                conexao.execute(f'LISTEN {CANAL}')
+                # Depois do LISTEN: nenhuma versão fica entre a lida e a primeira notificação
+                versao = conexao.execute(
+                    'SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM versao_dados_seq').fetchone()[0]
+                # Um xid novo, depois da leitura: quem fez nextval antes dela tem um xid menor
+                xid = conexao.execute('SELECT pg_current_xact_id()::text::bigint').fetchone()[0]
+                self._ressincronizar(versao, xid)
+                espera = 1
+                while not self._parar.is_set():
+                    self._confirmar(conexao)
+                    for notificacao in conexao.notifies(timeout=1 if self._provisoria else 5):
+                        self._aplicar(notificacao.payload)
+            except Exception:
+                if self._parar.is_set():
+                    break
+                logger.warning("Ouvinte de invalidação desconectado; nova tentativa em %ss", espera, exc_info=True)
+            finally:
+                self.conectado = False
+                self.versao = self._provisoria = None
+                if conexao is not None:
+                    try:
+                        conexao.close()
+                    except Exception:
+                        pass
+            self._parar.wait(espera)
+            espera = min(espera * 2, 60)
+            self.reconexoes += 1
+
+    def _ressincronizar(self, versao, xid):
+        self._provisoria = (versao, xid)
+        self._despachar(RESSINCRONIZAR)
+        self.conectado = True
+        logger.info("Ouvinte de invalidação conectado (pid %s, versão %s)", self.pid, versao)
+
+    def _confirmar(self, conexao):
+        """Passa a usar a versão lida na conexão quando as transações em andamento na leitura terminaram."""
+        if self._provisoria is None:
+            return
+        versao, xid = self._provisoria
+        # xmin do snapshot: o menor xid ainda em andamento
+        xmin = conexao.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint').fetchone()[0]
+        if xmin > xid:
+            self.versao = max(versao, self.versao or 0)
+            self._provisoria = None
+
+    def _aplicar(self, payload):
+        mensagem = json.loads(payload)
+        self.eventos += 1
+        self.ultimo_evento_em = time.time()
+        if 'versao' in mensagem:
+            # Só avança: uma versão atrasada (COMMITs concorrentes) não volta o contador.
+            # Entregue depois do COMMIT, vale mesmo com a versão lida na conexão pendente
+            self.versao = max(mensagem['versao'], self.versao or 0)
+        else:
+            self._despachar(mensagem)
+
+    def _despachar(self, evento):
+        with _trava:
+            _geracoes[evento['tabela']] = _geracoes.get(evento['tabela'], 0) + 1
+            _geracoes['*'] = _geracoes.get('*', 0) + 1
+        for nome, ao_alterar, tabelas in list(_registrados):
+            if tabelas is not None and evento['tabela'] is not None and evento['tabela'] not in tabelas:
+                continue
+            try:
+                ao_alterar(evento)
+            except Exception:
+                self.erros_aplicacao += 1
+                logger.exception("Erro ao aplicar evento de invalidação em %s", nome)
+
+    def metricas(self):
+        return {
+            'conectado': self.conectado,
+            'versao': self.versao,
+            'versao_pendente': self._provisoria[0] if self._provisoria else None,
+            'eventos': self.eventos,
+            'reconexoes': self.reconexoes,
+            'erros_aplicacao': self.erros_aplicacao,
+            'segundos_desde_ultimo_evento': round(time.time() - self.ultimo_evento_em, 1)
+            if self.ultimo_evento_em else None,
+        }
+
+
+def iniciar(engine):
+    """
+    Garante um ouvinte rodando neste processo (idempotente e barato; chamado a cada requisição).
+
+    Um ouvinte herdado por fork (ex.: do mestre do gunicorn) não tem thread no filho e é
+    substituído.
+    """
+    global _ouvinte
+    if not ATIVO or (_ouvinte is not None and _ouvinte.pid == os.getpid()):
+        return _ouvinte
+    with _trava:
+        if _ouvinte is None or _ouvinte.pid != os.getpid():
+            _ouvinte = Ouvinte(engine)
+            _ouvinte.iniciar()
+    return _ouvinte
+
+
+def parar():
+    global _ouvinte
+    with _trava:
+        if _ouvinte is not None and _ouvinte.pid == os.getpid():
+            _ouvinte.parar()
+        _ouvinte = None
+
+
+def conectado():
+    """True se este processo recebe os eventos de escrita agora."""
+    return _ouvinte is not None and _ouvinte.pid == os.getpid() and _ouvinte.conectado
+
+
+def versao():
+    """Versão dos dados entregue pelo ouvinte, ou None (desconectado ou versão ainda não confirmada)."""
+    return _ouvinte.versao if conectado() else None
+
+
+def metricas():
+    if _ouvinte is None or _ouvinte.pid != os.getpid():
+        return {'ativo': ATIVO, 'conectado': False}
+    return {'ativo': ATIVO, **_ouvinte.metricas()}
@@ -0,0 +1,458 @@
+"""
+Backend de LLM plugável: Gemini de verdade, simulador local ou gravação/reprodução.
+
+Todos os clientes têm a interface usada pela aplicação de google.genai.Client
+(client.models.generate_content, generate_content_stream e embed_content) e devolvem os
+mesmos tipos (types.GenerateContentResponse, types.EmbedContentResponse) e os mesmos
+erros (errors.ClientError/ServerError). LLM_BACKEND escolhe:
+
+  gemini      (padrão) a API, com GEMINI_API_KEY;
+  simulador   sem rede e sem chave: JSON de extração válido a partir do texto da nota,
+              respostas do RAG e dos relatórios, embeddings lexicais, latência por
+              distribuição, erros 503/429 e streaming (LLM_SIM_*, ver Simulador);
+  gravar      chama a API e grava cada resposta (ou erro) em LLM_GRAVACOES;
+  reproduzir  devolve as respostas gravadas, sem rede e sem chave. A chave é o método,
+              o modelo e o texto do prompt: o banco e a data precisam ser os da gravação.
+              Prompts sem gravação levantam GravacaoAusente ou, com
+              LLM_REPRODUZIR_FALTA=simulador, vão para o simulador.
+
+Com vários prompts iguais gravados, a reprodução os devolve em ordem, em ciclo.
+"""
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.getenv('LLM_BACKEND', 'gemini').lower()
+BACKENDS = ('gemini', 'simulador', 'gravar', 'reproduzir')
+GRAVACOES = os.getenv('LLM_GRAVACOES', 'gravacoes_llm.jsonl')
+
+_contadores = {}
+_trava_contadores = threading.Lock()
+
+
+class GravacaoAusente(LookupError):
+    """Prompt sem resposta gravada no modo reproduzir."""
+
+
+def _contar(nome, quantidade=1):
+    with _trava_contadores:
+        _contadores[nome] = _contadores.get(nome, 0) + quantidade
+
+
+def metricas():
+    with _trava_contadores:
+        return {'backend': BACKEND, **_contadores}
+
+
+def disponivel():
+    """True se há como chamar o LLM: chave configurada ou backend que não usa a API."""
+    return BACKEND in ('simulador', 'reproduzir') or bool(os.getenv('GEMINI_API_KEY'))
+
+
+def cliente():
+    """
+    Cliente do backend de LLM_BACKEND (import de google.genai adiado até aqui: ~0,6 s).
+
+    Simulador e reprodução são um por processo, compartilhados pelos agentes: o limite
+    de chamadas simultâneas e a ordem das gravações valem para o worker inteiro.
+    """
+    if BACKEND not in BACKENDS:
+        raise ValueError(f"LLM_BACKEND inválido: {BACKEND}. Use: {', '.join(BACKENDS)}")
+    if BACKEND in ('simulador', 'reproduzir'):
+        return _cliente_local()
+    from google import genai
+    real = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    return Gravador(real, GRAVACOES) if BACKEND == 'gravar' else real
+
+
+@functools.lru_cache(maxsize=1)
+def _cliente_local():
+    return Simulador() if BACKEND == 'simulador' else Reprodutor(GRAVACOES)
+
+
+def texto_prompt(contents):
+    """Texto das partes de `contents` (str, Part, Content ou listas deles), na ordem."""
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return '\n'.join(texto_prompt(c) for c in contents)
+    if isinstance(contents, dict):
+        return texto_prompt(contents.get('parts') or contents.get('text') or '')
+    partes = getattr(contents, 'parts', None)
+    if partes is not None:
+        return texto_prompt(partes)
+    return getattr(contents, 'text', None) or ''
+
+
+def _erro_api(codigo, status, mensagem):
+    """errors.ClientError/ServerError como os levantados pelo SDK para uma resposta HTTP de erro."""
+    import requests
+    from google.genai import errors
+    resposta = requests.Response()
+    resposta.status_code = codigo
+    resposta.reason = status
+    resposta._content = json.dumps({'error': {'code': codigo, 'message': mensagem, 'status': status}}).encode()
+    return (errors.ClientError if codigo < 500 else errors.ServerError)(codigo, resposta)
+
+
+# -----------------------------
+# Simulador
+# -----------------------------
+
+def distribuicao(especificacao):
+    """
+    Sorteador de latência em ms a partir do texto de configuração:
+    "800" (fixa), "uniforme:200,1500", "normal:800,200" ou "lognormal:800,0.5"
+    (mediana e sigma do logaritmo: cauda longa, como a API).
+    """
+    nome, _, parametros = str(especificacao).strip().partition(':')
+    if not parametros:
+        fixa = float(nome)
+        return lambda aleatorio: fixa
+    a, _, b = parametros.partition(',')
+    a, b = float(a), float(b or 0)
+    if nome == 'uniforme':
+        return lambda aleatorio: aleatorio.uniform(a, b)
+    if nome == 'normal':
+        return lambda aleatorio: max(0.0, aleatorio.gauss(a, b))
+    if nome == 'lognormal':
+        return lambda aleatorio: aleatorio.lognormvariate(math.log(a), b) if a > 0 else 0.0
+    raise ValueError(f'Distribuição de latência inválida: {especificacao}')
+
+
+class Simulador:
+    """
+    Gemini simulado, sem rede.
+
+    - generate_content: prompt de extração de nota (app.processar_nota_fiscal_gemini) ->
+      JSON no formato pedido, com número, CNPJ/CPF, data, valor e descrição tirados do
+      texto do PDF quando presentes e a categoria pelas palavras-chave listadas no próprio
+      prompt; classificação de despesa -> uma das classificações listadas; relatórios que
+      pedem JSON -> JSON de análise; demais (RAG) -> texto citando a pergunta.
+    - embed_content: embeddings lexicais determinísticos (cache.embedding_lexical, 768 dimensões).
+    - generate_content_stream: a mesma resposta em pedaços; o primeiro chega com
+      LLM_SIM_PRIMEIRO_PEDACO (fração da latência) e os demais distribuídos no restante.
+
+    Configuração (variáveis de ambiente ou argumentos):
+      LLM_SIM_LATENCIA_MS        geração (padrão "lognormal:900,0.5"; ver distribuicao)
+      LLM_SIM_LATENCIA_EMBED_MS  embeddings (padrão "lognormal:60,0.3")
+      LLM_SIM_ERRO_503           fração de chamadas com 503 UNAVAILABLE, após a latência
+      LLM_SIM_ERRO_429           fração com 429 RESOURCE_EXHAUSTED, imediato
+      LLM_SIM_MAX_SIMULTANEAS    chamadas em voo neste processo acima das quais vem 429 (0 = sem limite)
+      LLM_SIM_SEMENTE            semente dos sorteios (respostas e falhas reproduzíveis)
+    """
+
+    def __init__(self, latencia_ms=None, latencia_embed_ms=None, erro_503=None, erro_429=None,
+                 max_simultaneas=None, semente=None, primeiro_pedaco=None):
+        def config(valor, variavel, padrao):
+            return valor if valor is not None else os.getenv(variavel, padrao)
+
+        self.models = self
+        self.latencia = distribuicao(config(latencia_ms, 'LLM_SIM_LATENCIA_MS', 'lognormal:900,0.5'))
+        self.latencia_embed = distribuicao(config(latencia_embed_ms, 'LLM_SIM_LATENCIA_EMBED_MS', 'lognormal:60,0.3'))
+        self.erro_503 = float(config(erro_503, 'LLM_SIM_ERRO_503', '0'))
+        self.erro_429 = float(config(erro_429, 'LLM_SIM_ERRO_429', '0'))
+        self.max_simultaneas = int(config(max_simultaneas, 'LLM_SIM_MAX_SIMULTANEAS', '0'))
+        self.primeiro_pedaco = float(config(primeiro_pedaco, 'LLM_SIM_PRIMEIRO_PEDACO', '0.3'))
+        semente = config(semente, 'LLM_SIM_SEMENTE', None)
+        self._aleatorio = random.Random(int(semente) if semente not in (None, '') else None)
+        self._trava = threading.Lock()
+        self._em_voo = 0
+        self._notas = itertools.count(1)
+
+    def _sortear(self, funcao):
+        # random.Random não é seguro entre threads
+        with self._trava:
+            return funcao(self._aleatorio)
+
+    def _entrar(self):
+        """Ocupa uma vaga de chamada em voo (ou levanta 429); retorna True se a chamada deve falhar com 503."""
+        with self._trava:
+            if self.max_simultaneas and self._em_voo >= self.max_simultaneas:
+                _contar('simulador_429_concorrencia')
+                raise _erro_api(429, 'RESOURCE_EXHAUSTED', 'Simulador: limite de chamadas simultâneas')
+            if self.erro_429 and self._aleatorio.random() < self.erro_429:
+                _contar('simulador_429')
+                raise _erro_api(429, 'RESOURCE_EXHAUSTED', 'Simulador: quota excedida')
+            self._em_voo += 1
+            return bool(self.erro_503) and self._aleatorio.random() < self.erro_503
+
+    def _sair(self):
+        with self._trava:
+            self._em_voo -= 1
+
+    def _chamar(self, latencia, responder):
+        falhar = self._entrar()
+        try:
+            time.sleep(self._sortear(latencia) / 1000)
+            if falhar:
+                _contar('simulador_503')
+                raise _erro_api(503, 'UNAVAILABLE', 'Simulador: modelo sobrecarregado')
+            return responder()
+        finally:
+            self._sair()
+
+    def generate_content(self, *, model, contents, config=None):
+        _contar('simulador_geracoes')
+        prompt = texto_prompt(contents)
+        return self._chamar(self.latencia, lambda: self._resposta(prompt, self.responder(prompt)))
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        _contar('simulador_geracoes_stream')
+        prompt = texto_prompt(contents)
+        falhar = self._entrar()
+        try:
+            ms = self._sortear(self.latencia)
+            time.sleep(ms * self.primeiro_pedaco / 1000)
+            if falhar:
+                _contar('simulador_503')
+                raise _erro_api(503, 'UNAVAILABLE', 'Simulador: modelo sobrecarregado')
+            palavras = re.findall(r'\S+\s*', self.responder(prompt))
+            tamanho = max(1, len(palavras) // 8)
+            pedacos = [''.join(palavras[i:i + tamanho]) for i in range(0, len(palavras), tamanho)] or ['']
+            for i, pedaco in enumerate(pedacos):
+                if i:
+                    time.sleep(ms * (1 - self.primeiro_pedaco) / (len(pedacos) - 1) / 1000)
+                # Uso de tokens só no último pedaço, como na API
+                yield self._resposta(prompt if i == len(pedacos) - 1 else '', pedaco)
+        finally:
+            self._sair()
+
+    def embed_content(self, *, model, contents, config=None):
+        from google.genai import types
+        from cache import embedding_lexical
+        _contar('simulador_embeddings')
+        textos = contents if isinstance(contents, list) else [contents]
+        return self._chamar(self.latencia_embed, lambda: types.EmbedContentResponse(embeddings=[
+            types.ContentEmbedding(values=embedding_lexical(texto_prompt(t), dimensoes=768)) for t in textos]))
+
+    def _resposta(self, prompt, texto):
+        from google.genai import types
+        tokens_prompt, tokens_resposta = len(prompt) // 4, len(texto) // 4
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role='model', parts=[types.Part(text=texto)]),
+                                        finish_reason='STOP')],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=tokens_prompt, candidates_token_count=tokens_resposta,
+                total_token_count=tokens_prompt + tokens_resposta),
+        )
+
+    def responder(self, prompt):
+        """Texto da resposta simulada para o prompt (sem latência nem falhas)."""
+        if 'Analise a seguinte nota fiscal' in prompt:
+            return json.dumps(self.nota(prompt), ensure_ascii=False, indent=2)
+        opcoes = re.findall(r'^\s*-\s*([A-ZÀ-Ú][A-ZÀ-Ú ]+)\s*$', prompt, re.MULTILINE)
+        if 'Retorne apenas o nome da classificação' in prompt and opcoes:
+            descricao = re.search(r'Descrição:\s*(.*)', prompt)
+            indice = int(hashlib.md5((descricao.group(1) if descricao else prompt).encode()).hexdigest(), 16)
+            return opcoes[indice % len(opcoes)].strip()
+        if 'JSON' in prompt:
+            return json.dumps({
+                'resumo_executivo': 'Análise simulada do período com base nos dados enviados.',
+                'principais_categorias': ['INSUMOS AGRÍCOLAS', 'MANUTENÇÃO E OPERAÇÃO'],
+                'tendencias': ['Despesas concentradas nos meses de plantio e colheita.'],
+                'recomendacoes': ['Negociar prazos com os maiores fornecedores.'],
+                'alertas': [],
+            }, ensure_ascii=False, indent=2)
+        pergunta = re.search(r'PERGUNTA:\s*(.*)', prompt) or re.search(r'Pergunta[^:]*:\s*(.*)', prompt)
+        valores = re.findall(r'R?\$?\s?\d{1,3}(?:\.\d{3})*,\d{2}|\b\d+\.\d{2}\b', prompt)[:3]
+        return (f"Resposta simulada para: {pergunta.group(1).strip() if pergunta else 'a pergunta'}.\n\n"
+                f"Foram analisados os dados recuperados ({len(prompt.splitlines())} linhas de contexto). "
+                + (f"Valores de destaque: {', '.join(valores)}." if valores else 'Nenhum valor relevante encontrado.'))
+
+    def nota(self, prompt=''):
+        """Nota no formato do prompt de extração; campos presentes no texto do PDF são aproveitados."""
+        n = next(self._notas)
+        # Só o texto do PDF: o restante do prompt tem categorias e um exemplo com CNPJ e número
+        texto, _, categorias = prompt.partition('Categorias de despesas')
+
+        def achar(padrao, padrao_falta):
+            encontrado = re.search(padrao, texto, re.IGNORECASE)
+            return encontrado.group(1).strip() if encontrado else padrao_falta
+
+        produto = achar(r'PRODUTO:\s*(.+?)(?:\s{2,}|$)', 'Óleo diesel S10')
+        valor = achar(r'VALOR\s*(?:TOTAL)?\s*:?\s*R?\$?\s*([\d.]+,\d{2})', None)
+        valor = (float(valor.replace('.', '').replace(',', '.')) if valor
+                 else round(self._sortear(lambda aleatorio: aleatorio.uniform(100, 20000)), 2))
+        emissao = re.search(r'EMISS[AÃ]O\D{0,5}(\d{2})/(\d{2})/(\d{4})', texto, re.IGNORECASE)
+        # Categoria: palavras-chave das linhas "- CATEGORIA: a, b, c" do próprio prompt
+        categoria = 'Outros'
+        for nome, palavras in re.findall(r'^\s*-\s*([^:\n]+):\s*(.+)$', categorias, re.MULTILINE):
+            if any(p.strip().lower() in produto.lower() for p in palavras.split(',') if p.strip()):
+                categoria = nome.strip()
+                break
+        return {
+            'nota_fiscal': {
+                'numero': achar(r'N(?:[ºo°]|F-?e)\.?\s*(?:N[ºo°])?\s*([\d.]{3,})', f'{int(time.time())}{n:05d}'),
+                'serie': achar(r'S[ÉE]RIE\s*:?\s*(\d+)', '1'),
+                'data_emissao': (f'{emissao.group(3)}-{emissao.group(2)}-{emissao.group(1)}'
+                                 if emissao else date.today().isoformat()),
+            },
+            'emitente': {
+                'razao_social': achar(r'EMITENTE:\s*(.+?)(?:\s{2,}|$)', f'FORNECEDOR SIMULADO {n} LTDA'),
+                'cnpj': achar(r'(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})', f'{n % 100:02d}.{n:03d}.000/0001-00'),
+                'endereco': 'Rodovia BR-163, km 10, Sorriso, MT',
+            },
+            'remetente': {
+                'nome_completo': achar(r'DESTINAT[AÁ]RIO:\s*(.+?)(?:\s{2,}|$)', 'FAZENDA SIMULADA'),
+                'cpf_ou_cnpj': achar(r'(\d{3}\.\d{3}\.\d{3}-\d{2})', '000.000.000-00'),
+                'endereco': 'Zona Rural, Sorriso, MT',
+            },
+            'itens': {
+                'descricao_produtos': produto,
+                'quantidade': int(achar(r'QTD\s*:?\s*(\d+)', '1')),
+                'parcelas': int(achar(r'(\d+)\s*PARCELAS?', '1')),
+                'valor_total': valor,
+            },
+            'classificacoes': [categoria] if categoria != 'Outros' else [],
+        }
+
+
+# -----------------------------
+# Gravação e reprodução
+# -----------------------------
+
+def chave_gravacao(metodo, modelo, contents):
+    """Método, modelo e texto do prompt (espaços normalizados) -> sha256."""
+    texto = ' '.join(texto_prompt(contents).split())
+    return hashlib.sha256(json.dumps([metodo, modelo, texto], ensure_ascii=False).encode()).hexdigest()
+
+
+class Gravador:
+    """
+    Cliente real que grava cada chamada em `caminho` (JSON Lines, uma linha por chamada:
+    chave, método, modelo, ms e a resposta serializada ou o erro). Linhas curtas escritas
+    de uma vez em modo append: workers podem gravar no mesmo arquivo.
+    """
+
+    def __init__(self, real, caminho):
+        self.models = self
+        self.real = real
+        self.caminho = caminho
+        self._trava = threading.Lock()
+
+    def _gravar(self, metodo, modelo, contents, inicio, resposta=None, erro=None):
+        registro = {'chave': chave_gravacao(metodo, modelo, contents), 'metodo': metodo, 'modelo': modelo,
+                    'ms': round((time.perf_counter() - inicio) * 1000, 1), 'gravado_em': time.time()}
+        if erro is not None:
+            registro['erro'] = {'code': getattr(erro, 'code', 500), 'status': getattr(erro, 'status', 'UNKNOWN'),
+                                'message': getattr(erro, 'message', str(erro))}
+        else:
+            registro['resposta'] = resposta
+        linha = json.dumps(registro, ensure_ascii=False) + '\n'
+        with self._trava, open(self.caminho, 'a', encoding='utf-8') as f:
+            f.write(linha)
+        _contar('gravadas')
+
+    def _chamar(self, metodo, modelo, contents, funcao, serializar):
+        inicio = time.perf_counter()
+        try:
+            resposta = funcao()
+        except Exception as e:
+            if hasattr(e, 'code'):  # erro da API (429, 503...): também é reproduzido
+                self._gravar(metodo, modelo, contents, inicio, erro=e)
+            raise
+        self._gravar(metodo, modelo, contents, inicio, resposta=serializar(resposta))
+        return resposta
+
+    def generate_content(self, *, model, contents, config=None):
+        return self._chamar('generate_content', model, contents,
+                            lambda: self.real.models.generate_content(model=model, contents=contents, config=config),
+                            lambda r: r.model_dump(mode='json', exclude_none=True))
+
+    def embed_content(self, *, model, contents, config=None):
+        return self._chamar('embed_content', model, contents,
+                            lambda: self.real.models.embed_content(model=model, contents=contents, config=config),
+                            lambda r: r.model_dump(mode='json', exclude_none=True))
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        inicio = time.perf_counter()
+        pedacos = []
+        try:
+            for pedaco in self.real.models.generate_content_stream(model=model, contents=contents, config=config):
+                pedacos.append(pedaco.model_dump(mode='json', exclude_none=True))
+                yield pedaco
+        except Exception as e:
+            if hasattr(e, 'code'):
+                self._gravar('generate_content_stream', model, contents, inicio, erro=e)
+            raise
+        self._gravar('generate_content_stream', model, contents, inicio, resposta=pedacos)
+
+
+class Reprodutor:
+    """
+    Respostas de um arquivo do Gravador, sem rede.
+
+    LLM_REPRODUZIR_LATENCIA=1 dorme o tempo gravado de cada chamada (padrão: responde na
+    hora). LLM_REPRODUZIR_FALTA=simulador responde prompts sem gravação pelo Simulador.
+    """
+
+    def __init__(self, caminho, latencia=None, falta=None):
+        self.models = self
+        self.latencia = (latencia if latencia is not None
+                         else os.getenv('LLM_REPRODUZIR_LATENCIA', '0').lower() in ('1', 'true'))
+        self.falta = falta or os.getenv('LLM_REPRODUZIR_FALTA', 'erro')
+        self._gravacoes = {}
+        self._posicoes = {}
+        self._trava = threading.Lock()
+        self._simulador = Simulador() if self.falta == 'simulador' else None
+        with open(caminho, encoding='utf-8') as f:
+            for linha in f:
+                if linha.strip():
+                    registro = json.loads(linha)
+                    self._gravacoes.setdefault(registro['chave'], []).append(registro)
+        logger.info("LLM: %s prompts gravados carregados de %s", len(self._gravacoes), caminho)
+
+    def _proxima(self, metodo, modelo, contents):
+        chave = chave_gravacao(metodo, modelo, contents)
+        with self._trava:
+            registros = self._gravacoes.get(chave)
+            if not registros:
+                return None
+            posicao = self._posicoes.get(chave, 0)
+            self._posicoes[chave] = posicao + 1
+        return registros[posicao % len(registros)]
+
+    def _reproduzir(self, metodo, model, contents, config, converter):
+        registro = self._proxima(metodo, model, contents)
+        if registro is None:
+            _contar('reproducao_faltas')
+            if self._simulador is not None:
+                return getattr(self._simulador, metodo)(model=model, contents=contents, config=config)
+            raise GravacaoAusente(f'{metodo} {model}: prompt sem gravação ({chave_gravacao(metodo, model, contents)[:12]})')
+        _contar('reproduzidas')
+        if self.latencia:
+            time.sleep(registro['ms'] / 1000)
+        if 'erro' in registro:
+            erro = registro['erro']
+            raise _erro_api(erro['code'], erro['status'], erro['message'])
+        return converter(registro['resposta'])
+
+    def generate_content(self, *, model, contents, config=None):
+        from google.genai import types
+        return self._reproduzir('generate_content', model, contents, config,
+                                types.GenerateContentResponse.model_validate)
+
+    def embed_content(self, *, model, contents, config=None):
+        from google.genai import types
+        return self._reproduzir('embed_content', model, contents, config, types.EmbedContentResponse.model_validate)
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        from google.genai import types
+        yield from self._reproduzir('generate_content_stream', model, contents, config,
+                                    lambda pedacos: [types.GenerateContentResponse.model_validate(p) for p in pedacos])
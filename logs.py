@@ -0,0 +1,272 @@
+"""
+Logging assíncrono: as requisições só enfileiram o registro; uma thread por processo grava.
+
+configurar() troca os handlers da raiz por um QueueHandler. Quem chama logger.info()
+formata a mensagem, anota o contexto da requisição (id, método, rota) e põe o registro
+em uma fila limitada (LOG_FILA_MAX); um QueueListener grava no terminal e no arquivo.
+Com a fila cheia (disco travado), o registro é descartado e contado em
+nf_logs_descartados_total, em vez de segurar a requisição.
+
+Arquivo (LOG_ARQUIVO, padrão app.log; vazio desativa): um objeto JSON por linha
+(LOG_FORMATO=texto para o formato antigo), rotacionado ao passar de LOG_MAX_MB ou na
+virada de cada período de LOG_ROTACAO_HORAS (contado desde a meia-noite UTC), mantendo
+LOG_BACKUPS arquivos (app.log.1 é o mais recente). Os workers do gunicorn gravam no mesmo
+arquivo: a rotação é feita por um só, sob flock, e os outros reabrem o arquivo novo.
+
+Terminal: texto (LOG_FORMATO_TERMINAL=json para coletores de log de contêiner).
+
+instrumentar(app) dá a cada requisição um id (o X-Request-ID recebido, se válido, ou um
+novo), devolvido no cabeçalho X-Request-ID e presente em todo registro feito durante ela,
+e grava no logger `requisicao` uma linha por requisição com status, duração e os tempos
+por estágio de telemetria.py (LOG_REQUISICOES=0 desativa; as rotas de
+LOG_REQUISICOES_IGNORAR ficam de fora).
+"""
+import atexit
+import fcntl
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+import por_processo
+import telemetria
+
+ARQUIVO = os.getenv('LOG_ARQUIVO', 'app.log')
+NIVEL = os.getenv('LOG_NIVEL', 'INFO').upper()
+FORMATO = os.getenv('LOG_FORMATO', 'json').lower()
+FORMATO_TERMINAL = os.getenv('LOG_FORMATO_TERMINAL', 'texto').lower()
+MAX_BYTES = int(float(os.getenv('LOG_MAX_MB', '50')) * 1024 * 1024)
+ROTACAO_S = float(os.getenv('LOG_ROTACAO_HORAS', '24')) * 3600
+BACKUPS = int(os.getenv('LOG_BACKUPS', '7'))
+FILA_MAX = int(os.getenv('LOG_FILA_MAX', '10000'))
+REQUISICOES = os.getenv('LOG_REQUISICOES', '1').lower() in ('1', 'true')
+IGNORAR = {r.strip() for r in os.getenv('LOG_REQUISICOES_IGNORAR', '/healthz,/metrics').split(',') if r.strip()}
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+logger_requisicoes = logging.getLogger('requisicao')
+
+_ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Atributos de todo LogRecord; o que não estiver aqui veio de extra= e vai para o JSON
+_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'excecao'}
+
+_fila_handler = None
+
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por registro: instante, nível, logger, mensagem, contexto da requisição e extras."""
+
+    def format(self, record):
+        dados = {
+            'em': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for nome, valor in vars(record).items():
+            if nome not in _PADRAO and not nome.startswith('_'):
+                dados[nome] = valor
+        excecao = getattr(record, 'excecao', None) or (self.formatException(record.exc_info) if record.exc_info else None)
+        if excecao:
+            dados['excecao'] = excecao
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    """O formato de texto de sempre, com o id da requisição e a exceção já formatada na fila."""
+
+    def format(self, record):
+        texto = super().format(record)
+        if getattr(record, 'id_requisicao', None):
+            texto += f' [{record.id_requisicao}]'
+        if getattr(record, 'excecao', None):
+            texto += '\n' + record.excecao
+        return texto
+
+
+class FiltroContexto(logging.Filter):
+    """Anota o registro com o id, o método e a rota da requisição (roda na thread que registrou)."""
+
+    def filter(self, record):
+        if has_request_context() and 'id_requisicao' in g:
+            record.id_requisicao = g.id_requisicao
+            record.metodo = request.method
+            record.rota = telemetria._rota()
+        return True
+
+
+class FilaHandler(logging.handlers.QueueHandler):
+    """QueueHandler que não bloqueia: fila cheia descarta; a thread de gravação nasce no processo que a usa."""
+
+    def prepare(self, record):
+        # Formata na thread de origem (args podem mudar depois) e guarda a exceção como texto,
+        # para o formatador do outro lado montar o JSON
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.excecao = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def enqueue(self, record):
+        _ouvinte.garantir()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            telemetria.contar('nf_logs_descartados_total', nivel=record.levelname)
+
+
+class ArquivoRotativo(logging.handlers.RotatingFileHandler):
+    """
+    Rotação por tamanho (max_bytes) ou por período (rotacao_s), segura entre processos:
+    quem rotaciona segura o flock de <arquivo>.trava, e os demais percebem pelo inode que o
+    arquivo foi trocado e o reabrem.
+    """
+
+    def __init__(self, arquivo, max_bytes=0, backups=0, rotacao_s=0):
+        super().__init__(arquivo, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        self.rotacao_s = rotacao_s
+        self._periodo = None
+        self._inode = None
+        self._conferido = 0.0
+
+    def _periodo_atual(self):
+        return int(time.time() // self.rotacao_s) if self.rotacao_s else 0
+
+    def _open(self):
+        stream = super()._open()
+        self._inode = os.fstat(stream.fileno()).st_ino
+        if self._periodo is None:
+            # Um arquivo que já existia conta a partir do período da sua última escrita
+            self._periodo = int(os.fstat(stream.fileno()).st_mtime // self.rotacao_s) if self.rotacao_s else 0
+        return stream
+
+    def _trocado(self):
+        """O arquivo do caminho não é mais o que está aberto (outro processo rotacionou)."""
+        try:
+            return os.stat(self.baseFilename).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def _reabrir(self):
+        if self.stream:
+            self.stream.close()
+        self.stream = self._open()
+        self._periodo = self._periodo_atual()
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        agora = time.monotonic()
+        if agora - self._conferido >= 1:  # um stat por segundo, não por registro
+            self._conferido = agora
+            if self._trocado():
+                self._reabrir()
+        if self.rotacao_s and self._periodo_atual() != self._periodo:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        with open(self.baseFilename + '.trava', 'a') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            if self._trocado():
+                self._reabrir()  # outro worker já rotacionou
+                return
+            super().doRollover()
+            self.stream = self._open()
+            self._periodo = self._periodo_atual()
+
+
+def _handlers():
+    terminal = logging.StreamHandler()
+    terminal.setFormatter(FormatadorJSON() if FORMATO_TERMINAL == 'json' else FormatadorTexto(FORMATO_TEXTO))
+    handlers = [terminal]
+    if ARQUIVO:
+        arquivo = ArquivoRotativo(ARQUIVO, MAX_BYTES, BACKUPS, ROTACAO_S)
+        arquivo.setFormatter(FormatadorTexto(FORMATO_TEXTO) if FORMATO == 'texto' else FormatadorJSON())
+        handlers.append(arquivo)
+    return handlers
+
+
+def _iniciar_ouvinte():
+    ouvinte = logging.handlers.QueueListener(_fila_handler.queue, *_fila_handler.destinos, respect_handler_level=True)
+    ouvinte.start()
+    return ouvinte
+
+
+_ouvinte = por_processo.PorProcesso(_iniciar_ouvinte)
+
+
+def parar():
+    """Grava o que ainda está na fila e para a thread deste processo."""
+    ouvinte = _ouvinte.descartar()
+    if ouvinte is not None:
+        try:
+            ouvinte.stop()
+        except queue.Full:
+            pass
+
+
+atexit.register(parar)
+
+
+def configurar():
+    """
+    Liga o logging assíncrono na raiz. Como logging.basicConfig, não faz nada se a raiz já
+    tem handlers de outra origem (um script que configurou o próprio logging antes).
+    """
+    global _fila_handler
+    raiz = logging.getLogger()
+    if raiz.handlers and _fila_handler not in raiz.handlers:
+        return
+    if _fila_handler is not None:
+        parar()
+        raiz.removeHandler(_fila_handler)
+        for handler in _fila_handler.destinos:
+            handler.close()
+    _fila_handler = FilaHandler(queue.Queue(FILA_MAX))
+    _fila_handler.destinos = _handlers()
+    _fila_handler.addFilter(FiltroContexto())
+    raiz.addHandler(_fila_handler)
+    raiz.setLevel(NIVEL)
+
+
+def instrumentar(app):
+    """Id por requisição (X-Request-ID) e a linha de log de cada requisição no logger `requisicao`."""
+
+    @app.before_request
+    def _inicio():
+        recebido = request.headers.get('X-Request-ID', '')
+        g.id_requisicao = recebido if _ID_VALIDO.match(recebido) else uuid.uuid4().hex
+
+    @app.after_request
+    def _fim(resposta):
+        if 'id_requisicao' not in g:
+            return resposta
+        resposta.headers['X-Request-ID'] = g.id_requisicao
+        rota = telemetria._rota()
+        if REQUISICOES and rota not in IGNORAR:
+            tempos = telemetria.tempos_requisicao()
+            logger_requisicoes.info(
+                "%s %s %s %.1f ms", request.method, request.path, resposta.status_code, tempos.get('total_ms', 0),
+                extra={'status': resposta.status_code, 'ms': tempos.pop('total_ms', None), 'estagios': tempos})
+        return resposta
+
+
+def _reiniciar_no_filho():
+    # A fila do mestre pode ter sido copiada com registros e com a trava interna presa
+    if _fila_handler is not None:
+        _fila_handler.queue = queue.Queue(FILA_MAX)
+
+
+os.register_at_fork(after_in_child=_reiniciar_no_filho)
@@ -0,0 +1,186 @@
+"""
+Memória das requisições: pico de alocação por rota (tracemalloc), RSS e locais que mais alocam.
+
+RSS: ao fim de cada requisição, o RSS atual (/proc/self/statm) e o maior RSS do processo
+(getrusage, ru_maxrss) vão para as medidas nf_memoria_rss_bytes e
+nf_memoria_rss_maximo_bytes de /metrics (entre workers, vale o maior). Custa uma leitura
+de /proc por requisição.
+
+tracemalloc (MEMORIA_TRACEMALLOC=1 no início, ou POST /admin/api/memoria/rastrear em um
+worker já rodando): cada requisição mede o pico de memória Python alocada acima do que
+havia no início, em nf_memoria_pico_bytes{rota} e em relatorio(). O pico do tracemalloc é
+do processo, então só é exato para uma requisição que não se sobrepôs a outra no mesmo
+worker; as sobrepostas só são contadas. Picos acima de MEMORIA_ALERTA_MB vão para o log.
+principais_alocacoes() lista os locais com mais memória alocada agora, ou o crescimento
+desde o início do rastreamento. O tracemalloc deixa as alocações ~2x mais lentas: ligue-o
+em um worker para investigar, não em todos.
+"""
+import logging
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+
+from flask import g, request
+
+import telemetria
+
+logger = logging.getLogger(__name__)
+
+QUADROS = int(os.getenv('MEMORIA_TRACEMALLOC_QUADROS', '10'))
+ALERTA_BYTES = float(os.getenv('MEMORIA_ALERTA_MB', '200')) * 1024 * 1024
+
+_trava = threading.Lock()
+_em_voo = 0
+_inicios = 0          # requisições iniciadas (detecta sobreposição)
+_rotas = {}           # rota -> agregado dos picos
+_base = None          # snapshot do início do rastreamento (para a comparação)
+_TAMANHO_PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes():
+    """RSS atual do processo (None fora do Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _TAMANHO_PAGINA
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def rss_maximo_bytes():
+    """Maior RSS do processo desde o início (ru_maxrss: KiB no Linux, bytes no macOS)."""
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo if sys.platform == 'darwin' else maximo * 1024
+
+
+def iniciar_rastreamento(quadros=QUADROS):
+    """Liga o tracemalloc neste processo e guarda o snapshot de base para a comparação."""
+    global _base
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(quadros)
+    _base = tracemalloc.take_snapshot()
+
+
+def parar_rastreamento():
+    global _base
+    tracemalloc.stop()
+    _base = None
+
+
+def _filtrar(snapshot):
+    return snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ])
+
+
+def principais_alocacoes(limite=20, agrupar='lineno', comparar=False):
+    """
+    Locais com mais memória alocada agora (ou, com comparar, que mais cresceram desde
+    iniciar_rastreamento), agrupados por linha ('lineno'), arquivo ('filename') ou pilha
+    ('traceback'). [] sem tracemalloc.
+    """
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = _filtrar(tracemalloc.take_snapshot())
+    if comparar and _base is not None:
+        estatisticas = snapshot.compare_to(_filtrar(_base), agrupar)
+    else:
+        estatisticas = snapshot.statistics(agrupar)
+    principais = []
+    for estatistica in estatisticas[:limite]:
+        item = {
+            'local': f'{estatistica.traceback[0].filename}:{estatistica.traceback[0].lineno}',
+            'tamanho_bytes': estatistica.size,
+            'blocos': estatistica.count,
+        }
+        if hasattr(estatistica, 'size_diff'):
+            item['diferenca_bytes'] = estatistica.size_diff
+            item['diferenca_blocos'] = estatistica.count_diff
+        if agrupar == 'traceback':
+            item['pilha'] = estatistica.traceback.format()
+        principais.append(item)
+    return principais
+
+
+def _agregar(rota, pico):
+    with _trava:
+        item = _rotas.setdefault(rota, {'exatas': 0, 'sobrepostas': 0, 'pico_maximo_bytes': 0, 'pico_total_bytes': 0})
+        if pico is None:
+            item['sobrepostas'] += 1
+            return
+        item['exatas'] += 1
+        item['pico_total_bytes'] += pico
+        item['pico_maximo_bytes'] = max(item['pico_maximo_bytes'], pico)
+
+
+def instrumentar(app):
+    """Liga a medição de memória às requisições do app."""
+    if os.getenv('MEMORIA_TRACEMALLOC', '0').lower() in ('1', 'true'):
+        iniciar_rastreamento()
+
+    @app.before_request
+    def _inicio():
+        global _em_voo, _inicios
+        if not tracemalloc.is_tracing():
+            return
+        with _trava:
+            sozinha = _em_voo == 0
+            _em_voo += 1
+            _inicios += 1
+            if sozinha:
+                tracemalloc.reset_peak()
+            g.memoria_inicio = (tracemalloc.get_traced_memory()[0], _inicios if sozinha else None)
+
+    @app.teardown_request
+    def _fim(erro):
+        global _em_voo
+        inicio = g.pop('memoria_inicio', None)
+        if inicio is not None:
+            base, inicios = inicio
+            with _trava:
+                _em_voo -= 1
+                # Exata se começou sozinha e nenhuma outra começou até aqui
+                exata = inicios == _inicios and tracemalloc.is_tracing()
+                pico = max(0, tracemalloc.get_traced_memory()[1] - base) if exata else None
+            rota = telemetria._rota()
+            _agregar(rota, pico)
+            if pico is not None:
+                telemetria.observar('nf_memoria_pico_bytes', pico, rota=rota)
+                if pico >= ALERTA_BYTES:
+                    logger.warning("Pico de %.1f MB alocados em %s %s", pico / 1024 / 1024, request.method, rota)
+        rss = rss_bytes()
+        if rss is not None:
+            telemetria.medir('nf_memoria_rss_bytes', rss)
+        telemetria.medir('nf_memoria_rss_maximo_bytes', rss_maximo_bytes())
+
+
+def relatorio():
+    """RSS, estado do tracemalloc e os picos por rota deste processo."""
+    rastreando = tracemalloc.is_tracing()
+    atual, pico = tracemalloc.get_traced_memory() if rastreando else (None, None)
+    with _trava:
+        rotas = {
+            rota: {**item, 'pico_medio_bytes': item['pico_total_bytes'] // item['exatas'] if item['exatas'] else None}
+            for rota, item in _rotas.items()
+        }
+    return {
+        'rss_bytes': rss_bytes(),
+        'rss_maximo_bytes': rss_maximo_bytes(),
+        'tracemalloc': {'ativo': rastreando, 'quadros': tracemalloc.get_traceback_limit() if rastreando else None,
+                        'atual_bytes': atual, 'pico_bytes': pico},
+        'rotas': dict(sorted(rotas.items(), key=lambda item: -item[1]['pico_maximo_bytes'])),
+    }
+
+
+def _reiniciar_no_filho():
+    global _trava, _em_voo
+    _trava = threading.Lock()
+    _em_voo = 0
+    _rotas.clear()
+
+
+os.register_at_fork(after_in_child=_reiniciar_no_filho)
@@ -0,0 +1,134 @@
+"""
+Aplicação das migrações SQL em migrations/ (em ordem numérica, uma única vez cada).
+
+Uso:
+    python migracoes.py            # aplica as migrações pendentes
+    python migracoes.py --listar   # mostra aplicadas e pendentes
+"""
+import argparse
+import glob
+import os
+import re
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from database import resolver_database_url
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Migrações com este marcador rodam fora de transação (ex.: CREATE INDEX CONCURRENTLY),
+# um comando por vez
+MARCADOR_SEM_TRANSACAO = '-- migracao: sem-transacao'
+
+# Migrações com este marcador (um por extensão) só rodam quando a extensão está disponível
+# no servidor; sem ela ficam pendentes, sem registro, e são aplicadas quando for instalada
+_REQUER_EXTENSAO = re.compile(r'^-- migracao: requer-extensao (\w+)\s*$', re.MULTILINE)
+
+# Chave do advisory lock que serializa migrações entre processos
+CHAVE_LOCK = 'nf_ai_migracoes'
+
+
+def listar_migracoes():
+    """Retorna [(versao, caminho)] ordenado pelo prefixo numérico do arquivo."""
+    arquivos = sorted(glob.glob(os.path.join(DIRETORIO_MIGRACOES, '[0-9]*.sql')))
+    return [(os.path.splitext(os.path.basename(a))[0], a) for a in arquivos]
+
+
+def _comandos(sql):
+    """Divide um arquivo sem transação em comandos (um por ';' no fim da linha)."""
+    sem_comentarios = re.sub(r'--[^\n]*', '', sql)
+    return [c.strip() for c in re.split(r';\s*(?:\n|$)', sem_comentarios) if c.strip()]
+
+
+def _executar_script(conn, sql):
+    """Executa SQL bruto sem parâmetros (permite vários comandos e '%' literais)."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(sql)
+    finally:
+        cursor.close()
+
+
+def _garantir_tabela_controle(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migracoes ('
+        ' versao VARCHAR(200) PRIMARY KEY,'
+        ' aplicada_em TIMESTAMP NOT NULL DEFAULT now())'
+    ))
+
+
+def migracoes_aplicadas(engine):
+    with engine.begin() as conn:
+        _garantir_tabela_controle(conn)
+        return {r[0] for r in conn.execute(text('SELECT versao FROM schema_migracoes'))}
+
+
+def extensoes_indisponiveis(conn, sql):
+    """Extensões exigidas pela migração (marcador requer-extensao) que o servidor não oferece."""
+    requeridas = _REQUER_EXTENSAO.findall(sql)
+    if not requeridas:
+        return []
+    disponiveis = {r[0] for r in conn.execute(
+        text('SELECT name FROM pg_available_extensions WHERE name = ANY(:nomes)'), {'nomes': requeridas})}
+    return [nome for nome in requeridas if nome not in disponiveis]
+
+
+def aplicar_migracoes(engine, log=print):
+    """
+    Aplica as migrações pendentes e retorna a lista de versões aplicadas.
+
+    Um advisory lock de sessão garante que apenas um processo migra por vez;
+    os demais esperam e, ao obter o lock, encontram tudo já aplicado. Migrações que
+    exigem uma extensão indisponível são puladas sem registro (ficam pendentes).
+    """
+    aplicadas_agora = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn_lock:
+        conn_lock.execute(text('SELECT pg_advisory_lock(hashtext(:k))'), {'k': CHAVE_LOCK})
+        try:
+            ja_aplicadas = migracoes_aplicadas(engine)
+            for versao, caminho in listar_migracoes():
+                if versao in ja_aplicadas:
+                    continue
+                with open(caminho, encoding='utf-8') as f:
+                    sql = f.read()
+
+                faltando = extensoes_indisponiveis(conn_lock, sql)
+                if faltando:
+                    log(f"Migração {versao} adiada: extensão {', '.join(faltando)} indisponível no servidor")
+                    continue
+                log(f"Aplicando migração {versao}...")
+                if MARCADOR_SEM_TRANSACAO in sql:
+                    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                        for comando in _comandos(sql):
+                            _executar_script(conn, comando)
+                        conn.execute(text('INSERT INTO schema_migracoes (versao) VALUES (:v)'), {'v': versao})
+                else:
+                    with engine.begin() as conn:
+                        _executar_script(conn, sql)
+                        conn.execute(text('INSERT INTO schema_migracoes (versao) VALUES (:v)'), {'v': versao})
+                aplicadas_agora.append(versao)
+        finally:
+            conn_lock.execute(text('SELECT pg_advisory_unlock(hashtext(:k))'), {'k': CHAVE_LOCK})
+    return aplicadas_agora
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Aplica as migrações SQL do diretório migrations/')
+    parser.add_argument('--listar', action='store_true', help='apenas lista o estado das migrações')
+    args = parser.parse_args()
+
+    engine = create_engine(resolver_database_url())
+    if args.listar:
+        aplicadas = migracoes_aplicadas(engine)
+        for versao, _ in listar_migracoes():
+            print(f"[{'x' if versao in aplicadas else ' '}] {versao}")
+        return
+
+    aplicadas = aplicar_migracoes(engine)
+    print(f"✅ {len(aplicadas)} migração(ões) aplicada(s)" if aplicadas else "✅ Banco já está atualizado")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+-- migracao: sem-transacao
+-- Índices para os predicados mais frequentes do código.
+-- Criados com CONCURRENTLY para não bloquear escritas em tabelas grandes.
+-- Medições que justificam cada índice: python -m benchmarks.bench_indices
+
+-- verificar_dados_existentes / salvar-dados: busca de nota fiscal pelo número
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_movimento_numeronotafiscal
+    ON movimento_contas (numeronotafiscal);
+
+-- Agent3 (_retrieve_data, _fallback_context) e listagem /movimentos:
+-- status = 'ATIVO' ORDER BY dataemissao DESC, com desempate pelo id (cursor de paginação)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_movimento_ativo_dataemissao
+    ON movimento_contas (dataemissao DESC, "idMovimentoContas" DESC)
+    WHERE status = 'ATIVO';
+
+-- Relacionamentos fornecedor_cliente / faturado (backrefs de Pessoas) e checagem de FK
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_movimento_fornecedor
+    ON movimento_contas ("Pessoas_idFornecedorCliente");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_movimento_faturado
+    ON movimento_contas ("Pessoas_idFaturado");
+
+-- Classificacao.query.filter_by(descricao=..., tipo=...) no salvamento e na reclassificação
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_classificacao_descricao_tipo
+    ON classificacao (descricao, tipo);
+
+-- Classificacao.movimentos (relatório por categorias) e filtros por classificação:
+-- a PK da associação começa pelo movimento, então a busca pela classificação precisa do inverso
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mov_classificacao_classificacao
+    ON "MovimentoContas_has_Classificacao" ("Classificacao_idClassificacao", "MovimentoContas_idMovimentoContas");
@@ -0,0 +1,11 @@
+-- migracao: requer-extensao pg_trgm
+-- Índices trigram para busca de fornecedores/clientes por trecho do nome
+-- (ILIKE '%termo%'), usada nos filtros de pessoas do RAG.
+-- Sem a extensão pg_trgm disponível no servidor, a migração fica pendente (não é
+-- registrada) e é aplicada quando a extensão for instalada.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_pessoas_razaosocial_trgm
+    ON pessoas USING gin (razaosocial gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_pessoas_fantasia_trgm
+    ON pessoas USING gin (fantasia gin_trgm_ops);
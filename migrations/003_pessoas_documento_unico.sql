@@ -0,0 +1,28 @@
+-- Documento normalizado (apenas letras e dígitos) único por pessoa.
+-- É a chave do upsert de emitente/remetente em salvar_dados_banco
+-- (INSERT ... ON CONFLICT); a expressão precisa ser idêntica à usada lá.
+-- Documento vazio (nota sem CPF/CNPJ) fica fora do índice: não é chave de ninguém.
+DO $$
+DECLARE
+    duplicados TEXT;
+BEGIN
+    SELECT string_agg(chave, ', ') INTO duplicados
+    FROM (
+        SELECT regexp_replace(documento, '[^0-9A-Za-z]', '', 'g') AS chave
+        FROM pessoas
+        WHERE regexp_replace(documento, '[^0-9A-Za-z]', '', 'g') <> ''
+        GROUP BY 1
+        HAVING count(*) > 1
+        LIMIT 20
+    ) d;
+
+    IF duplicados IS NOT NULL THEN
+        RAISE EXCEPTION 'Existem pessoas com o mesmo documento normalizado: %', duplicados
+            USING HINT = 'Unifique os cadastros duplicados (movimentos apontando para um único idPessoas) e rode a migração novamente.';
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_pessoas_documento_normalizado
+    ON pessoas ((regexp_replace(documento, '[^0-9A-Za-z]', '', 'g')))
+    WHERE regexp_replace(documento, '[^0-9A-Za-z]', '', 'g') <> '';
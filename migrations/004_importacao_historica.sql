@@ -0,0 +1,57 @@
+-- Suporte à importação histórica em massa (importacao.py):
+-- registro das cargas, linhas rejeitadas e conversões tolerantes de texto.
+
+CREATE TABLE IF NOT EXISTS importacoes (
+    id SERIAL PRIMARY KEY,
+    tipo VARCHAR(45) NOT NULL,
+    arquivo VARCHAR(300),
+    iniciada_em TIMESTAMP NOT NULL DEFAULT now(),
+    concluida_em TIMESTAMP,
+    linhas_lidas INT NOT NULL DEFAULT 0,
+    importadas INT NOT NULL DEFAULT 0,
+    erros INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS importacao_erros (
+    id BIGSERIAL PRIMARY KEY,
+    importacao_id INT NOT NULL REFERENCES importacoes (id) ON DELETE CASCADE,
+    linha BIGINT NOT NULL,
+    motivo VARCHAR(300) NOT NULL,
+    dados JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_importacao_erros_importacao
+    ON importacao_erros (importacao_id, linha);
+
+-- Datas em DD/MM/AAAA ou AAAA-MM-DD; NULL quando inválida (ex.: 31/02/2024)
+CREATE OR REPLACE FUNCTION importacao_data(valor TEXT) RETURNS DATE
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    valor := btrim(valor);
+    IF valor ~ '^\d{1,2}/\d{1,2}/\d{4}$' THEN
+        RETURN to_date(valor, 'DD/MM/YYYY');
+    ELSIF valor ~ '^\d{4}-\d{1,2}-\d{1,2}$' THEN
+        RETURN valor::date;
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;
+END
+$$;
+
+-- Valores em 1234.56, 1234,56 ou 1.234,56 (com ou sem "R$"); NULL quando inválido
+CREATE OR REPLACE FUNCTION importacao_numero(valor TEXT) RETURNS NUMERIC
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    valor := replace(replace(btrim(valor), 'R$', ''), ' ', '');
+    IF valor ~ '^-?\d{1,3}(\.\d{3})*,\d+$' OR valor ~ '^-?\d+,\d+$' THEN
+        valor := replace(replace(valor, '.', ''), ',', '.');
+    END IF;
+    IF valor ~ '^-?\d+(\.\d+)?$' THEN
+        RETURN valor::numeric;
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;
+END
+$$;
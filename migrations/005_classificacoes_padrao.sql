@@ -0,0 +1,22 @@
+-- Classificações padrão (antes inseridas por init_db a cada inicialização da aplicação)
+
+INSERT INTO classificacao (tipo, descricao, status)
+SELECT p.tipo, p.descricao, 'ATIVO'
+FROM (VALUES
+    ('DESPESA', 'INSUMOS AGRÍCOLAS'),
+    ('DESPESA', 'MANUTENÇÃO E OPERAÇÃO'),
+    ('DESPESA', 'RECURSOS HUMANOS'),
+    ('DESPESA', 'SERVIÇOS OPERACIONAIS'),
+    ('DESPESA', 'INFRAESTRUTURA E UTILIDADES'),
+    ('DESPESA', 'ADMINISTRATIVAS'),
+    ('DESPESA', 'SEGUROS E PROTEÇÃO'),
+    ('DESPESA', 'IMPOSTOS E TAXAS'),
+    ('DESPESA', 'INVESTIMENTOS'),
+    ('DESPESA', 'OUTROS'),
+    ('RECEITA', 'VENDAS'),
+    ('RECEITA', 'SERVIÇOS'),
+    ('RECEITA', 'OUTRAS RECEITAS')
+) AS p(tipo, descricao)
+WHERE NOT EXISTS (
+    SELECT 1 FROM classificacao c WHERE c.tipo = p.tipo AND c.descricao = p.descricao
+);
@@ -0,0 +1,52 @@
+-- Versão dos dados consultados pelo RAG (chave do cache de respostas, cache.py).
+--
+-- Toda transação que escreve em movimentos, parcelas, vínculos de classificação,
+-- pessoas ou classificações incrementa versao_dados_seq uma vez, ao final:
+--   1. um trigger por comando (não por linha: uma importação de 1M de linhas custa
+--      o mesmo que um upload) marca a transação em versao_dados_transacoes;
+--   2. um constraint trigger DEFERRED nessa tabela roda na hora do COMMIT, ainda dentro
+--      da transação, e faz o nextval.
+-- O nextval não é transacional: o novo valor fica visível na sequência antes de o COMMIT
+-- terminar (e mesmo se ele falhar). Um leitor que consulta a sequência pode ver a versão
+-- nova com os dados antigos; por isso a aplicação só usa as versões notificadas depois do
+-- COMMIT (migração 009, invalidacao.py). Sequência em vez de linha de tabela: não
+-- serializa escritas concorrentes.
+
+CREATE SEQUENCE IF NOT EXISTS versao_dados_seq;
+
+CREATE UNLOGGED TABLE IF NOT EXISTS versao_dados_transacoes (
+    xid BIGINT PRIMARY KEY
+);
+
+CREATE OR REPLACE FUNCTION versao_dados_marcar() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO versao_dados_transacoes (xid) VALUES (txid_current()) ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION versao_dados_incrementar() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM nextval('versao_dados_seq');
+    DELETE FROM versao_dados_transacoes WHERE xid = NEW.xid;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_versao_dados_commit ON versao_dados_transacoes;
+CREATE CONSTRAINT TRIGGER trg_versao_dados_commit
+    AFTER INSERT ON versao_dados_transacoes
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION versao_dados_incrementar();
+
+DO $$
+DECLARE
+    tabela TEXT;
+BEGIN
+    FOREACH tabela IN ARRAY ARRAY['movimento_contas', 'parcelas_contas', 'MovimentoContas_has_Classificacao',
+                                  'pessoas', 'classificacao'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_versao_dados ON %I', tabela);
+        EXECUTE format('CREATE TRIGGER trg_versao_dados AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION versao_dados_marcar()', tabela);
+    END LOOP;
+END $$;
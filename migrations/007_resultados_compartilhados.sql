@@ -0,0 +1,12 @@
+-- Coalescência entre workers (coalescencia.py): o worker que vence o advisory lock de uma
+-- requisição grava aqui o resultado; os que esperavam pelo lock o leem em vez de recalcular.
+-- UNLOGGED: sem WAL e sem réplica; os resultados valem por segundos e podem se perder num crash.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS resultados_compartilhados (
+    chave CHAR(64) PRIMARY KEY,
+    resultado JSONB NOT NULL,
+    criado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_resultados_compartilhados_criado_em
+    ON resultados_compartilhados (criado_em);
@@ -0,0 +1,251 @@
+-- Documentos do RAG (documentos.py): o texto legível de cada movimento, parcela, pessoa e
+-- classificação, com colunas de metadados para filtrar e ordenar sem juntar tabelas.
+--
+-- Mantidos por triggers por comando (transition tables), em qualquer caminho de escrita
+-- (upload, importação em massa, admin): cada comando reescreve, de uma vez, os documentos
+-- das linhas que tocou. Mudanças no nome de uma pessoa ou classificação reescrevem também
+-- os movimentos que a exibem. O UPDATE só acontece quando o texto ou os metadados mudam
+-- (hash_texto), então regravar a mesma nota não gera escrita.
+--
+-- Os triggers de movimento_contas e parcelas_contas são copiados pela conversão para
+-- tabela particionada (particionamento.py).
+
+CREATE TABLE IF NOT EXISTS rag_documentos (
+    tipo VARCHAR(20) NOT NULL,              -- movimentos | parcelas | pessoas | classificacoes
+    id_origem INT NOT NULL,
+    texto TEXT NOT NULL,
+    hash_texto CHAR(32) NOT NULL,           -- md5(texto)
+    dados JSONB NOT NULL,                   -- campos do registro (colunas de contexto.COLUNAS)
+    data DATE,                              -- emissão (movimentos) ou vencimento (parcelas)
+    valor NUMERIC(10, 2),
+    situacao VARCHAR(45),                   -- status do movimento/pessoa/classificação ou da parcela
+    categoria VARCHAR(45),                  -- tipo do movimento (DESPESA/RECEITA), pessoa ou classificação
+    pessoa_id INT,                          -- fornecedor/cliente do movimento ou a própria pessoa
+    classificacao_ids INT[] NOT NULL DEFAULT '{}',
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (tipo, id_origem)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rag_documentos_data
+    ON rag_documentos (tipo, data DESC, id_origem DESC);
+CREATE INDEX IF NOT EXISTS idx_rag_documentos_valor
+    ON rag_documentos (tipo, valor DESC, id_origem DESC);
+CREATE INDEX IF NOT EXISTS idx_rag_documentos_pessoa
+    ON rag_documentos (tipo, pessoa_id, data DESC, id_origem DESC);
+CREATE INDEX IF NOT EXISTS idx_rag_documentos_classificacoes
+    ON rag_documentos USING gin (classificacao_ids);
+
+-- Grava (ou remove, se a origem não existe mais) os documentos de p_ids
+CREATE OR REPLACE FUNCTION rag_documentos_movimentos(p_ids INT[]) RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO rag_documentos AS d (tipo, id_origem, texto, hash_texto, dados, data, valor, situacao, categoria,
+                                     pessoa_id, classificacao_ids)
+    SELECT 'movimentos', m."idMovimentoContas", t.texto, md5(t.texto), t.dados, m.dataemissao, m.valortotal,
+           m.status, m.tipo, m."Pessoas_idFornecedorCliente", cl.ids
+    FROM (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    JOIN movimento_contas m ON m."idMovimentoContas" = alvo.id
+    LEFT JOIN pessoas f ON f."idPessoas" = m."Pessoas_idFornecedorCliente"
+    LEFT JOIN pessoas fat ON fat."idPessoas" = m."Pessoas_idFaturado"
+    CROSS JOIN LATERAL (
+        SELECT coalesce(array_agg(c."idClassificacao" ORDER BY c."idClassificacao"), '{}') AS ids,
+               coalesce(array_agg(c.descricao ORDER BY c.descricao), '{}') AS nomes
+        FROM "MovimentoContas_has_Classificacao" v
+        JOIN classificacao c ON c."idClassificacao" = v."Classificacao_idClassificacao"
+        WHERE v."MovimentoContas_idMovimentoContas" = m."idMovimentoContas"
+    ) cl
+    CROSS JOIN LATERAL (
+        SELECT format('Movimento %s; NF %s; Emissão %s; Valor %s; Emitente %s; Destinatário %s; '
+                      'Classificações %s; Status %s; Descrição %s',
+                      m.tipo, coalesce(m.numeronotafiscal, '-'), to_char(m.dataemissao, 'DD/MM/YYYY'),
+                      m.valortotal, coalesce(f.razaosocial, '-'), coalesce(fat.razaosocial, '-'),
+                      coalesce(nullif(array_to_string(cl.nomes, ', '), ''), '-'), m.status,
+                      coalesce(nullif(btrim(m.descricao), ''), '-')) AS texto,
+               jsonb_build_object('nf', m.numeronotafiscal, 'emissao', to_char(m.dataemissao, 'DD/MM/YYYY'),
+                                  'valor', m.valortotal, 'emitente', f.razaosocial, 'destinatario', fat.razaosocial,
+                                  'classificacoes', to_jsonb(cl.nomes), 'descricao', btrim(coalesce(m.descricao, '')))
+                   AS dados
+    ) t
+    ON CONFLICT (tipo, id_origem) DO UPDATE SET
+        texto = EXCLUDED.texto, hash_texto = EXCLUDED.hash_texto, dados = EXCLUDED.dados, data = EXCLUDED.data,
+        valor = EXCLUDED.valor, situacao = EXCLUDED.situacao, categoria = EXCLUDED.categoria,
+        pessoa_id = EXCLUDED.pessoa_id, classificacao_ids = EXCLUDED.classificacao_ids, atualizado_em = now()
+    WHERE d.hash_texto <> EXCLUDED.hash_texto OR d.pessoa_id IS DISTINCT FROM EXCLUDED.pessoa_id
+       OR d.classificacao_ids <> EXCLUDED.classificacao_ids;
+
+    DELETE FROM rag_documentos d
+    USING (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    WHERE d.tipo = 'movimentos' AND d.id_origem = alvo.id
+      AND NOT EXISTS (SELECT 1 FROM movimento_contas m WHERE m."idMovimentoContas" = alvo.id);
+$$;
+
+CREATE OR REPLACE FUNCTION rag_documentos_parcelas(p_ids INT[]) RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO rag_documentos AS d (tipo, id_origem, texto, hash_texto, dados, data, valor, situacao)
+    SELECT 'parcelas', p."idParcelasContas", t.texto, md5(t.texto), t.dados, p.datavencimento, p.valorparcela,
+           p.statusparcela
+    FROM (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    JOIN parcelas_contas p ON p."idParcelasContas" = alvo.id
+    CROSS JOIN LATERAL (
+        SELECT format('Parcela %s; Vencimento %s; Valor %s; Pago %s; Saldo %s; Status %s',
+                      p.identificacao, to_char(p.datavencimento, 'DD/MM/YYYY'), p.valorparcela,
+                      coalesce(p.valorpago, 0), coalesce(p.valorsaldo, 0), coalesce(p.statusparcela, '-')) AS texto,
+               jsonb_build_object('parcela', p.identificacao, 'vencimento', to_char(p.datavencimento, 'DD/MM/YYYY'),
+                                  'valor', p.valorparcela, 'pago', coalesce(p.valorpago, 0),
+                                  'saldo', coalesce(p.valorsaldo, 0), 'status', p.statusparcela) AS dados
+    ) t
+    ON CONFLICT (tipo, id_origem) DO UPDATE SET
+        texto = EXCLUDED.texto, hash_texto = EXCLUDED.hash_texto, dados = EXCLUDED.dados, data = EXCLUDED.data,
+        valor = EXCLUDED.valor, situacao = EXCLUDED.situacao, atualizado_em = now()
+    WHERE d.hash_texto <> EXCLUDED.hash_texto;
+
+    DELETE FROM rag_documentos d
+    USING (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    WHERE d.tipo = 'parcelas' AND d.id_origem = alvo.id
+      AND NOT EXISTS (SELECT 1 FROM parcelas_contas p WHERE p."idParcelasContas" = alvo.id);
+$$;
+
+CREATE OR REPLACE FUNCTION rag_documentos_pessoas(p_ids INT[]) RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO rag_documentos AS d (tipo, id_origem, texto, hash_texto, dados, situacao, categoria, pessoa_id)
+    SELECT 'pessoas', p."idPessoas", t.texto, md5(t.texto), t.dados, p.status, p.tipo, p."idPessoas"
+    FROM (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    JOIN pessoas p ON p."idPessoas" = alvo.id
+    CROSS JOIN LATERAL (
+        SELECT format('Pessoa %s; Razão social %s; Fantasia %s; Documento %s; Status %s',
+                      p.tipo, p.razaosocial, coalesce(p.fantasia, '-'), p.documento, coalesce(p.status, '-')) AS texto,
+               jsonb_build_object('razaosocial', p.razaosocial, 'fantasia', p.fantasia,
+                                  'documento', p.documento, 'status', p.status) AS dados
+    ) t
+    ON CONFLICT (tipo, id_origem) DO UPDATE SET
+        texto = EXCLUDED.texto, hash_texto = EXCLUDED.hash_texto, dados = EXCLUDED.dados,
+        situacao = EXCLUDED.situacao, categoria = EXCLUDED.categoria, atualizado_em = now()
+    WHERE d.hash_texto <> EXCLUDED.hash_texto;
+
+    DELETE FROM rag_documentos d
+    USING (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    WHERE d.tipo = 'pessoas' AND d.id_origem = alvo.id
+      AND NOT EXISTS (SELECT 1 FROM pessoas p WHERE p."idPessoas" = alvo.id);
+$$;
+
+CREATE OR REPLACE FUNCTION rag_documentos_classificacoes(p_ids INT[]) RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO rag_documentos AS d (tipo, id_origem, texto, hash_texto, dados, situacao, categoria,
+                                     classificacao_ids)
+    SELECT 'classificacoes', c."idClassificacao", t.texto, md5(t.texto), t.dados, c.status, c.tipo,
+           ARRAY[c."idClassificacao"]
+    FROM (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    JOIN classificacao c ON c."idClassificacao" = alvo.id
+    CROSS JOIN LATERAL (
+        SELECT format('Classificação %s; Descrição %s; Status %s', c.tipo, c.descricao, coalesce(c.status, '-')) AS texto,
+               jsonb_build_object('descricao', c.descricao, 'status', c.status) AS dados
+    ) t
+    ON CONFLICT (tipo, id_origem) DO UPDATE SET
+        texto = EXCLUDED.texto, hash_texto = EXCLUDED.hash_texto, dados = EXCLUDED.dados,
+        situacao = EXCLUDED.situacao, categoria = EXCLUDED.categoria, atualizado_em = now()
+    WHERE d.hash_texto <> EXCLUDED.hash_texto;
+
+    DELETE FROM rag_documentos d
+    USING (SELECT DISTINCT unnest(p_ids) AS id) alvo
+    WHERE d.tipo = 'classificacoes' AND d.id_origem = alvo.id
+      AND NOT EXISTS (SELECT 1 FROM classificacao c WHERE c."idClassificacao" = alvo.id);
+$$;
+
+CREATE OR REPLACE FUNCTION rag_documentos_atualizar(p_tipo TEXT, p_ids INT[]) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF p_ids = '{}' THEN
+        RETURN;
+    ELSIF p_tipo = 'movimentos' THEN
+        PERFORM rag_documentos_movimentos(p_ids);
+    ELSIF p_tipo = 'parcelas' THEN
+        PERFORM rag_documentos_parcelas(p_ids);
+    ELSIF p_tipo = 'pessoas' THEN
+        PERFORM rag_documentos_pessoas(p_ids);
+    ELSIF p_tipo = 'classificacoes' THEN
+        PERFORM rag_documentos_classificacoes(p_ids);
+    END IF;
+END $$;
+
+-- Trigger por comando. Argumentos: tipo do documento, coluna do id na tabela do trigger e,
+-- para pessoas e classificações, a coluna do nome exibido nos movimentos.
+CREATE OR REPLACE FUNCTION rag_documentos_sincronizar() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    coluna_id TEXT := TG_ARGV[1];
+    coluna_nome TEXT := TG_ARGV[2];
+    ids INT[] := '{}';
+    renomeados INT[];
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        ids := ids || ARRAY(SELECT (to_jsonb(n) ->> coluna_id)::int FROM novos n);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        ids := ids || ARRAY(SELECT (to_jsonb(a) ->> coluna_id)::int FROM antigos a);
+    END IF;
+    PERFORM rag_documentos_atualizar(TG_ARGV[0], ids);
+
+    IF TG_OP = 'UPDATE' AND coluna_nome <> '' THEN
+        renomeados := ARRAY(
+            SELECT (n.linha ->> coluna_id)::int
+            FROM (SELECT to_jsonb(n) AS linha FROM novos n) n
+            JOIN (SELECT to_jsonb(a) AS linha FROM antigos a) a ON a.linha ->> coluna_id = n.linha ->> coluna_id
+            WHERE n.linha ->> coluna_nome IS DISTINCT FROM a.linha ->> coluna_nome
+        );
+        IF renomeados <> '{}' AND TG_ARGV[0] = 'pessoas' THEN
+            PERFORM rag_documentos_movimentos(ARRAY(
+                SELECT "idMovimentoContas" FROM movimento_contas WHERE "Pessoas_idFornecedorCliente" = ANY(renomeados)
+                UNION
+                SELECT "idMovimentoContas" FROM movimento_contas WHERE "Pessoas_idFaturado" = ANY(renomeados)
+            ));
+        ELSIF renomeados <> '{}' AND TG_ARGV[0] = 'classificacoes' THEN
+            PERFORM rag_documentos_movimentos(ARRAY(
+                SELECT "MovimentoContas_idMovimentoContas" FROM "MovimentoContas_has_Classificacao"
+                WHERE "Classificacao_idClassificacao" = ANY(renomeados)
+            ));
+        END IF;
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION rag_documentos_truncar() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM rag_documentos WHERE tipo = TG_ARGV[0];
+    RETURN NULL;
+END $$;
+
+DO $$
+DECLARE
+    t RECORD;
+    evento TEXT;
+    referencias CONSTANT JSONB := '{"INSERT": "NEW TABLE AS novos", "DELETE": "OLD TABLE AS antigos",
+                                    "UPDATE": "OLD TABLE AS antigos NEW TABLE AS novos"}';
+BEGIN
+    FOR t IN SELECT * FROM (VALUES
+        ('movimento_contas', 'movimentos', 'idMovimentoContas', ''),
+        ('parcelas_contas', 'parcelas', 'idParcelasContas', ''),
+        ('pessoas', 'pessoas', 'idPessoas', 'razaosocial'),
+        ('classificacao', 'classificacoes', 'idClassificacao', 'descricao'),
+        ('MovimentoContas_has_Classificacao', 'movimentos', 'MovimentoContas_idMovimentoContas', '')
+    ) v (tabela, tipo, coluna_id, coluna_nome) LOOP
+        FOREACH evento IN ARRAY ARRAY['INSERT', 'UPDATE', 'DELETE'] LOOP
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_rag_documentos_' || lower(evento), t.tabela);
+            EXECUTE format('CREATE TRIGGER %I AFTER %s ON %I REFERENCING %s FOR EACH STATEMENT '
+                           'EXECUTE FUNCTION rag_documentos_sincronizar(%L, %L, %L)',
+                           'trg_rag_documentos_' || lower(evento), evento, t.tabela, referencias ->> evento,
+                           t.tipo, t.coluna_id, t.coluna_nome);
+        END LOOP;
+        IF t.tabela <> 'MovimentoContas_has_Classificacao' THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_rag_documentos_truncate ON %I', t.tabela);
+            EXECUTE format('CREATE TRIGGER trg_rag_documentos_truncate AFTER TRUNCATE ON %I '
+                           'FOR EACH STATEMENT EXECUTE FUNCTION rag_documentos_truncar(%L)', t.tabela, t.tipo);
+        END IF;
+    END LOOP;
+END $$;
+
+-- Carga inicial
+SELECT rag_documentos_pessoas(ARRAY(SELECT "idPessoas" FROM pessoas));
+SELECT rag_documentos_classificacoes(ARRAY(SELECT "idClassificacao" FROM classificacao));
+SELECT rag_documentos_movimentos(ARRAY(SELECT "idMovimentoContas" FROM movimento_contas));
+SELECT rag_documentos_parcelas(ARRAY(SELECT "idParcelasContas" FROM parcelas_contas));
+ANALYZE rag_documentos;
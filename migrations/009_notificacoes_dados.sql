@@ -0,0 +1,76 @@
+-- Barramento de invalidação entre workers (invalidacao.py): eventos de escrita via NOTIFY.
+--
+-- Canal dados_alterados, mensagens JSON:
+--   {"tabela": "pessoas", "operacao": "update", "ids": [7, 9]}   a cada comando que escreve
+--       em movimentos, parcelas, vínculos de classificação, pessoas ou classificações;
+--       ids nulo = a tabela inteira (TRUNCATE ou mais de 100 linhas no comando);
+--   {"versao": 42}   no COMMIT, a nova versão dos dados (versao_dados_seq, migração 006).
+--
+-- O PostgreSQL só entrega as notificações depois do COMMIT, na ordem em que foram enviadas:
+-- os eventos de uma transação chegam antes da versão dela, e nada chega de um ROLLBACK.
+-- Mensagens idênticas na mesma transação chegam uma vez só.
+--
+-- Triggers por comando (transition tables), como os da migração 008: uma importação de 1M
+-- de linhas publica um evento de tabela, não 1M de eventos.
+
+CREATE OR REPLACE FUNCTION dados_alterados_notificar() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    coluna_id TEXT := TG_ARGV[0];
+    limite CONSTANT INT := 100;
+    ids INT[];
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        ids := NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF (SELECT count(*) FROM (SELECT 1 FROM antigos LIMIT limite + 1) t) <= limite THEN
+            ids := ARRAY(SELECT DISTINCT (to_jsonb(a) ->> coluna_id)::int FROM antigos a ORDER BY 1);
+        END IF;
+    ELSIF (SELECT count(*) FROM (SELECT 1 FROM novos LIMIT limite + 1) t) <= limite THEN
+        -- INSERT e UPDATE (o id não muda em um UPDATE destas tabelas)
+        ids := ARRAY(SELECT DISTINCT (to_jsonb(n) ->> coluna_id)::int FROM novos n ORDER BY 1);
+    END IF;
+    IF ids = '{}' THEN
+        RETURN NULL;  -- comando que não tocou nenhuma linha
+    END IF;
+    PERFORM pg_notify('dados_alterados', json_build_object(
+        'tabela', TG_TABLE_NAME, 'operacao', lower(TG_OP), 'ids', ids)::text);
+    RETURN NULL;
+END $$;
+
+-- Migração 006 com a versão publicada no mesmo canal, depois dos eventos da transação
+CREATE OR REPLACE FUNCTION versao_dados_incrementar() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('dados_alterados', json_build_object('versao', nextval('versao_dados_seq'))::text);
+    DELETE FROM versao_dados_transacoes WHERE xid = NEW.xid;
+    RETURN NULL;
+END $$;
+
+DO $$
+DECLARE
+    t RECORD;
+    evento TEXT;
+    referencias CONSTANT JSONB := '{"INSERT": "NEW TABLE AS novos", "DELETE": "OLD TABLE AS antigos",
+                                    "UPDATE": "NEW TABLE AS novos"}';
+BEGIN
+    FOR t IN SELECT * FROM (VALUES
+        ('movimento_contas', 'idMovimentoContas'),
+        ('parcelas_contas', 'idParcelasContas'),
+        ('pessoas', 'idPessoas'),
+        ('classificacao', 'idClassificacao'),
+        -- No vínculo, o evento identifica o movimento reclassificado
+        ('MovimentoContas_has_Classificacao', 'MovimentoContas_idMovimentoContas')
+    ) v (tabela, coluna_id) LOOP
+        FOREACH evento IN ARRAY ARRAY['INSERT', 'UPDATE', 'DELETE'] LOOP
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_dados_alterados_' || lower(evento), t.tabela);
+            EXECUTE format('CREATE TRIGGER %I AFTER %s ON %I REFERENCING %s FOR EACH STATEMENT '
+                           'EXECUTE FUNCTION dados_alterados_notificar(%L)',
+                           'trg_dados_alterados_' || lower(evento), evento, t.tabela, referencias ->> evento,
+                           t.coluna_id);
+        END LOOP;
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_dados_alterados_truncate ON %I', t.tabela);
+        EXECUTE format('CREATE TRIGGER trg_dados_alterados_truncate AFTER TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION dados_alterados_notificar(%L)', t.tabela, t.coluna_id);
+    END LOOP;
+END $$;
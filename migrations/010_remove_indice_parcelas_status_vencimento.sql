@@ -0,0 +1,7 @@
+-- idx_parcelas_status_vencimento (antes em 001) não se pagou: no bench_indices, as parcelas
+-- pendentes de um período caíram só de 16,4 para 13,1 ms, com o mesmo plano dos índices de
+-- status e de vencimento que já existiam, e cada escrita em parcelas mantinha mais um índice.
+-- Sem CONCURRENTLY: com o particionamento (particionamento.py) o índice é particionado, e o
+-- PostgreSQL não remove índice particionado concorrentemente. A remoção não lê a tabela e
+-- segura o lock só pelo tempo de apagar os arquivos do índice.
+DROP INDEX IF EXISTS idx_parcelas_status_vencimento;
@@ -0,0 +1,10 @@
+-- migracao: requer-extensao pg_trgm
+-- Bancos em que a 002 foi registrada sem a extensão (versão anterior do executor, que só
+-- emitia um NOTICE) ficaram sem os índices trigram; esta migração os cria quando a
+-- extensão estiver disponível. Nos demais, os IF NOT EXISTS não fazem nada.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_pessoas_razaosocial_trgm
+    ON pessoas USING gin (razaosocial gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_pessoas_fantasia_trgm
+    ON pessoas USING gin (fantasia gin_trgm_ops);
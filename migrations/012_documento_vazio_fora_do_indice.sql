@@ -0,0 +1,8 @@
+-- Bancos em que a 003 criou o índice único sobre todos os documentos: o documento vazio
+-- (nota sem CPF/CNPJ) virava a chave '' e as notas seguintes sem documento eram ligadas
+-- à primeira pessoa cadastrada sem ele. Recria o índice como parcial, igual à 003 atual.
+DROP INDEX IF EXISTS uq_pessoas_documento_normalizado;
+
+CREATE UNIQUE INDEX uq_pessoas_documento_normalizado
+    ON pessoas ((regexp_replace(documento, '[^0-9A-Za-z]', '', 'g')))
+    WHERE regexp_replace(documento, '[^0-9A-Za-z]', '', 'g') <> '';
@@ -0,0 +1,5 @@
+-- Coalescência entre workers sem transação aberta durante o cálculo: o líder reserva a chave
+-- com uma linha de resultado NULL (INSERT curto, em autocommit), calcula sem segurar conexão
+-- e depois grava o resultado na mesma linha. Os outros workers consultam a linha até o
+-- resultado aparecer.
+ALTER TABLE resultados_compartilhados ALTER COLUMN resultado DROP NOT NULL;
@@ -0,0 +1,294 @@
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import db, Pessoas, Classificacao, MovimentoContas
+
+logger = logging.getLogger(__name__)
+
+# Mesma expressão do índice único uq_pessoas_documento_normalizado (migrations/003 e 012):
+# precisa ser idêntica para o ON CONFLICT encontrar o índice, que é parcial (documento vazio fica de fora)
+EXPRESSAO_DOCUMENTO_NORMALIZADO = "regexp_replace(documento, '[^0-9A-Za-z]', '', 'g')"
+
+
+def normalizar_documento(documento):
+    """Remove pontuação do CPF/CNPJ (12.345.678/0001-90 -> 12345678000190)"""
+    return re.sub(r'[^0-9A-Za-z]', '', documento or '')
+
+
+def chave_pessoa(tipo, documento):
+    """
+    Chave de emitente/remetente em SQL_SALVAR_NOTA: o documento normalizado ou, sem documento,
+    o papel (#FORNECEDOR/#CLIENTE), para a pessoa ser criada à parte e não casar com outra.
+    """
+    return normalizar_documento(documento) or f'#{tipo}'
+
+
+def verificar_dados_existentes(dados_extraidos):
+    """Verifica se os dados já existem no banco de dados"""
+    validacoes = {
+        'emitente_existe': False,
+        'remetente_existe': False,
+        'nota_fiscal_existe': False,
+        'classificacoes_existem': [],
+        'classificacoes_novas': [],
+        'detalhes': {},
+        'dados_novos': {
+            'emitente': None,
+            'remetente': None,
+            'nota_fiscal': None,
+            'classificacoes_novas': []
+        }
+    }
+
+    try:
+        # Emitente e remetente em uma única consulta, pelo documento normalizado
+        cnpj_emitente = dados_extraidos.get('emitente', {}).get('cnpj', '')
+        doc_remetente = dados_extraidos.get('remetente', {}).get('cpf_ou_cnpj', '')
+        chaves = {normalizar_documento(d) for d in (cnpj_emitente, doc_remetente)} - {''}
+        pessoas_por_chave = {}
+        if chaves:
+            expressao = db.func.regexp_replace(Pessoas.documento, '[^0-9A-Za-z]', '', 'g')
+            for pessoa in Pessoas.query.filter(expressao.in_(chaves)).all():
+                pessoas_por_chave[normalizar_documento(pessoa.documento)] = pessoa
+
+        for papel, documento in (('emitente', cnpj_emitente), ('remetente', doc_remetente)):
+            existente = pessoas_por_chave.get(normalizar_documento(documento))
+            if existente:
+                validacoes[f'{papel}_existe'] = True
+                validacoes['detalhes'][papel] = {
+                    'id': existente.idPessoas,
+                    'razao_social': existente.razaosocial,
+                    'documento': existente.documento,
+                    'tipo': existente.tipo
+                }
+
+        # Verificar nota fiscal
+        nota_fiscal_data = dados_extraidos.get('nota_fiscal', {})
+        numero_nf = nota_fiscal_data.get('numero', '')
+        if numero_nf:
+            nf_existente = MovimentoContas.query.filter_by(numeronotafiscal=numero_nf).first()
+            if nf_existente:
+                validacoes['nota_fiscal_existe'] = True
+                validacoes['detalhes']['nota_fiscal'] = {
+                    'id': nf_existente.idMovimentoContas,
+                    'numero': nf_existente.numeronotafiscal,
+                    'data_emissao': nf_existente.dataemissao.strftime('%d/%m/%Y') if nf_existente.dataemissao else '',
+                    'valor_total': float(nf_existente.valortotal) if nf_existente.valortotal else 0,
+                    'descricao': nf_existente.descricao
+                }
+
+        # Verificar classificações (todas em uma única consulta)
+        classificacoes = dados_extraidos.get('classificacoes', [])
+        if classificacoes:
+            existentes = {
+                c.descricao: c
+                for c in Classificacao.query.filter(
+                    Classificacao.descricao.in_(classificacoes),
+                    Classificacao.tipo == 'DESPESA'
+                ).all()
+            }
+            for classificacao_nome in classificacoes:
+                classificacao_existente = existentes.get(classificacao_nome)
+                if classificacao_existente:
+                    validacoes['classificacoes_existem'].append({
+                        'id': classificacao_existente.idClassificacao,
+                        'nome': classificacao_existente.descricao,
+                        'descricao': classificacao_existente.descricao
+                    })
+                else:
+                    validacoes['classificacoes_novas'].append(classificacao_nome)
+
+        # Preparar dados novos para exibição
+        if not validacoes['emitente_existe']:
+            validacoes['dados_novos']['emitente'] = dados_extraidos.get('emitente', {})
+
+        if not validacoes['remetente_existe']:
+            validacoes['dados_novos']['remetente'] = dados_extraidos.get('remetente', {})
+
+        if not validacoes['nota_fiscal_existe']:
+            validacoes['dados_novos']['nota_fiscal'] = dados_extraidos.get('nota_fiscal', {})
+
+        if validacoes['classificacoes_novas']:
+            validacoes['dados_novos']['classificacoes_novas'] = validacoes['classificacoes_novas']
+
+        return validacoes
+
+    except Exception as e:
+        logger.exception("Erro ao verificar dados existentes: %s", e)
+        return validacoes
+
+
+SQL_CRIAR_CLASSIFICACOES = text("""
+    INSERT INTO classificacao (tipo, descricao, status)
+    SELECT DISTINCT 'DESPESA', nome, 'ATIVO'
+    FROM unnest(CAST(:nomes AS varchar[])) AS nome
+    WHERE NOT EXISTS (
+        SELECT 1 FROM classificacao c WHERE c.descricao = nome AND c.tipo = 'DESPESA'
+    )
+    RETURNING "idClassificacao", descricao
+""")
+
+
+def criar_classificacoes_novas(classificacoes_novas):
+    """Cria novas classificações de despesa no banco de dados (um único INSERT)"""
+    try:
+        linhas = db.session.execute(SQL_CRIAR_CLASSIFICACOES, {'nomes': list(classificacoes_novas)}).all()
+        db.session.commit()
+        return [{'id': id_cls, 'nome': descricao, 'descricao': descricao} for id_cls, descricao in linhas]
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Erro ao criar classificações: %s", e)
+        return []
+
+
+# Salvamento completo de uma nota fiscal em um único comando:
+# emitente/remetente pelo documento normalizado (só os que não existem são inseridos; sem documento,
+# pessoa nova), movimento, classificações (criando as que faltarem), vínculos e parcelas.
+SQL_SALVAR_NOTA = text(f"""
+    WITH dados_pessoas AS (
+        SELECT * FROM unnest(
+            CAST(:pessoas_tipo AS varchar[]), CAST(:pessoas_razaosocial AS varchar[]),
+            CAST(:pessoas_fantasia AS varchar[]), CAST(:pessoas_documento AS varchar[])
+        ) AS p(tipo, razaosocial, fantasia, documento)
+    ),
+    pessoas_novas AS (
+        -- DO NOTHING: pessoas já existentes não são reescritas (nem disparam gatilhos e NOTIFY)
+        INSERT INTO pessoas (tipo, razaosocial, fantasia, documento, status)
+        SELECT tipo, razaosocial, fantasia, documento, 'ATIVO' FROM dados_pessoas
+        ON CONFLICT (({EXPRESSAO_DOCUMENTO_NORMALIZADO})) WHERE {EXPRESSAO_DOCUMENTO_NORMALIZADO} <> ''
+        DO NOTHING
+        -- Mesma chave de chave_pessoa(): sem documento, o papel (a linha é sempre nova)
+        RETURNING "idPessoas", coalesce(nullif({EXPRESSAO_DOCUMENTO_NORMALIZADO}, ''), '#' || tipo) AS chave
+    ),
+    pessoas_upsert AS (
+        SELECT "idPessoas", chave FROM pessoas_novas
+        UNION ALL
+        -- As existentes, pelo índice único do documento normalizado (o snapshot do comando não vê
+        -- as inseridas acima, então nenhuma chave aparece duas vezes)
+        SELECT "idPessoas", {EXPRESSAO_DOCUMENTO_NORMALIZADO} FROM pessoas
+        WHERE {EXPRESSAO_DOCUMENTO_NORMALIZADO} <> ''
+          AND {EXPRESSAO_DOCUMENTO_NORMALIZADO} = ANY(CAST(:pessoas_chave AS varchar[]))
+    ),
+    movimento AS (
+        INSERT INTO movimento_contas (tipo, numeronotafiscal, dataemissao, descricao, status, valortotal,
+                                      "Pessoas_idFornecedorCliente", "Pessoas_idFaturado")
+        SELECT 'DESPESA', CAST(:numero AS varchar), CAST(:dataemissao AS date), CAST(:descricao AS varchar),
+               'ATIVO', CAST(:valortotal AS numeric), e."idPessoas", r."idPessoas"
+        -- Sem a linha de uma das pessoas (ver salvar_dados_banco) o comando não devolve nada
+        FROM pessoas_upsert e, pessoas_upsert r
+        WHERE e.chave = :chave_emitente AND r.chave = :chave_remetente
+        RETURNING "idMovimentoContas"
+    ),
+    classificacoes_novas AS (
+        INSERT INTO classificacao (tipo, descricao, status)
+        SELECT DISTINCT 'DESPESA', nome, 'ATIVO'
+        FROM unnest(CAST(:classificacoes AS varchar[])) AS nome
+        WHERE NOT EXISTS (SELECT 1 FROM classificacao c WHERE c.descricao = nome AND c.tipo = 'DESPESA')
+        RETURNING "idClassificacao"
+    ),
+    classificacoes_alvo AS (
+        (SELECT DISTINCT ON (descricao) "idClassificacao" FROM classificacao
+         WHERE descricao = ANY(CAST(:classificacoes AS varchar[])) AND tipo = 'DESPESA'
+         ORDER BY descricao, "idClassificacao")
+        UNION
+        SELECT "idClassificacao" FROM classificacoes_novas
+    ),
+    vinculos AS (
+        INSERT INTO "MovimentoContas_has_Classificacao"
+            ("MovimentoContas_idMovimentoContas", "Classificacao_idClassificacao")
+        SELECT m."idMovimentoContas", c."idClassificacao" FROM movimento m CROSS JOIN classificacoes_alvo c
+        ON CONFLICT DO NOTHING
+    ),
+    parcelas AS (
+        INSERT INTO parcelas_contas (identificacao, datavencimento, valorparcela, valorpago, valorsaldo, statusparcela)
+        SELECT CAST(:numero AS varchar) || '-' || n, CAST(:dataemissao AS date),
+               CAST(:valor_parcela AS numeric), 0.00, CAST(:valor_parcela AS numeric), 'PENDENTE'
+        FROM generate_series(1, :num_parcelas) AS n
+    )
+    SELECT m."idMovimentoContas",
+           (SELECT "idPessoas" FROM pessoas_upsert WHERE chave = :chave_emitente),
+           (SELECT "idPessoas" FROM pessoas_upsert WHERE chave = :chave_remetente)
+    FROM movimento m
+""")
+
+
+def parametros_salvamento(dados_extraidos):
+    """Converte o JSON extraído da nota nos parâmetros de SQL_SALVAR_NOTA"""
+    emitente_data = dados_extraidos.get('emitente', {})
+    remetente_data = dados_extraidos.get('remetente', {})
+    nota_fiscal_data = dados_extraidos.get('nota_fiscal', {})
+    itens_data = dados_extraidos.get('itens', {})
+
+    pessoas = [
+        ('FORNECEDOR', emitente_data.get('razao_social', ''), emitente_data.get('nome_fantasia', ''),
+         emitente_data.get('cnpj', '')),
+        ('CLIENTE', remetente_data.get('nome_completo', ''), remetente_data.get('nome_completo', ''),
+         remetente_data.get('cpf_ou_cnpj', '')),
+    ]
+    # Emitente e remetente com o mesmo documento viram uma única linha do upsert
+    # (um INSERT ... ON CONFLICT não pode afetar a mesma linha duas vezes); sem documento,
+    # a chave é o papel e cada um vira uma pessoa nova
+    unicas = {}
+    for pessoa in pessoas:
+        unicas.setdefault(chave_pessoa(pessoa[0], pessoa[3]), pessoa)
+
+    # Converter data de emissão
+    data_emissao_str = nota_fiscal_data.get('data_emissao', '')
+    try:
+        data_emissao = datetime.strptime(data_emissao_str, '%d/%m/%Y').date()
+    except:
+        data_emissao = datetime.now().date()
+
+    num_parcelas = max(int(itens_data.get('parcelas', 1) or 1), 1)
+    valor_parcela = float(itens_data.get('valor_total', 0)) / num_parcelas
+
+    return {
+        'pessoas_tipo': [p[0] for p in unicas.values()],
+        'pessoas_razaosocial': [p[1] for p in unicas.values()],
+        'pessoas_fantasia': [p[2] for p in unicas.values()],
+        'pessoas_documento': [p[3] for p in unicas.values()],
+        'pessoas_chave': list(unicas),
+        'chave_emitente': chave_pessoa(pessoas[0][0], pessoas[0][3]),
+        'chave_remetente': chave_pessoa(pessoas[1][0], pessoas[1][3]),
+        'numero': nota_fiscal_data.get('numero', ''),
+        'dataemissao': data_emissao,
+        'descricao': itens_data.get('descricao_produtos', ''),
+        'valortotal': itens_data.get('valor_total', 0),
+        'classificacoes': list(dados_extraidos.get('classificacoes', []) or []),
+        'num_parcelas': num_parcelas,
+        'valor_parcela': valor_parcela,
+    }
+
+
+def salvar_dados_banco(dados_extraidos):
+    """
+    Salva os dados extraídos no banco de dados.
+
+    Tudo é gravado por um único comando SQL (SQL_SALVAR_NOTA) dentro de uma
+    transação: uma ida ao banco para gravar e outra para o COMMIT.
+    """
+    try:
+        parametros = parametros_salvamento(dados_extraidos)
+        linha = db.session.execute(SQL_SALVAR_NOTA, parametros).first()
+        if linha is None:
+            # Outra transação gravou o mesmo documento novo durante o comando: o DO NOTHING o
+            # pulou e o snapshot do comando não o enxerga; repetido, o comando o encontra
+            db.session.rollback()
+            linha = db.session.execute(SQL_SALVAR_NOTA, parametros).one()
+        movimento_id, emitente_id, remetente_id = linha
+        db.session.commit()
+
+        return {
+            'sucesso': True,
+            'movimento_id': movimento_id,
+            'emitente_id': emitente_id,
+            'remetente_id': remetente_id
+        }
+
+    except Exception as e:
+        db.session.rollback()
+        return {'sucesso': False, 'erro': str(e)}
@@ -0,0 +1,157 @@
+import base64
+import json
+from datetime import date, datetime
+
+from flask import request, jsonify
+from sqlalchemy import tuple_, text
+
+from database import db
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+
+class ParametroInvalido(ValueError):
+    """Parâmetro de listagem inválido (cursor, ordenação ou filtro)."""
+
+
+def _serializar_valor(valor):
+    if isinstance(valor, (date, datetime)):
+        return {'d': valor.isoformat()}
+    return valor
+
+
+def _desserializar_valor(valor):
+    if isinstance(valor, dict) and 'd' in valor:
+        return date.fromisoformat(valor['d'])
+    return valor
+
+
+def codificar_cursor(ordenacao, valor, id_registro):
+    """Gera um cursor opaco (base64 url-safe) com a posição do último registro da página."""
+    bruto = json.dumps([ordenacao, _serializar_valor(valor), id_registro], separators=(',', ':'))
+    return base64.urlsafe_b64encode(bruto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, ordenacao):
+    """Decodifica o cursor e garante que ele pertence à mesma ordenação solicitada."""
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        ordem_cursor, valor, id_registro = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+    except Exception:
+        raise ParametroInvalido('Cursor inválido')
+    if ordem_cursor != ordenacao or not isinstance(id_registro, int):
+        raise ParametroInvalido('Cursor não corresponde à ordenação solicitada')
+    return _desserializar_valor(valor), id_registro
+
+
+def data_param(nome):
+    """Lê um filtro de data da query string (AAAA-MM-DD ou DD/MM/AAAA)."""
+    bruto = request.args.get(nome)
+    if not bruto:
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(bruto, formato).date()
+        except ValueError:
+            continue
+    raise ParametroInvalido(f"Data inválida em '{nome}': use AAAA-MM-DD ou DD/MM/AAAA")
+
+
+def parametros_paginacao(ordenacoes_permitidas, ordenacao_padrao):
+    """
+    Lê limite, cursor, ordenação e pedido de estimativa da query string.
+    A ordenação usa o formato "coluna" (crescente) ou "-coluna" (decrescente)
+    e só aceita colunas indexadas listadas em ordenacoes_permitidas.
+    """
+    ordenacao = request.args.get('ordenar', ordenacao_padrao)
+    if ordenacao.lstrip('-') not in ordenacoes_permitidas:
+        raise ParametroInvalido(
+            f"Ordenação inválida. Use: {', '.join(sorted(ordenacoes_permitidas))}"
+        )
+
+    limite = request.args.get('limite', LIMITE_PADRAO, type=int)
+    limite = max(1, min(limite or LIMITE_PADRAO, LIMITE_MAXIMO))
+
+    return {
+        'ordenacao': ordenacao,
+        'limite': limite,
+        'cursor': request.args.get('cursor') or None,
+        'estimativa': request.args.get('estimativa', '').lower() in ('1', 'true', 'sim'),
+    }
+
+
+def paginar(query, coluna_ordem, coluna_id, params):
+    """
+    Aplica paginação por chave (keyset) em uma query do ORM.
+
+    A ordenação é sempre composta (coluna_ordem, coluna_id) para que o cursor
+    seja estável mesmo com valores repetidos na coluna de ordenação.
+    Retorna (itens, proximo_cursor); proximo_cursor é None na última página.
+    """
+    ordenacao = params['ordenacao']
+    decrescente = ordenacao.startswith('-')
+
+    if params['cursor']:
+        valor, id_registro = decodificar_cursor(params['cursor'], ordenacao)
+        if coluna_ordem is coluna_id:
+            condicao = coluna_id < id_registro if decrescente else coluna_id > id_registro
+        else:
+            chave = tuple_(coluna_ordem, coluna_id)
+            condicao = chave < tuple_(valor, id_registro) if decrescente else chave > tuple_(valor, id_registro)
+        query = query.filter(condicao)
+
+    if coluna_ordem is coluna_id:
+        ordem = [coluna_id.desc() if decrescente else coluna_id.asc()]
+    elif decrescente:
+        ordem = [coluna_ordem.desc(), coluna_id.desc()]
+    else:
+        ordem = [coluna_ordem.asc(), coluna_id.asc()]
+
+    # Busca um registro extra para saber se existe próxima página sem COUNT(*)
+    itens = query.order_by(*ordem).limit(params['limite'] + 1).all()
+
+    proximo_cursor = None
+    if len(itens) > params['limite']:
+        itens = itens[:params['limite']]
+        ultimo = itens[-1]
+        proximo_cursor = codificar_cursor(
+            ordenacao,
+            getattr(ultimo, coluna_ordem.key),
+            getattr(ultimo, coluna_id.key),
+        )
+    return itens, proximo_cursor
+
+
+def estimar_total(query):
+    """
+    Estimativa de total pelo planejador do PostgreSQL (EXPLAIN), sem varrer a tabela.
+    Retorna None se a estimativa não estiver disponível.
+
+    O EXPLAIN roda num savepoint: um erro no banco (statement_timeout, erro do planejador)
+    desfaz só o savepoint, sem deixar abortada a transação usada em seguida pela listagem.
+    """
+    try:
+        sql = query.with_entities(*query.column_descriptions[0]['entity'].__table__.primary_key.columns).statement
+        compilado = sql.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+        with db.session.begin_nested():
+            plano = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {compilado}")).scalar()
+        if isinstance(plano, str):
+            plano = json.loads(plano)
+        return int(plano[0]['Plan']['Plan Rows'])
+    except Exception:
+        return None
+
+
+def responder_pagina(dados, proximo_cursor, total_estimado=None):
+    """
+    Monta a resposta JSON mantendo o corpo como lista (compatível com os clientes atuais)
+    e publica o cursor da próxima página e a estimativa de total em cabeçalhos.
+    """
+    resposta = jsonify(dados)
+    if proximo_cursor:
+        resposta.headers['X-Proximo-Cursor'] = proximo_cursor
+    if total_estimado is not None:
+        resposta.headers['X-Total-Estimado'] = str(total_estimado)
+    resposta.headers['Access-Control-Expose-Headers'] = 'X-Proximo-Cursor, X-Total-Estimado'
+    return resposta
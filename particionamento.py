@@ -0,0 +1,314 @@
+"""
+Particionamento opcional por faixa de datas de movimento_contas (dataemissao)
+e parcelas_contas (datavencimento), mensal ou anual.
+
+A conversão é feita uma vez, em uma única transação (as tabelas ficam bloqueadas
+durante a cópia). Depois disso as partições futuras são criadas automaticamente
+na preparação do banco (preparar_banco) ou pelo comando "manter" (ex.: via cron).
+Linhas fora das partições existentes caem na partição padrão (<tabela>_padrao)
+e são movidas para a partição correta na próxima manutenção.
+
+Uso:
+    python particionamento.py converter --granularidade mes
+    python particionamento.py converter --granularidade ano --tabelas movimento_contas
+    python particionamento.py manter --meses-futuros 3
+    python particionamento.py status
+"""
+import argparse
+import re
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+# tabela -> coluna de partição
+TABELAS = {
+    'movimento_contas': 'dataemissao',
+    'parcelas_contas': 'datavencimento',
+}
+
+GRANULARIDADES = ('mes', 'ano')
+
+MESES_FUTUROS_PADRAO = 3
+
+SQL_FUNCOES = """
+CREATE TABLE IF NOT EXISTS particionamento (
+    tabela VARCHAR(100) PRIMARY KEY,
+    coluna VARCHAR(100) NOT NULL,
+    granularidade VARCHAR(3) NOT NULL CHECK (granularidade IN ('mes', 'ano'))
+);
+
+-- Cria as partições que faltam entre p_de e p_ate (inclusive). Linhas desse
+-- intervalo que estiverem na partição padrão são movidas para a nova partição.
+CREATE OR REPLACE FUNCTION particionamento_garantir(p_tabela TEXT, p_de DATE, p_ate DATE) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    cfg RECORD;
+    unidade TEXT;
+    inicio DATE;
+    fim DATE;
+    nome TEXT;
+    criadas INT := 0;
+BEGIN
+    SELECT * INTO cfg FROM particionamento WHERE tabela = p_tabela;
+    IF NOT FOUND THEN
+        RETURN 0;
+    END IF;
+    unidade := CASE cfg.granularidade WHEN 'mes' THEN 'month' ELSE 'year' END;
+    inicio := date_trunc(unidade, p_de)::date;
+    WHILE inicio <= p_ate LOOP
+        fim := (inicio + ('1 ' || unidade)::interval)::date;
+        nome := p_tabela || '_p' || to_char(inicio, CASE cfg.granularidade WHEN 'mes' THEN 'YYYY_MM' ELSE 'YYYY' END);
+        IF to_regclass(quote_ident(nome)) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nome, p_tabela);
+            EXECUTE format(
+                'WITH movidas AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM movidas',
+                p_tabela || '_padrao', cfg.coluna, inicio, cfg.coluna, fim, nome
+            );
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           p_tabela, nome, inicio, fim);
+            criadas := criadas + 1;
+        END IF;
+        inicio := fim;
+    END LOOP;
+    RETURN criadas;
+END $$;
+
+-- Garante partições de hoje até p_meses_futuros à frente e para os períodos
+-- das linhas que caíram na partição padrão (ex.: importação de anos antigos)
+CREATE OR REPLACE FUNCTION particionamento_manter(p_meses_futuros INT DEFAULT 3) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    cfg RECORD;
+    periodo DATE;
+    criadas INT := 0;
+BEGIN
+    FOR cfg IN SELECT * FROM particionamento LOOP
+        criadas := criadas + particionamento_garantir(
+            cfg.tabela, current_date, (current_date + make_interval(months => p_meses_futuros))::date
+        );
+        FOR periodo IN EXECUTE format(
+            'SELECT DISTINCT date_trunc(%L, %I)::date FROM %I',
+            CASE cfg.granularidade WHEN 'mes' THEN 'month' ELSE 'year' END, cfg.coluna, cfg.tabela || '_padrao'
+        ) LOOP
+            criadas := criadas + particionamento_garantir(cfg.tabela, periodo, periodo);
+        END LOOP;
+    END LOOP;
+    RETURN criadas;
+END $$;
+
+-- A associação com classificações não pode ter FK para movimento_contas particionada
+-- (a chave primária passa a incluir dataemissao); a integridade fica com estes triggers.
+CREATE OR REPLACE FUNCTION movimento_classificacao_verificar() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    orfao INT;
+BEGIN
+    SELECT n."MovimentoContas_idMovimentoContas" INTO orfao
+    FROM novos n
+    WHERE NOT EXISTS (
+        SELECT 1 FROM movimento_contas m WHERE m."idMovimentoContas" = n."MovimentoContas_idMovimentoContas"
+    )
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE foreign_key_violation USING MESSAGE = format('movimento_contas %s não existe', orfao);
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION movimento_contas_excluir_vinculos() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM "MovimentoContas_has_Classificacao" v
+    USING removidos r
+    WHERE v."MovimentoContas_idMovimentoContas" = r."idMovimentoContas";
+    RETURN NULL;
+END $$;
+"""
+
+SQL_TRIGGERS_VINCULOS = """
+CREATE TRIGGER trg_movimento_classificacao_insert
+    AFTER INSERT ON "MovimentoContas_has_Classificacao"
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION movimento_classificacao_verificar();
+CREATE TRIGGER trg_movimento_classificacao_update
+    AFTER UPDATE ON "MovimentoContas_has_Classificacao"
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION movimento_classificacao_verificar();
+CREATE TRIGGER trg_movimento_contas_excluir_vinculos
+    AFTER DELETE ON movimento_contas
+    REFERENCING OLD TABLE AS removidos
+    FOR EACH STATEMENT EXECUTE FUNCTION movimento_contas_excluir_vinculos();
+"""
+
+
+def _executar(conn, sql, params=None):
+    """SQL bruto pelo cursor do driver (permite vários comandos e '%' literais)."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall() if cursor.description else None
+    finally:
+        cursor.close()
+
+
+def tabela_particionada(conn, tabela):
+    return conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {'t': tabela}
+    ).scalar() or False
+
+
+def _converter_tabela(conn, tabela, coluna, granularidade, meses_futuros, log):
+    if tabela_particionada(conn, tabela):
+        log(f"   {tabela} já é particionada")
+        return
+
+    legado = f'{tabela}_legado'
+    conn.execute(text(f'LOCK TABLE {tabela} IN ACCESS EXCLUSIVE MODE'))
+
+    # Definições dos índices atuais (exceto a PK), recriados na tabela particionada
+    indices = [
+        definicao for (definicao,) in conn.execute(text("""
+            SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+            WHERE i.indrelid = to_regclass(:t) AND NOT i.indisprimary
+        """), {'t': tabela})
+    ]
+    # FKs da tabela original (para pessoas), recriadas na particionada
+    fks = [
+        definicao for (definicao,) in conn.execute(text("""
+            SELECT pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = to_regclass(:t) AND contype = 'f'
+        """), {'t': tabela})
+    ]
+    # Triggers próprios da tabela (ex.: versão dos dados, migração 006), recriados na particionada
+    triggers = [
+        definicao for (definicao,) in conn.execute(text("""
+            SELECT pg_get_triggerdef(oid) FROM pg_trigger
+            WHERE tgrelid = to_regclass(:t) AND NOT tgisinternal
+        """), {'t': tabela})
+    ]
+    coluna_id = conn.execute(text("""
+        SELECT a.attname FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = to_regclass(:t) AND i.indisprimary
+    """), {'t': tabela}).scalar()
+    sequencia = conn.execute(text('SELECT pg_get_serial_sequence(:t, :c)'), {'t': tabela, 'c': coluna_id}).scalar()
+
+    conn.execute(text(f'ALTER TABLE {tabela} RENAME TO {legado}'))
+    # A sequência do SERIAL deixa de pertencer à tabela antiga para não ser removida junto com ela
+    conn.execute(text(f'ALTER SEQUENCE {sequencia} OWNED BY NONE'))
+    conn.execute(text(
+        f'CREATE TABLE {tabela} (LIKE {legado} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ({coluna})'
+    ))
+    conn.execute(text(f'CREATE TABLE {tabela}_padrao PARTITION OF {tabela} DEFAULT'))
+    conn.execute(text(
+        'INSERT INTO particionamento (tabela, coluna, granularidade) VALUES (:t, :c, :g) '
+        'ON CONFLICT (tabela) DO UPDATE SET coluna = EXCLUDED.coluna, granularidade = EXCLUDED.granularidade'
+    ), {'t': tabela, 'c': coluna, 'g': granularidade})
+    # Partições criadas antes da cópia: cada linha vai direto para a partição definitiva
+    # (uma por período com dados, mais as futuras)
+    unidade = 'month' if granularidade == 'mes' else 'year'
+    criadas = conn.execute(text(f"""
+        SELECT sum(particionamento_garantir(:t, periodo, periodo)) FROM (
+            SELECT DISTINCT date_trunc('{unidade}', {coluna})::date AS periodo FROM {legado}
+            UNION
+            SELECT generate_series(date_trunc('{unidade}', current_date),
+                                   current_date + make_interval(months => :meses), '1 {unidade}')::date
+        ) p
+    """), {'t': tabela, 'meses': meses_futuros}).scalar() or 0
+
+    conn.execute(text(f'INSERT INTO {tabela} SELECT * FROM {legado}'))
+
+    if tabela == 'movimento_contas':
+        # A FK da associação para movimento_contas é substituída por triggers (SQL_TRIGGERS_VINCULOS)
+        for (nome,) in conn.execute(text("""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = to_regclass('"MovimentoContas_has_Classificacao"')
+              AND contype = 'f' AND confrelid = to_regclass(:legado)
+        """), {'legado': legado}).all():
+            conn.execute(text(f'ALTER TABLE "MovimentoContas_has_Classificacao" DROP CONSTRAINT "{nome}"'))
+    conn.execute(text(f'DROP TABLE {legado}'))
+
+    conn.execute(text(f'ALTER SEQUENCE {sequencia} OWNED BY {tabela}."{coluna_id}"'))
+    # A chave primária de uma tabela particionada precisa conter a coluna de partição
+    conn.execute(text(f'ALTER TABLE {tabela} ADD PRIMARY KEY ("{coluna_id}", {coluna})'))
+    for fk in fks:
+        conn.execute(text(f'ALTER TABLE {tabela} ADD {fk}'))
+    for definicao in indices:
+        # CONCURRENTLY não é suportado em tabela particionada
+        conn.execute(text(re.sub(r'\bCONCURRENTLY\b', '', definicao)))
+    for definicao in triggers:
+        conn.execute(text(definicao))
+    if tabela == 'movimento_contas':
+        _executar(conn, SQL_TRIGGERS_VINCULOS)
+    conn.execute(text(f'ANALYZE {tabela}'))
+    log(f"   {tabela}: {criadas} partições ({granularidade}), {len(indices)} índices recriados")
+
+
+def converter(engine, tabelas=None, granularidade='mes', meses_futuros=MESES_FUTUROS_PADRAO, log=print):
+    """Converte as tabelas para o layout particionado (idempotente, uma transação)."""
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida. Use: {', '.join(GRANULARIDADES)}")
+    with engine.begin() as conn:
+        _executar(conn, SQL_FUNCOES)
+        for tabela in tabelas or TABELAS:
+            _converter_tabela(conn, tabela, TABELAS[tabela], granularidade, meses_futuros, log)
+
+
+def manter_particoes(engine, meses_futuros=MESES_FUTUROS_PADRAO):
+    """
+    Cria as partições futuras (e as de datas que caíram na partição padrão).
+    Não faz nada se o banco não foi convertido. Retorna o número de partições criadas.
+    """
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT to_regclass('particionamento') IS NULL")).scalar():
+            return 0
+        return conn.execute(text('SELECT particionamento_manter(:m)'), {'m': meses_futuros}).scalar()
+
+
+def status(engine):
+    """[(tabela, partição, faixa, linhas estimadas)] das tabelas particionadas."""
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT parent.relname, child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = ANY(:tabelas) AND parent.relkind = 'p'
+              AND parent.relnamespace = child.relnamespace
+              AND pg_table_is_visible(parent.oid)
+            ORDER BY parent.relname, child.relname
+        """), {'tabelas': list(TABELAS)}).all()
+
+
+def main():
+    load_dotenv()
+    from sqlalchemy import create_engine
+    from database import resolver_database_url
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_conv = sub.add_parser('converter', help='converte as tabelas para o layout particionado')
+    p_conv.add_argument('--granularidade', choices=GRANULARIDADES, default='mes')
+    p_conv.add_argument('--tabelas', nargs='+', choices=sorted(TABELAS))
+    p_conv.add_argument('--meses-futuros', type=int, default=MESES_FUTUROS_PADRAO)
+    p_manter = sub.add_parser('manter', help='cria as partições futuras')
+    p_manter.add_argument('--meses-futuros', type=int, default=MESES_FUTUROS_PADRAO)
+    sub.add_parser('status', help='lista as partições')
+    args = parser.parse_args()
+
+    engine = create_engine(resolver_database_url())
+    if args.comando == 'converter':
+        print('Convertendo para o layout particionado...')
+        converter(engine, args.tabelas, args.granularidade, args.meses_futuros)
+        print('✅ Conversão concluída')
+    elif args.comando == 'manter':
+        print(f'✅ {manter_particoes(engine, args.meses_futuros)} partição(ões) criada(s)')
+    else:
+        for tabela, particao, faixa, linhas in status(engine):
+            print(f'{tabela:18} {particao:34} {faixa:60} ~{max(linhas, 0):,} linhas')
+
+
+if __name__ == '__main__':
+    main()
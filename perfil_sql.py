@@ -0,0 +1,249 @@
+"""
+Perfil do SQL de cada requisição: comandos, tempo no banco, formas repetidas (N+1) e consultas lentas.
+
+Cada comando medido por telemetria.py (todas as engines; a mesma medida do estágio db_query,
+recebida por telemetria.ao_medir_comando) entra no perfil da requisição: os comandos, o tempo
+total no banco e quantas vezes cada forma normalizada se repetiu (literais e parâmetros viram
+?, listas de IN viram (?...)). Uma forma repetida pelo menos
+PERFIL_SQL_REPETICOES vezes na mesma requisição é a marca de um N+1 (lazy load em um laço,
+como em to_dict): vai para o log e para o contador nf_sql_repeticoes_total.
+
+Em modo debug (ou com PERFIL_SQL_CABECALHOS=1) a resposta traz:
+  X-SQL-Comandos   comandos executados
+  X-SQL-Tempo-ms   tempo total no banco
+  X-SQL-Repetida   a forma mais repetida, como "50x SELECT ... WHERE pessoas.\"idPessoas\" = ?"
+
+Consultas com PERFIL_SQL_LENTA_MS ou mais entram no log de lentas deste processo, agregadas
+por forma e rota (GET /admin/api/sql) e no logger sql_lento. Uma fração delas
+(PERFIL_SQL_EXPLAIN_AMOSTRA, só SELECT/WITH) recebe um EXPLAIN em uma thread de fundo, em
+outra conexão e com statement_timeout, fora do tempo da requisição. EXPLAIN (ANALYZE, BUFFERS)
+executa o comando de novo, então fica para as leituras puras (so_leitura: sem escrita e sem
+chamadas além de funções conhecidas sem efeito colateral); as demais (pg_advisory_lock,
+nextval, funções do usuário) recebem só o plano estimado.
+"""
+import functools
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, has_request_context, request
+
+import por_processo
+import telemetria
+
+logger = logging.getLogger(__name__)
+logger_lentas = logging.getLogger('sql_lento')
+
+ATIVO = os.getenv('PERFIL_SQL', '1').lower() in ('1', 'true')
+REPETICOES = int(os.getenv('PERFIL_SQL_REPETICOES', '10'))
+LENTA_MS = float(os.getenv('PERFIL_SQL_LENTA_MS', '200'))
+EXPLAIN_AMOSTRA = float(os.getenv('PERFIL_SQL_EXPLAIN_AMOSTRA', '0.1'))
+EXPLAIN_TIMEOUT_MS = int(os.getenv('PERFIL_SQL_EXPLAIN_TIMEOUT_MS', '5000'))
+# Vazio: cabeçalhos só com app.debug
+CABECALHOS = os.getenv('PERFIL_SQL_CABECALHOS', '').lower()
+MAX_LENTAS = 200
+MAX_REPETICOES = 200
+
+_trava = threading.Lock()
+_lentas = OrderedDict()      # (forma, rota) -> agregado, da menos para a mais recente
+_repeticoes = OrderedDict()  # (forma, rota) -> agregado
+_explains = queue.Queue(maxsize=20)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PARAMETRO = re.compile(r'%\(\w+\)s|%s|\$\d+|\b\d+(?:\.\d+)?\b')
+_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ESCRITA = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+UPDATE|FOR\s+SHARE|NEXTVAL|SETVAL)\b', re.IGNORECASE)
+_LEITURA = re.compile(r'^\s*(?:--[^\n]*\n\s*|/\*.*?\*/\s*)*(?:SELECT|WITH)\b', re.IGNORECASE | re.DOTALL)
+_CHAMADA = re.compile(r'\b([A-Za-z_][\w.]*)\s*\(')
+# O que pode vir antes de "(" numa consulta que o EXPLAIN ANALYZE reexecuta: palavras do SQL e
+# funções sem efeito colateral. Qualquer outra chamada (pg_advisory_lock, nextval, funções do
+# usuário) faz o comando receber só o EXPLAIN, que planeja sem executar.
+_PALAVRAS_SQL = frozenset((
+    'select', 'with', 'as', 'from', 'join', 'lateral', 'on', 'using', 'where', 'and', 'or', 'not',
+    'in', 'any', 'all', 'some', 'exists', 'values', 'over', 'filter', 'partition', 'by', 'cast', 'array',
+    'when', 'then', 'else', 'union', 'intersect', 'except', 'having', 'limit', 'offset', 'between',
+))
+_FUNCOES_PURAS = frozenset((
+    'count', 'sum', 'avg', 'min', 'max', 'coalesce', 'nullif', 'greatest', 'least', 'lower', 'upper',
+    'btrim', 'trim', 'length', 'left', 'right', 'substring', 'concat', 'replace', 'regexp_replace',
+    'to_char', 'date_trunc', 'date_part', 'extract', 'make_date', 'make_interval', 'round', 'abs',
+    'array_agg', 'string_agg', 'array_length', 'unnest', 'json_build_object', 'jsonb_build_object',
+    'row_number', 'rank', 'dense_rank', 'lag', 'lead', 'now',
+))
+
+
+def so_leitura(statement):
+    """SELECT/WITH sem escrita e sem chamadas a funções fora de _FUNCOES_PURAS: seguro para EXPLAIN ANALYZE."""
+    sem_literais = _LITERAL.sub("''", statement)
+    if not _LEITURA.match(statement) or _ESCRITA.search(sem_literais):
+        return False
+    nomes = _CHAMADA.findall(sem_literais)
+    return all(nome.lower() in _PALAVRAS_SQL or nome.lower() in _FUNCOES_PURAS for nome in nomes)
+
+
+@functools.lru_cache(maxsize=4096)
+def normalizar(sql):
+    """Forma do comando: espaços colapsados, literais e parâmetros como ?, listas (?, ?, ?) como (?...)."""
+    forma = ' '.join(sql.split())
+    forma = _PARAMETRO.sub('?', _LITERAL.sub('?', forma))
+    return _LISTA.sub('(?...)', forma)
+
+
+@telemetria.ao_medir_comando
+def _comando_medido(conn, statement, parameters, executemany, segundos):
+    if not ATIVO:
+        return
+    forma = normalizar(statement)
+    rota = ''
+    if has_request_context():
+        rota = telemetria._rota()
+        perfil = g.get('perfil_sql')
+        if perfil is None:
+            perfil = g.perfil_sql = {'comandos': 0, 'segundos': 0.0, 'formas': {}}
+        perfil['comandos'] += 1
+        perfil['segundos'] += segundos
+        perfil['formas'][forma] = perfil['formas'].get(forma, 0) + 1
+    if segundos * 1000 >= LENTA_MS:
+        _registrar_lenta(conn.engine, forma, rota, segundos, statement, parameters, executemany)
+
+
+def _agregar(registro, chave, limite, **valores):
+    """Soma `valores` ao agregado de `chave` (o mais recente vai para o fim; o mais antigo sai acima do limite)."""
+    with _trava:
+        item = registro.pop(chave, None) or {'forma': chave[0], 'rota': chave[1], 'ocorrencias': 0}
+        item['ocorrencias'] += 1
+        for nome, valor in valores.items():
+            if nome.startswith('total_'):
+                item[nome] = round(item.get(nome, 0) + valor, 1)
+            elif nome.startswith('max_'):
+                item[nome] = max(item.get(nome, 0), valor)
+            else:
+                item[nome] = valor
+        registro[chave] = item
+        while len(registro) > limite:
+            registro.popitem(last=False)
+        return item
+
+
+def _registrar_lenta(engine, forma, rota, segundos, statement, parameters, executemany):
+    ms = round(segundos * 1000, 1)
+    item = _agregar(_lentas, (forma, rota), MAX_LENTAS, total_ms=ms, max_ms=ms, ultima_em=time.time())
+    telemetria.contar('nf_sql_lentas_total', rota=rota)
+    logger_lentas.warning("Consulta lenta (%.1f ms) em %s: %s", ms, rota or '-', forma[:500])
+    if (not executemany and EXPLAIN_AMOSTRA and 'explain' not in item
+            and _LEITURA.match(statement) and random.random() < EXPLAIN_AMOSTRA):
+        try:
+            _explains.put_nowait((engine, statement, parameters, so_leitura(statement), (forma, rota)))
+        except queue.Full:
+            return
+        _thread_explain.garantir()
+
+
+def explicar(engine, statement, parameters, analisar=True):
+    """
+    Texto do plano do comando, em uma conexão própria e revertido no fim. Com `analisar`,
+    EXPLAIN (ANALYZE, BUFFERS), que executa o comando: só para os que passam em so_leitura().
+    """
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        # SET LOCAL: vale só para esta transação, que é revertida
+        cursor.execute(f'SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}')
+        cursor.execute(('EXPLAIN (ANALYZE, BUFFERS) ' if analisar else 'EXPLAIN ') + statement, parameters)
+        return '\n'.join(linha[0] for linha in cursor.fetchall())
+    finally:
+        conexao.rollback()
+        conexao.close()
+
+
+def _laco_explain():
+    while True:
+        engine, statement, parameters, analisar, chave = _explains.get()
+        try:
+            plano = explicar(engine, statement, parameters, analisar)
+        except Exception as e:
+            plano = f'EXPLAIN falhou: {e}'
+        with _trava:
+            if chave in _lentas:
+                _lentas[chave]['explain'] = plano
+                _lentas[chave]['explain_analyze'] = analisar
+                _lentas[chave]['explain_em'] = time.time()
+        logger_lentas.info("Plano de %s:\n%s", chave[0][:200], plano)
+
+
+_thread_explain = por_processo.thread('perfil_sql_explain', _laco_explain)
+
+
+def perfil_requisicao():
+    """{comandos, tempo_ms, formas: [(forma, vezes)] da mais repetida para a menos} da requisição atual."""
+    perfil = g.get('perfil_sql') or {'comandos': 0, 'segundos': 0.0, 'formas': {}}
+    return {
+        'comandos': perfil['comandos'],
+        'tempo_ms': round(perfil['segundos'] * 1000, 1),
+        'formas': sorted(perfil['formas'].items(), key=lambda item: -item[1]),
+    }
+
+
+def _cabecalho(texto, limite=300):
+    # Cabeçalhos HTTP são latin-1: acentos e quebras de linha saem
+    return texto[:limite].encode('ascii', 'replace').decode().replace('\r', ' ').replace('\n', ' ')
+
+
+def instrumentar(app):
+    """Fecha o perfil de cada requisição: N+1 no log e nas métricas, cabeçalhos X-SQL-* em debug."""
+
+    @app.after_request
+    def _fim(resposta):
+        if not ATIVO or 'perfil_sql' not in g:
+            return resposta
+        perfil = perfil_requisicao()
+        rota = telemetria._rota()
+        telemetria.contar('nf_sql_comandos_total', perfil['comandos'], rota=rota)
+        for forma, vezes in perfil['formas']:
+            if vezes < REPETICOES:
+                break
+            telemetria.contar('nf_sql_repeticoes_total', rota=rota)
+            _agregar(_repeticoes, (forma, rota), MAX_REPETICOES, max_vezes=vezes, ultima_em=time.time())
+            logger.warning("N+1 provável em %s %s: %sx %s", request.method, rota, vezes, forma[:300])
+        if CABECALHOS in ('1', 'true') or (CABECALHOS == '' and current_app.debug):
+            resposta.headers['X-SQL-Comandos'] = str(perfil['comandos'])
+            resposta.headers['X-SQL-Tempo-ms'] = str(perfil['tempo_ms'])
+            if perfil['formas']:
+                forma, vezes = perfil['formas'][0]
+                resposta.headers['X-SQL-Repetida'] = _cabecalho(f'{vezes}x {forma}')
+        return resposta
+
+
+def _reiniciar_no_filho():
+    global _trava
+    _trava = threading.Lock()
+    _lentas.clear()
+    _repeticoes.clear()
+
+
+os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+def relatorio():
+    """Consultas lentas e formas repetidas deste processo, das que mais custaram para as que menos."""
+    with _trava:
+        lentas = [dict(item) for item in _lentas.values()]
+        repeticoes = [dict(item) for item in _repeticoes.values()]
+    return {
+        'ativo': ATIVO,
+        'lenta_ms': LENTA_MS,
+        'repeticoes_limiar': REPETICOES,
+        'lentas': sorted(lentas, key=lambda item: -item['total_ms']),
+        'repeticoes': sorted(repeticoes, key=lambda item: -item['ocorrencias'] * item['max_vezes']),
+    }
+
+
+def limpar():
+    with _trava:
+        _lentas.clear()
+        _repeticoes.clear()
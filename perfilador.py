@@ -0,0 +1,249 @@
+"""
+Perfilador por amostragem de requisições, sob demanda, com saída no formato do speedscope.
+
+Uma requisição é perfilada quando:
+  - traz o cabeçalho X-Perfilar com o valor de PERFILADOR_TOKEN (sem token configurado,
+    qualquer valor, mas só em modo debug); ou
+  - é sorteada com a probabilidade PERFILADOR_AMOSTRA (padrão 0).
+
+Durante a requisição, uma thread do processo lê a pilha da thread que a atende a cada
+PERFILADOR_INTERVALO_MS (sys._current_frames). No fim, se a requisição levou pelo menos
+PERFILADOR_MIN_MS, a mesma thread grava as amostras em
+<PERFILADOR_DIRETORIO>/<instante>-<método>-<rota>-<pid>.speedscope.json (abre em
+https://www.speedscope.app, como flamegraph "Left Heavy" ou linha do tempo) e uma linha em
+indice.jsonl. A resposta perfilada traz X-Perfil com o nome do arquivo (gravado se passou do mínimo). Só os
+PERFILADOR_MAX_ARQUIVOS mais recentes ficam no diretório.
+
+Sem requisição perfilada, o custo é o do sorteio e da leitura do cabeçalho em before_request;
+a thread de amostragem fica parada.
+"""
+import fcntl
+import glob
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, request
+
+import por_processo
+import telemetria
+
+TOKEN = os.getenv('PERFILADOR_TOKEN', '')
+AMOSTRA = float(os.getenv('PERFILADOR_AMOSTRA', '0'))
+INTERVALO_S = float(os.getenv('PERFILADOR_INTERVALO_MS', '5')) / 1000
+MIN_MS = float(os.getenv('PERFILADOR_MIN_MS', '0'))
+DIRETORIO = os.getenv('PERFILADOR_DIRETORIO') or os.path.join(tempfile.gettempdir(), 'nf_ai_perfis')
+MAX_ARQUIVOS = int(os.getenv('PERFILADOR_MAX_ARQUIVOS', '200'))
+SUFIXO = '.speedscope.json'
+INDICE = 'indice.jsonl'
+
+_condicao = threading.Condition()
+_ativas = {}       # id da thread -> Captura
+_terminadas = []   # capturas a gravar
+
+
+class Captura:
+    """Amostras de pilha de uma requisição, com os quadros (função, arquivo, linha) indexados."""
+
+    def __init__(self, thread_id, metodo, rota, caminho, motivo):
+        self.thread_id = thread_id
+        self.metodo = metodo
+        self.rota = rota
+        self.caminho = caminho
+        self.motivo = motivo
+        self.inicio_em = time.time()
+        self.inicio = self.ultima = time.perf_counter()
+        self.quadros = {}
+        self.amostras = []
+        self.pesos = []
+        self.status = None
+        self.ms = None
+
+    def registrar(self, frame, agora):
+        pilha = []
+        while frame is not None:
+            codigo = frame.f_code
+            chave = (getattr(codigo, 'co_qualname', codigo.co_name), codigo.co_filename, codigo.co_firstlineno)
+            indice = self.quadros.get(chave)
+            if indice is None:
+                indice = self.quadros[chave] = len(self.quadros)
+            pilha.append(indice)
+            frame = frame.f_back
+        pilha.reverse()  # raiz primeiro, como pede o speedscope
+        self.amostras.append(pilha)
+        self.pesos.append(round((agora - self.ultima) * 1000, 3))
+        self.ultima = agora
+
+    def speedscope(self):
+        nome = f'{self.metodo} {self.rota} ({self.ms} ms, status {self.status})'
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': nome,
+            'exporter': 'nf-ai-dados perfilador',
+            'activeProfileIndex': 0,
+            'shared': {'frames': [{'name': nome_funcao, 'file': arquivo, 'line': linha}
+                                  for nome_funcao, arquivo, linha in self.quadros]},
+            'profiles': [{
+                'type': 'sampled', 'name': nome, 'unit': 'milliseconds',
+                'startValue': 0, 'endValue': round(sum(self.pesos), 3),
+                'samples': self.amostras, 'weights': self.pesos,
+            }],
+        }
+
+    def resumo(self):
+        return {'arquivo': os.path.basename(self.caminho), 'metodo': self.metodo, 'rota': self.rota,
+                'status': self.status, 'ms': self.ms, 'amostras': len(self.amostras), 'motivo': self.motivo,
+                'pid': os.getpid(), 'em': self.inicio_em}
+
+
+def _laco():
+    while True:
+        with _condicao:
+            while not _ativas and not _terminadas:
+                _condicao.wait()
+            terminadas = _terminadas[:]
+            _terminadas.clear()
+        for captura in terminadas:
+            try:
+                _gravar(captura)
+            except OSError:
+                pass
+        if _ativas:
+            agora = time.perf_counter()
+            quadros = sys._current_frames()
+            for thread_id, captura in list(_ativas.items()):
+                frame = quadros.get(thread_id)
+                if frame is not None:
+                    captura.registrar(frame, agora)
+            del quadros
+            time.sleep(INTERVALO_S)
+
+
+_amostrador = por_processo.thread('perfilador', _laco)
+
+
+def _gravar(captura):
+    os.makedirs(DIRETORIO, exist_ok=True)
+    temporario = captura.caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(captura.speedscope(), f, separators=(',', ':'))
+    os.replace(temporario, captura.caminho)
+    with open(os.path.join(DIRETORIO, '.trava'), 'w') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        with open(os.path.join(DIRETORIO, INDICE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(captura.resumo(), ensure_ascii=False) + '\n')
+        _podar()
+
+
+def _podar():
+    """Mantém os MAX_ARQUIVOS perfis mais recentes e reescreve o índice quando ele dobra de tamanho."""
+    arquivos = sorted(glob.glob(os.path.join(DIRETORIO, '*' + SUFIXO)))
+    for caminho in arquivos[:-MAX_ARQUIVOS] if MAX_ARQUIVOS else []:
+        os.remove(caminho)
+    caminho_indice = os.path.join(DIRETORIO, INDICE)
+    registros = _ler_indice()
+    if len(registros) > 2 * MAX_ARQUIVOS:
+        existentes = {os.path.basename(c) for c in arquivos[-MAX_ARQUIVOS:]}
+        with open(caminho_indice + '.tmp', 'w', encoding='utf-8') as f:
+            for registro in registros:
+                if registro.get('arquivo') in existentes:
+                    f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        os.replace(caminho_indice + '.tmp', caminho_indice)
+
+
+def _ler_indice():
+    try:
+        with open(os.path.join(DIRETORIO, INDICE), encoding='utf-8') as f:
+            return [json.loads(linha) for linha in f if linha.strip()]
+    except (OSError, ValueError):
+        return []
+
+
+def _motivo():
+    cabecalho = request.headers.get('X-Perfilar')
+    if cabecalho and (hmac.compare_digest(cabecalho, TOKEN) if TOKEN else current_app.debug):
+        return 'cabecalho'
+    if AMOSTRA and random.random() < AMOSTRA:
+        return 'amostra'
+    return None
+
+
+def iniciar(motivo):
+    """Começa a perfilar a requisição atual (na thread atual)."""
+    rota = telemetria._rota()
+    nome = re.sub(r'[^A-Za-z0-9]+', '_', rota).strip('_') or 'raiz'
+    caminho = os.path.join(DIRETORIO, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}-{nome}-{os.getpid()}{SUFIXO}")
+    captura = g.perfil_captura = Captura(threading.get_ident(), request.method, rota, caminho, motivo)
+    with _condicao:
+        _amostrador.garantir()
+        _ativas[captura.thread_id] = captura
+        _condicao.notify()
+    return captura
+
+
+def terminar(captura, status):
+    """Para a captura; a gravação fica com a thread do perfilador, fora da requisição."""
+    with _condicao:
+        _ativas.pop(captura.thread_id, None)
+        captura.status = status
+        captura.ms = round((time.perf_counter() - captura.inicio) * 1000, 1)
+        if captura.ms >= MIN_MS and captura.amostras:
+            _terminadas.append(captura)
+            telemetria.contar('nf_perfis_total', rota=captura.rota, motivo=captura.motivo)
+        _condicao.notify()
+
+
+def instrumentar(app):
+    """Liga o perfilador às requisições do app."""
+
+    @app.before_request
+    def _inicio():
+        motivo = _motivo()
+        if motivo:
+            iniciar(motivo)
+
+    @app.after_request
+    def _cabecalho(resposta):
+        captura = g.get('perfil_captura')
+        if captura is not None:
+            resposta.headers['X-Perfil'] = os.path.basename(captura.caminho)
+            g.perfil_status = resposta.status_code
+        return resposta
+
+    @app.teardown_request
+    def _fim(erro):
+        captura = g.pop('perfil_captura', None)
+        if captura is not None:
+            terminar(captura, g.get('perfil_status', 500))
+
+
+def _reiniciar_no_filho():
+    global _condicao
+    _condicao = threading.Condition()
+    _ativas.clear()
+    _terminadas.clear()
+
+
+os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+def recentes(rota=None, limite=100):
+    """Capturas gravadas (de todos os workers), da mais recente para a mais antiga."""
+    existentes = {os.path.basename(c) for c in glob.glob(os.path.join(DIRETORIO, '*' + SUFIXO))}
+    registros = [r for r in _ler_indice() if r.get('arquivo') in existentes and (not rota or r.get('rota') == rota)]
+    return sorted(registros, key=lambda r: r.get('em', 0), reverse=True)[:limite]
+
+
+def caminho_arquivo(nome):
+    """Caminho de um perfil do diretório pelo nome (None se o nome não é de um perfil existente)."""
+    if os.path.basename(nome) != nome or not nome.endswith(SUFIXO):
+        return None
+    caminho = os.path.join(DIRETORIO, nome)
+    return caminho if os.path.isfile(caminho) else None
@@ -0,0 +1,50 @@
+"""
+Objetos de fundo (threads de gravação e amostragem) criados no primeiro uso, um por processo.
+
+O mestre do gunicorn importa o app antes do fork, e threads não atravessam o fork: um worker
+herdaria a referência a uma thread que nele não existe. PorProcesso guarda, com o objeto, o
+pid de quem o criou; o primeiro garantir() de outro processo cria um novo. Usado por
+telemetria.py (gravador dos retratos), logs.py (QueueListener), perfilador.py (amostrador) e
+perfil_sql.py (EXPLAIN em fundo).
+"""
+import os
+import threading
+
+
+class PorProcesso:
+    """garantir() devolve o objeto deste processo, criado por criar() na primeira chamada nele."""
+
+    def __init__(self, criar):
+        self._criar = criar
+        self._trava = threading.Lock()
+        self._atual = None  # (pid, objeto)
+        # A trava pode ter sido copiada presa por outra thread do processo pai
+        os.register_at_fork(after_in_child=self._reiniciar_no_filho)
+
+    def garantir(self):
+        atual = self._atual
+        if atual is not None and atual[0] == os.getpid():
+            return atual[1]
+        with self._trava:
+            if self._atual is None or self._atual[0] != os.getpid():
+                self._atual = (os.getpid(), self._criar())
+            return self._atual[1]
+
+    def descartar(self):
+        """Esquece o objeto; devolve-o se foi criado neste processo (para pará-lo), senão None."""
+        with self._trava:
+            atual, self._atual = self._atual, None
+        return atual[1] if atual is not None and atual[0] == os.getpid() else None
+
+    def _reiniciar_no_filho(self):
+        self._trava = threading.Lock()
+
+
+def thread(nome, alvo):
+    """PorProcesso de uma thread daemon que roda alvo() (um laço que não termina)."""
+
+    def iniciar():
+        thread = threading.Thread(target=alvo, name=nome, daemon=True)
+        thread.start()
+        return thread
+    return PorProcesso(iniciar)
@@ -17,95 +17,174 @@ const tabelasConfig = {
     }
 };
 
-// Função para carregar tabela
+// Estado da listagem atual (paginação por cursor)
+let estadoTabela = null;
+const TAMANHO_PAGINA = 50;
+
+// Função para carregar tabela (primeira página)
 function carregarTabela(tipo) {
     const config = tabelasConfig[tipo];
     if (!config) return;
 
+    estadoTabela = { tipo: tipo, config: config, cursor: null, carregando: false, total: 0 };
+
     mostrarLoading();
     esconderErro();
+    carregarPagina(true);
+}
+
+// Função para buscar a próxima página e anexar as linhas
+function carregarPagina(primeira) {
+    const estado = estadoTabela;
+    if (!estado || estado.carregando) return;
+    estado.carregando = true;
 
-    fetch(config.endpoint)
+    const params = new URLSearchParams({ limite: TAMANHO_PAGINA });
+    if (primeira) {
+        params.set('estimativa', '1');
+    } else {
+        params.set('cursor', estado.cursor);
+    }
+
+    fetch(estado.config.endpoint + '?' + params.toString())
         .then(response => {
             if (!response.ok) {
                 throw new Error('Falha ao carregar (' + response.status + ')');
             }
-            return response.json();
+            return response.json().then(data => ({
+                data: data,
+                cursor: response.headers.get('X-Proximo-Cursor'),
+                totalEstimado: response.headers.get('X-Total-Estimado')
+            }));
         })
-        .then(data => {
+        .then(resultado => {
+            // Ignora respostas de uma tabela que já foi trocada
+            if (estado !== estadoTabela) return;
             esconderLoading();
-            if (data && data.erro) {
+            estado.carregando = false;
+            if (resultado.data && resultado.data.erro) {
                 mostrarErro('Não foi possível carregar. Tente novamente.');
+                return;
+            }
+            if (primeira) {
+                renderizarTabela(resultado.data, estado.config, resultado.totalEstimado);
             } else {
-                renderizarTabela(data, config);
+                anexarLinhas(resultado.data, estado.config);
             }
+            estado.total += resultado.data.length;
+            estado.cursor = resultado.cursor;
+            atualizarRodape();
         })
         .catch(error => {
+            estado.carregando = false;
             esconderLoading();
             console.error('Erro ao carregar dados:', error);
             mostrarErro('Não foi possível carregar. Tente novamente.');
         });
 }
 
-// Função para renderizar tabela
-function renderizarTabela(dados, config) {
+// Função para renderizar tabela (cabeçalho + primeira página)
+function renderizarTabela(dados, config, totalEstimado) {
     const container = document.getElementById('table-container');
     
     let html = '<h2>' + config.titulo + '</h2>';
+    if (totalEstimado) {
+        html += '<p class="total-estimado">Aproximadamente ' + totalEstimado + ' registros</p>';
+    }
     
     if (dados.length === 0) {
         html += '<p>Nenhum registro encontrado.</p>';
-    } else {
-        html += '<table>';
-        html += '<thead><tr>';
-        
-        // Cabeçalhos
-        config.colunas.forEach(coluna => {
-            html += '<th>' + coluna + '</th>';
-        });
-        html += '</tr></thead>';
-        
-        // Dados
-        html += '<tbody>';
-        dados.forEach(item => {
-            html += '<tr>';
-            html += '<td>' + item.id + '</td>';
-            
-            if (config.titulo === 'Pessoas') {
-                const isAtivo = (item.status || '').toUpperCase() === 'ATIVO';
-                const statusLabel = isAtivo ? 'Ativo' : 'Inativo';
-                html += '<td>' + item.nome + '</td>';
-                html += '<td>' + item.cpf_cnpj + '</td>';
-                html += '<td>' + item.tipo + '</td>';
-                html += '<td>' + (item.fantasia || '-') + '</td>';
-                html += '<td>' + statusLabel + '</td>';
-                html += '<td class="acoes">';
-                html += '<button class="btn-editar" onclick="editarPessoa(' + item.id + ')" title="Editar">✏️</button>';
-                html += '<button class="btn-inativar" onclick="inativarPessoa(' + item.id + ', \'' + (item.status || '') + '\')" title="' + (isAtivo ? 'Inativar' : 'Ativar') + '">';
-                html += isAtivo ? '🔓' : '🔒';
-                html += '</button>';
-                html += '</td>';
-            } else if (config.titulo === 'Movimentações') {
-                html += '<td>' + item.pessoa_nome + '</td>';
-                html += '<td>' + item.classificacao_nome + '</td>';
-                html += '<td>' + item.descricao + '</td>';
-                html += '<td>R$ ' + formatarMoeda(item.valor) + '</td>';
-                html += '<td>' + item.tipo_movimento + '</td>';
-                html += '<td>' + item.data_movimento + '</td>';
-                html += '<td>' + item.data_criacao + '</td>';
-            } else if (config.titulo === 'Classificações') {
-                html += '<td>' + item.nome + '</td>';
-                html += '<td>' + item.descricao + '</td>';
-                html += '<td>' + item.data_criacao + '</td>';
-            }
-            
-            html += '</tr>';
-        });
-        html += '</tbody>';
-        html += '</table>';
+        container.innerHTML = html;
+        return;
     }
+
+    html += '<table>';
+    html += '<thead><tr>';
+    
+    // Cabeçalhos
+    config.colunas.forEach(coluna => {
+        html += '<th>' + coluna + '</th>';
+    });
+    html += '</tr></thead>';
+    html += '<tbody id="tabela-corpo"></tbody>';
+    html += '</table>';
+    html += '<div id="rodape-tabela">';
+    html += '<span id="contador-registros"></span>';
+    html += '<button id="btn-carregar-mais" onclick="carregarPagina(false)">Carregar mais</button>';
+    html += '<div id="sentinela-tabela"></div>';
+    html += '</div>';
     
     container.innerHTML = html;
+    anexarLinhas(dados, config);
+    observarFimDaTabela();
+}
+
+// Função para anexar linhas sem re-renderizar as já exibidas
+function anexarLinhas(dados, config) {
+    const corpo = document.getElementById('tabela-corpo');
+    if (!corpo) return;
+    corpo.insertAdjacentHTML('beforeend', dados.map(item => renderizarLinha(item, config)).join(''));
+}
+
+// Função para renderizar uma linha
+function renderizarLinha(item, config) {
+    let html = '<tr>';
+    html += '<td>' + item.id + '</td>';
+    
+    if (config.titulo === 'Pessoas') {
+        const isAtivo = (item.status || '').toUpperCase() === 'ATIVO';
+        const statusLabel = isAtivo ? 'Ativo' : 'Inativo';
+        html += '<td>' + item.nome + '</td>';
+        html += '<td>' + item.cpf_cnpj + '</td>';
+        html += '<td>' + item.tipo + '</td>';
+        html += '<td>' + (item.fantasia || '-') + '</td>';
+        html += '<td>' + statusLabel + '</td>';
+        html += '<td class="acoes">';
+        html += '<button class="btn-editar" onclick="editarPessoa(' + item.id + ')" title="Editar">✏️</button>';
+        html += '<button class="btn-inativar" onclick="inativarPessoa(' + item.id + ', \'' + (item.status || '') + '\')" title="' + (isAtivo ? 'Inativar' : 'Ativar') + '">';
+        html += isAtivo ? '🔓' : '🔒';
+        html += '</button>';
+        html += '</td>';
+    } else if (config.titulo === 'Movimentações') {
+        html += '<td>' + item.pessoa_nome + '</td>';
+        html += '<td>' + item.classificacao_nome + '</td>';
+        html += '<td>' + item.descricao + '</td>';
+        html += '<td>R$ ' + formatarMoeda(item.valor) + '</td>';
+        html += '<td>' + item.tipo_movimento + '</td>';
+        html += '<td>' + item.data_movimento + '</td>';
+        html += '<td>' + item.data_criacao + '</td>';
+    } else if (config.titulo === 'Classificações') {
+        html += '<td>' + item.nome + '</td>';
+        html += '<td>' + item.descricao + '</td>';
+        html += '<td>' + item.data_criacao + '</td>';
+    }
+    
+    html += '</tr>';
+    return html;
+}
+
+// Função para atualizar contador e botão "Carregar mais"
+function atualizarRodape() {
+    const contador = document.getElementById('contador-registros');
+    const botao = document.getElementById('btn-carregar-mais');
+    if (contador) {
+        contador.textContent = estadoTabela.total + ' registros exibidos';
+    }
+    if (botao) {
+        botao.style.display = estadoTabela.cursor ? 'inline-block' : 'none';
+    }
+}
+
+// Carrega a próxima página automaticamente ao rolar até o fim da tabela
+function observarFimDaTabela() {
+    const sentinela = document.getElementById('sentinela-tabela');
+    if (!sentinela || !('IntersectionObserver' in window)) return;
+    const observador = new IntersectionObserver(entradas => {
+        if (entradas[0].isIntersecting && estadoTabela && estadoTabela.cursor) {
+            carregarPagina(false);
+        }
+    });
+    observador.observe(sentinela);
 }
 
 // Funções auxiliares
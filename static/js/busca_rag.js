@@ -0,0 +1,114 @@
+let selectedMethod = 'hibrido';
+
+// Seleção de método
+document.querySelectorAll('.method-btn').forEach(btn => {
+    btn.addEventListener('click', function() {
+        document.querySelectorAll('.method-btn').forEach(b => b.classList.remove('active'));
+        this.classList.add('active');
+        selectedMethod = this.dataset.method;
+    });
+});
+
+// Sugestões
+document.querySelectorAll('.suggestion-chip').forEach(chip => {
+    chip.addEventListener('click', function() {
+        document.getElementById('query-input').value = this.dataset.query;
+    });
+});
+
+// Botão buscar
+document.getElementById('btn-search').addEventListener('click', executeSearch);
+
+// Ctrl+Enter para buscar
+document.getElementById('query-input').addEventListener('keydown', function(e) {
+    if (e.ctrlKey && e.key === 'Enter') {
+        e.preventDefault();
+        executeSearch();
+    }
+});
+
+// Botão limpar
+document.getElementById('btn-clear').addEventListener('click', function() {
+    document.getElementById('query-input').value = '';
+    document.getElementById('error-message').style.display = 'none';
+    document.getElementById('result-card').classList.remove('active');
+});
+
+function executeSearch() {
+    const query = document.getElementById('query-input').value.trim();
+    if (!query) {
+        showError('Por favor, digite uma pergunta.');
+        return;
+    }
+
+    hideError();
+    showLoading();
+
+    // Determinar endpoint
+    let endpoint = '/rag/query'; // híbrido (padrão)
+    if (selectedMethod === 'simples') endpoint = '/rag/query-simples';
+    if (selectedMethod === 'embeddings') endpoint = '/rag/query-embeddings';
+
+    const startTime = performance.now();
+
+    fetch(endpoint, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ pergunta: query })
+    })
+    .then(response => response.json())
+    .then(data => {
+        hideLoading();
+        if (!data.sucesso) {
+            showError(data.erro || 'Erro ao processar a busca.');
+            return;
+        }
+
+        const totalTime = Math.round(performance.now() - startTime);
+        showResults(data, totalTime);
+    })
+    .catch(error => {
+        hideLoading();
+        console.error('Erro:', error);
+        showError('Erro ao conectar com o servidor.');
+    });
+}
+
+function showResults(data, totalTime) {
+    document.getElementById('result-method').textContent = `${data.metodo || 'RAG'}`;
+    document.getElementById('result-time').textContent = `${data.tempo_busca_ms || totalTime} ms`;
+    document.getElementById('result-count').textContent = `${data.registros_encontrados || data.contexto?.length || 0} registros`;
+    document.getElementById('result-answer').textContent = data.resposta || '(sem resposta)';
+    document.getElementById('result-context').textContent = data.contexto?.join('\n\n') || '(sem contexto)';
+    document.getElementById('result-card').classList.add('active');
+}
+
+function showError(message) {
+    const errorEl = document.getElementById('error-message');
+    errorEl.textContent = message;
+    errorEl.style.display = 'block';
+}
+
+function hideError() {
+    document.getElementById('error-message').style.display = 'none';
+}
+
+function showLoading() {
+    document.getElementById('loading').classList.add('active');
+    document.getElementById('btn-search').disabled = true;
+}
+
+function hideLoading() {
+    document.getElementById('loading').classList.remove('active');
+    document.getElementById('btn-search').disabled = false;
+}
+
+function copyAnswer() {
+    const answer = document.getElementById('result-answer').textContent;
+    navigator.clipboard.writeText(answer).then(() => {
+        alert('✅ Resposta copiada!');
+    });
+}
+
+// Focus no input ao carregar
+document.getElementById('query-input').focus();
@@ -0,0 +1,395 @@
+"""
+Métricas no formato de texto do Prometheus (GET /metrics) e tempos por estágio de cada requisição.
+
+Histogramas (segundos):
+  nf_estagio_segundos{estagio, rota, modelo}    estágios do pipeline: pdf_extract,
+      llm_generate, llm_embed, db_query, retrieval, serialization, compression
+  nf_requisicao_segundos{rota, metodo, status}  requisição inteira
+Contadores:
+  nf_cache_total{cache, resultado}              acerto/falha dos caches de cache.py
+  nf_tentativas_total{operacao, modelo}         novas tentativas depois de erro transitório
+  nf_fallbacks_total{operacao, destino}         caminho reserva (outro modelo, resumo offline...)
+  nf_tokens_total{modelo, tipo}                 tokens de prompt/resposta contados pelo Gemini
+  nf_sql_comandos_total{rota}, nf_sql_repeticoes_total{rota}, nf_sql_lentas_total{rota}
+                                                perfil do SQL (perfil_sql.py)
+  nf_perfis_total{rota, motivo}                 perfis de CPU gravados (perfilador.py)
+  nf_logs_descartados_total{nivel}              registros de log perdidos com a fila cheia (logs.py)
+  nf_compressao_bytes_total{estado}             bytes das respostas antes/depois do gzip (compressao.py)
+Histograma em bytes: nf_memoria_pico_bytes{rota} (pico de alocação, memoria.py).
+Medidas (gauge; entre workers vale a maior): nf_memoria_rss_bytes, nf_memoria_rss_maximo_bytes.
+
+`rota` é o padrão da rota do Flask ("/admin/api/pessoas/<int:id>"), vazio fora de uma
+requisição. Estágios podem se aninhar: retrieval inclui as db_query feitas durante a
+recuperação.
+
+Cada requisição acumula o tempo de cada estágio. O total vai no cabeçalho Server-Timing de
+toda resposta e, em respostas JSON com ?timings=1 (ou cabeçalho X-Timings: 1, ou
+METRICAS_TIMINGS=1 para todas), no campo `timings` do corpo.
+
+Workers do gunicorn: com METRICAS_DIRETORIO, cada processo grava a cada
+METRICAS_INTERVALO_S segundos um retrato das suas séries em <diretório>/<pid>-<início>.json
+e GET /metrics soma os retratos de todos os processos (os de processos encerrados são
+consolidados em mortos.json, para os contadores nunca voltarem). Sem o diretório, /metrics
+mostra só o processo que atendeu.
+"""
+import bisect
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import por_processo
+
+ESTAGIOS = ('pdf_extract', 'llm_generate', 'llm_embed', 'db_query', 'retrieval', 'serialization', 'compression')
+LIMITES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DESCRICOES = {
+    'nf_estagio_segundos': ('histogram', 'Duração de cada estágio do pipeline'),
+    'nf_requisicao_segundos': ('histogram', 'Duração das requisições HTTP'),
+    'nf_cache_total': ('counter', 'Consultas aos caches por resultado'),
+    'nf_tentativas_total': ('counter', 'Novas tentativas depois de erro transitório'),
+    'nf_fallbacks_total': ('counter', 'Uso de caminhos reserva'),
+    'nf_tokens_total': ('counter', 'Tokens contados pelo modelo'),
+    'nf_sql_comandos_total': ('counter', 'Comandos SQL executados pelas requisições'),
+    'nf_sql_repeticoes_total': ('counter', 'Formas de SQL repetidas em uma requisição (N+1 provável)'),
+    'nf_sql_lentas_total': ('counter', 'Consultas SQL acima do limiar de lentidão'),
+    'nf_perfis_total': ('counter', 'Requisições perfiladas gravadas pelo perfilador'),
+    'nf_logs_descartados_total': ('counter', 'Registros de log descartados com a fila de gravação cheia'),
+    'nf_compressao_bytes_total': ('counter', 'Bytes das respostas comprimidas, antes (original) e depois (comprimido)'),
+    'nf_memoria_pico_bytes': ('histogram', 'Pico de alocação Python por requisição (tracemalloc)'),
+    'nf_memoria_rss_bytes': ('gauge', 'RSS atual (o maior entre os workers)'),
+    'nf_memoria_rss_maximo_bytes': ('gauge', 'Maior RSS desde o início do processo (o maior entre os workers)'),
+}
+# Histogramas com limites próprios (os demais usam LIMITES, em segundos)
+LIMITES_METRICA = {
+    'nf_memoria_pico_bytes': tuple(float(2 ** n) for n in range(16, 31, 2)),  # 64 KiB a 1 GiB
+}
+
+DIRETORIO = os.getenv('METRICAS_DIRETORIO') or None
+INTERVALO_S = float(os.getenv('METRICAS_INTERVALO_S', '5'))
+TIMINGS_SEMPRE = os.getenv('METRICAS_TIMINGS', '0').lower() in ('1', 'true')
+
+_trava = threading.Lock()
+_histogramas = {}  # (nome, rótulos) -> [contagens por limite + Inf, soma]
+_contadores = {}   # (nome, rótulos) -> valor
+_medidas = {}      # (nome, rótulos) -> último valor (gauge)
+_arquivos = {}     # pid -> arquivo do retrato
+_ouvintes_comando = []
+
+
+def _rotulos(pares):
+    return tuple(sorted((k, '' if v is None else str(v)) for k, v in pares.items()))
+
+
+def observar(nome, segundos, **rotulos):
+    chave = (nome, _rotulos(rotulos))
+    with _trava:
+        limites = LIMITES_METRICA.get(nome, LIMITES)
+        serie = _histogramas.get(chave)
+        if serie is None:
+            serie = _histogramas[chave] = [[0] * (len(limites) + 1), 0.0]
+        serie[0][bisect.bisect_left(limites, segundos)] += 1
+        serie[1] += segundos
+    _iniciar_gravador()
+
+
+def contar(nome, valor=1, **rotulos):
+    chave = (nome, _rotulos(rotulos))
+    with _trava:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+    _iniciar_gravador()
+
+
+def medir(nome, valor, **rotulos):
+    """Define o valor atual de uma medida (gauge). Entre processos, /metrics mostra a maior."""
+    with _trava:
+        _medidas[(nome, _rotulos(rotulos))] = valor
+    _iniciar_gravador()
+
+
+def _rota():
+    """Padrão da rota da requisição atual ('sem_rota' sem regra; vazio fora de uma requisição)."""
+    if not has_request_context():
+        return ''
+    return request.url_rule.rule if request.url_rule else 'sem_rota'
+
+
+def registrar_estagio(estagio, segundos, modelo=None):
+    """Observa um estágio medido fora de estagio() e soma o tempo ao da requisição atual."""
+    observar('nf_estagio_segundos', segundos, estagio=estagio, rota=_rota(), modelo=modelo)
+    if has_request_context():
+        tempos = g.setdefault('tempos_estagios', {})
+        tempos[estagio] = tempos.get(estagio, 0.0) + segundos
+
+
+@contextmanager
+def estagio(nome, modelo=None):
+    """Mede o bloco como o estágio `nome` (também quando o bloco levanta exceção)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_estagio(nome, time.perf_counter() - inicio, modelo)
+
+
+def contar_tokens(modelo, metadados):
+    """Tokens de prompt e de resposta de um usage_metadata do Gemini (ignorado se ausente)."""
+    for tipo, campo in (('prompt', 'prompt_token_count'), ('resposta', 'candidates_token_count')):
+        valor = getattr(metadados, campo, None)
+        if valor:
+            contar('nf_tokens_total', valor, modelo=modelo, tipo=tipo)
+
+
+def tempos_requisicao():
+    """{estágio: ms} da requisição atual, mais total_ms."""
+    tempos = {k: round(v * 1000, 1) for k, v in g.get('tempos_estagios', {}).items()}
+    if 'inicio_requisicao' in g:
+        tempos['total_ms'] = round((time.perf_counter() - g.inicio_requisicao) * 1000, 1)
+    return tempos
+
+
+def ao_medir_comando(funcao):
+    """
+    Registra funcao(conn, statement, parameters, executemany, segundos), chamada depois de cada
+    comando medido como db_query (perfil_sql.py usa a mesma medida em vez de cronometrar de novo).
+    """
+    _ouvintes_comando.append(funcao)
+    return funcao
+
+
+# Todas as engines (principal, leitura, scripts): cada comando enviado ao banco é um db_query
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_comando(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('inicio_comando', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_comando(conn, cursor, statement, parameters, context, executemany):
+    pilha = conn.info.get('inicio_comando')
+    if pilha:
+        segundos = time.perf_counter() - pilha.pop()
+        registrar_estagio('db_query', segundos)
+        for funcao in _ouvintes_comando:
+            funcao(conn, statement, parameters, executemany, segundos)
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    """JSON do Flask com a serialização das respostas medida como estágio serialization."""
+
+    def dumps(self, obj, **kwargs):
+        with estagio('serialization'):
+            return super().dumps(obj, **kwargs)
+
+
+def instrumentar(app):
+    """Liga a medição das requisições, o Server-Timing e o campo `timings` ao app."""
+    app.json = ProvedorJSON(app)
+
+    @app.before_request
+    def _inicio():
+        g.inicio_requisicao = time.perf_counter()
+
+    @app.after_request
+    def _fim(resposta):
+        if 'inicio_requisicao' not in g:
+            return resposta
+        tempos = tempos_requisicao()
+        resposta.headers['Server-Timing'] = ', '.join(
+            f"{nome.removesuffix('_ms')};dur={ms}" for nome, ms in tempos.items())
+        pedido = TIMINGS_SEMPRE or request.args.get('timings') == '1' or request.headers.get('X-Timings') == '1'
+        if pedido and resposta.is_json and not resposta.is_streamed:
+            dados = resposta.get_json(silent=True)
+            if isinstance(dados, dict):
+                dados['timings'] = tempos
+                # Sem medir de novo: o tempo desta serialização não entra no próprio relatório
+                resposta.set_data(DefaultJSONProvider.dumps(app.json, dados) + '\n')
+        observar('nf_requisicao_segundos', tempos['total_ms'] / 1000, rota=_rota(),
+                 metodo=request.method, status=resposta.status_code)
+        return resposta
+
+
+# --- Agregação entre processos -------------------------------------------------------
+
+def _reiniciar_no_filho():
+    # Um worker criado por fork herdaria as séries do mestre e as somaria de novo no /metrics
+    global _trava
+    _trava = threading.Lock()
+    _histogramas.clear()
+    _contadores.clear()
+    _medidas.clear()
+
+
+os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+def _retrato():
+    with _trava:
+        return {
+            'histogramas': [[n, list(r), s[0][:], s[1]] for (n, r), s in _histogramas.items()],
+            'contadores': [[n, list(r), v] for (n, r), v in _contadores.items()],
+            'medidas': [[n, list(r), v] for (n, r), v in _medidas.items()],
+        }
+
+
+def _arquivo_processo():
+    # pid + instante da primeira gravação: um pid reaproveitado não sobrescreve o retrato de outro processo
+    pid = os.getpid()
+    if pid not in _arquivos:
+        _arquivos[pid] = os.path.join(DIRETORIO, f'{pid}-{time.time_ns()}.json')
+    return _arquivos[pid]
+
+
+def _gravar_json(caminho, dados):
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f)
+    os.replace(temporario, caminho)
+
+
+def gravar_retrato():
+    if DIRETORIO:
+        os.makedirs(DIRETORIO, exist_ok=True)
+        _gravar_json(_arquivo_processo(), _retrato())
+
+
+def _laco_gravador():
+    while True:
+        time.sleep(INTERVALO_S)
+        try:
+            gravar_retrato()
+        except OSError:
+            pass
+
+
+_gravador = por_processo.thread('metricas', _laco_gravador)
+
+
+def _iniciar_gravador():
+    if DIRETORIO:
+        _gravador.garantir()
+
+
+def _somar(destino, retrato):
+    for nome, rotulos, contagens, soma in retrato.get('histogramas', []):
+        serie = destino['histogramas'].setdefault((nome, tuple(map(tuple, rotulos))), [[0] * len(contagens), 0.0])
+        serie[0] = [a + b for a, b in zip(serie[0], contagens)]
+        serie[1] += soma
+    for nome, rotulos, valor in retrato.get('contadores', []):
+        chave = (nome, tuple(map(tuple, rotulos)))
+        destino['contadores'][chave] = destino['contadores'].get(chave, 0) + valor
+    # Medidas não se somam: vale a maior (processos encerrados não entram em mortos.json)
+    for nome, rotulos, valor in retrato.get('medidas', []):
+        chave = (nome, tuple(map(tuple, rotulos)))
+        medidas = destino.setdefault('medidas', {})
+        medidas[chave] = max(medidas.get(chave, valor), valor)
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _ler(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@contextmanager
+def _trava_diretorio():
+    """flock de <diretório>/.trava: entre processos, só um consolida ou lê os retratos por vez."""
+    with open(os.path.join(DIRETORIO, '.trava'), 'w') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        yield
+
+
+def _consolidar_mortos():
+    """Soma os retratos de processos encerrados em mortos.json e os remove (com _trava_diretorio)."""
+    arquivos = [a for a in glob.glob(os.path.join(DIRETORIO, '*-*.json'))
+                if not _vivo(int(os.path.basename(a).split('-')[0]))]
+    if not arquivos:
+        return
+    caminho_mortos = os.path.join(DIRETORIO, 'mortos.json')
+    total = {'histogramas': {}, 'contadores': {}}
+    for caminho in [caminho_mortos, *arquivos]:
+        _somar(total, _ler(caminho))
+    _gravar_json(caminho_mortos, {
+        'histogramas': [[n, list(r), s[0], s[1]] for (n, r), s in total['histogramas'].items()],
+        'contadores': [[n, list(r), v] for (n, r), v in total['contadores'].items()],
+    })
+    for caminho in arquivos:
+        os.remove(caminho)
+
+
+def series():
+    """Séries somadas de todos os processos (ou só deste, sem METRICAS_DIRETORIO)."""
+    total = {'histogramas': {}, 'contadores': {}, 'medidas': {}}
+    if DIRETORIO:
+        gravar_retrato()
+        # A leitura fica sob a mesma trava da consolidação: sem ela, o retrato de um processo
+        # que acabou de morrer seria somado aqui e em mortos.json, ou sumiria entre o glob e a leitura
+        with _trava_diretorio():
+            _consolidar_mortos()
+            for caminho in glob.glob(os.path.join(DIRETORIO, '*.json')):
+                _somar(total, _ler(caminho))
+    else:
+        _somar(total, _retrato())
+    return total
+
+
+def _formatar_rotulos(rotulos):
+    def escapar(valor):
+        return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in rotulos) + '}' if rotulos else ''
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exposicao():
+    """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+    total = series()
+    linhas = []
+    for nome, (tipo, descricao) in DESCRICOES.items():
+        linhas += [f'# HELP {nome} {descricao}', f'# TYPE {nome} {tipo}']
+        if tipo == 'histogram':
+            limites = LIMITES_METRICA.get(nome, LIMITES)
+            for (n, rotulos), (contagens, soma) in sorted(total['histogramas'].items()):
+                if n != nome:
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(limites + (float('inf'),), contagens):
+                    acumulado += contagem
+                    le = '+Inf' if limite == float('inf') else repr(limite)
+                    linhas.append(f'{nome}_bucket{_formatar_rotulos(rotulos + (("le", le),))} {acumulado}')
+                linhas.append(f'{nome}_sum{_formatar_rotulos(rotulos)} {_numero(soma)}')
+                linhas.append(f'{nome}_count{_formatar_rotulos(rotulos)} {acumulado}')
+        else:
+            valores = total['medidas'] if tipo == 'gauge' else total['contadores']
+            for (n, rotulos), valor in sorted(valores.items()):
+                if n == nome:
+                    linhas.append(f'{nome}{_formatar_rotulos(rotulos)} {_numero(valor)}')
+    return '\n'.join(linhas) + '\n'
+
+
+def limpar_diretorio():
+    """Remove os retratos anteriores (início do gunicorn, antes dos workers)."""
+    if DIRETORIO:
+        for caminho in glob.glob(os.path.join(DIRETORIO, '*.json')):
+            os.remove(caminho)
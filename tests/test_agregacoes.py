@@ -0,0 +1,107 @@
+"""Detecção da intenção analítica (agregacoes.detectar): só texto e filtros, sem banco."""
+from datetime import date
+
+import pytest
+
+import agregacoes
+
+MOVIMENTOS = {'alvo': 'movimentos'}
+PARCELAS = {'alvo': 'parcelas'}
+MES_ATUAL = {'alvo': 'movimentos', 'data_inicio': date(2026, 10, 1), 'data_fim': date(2026, 10, 19)}
+
+
+def nome(pergunta, filtros=MOVIMENTOS):
+    intencao = agregacoes.detectar(pergunta, filtros)
+    return intencao and intencao['nome']
+
+
+@pytest.mark.parametrize('pergunta, esperada', [
+    ('Qual o total de despesas do ano atual?', 'soma'),
+    ('quanto gastei no total este ano', 'soma'),
+    ('Quantas notas fiscais foram emitidas este ano?', 'contagem'),
+    ('Quais fornecedores com maiores despesas este ano?', 'por_fornecedor'),
+    ('top 5 fornecedores por valor gasto no ano atual', 'por_fornecedor'),
+    ('Resumo das despesas por categoria este ano', 'por_categoria'),
+    ('gastos mês a mês', 'por_mes'),
+    ('Quais as maiores despesas do mês atual?', 'top'),
+    ('Quais as menores despesas do mês atual?', 'top'),
+    ('Quais as notas fiscais mais recentes?', None),
+    ('Quais fornecedores aparecem nas notas recentes?', None),
+    ('Quais despesas acima de 10000 este ano?', None),
+])
+def test_intencoes_de_movimentos(pergunta, esperada):
+    assert nome(pergunta) == esperada
+
+
+@pytest.mark.parametrize('pergunta, esperada', [
+    ('quantas parcelas pendentes?', 'contagem'),
+    ('Qual o valor total das parcelas este trimestre?', 'soma'),
+    ('Mostre as parcelas em aberto deste trimestre', None),
+])
+def test_intencoes_de_parcelas(pergunta, esperada):
+    assert nome(pergunta, PARCELAS) == esperada
+
+
+def test_ordem_por_data_nao_e_agrupamento():
+    assert nome('despesa mais antiga do fornecedor') is None
+    assert nome('qual a nota mais recente do fornecedor?') is None
+
+
+@pytest.mark.parametrize('pergunta, ordem', [
+    ('fornecedores com maiores despesas', 'desc'),
+    ('fornecedores com menores despesas', 'asc'),
+    ('categorias com menos gastos este ano', 'asc'),
+    ('Quais as menores despesas do mês atual?', 'asc'),
+    ('despesas mais baratas do mês atual', 'asc'),
+    ('Quais as maiores despesas do mês atual?', 'desc'),
+    ('fornecedores com despesas menor que 1000 por valor', 'desc'),
+])
+def test_ordem_do_ranking(pergunta, ordem):
+    assert agregacoes.detectar(pergunta, MOVIMENTOS)['ordem'] == ordem
+
+
+@pytest.mark.parametrize('pergunta', [
+    'quanto tempo falta para vencer a parcela?',
+    'quantos dias faltam para o vencimento?',
+    'quanto é 2 + 2?',
+])
+def test_quanto_sem_dinheiro_nem_o_que_contar_nao_e_agregado(pergunta):
+    assert nome(pergunta) is None
+    assert nome(pergunta, PARCELAS) is None
+
+
+@pytest.mark.parametrize('pergunta, filtros', [
+    ('quanto gastei no mês atual?', MES_ATUAL),
+    ('Qual o total de despesas do mês atual?', MES_ATUAL),
+    ('quantas despesas tive?', MOVIMENTOS),
+    ('quantas parcelas pendentes?', PARCELAS),
+])
+def test_resposta_direta_quando_so_o_numero_responde(pergunta, filtros):
+    assert agregacoes.detectar(pergunta, filtros)['direta'] is True
+
+
+@pytest.mark.parametrize('pergunta, filtros', [
+    ('quanto gastei em 2024?', MOVIMENTOS),
+    ('quanto gastei em março?', MOVIMENTOS),
+    ('quanto gastei no mês passado?', MOVIMENTOS),
+    ('qual o total de despesas comparado com o mês anterior?', MES_ATUAL),
+    ('qual a média do total de despesas do mês atual?', MES_ATUAL),
+    ('quantas despesas e receitas tive no mês atual?', MES_ATUAL),
+    ('por que o total de despesas subiu no mês atual?', MES_ATUAL),
+])
+def test_sem_resposta_direta_quando_a_pergunta_pede_mais(pergunta, filtros):
+    intencao = agregacoes.detectar(pergunta, filtros)
+    assert intencao['nome'] in ('soma', 'contagem')
+    assert intencao['direta'] is False
+
+
+def test_tipo_e_status():
+    assert agregacoes.detectar('total de receitas do ano', MOVIMENTOS)['tipo'] == 'RECEITA'
+    assert agregacoes.detectar('quanto gastei no total', MOVIMENTOS)['tipo'] == 'DESPESA'
+    assert agregacoes.detectar('quantas parcelas pagas?', PARCELAS)['status'] == 'PAGA'
+
+
+def test_n_do_ranking():
+    assert agregacoes.detectar('top 5 notas por valor', MOVIMENTOS)['n'] == 5
+    assert agregacoes.detectar('3 menores despesas do ano', MOVIMENTOS)['n'] == 3
+    assert agregacoes.detectar('top 500 notas', MOVIMENTOS)['n'] == agregacoes.N_MAXIMO
@@ -0,0 +1,229 @@
+"""
+Filtros de recuperação do RAG (documentos.consulta).
+
+A primeira parte só compila o SELECT (sem banco): predicados, ids de classificação no texto
+do SQL e ordenação. A segunda compara, numa base sintética pequena em um schema próprio, as
+linhas do SQL com o mesmo filtro aplicado em Python a todas as linhas das tabelas de origem;
+é pulada sem PostgreSQL.
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import documentos
+
+SCHEMA = 'teste_filtros_rag'
+
+
+def compilar(tipo, filtros, **opcoes):
+    compilado = documentos.consulta(tipo, filtros, **opcoes).compile(
+        dialect=postgresql.dialect(), compile_kwargs={'render_postcompile': True})
+    return ' '.join(str(compilado).split()), compilado.params
+
+
+@pytest.fixture
+def ids_fixos(monkeypatch):
+    """Nomes -> ids sem banco: 'AGRO' e 'Insumos' existem, o resto não."""
+    pessoas = {'AGRO': [10, 11], 'COSTA': [12]}
+    classificacoes = {'Insumos': [3], 'Combustível': [7]}
+    monkeypatch.setattr(documentos, 'ids_pessoas', lambda nomes: sorted(i for n in nomes for i in pessoas.get(n, [])))
+    monkeypatch.setattr(documentos, 'ids_classificacoes',
+                        lambda descricoes: sorted(i for d in descricoes for i in classificacoes.get(d, [])))
+
+
+def test_movimentos_so_ativos_e_mais_recentes_primeiro(ids_fixos):
+    sql, params = compilar('movimentos', {})
+    assert 'rag_documentos.situacao = %(situacao_1)s' in sql and params['situacao_1'] == 'ATIVO'
+    assert sql.endswith('ORDER BY rag_documentos.data DESC, rag_documentos.id_origem DESC')
+    assert 'LIMIT' not in sql
+
+
+def test_periodo_valor_e_tipo_do_movimento(ids_fixos):
+    filtros = {'data_inicio': date(2026, 1, 1), 'data_fim': date(2026, 3, 31), 'min_valor': 100,
+               'max_valor': 0, 'tipo': 'DESPESA'}
+    sql, params = compilar('movimentos', filtros)
+    assert 'rag_documentos.data >= %(data_1)s' in sql and 'rag_documentos.data <= %(data_2)s' in sql
+    # max_valor 0 é um limite, não ausência de filtro
+    assert 'rag_documentos.valor >= %(valor_1)s' in sql and 'rag_documentos.valor <= %(valor_2)s' in sql
+    assert params['valor_2'] == 0
+    assert 'rag_documentos.categoria = %(categoria_1)s' in sql and params['categoria_1'] == 'DESPESA'
+
+
+def test_status_da_parcela(ids_fixos):
+    sql, params = compilar('parcelas', {'status': 'PENDENTE'})
+    assert 'rag_documentos.situacao = %(situacao_1)s' in sql and params['situacao_1'] == 'PENDENTE'
+    sql, params = compilar('parcelas', {'status': 'PAGA'})
+    assert 'rag_documentos.situacao != %(situacao_1)s' in sql and params['situacao_1'] == 'PENDENTE'
+    sql, _ = compilar('parcelas', {})
+    assert 'situacao' not in sql
+
+
+def test_pessoas_e_classificacoes_nao_filtram_por_periodo(ids_fixos):
+    filtros = {'data_inicio': date(2026, 1, 1), 'min_valor': 10, 'tipo': 'DESPESA', 'status': 'PAGA'}
+    for tipo in ('pessoas', 'classificacoes'):
+        sql, _ = compilar(tipo, filtros)
+        assert 'rag_documentos.data >=' not in sql and 'valor' not in sql.split('FROM')[1]
+        assert 'situacao' not in sql and 'categoria =' not in sql
+        assert sql.endswith('ORDER BY rag_documentos.id_origem')
+
+
+def test_emitente_vira_ids_de_pessoa(ids_fixos):
+    sql, params = compilar('movimentos', {'pessoas_nomes': ['COSTA', 'AGRO']})
+    assert 'rag_documentos.pessoa_id IN (%(pessoa_id_1_1)s, %(pessoa_id_1_2)s, %(pessoa_id_1_3)s)' in sql
+    assert sorted(v for k, v in params.items() if k.startswith('pessoa_id')) == [10, 11, 12]
+    # Classificações não têm emitente
+    sql, _ = compilar('classificacoes', {'pessoas_nomes': ['AGRO']})
+    assert 'pessoa_id' not in sql
+
+
+def test_emitente_desconhecido_nao_traz_linhas(ids_fixos):
+    sql, _ = compilar('movimentos', {'pessoas_nomes': ['NINGUEM']})
+    # IN vazio: o SQLAlchemy gera um predicado sempre falso
+    assert 'rag_documentos.pessoa_id IN (NULL)' in sql and '1 != 1' in sql
+
+
+def test_classificacao_com_ids_no_texto_do_sql(ids_fixos):
+    sql, params = compilar('movimentos', {'classificacoes_incluidas': ['Insumos', 'Combustível']})
+    assert 'rag_documentos.classificacao_ids && ARRAY[3, 7]' in sql
+    assert not any(isinstance(v, list) for v in params.values())
+
+
+def test_classificacao_desconhecida_nao_traz_linhas(ids_fixos):
+    sql, _ = compilar('movimentos', {'classificacoes_incluidas': ['Nenhuma']})
+    assert 'classificacao_ids' not in sql and 'false' in sql.lower()
+    # Parcelas não têm classificação: o filtro é ignorado
+    sql, _ = compilar('parcelas', {'classificacoes_incluidas': ['Nenhuma']})
+    assert 'false' not in sql.lower()
+
+
+@pytest.mark.parametrize('opcoes, ordem', [
+    ({'por_valor': True}, 'ORDER BY rag_documentos.valor DESC NULLS LAST, rag_documentos.id_origem DESC'),
+    ({'por_valor': True, 'crescente': True}, 'ORDER BY rag_documentos.valor ASC NULLS LAST, rag_documentos.id_origem DESC'),
+    ({'crescente': True}, 'ORDER BY rag_documentos.data DESC, rag_documentos.id_origem DESC'),
+])
+def test_ordenacao(ids_fixos, opcoes, ordem):
+    sql, _ = compilar('movimentos', {}, **opcoes)
+    assert sql.endswith(ordem)
+
+
+# --- SQL x filtro em Python, no banco ----------------------------------------------------
+
+SQL_MOVIMENTOS = """
+    SELECT m."idMovimentoContas", m.tipo, m.status, m.dataemissao, m.valortotal, p.razaosocial, p.fantasia,
+           array(SELECT c.descricao FROM "MovimentoContas_has_Classificacao" mc
+                 JOIN classificacao c ON c."idClassificacao" = mc."Classificacao_idClassificacao"
+                 WHERE mc."MovimentoContas_idMovimentoContas" = m."idMovimentoContas")
+    FROM movimento_contas m
+    LEFT JOIN pessoas p ON p."idPessoas" = m."Pessoas_idFornecedorCliente"
+"""
+
+
+def atende_movimento(linha, filtros):
+    """O filtro de movimentos em Python, linha a linha (o que o Agent3 fazia depois do LIMIT, sem o LIMIT)."""
+    _, tipo, status, data, valor, razaosocial, fantasia, classificacoes = linha
+    if status != 'ATIVO' or (filtros.get('tipo') and tipo != filtros['tipo']):
+        return False
+    if (filtros.get('data_inicio') and data < filtros['data_inicio']) or (filtros.get('data_fim') and data > filtros['data_fim']):
+        return False
+    if (filtros.get('min_valor') is not None and valor < filtros['min_valor']) or \
+            (filtros.get('max_valor') is not None and valor > filtros['max_valor']):
+        return False
+    if filtros.get('classificacoes_incluidas') and not set(classificacoes) & set(filtros['classificacoes_incluidas']):
+        return False
+    if filtros.get('pessoas_nomes'):
+        nome = f"{razaosocial or ''} {fantasia or ''}".lower()
+        if not any(x.lower() in nome for x in filtros['pessoas_nomes']):
+            return False
+    return True
+
+
+@pytest.fixture(scope='module')
+def base():
+    """Schema com ~3000 movimentos sintéticos e a migração 008; app Flask apontando para ele."""
+    psycopg = pytest.importorskip('psycopg')
+    from benchmarks.comum import aplicar_migracoes, conectar, criar_app_flask, gerar_dados, recriar_schema
+    try:
+        conn = conectar(SCHEMA)
+    except psycopg.OperationalError as e:
+        pytest.skip(f'PostgreSQL indisponível: {e}')
+    try:
+        recriar_schema(conn, SCHEMA)
+        gerar_dados(conn, movimentos=3000, pessoas=200, classificacoes_extras=20, anos=2, semente=0.5)
+        aplicar_migracoes(conn, '008_rag_documentos.sql')
+        movimentos = conn.execute(SQL_MOVIMENTOS).fetchall()
+        parcelas = conn.execute(
+            'SELECT "idParcelasContas", statusparcela, datavencimento FROM parcelas_contas').fetchall()
+        fornecedores = [r for r, in conn.execute("""
+            SELECT p.razaosocial FROM movimento_contas m JOIN pessoas p ON p."idPessoas" = m."Pessoas_idFornecedorCliente"
+            GROUP BY p.razaosocial ORDER BY count(*) DESC, p.razaosocial""")]
+        app = criar_app_flask(SCHEMA)
+        with app.app_context():
+            yield {'movimentos': movimentos, 'parcelas': parcelas, 'fornecedores': fornecedores}
+            from database import db
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        conn.close()
+
+
+def ids_sql(tipo, filtros, **opcoes):
+    from database import db
+    return [id_origem for _, id_origem, _, _ in db.session.execute(documentos.consulta(tipo, filtros, **opcoes))]
+
+
+def casos_movimentos(base):
+    frequente, raro = base['fornecedores'][0], base['fornecedores'][-1]
+    ano = date.today().year
+    return {
+        'sem_filtro': {},
+        'emitente_frequente': {'pessoas_nomes': [frequente]},
+        'emitente_raro': {'pessoas_nomes': [raro]},
+        'trecho_do_nome_em_minusculas': {'pessoas_nomes': ['silva 1']},
+        'fantasia': {'pessoas_nomes': ['FANTASIA 7']},
+        'emitente_inexistente': {'pessoas_nomes': ['NINGUEM LTDA']},
+        'classificacao_padrao': {'classificacoes_incluidas': ['INSUMOS AGRÍCOLAS']},
+        'classificacao_extra': {'classificacoes_incluidas': ['CLASSIFICACAO AUTOMATICA 3', 'CLASSIFICACAO AUTOMATICA 4']},
+        'classificacao_inexistente': {'classificacoes_incluidas': ['Nenhuma']},
+        'emitente_e_classificacao': {'pessoas_nomes': [frequente], 'classificacoes_incluidas': ['INSUMOS AGRÍCOLAS']},
+        'periodo_valor_e_tipo': {'data_inicio': date(ano, 1, 1), 'data_fim': date(ano, 6, 30),
+                                 'min_valor': 500, 'max_valor': 20000, 'tipo': 'DESPESA'},
+    }
+
+
+def test_movimentos_iguais_ao_filtro_em_python(base):
+    for nome, filtros in casos_movimentos(base).items():
+        esperado = sorted((linha for linha in base['movimentos'] if atende_movimento(linha, filtros)),
+                          key=lambda linha: (linha[3], linha[0]), reverse=True)
+        assert ids_sql('movimentos', filtros) == [linha[0] for linha in esperado], nome
+
+
+def test_casos_cobrem_resultados_vazios_e_nao_vazios(base):
+    casos = casos_movimentos(base)
+    quantidades = {nome: len(ids_sql('movimentos', filtros)) for nome, filtros in casos.items()}
+    assert quantidades['emitente_inexistente'] == quantidades['classificacao_inexistente'] == 0
+    vazios = {nome for nome, n in quantidades.items() if n == 0} - {'emitente_inexistente', 'classificacao_inexistente'}
+    assert not vazios, f'casos sem linhas não testam o filtro: {sorted(vazios)}'
+
+
+def test_ordem_por_valor(base):
+    filtros = {'classificacoes_incluidas': ['INSUMOS AGRÍCOLAS']}
+    linhas = {linha[0]: linha for linha in base['movimentos'] if atende_movimento(linha, filtros)}
+    for crescente in (False, True):
+        ids = ids_sql('movimentos', filtros, por_valor=True, crescente=crescente)
+        assert set(ids) == set(linhas)
+        valores = [linhas[i][4] for i in ids]
+        assert valores == sorted(valores, reverse=not crescente)
+
+
+@pytest.mark.parametrize('status', ['PENDENTE', 'PAGA', None])
+def test_parcelas_iguais_ao_filtro_em_python(base, status):
+    inicio = date(date.today().year, 1, 1)
+    filtros = {'status': status, 'data_inicio': inicio}
+    esperado = sorted(
+        (linha for linha in base['parcelas'] if linha[2] >= inicio and (
+            status is None or (linha[1] == 'PENDENTE') == (status == 'PENDENTE'))),
+        key=lambda linha: (linha[2], linha[0]), reverse=True)
+    assert esperado
+    assert ids_sql('parcelas', filtros) == [linha[0] for linha in esperado]
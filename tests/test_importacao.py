@@ -0,0 +1,134 @@
+"""
+Importação em massa (importacao.py): leitura do CSV e carga com linhas mal formadas.
+
+A leitura (_registros) é testada sem banco. A carga completa roda num schema próprio e é
+pulada sem PostgreSQL.
+"""
+import io
+
+import pytest
+
+import importacao
+
+COLUNAS = ['identificacao', 'datavencimento', 'valorparcela']
+
+
+def ler(conteudo, encoding='utf8', delimitador=';'):
+    rejeitadas = []
+    registros = list(importacao._registros(io.BytesIO(conteudo), COLUNAS, delimitador, encoding, rejeitadas))
+    return registros, [(linha, motivo.split(' ')[0], texto) for linha, motivo, texto in rejeitadas]
+
+
+def test_registros_bem_formados_com_a_linha_fisica():
+    registros, rejeitadas = ler(b'A-1;10/01/2024;100,00\nA-2;11/01/2024;200,00\r\n')
+    assert registros == [(2, ['A-1', '10/01/2024', '100,00']), (3, ['A-2', '11/01/2024', '200,00'])]
+    assert rejeitadas == []
+
+
+def test_campo_entre_aspas_com_quebra_de_linha_nao_desloca_as_linhas_seguintes():
+    registros, rejeitadas = ler(b'"A\n1";10/01/2024;100\nA-2;11/01/2024;200\nA-3;x\n')
+    assert registros == [(2, ['A\n1', '10/01/2024', '100']), (4, ['A-2', '11/01/2024', '200'])]
+    assert rejeitadas == [(5, '2', 'A-3;x')]
+
+
+def test_delimitador_no_fim_e_linhas_em_branco_sao_aceitos():
+    registros, rejeitadas = ler(b'A-1;10/01/2024;100;;\n\nA-2;11/01/2024;200;\n')
+    assert [linha for linha, _ in registros] == [2, 4]
+    assert registros[0][1] == ['A-1', '10/01/2024', '100']
+    assert rejeitadas == []
+
+
+def test_campos_a_mais_ou_a_menos_sao_rejeitados_com_o_texto():
+    registros, rejeitadas = ler(b'A-1;10/01/2024\nA-2;11/01/2024;200;extra\nA-3;12/01/2024;300\n')
+    assert registros == [(4, ['A-3', '12/01/2024', '300'])]
+    assert rejeitadas == [(2, '2', 'A-1;10/01/2024'), (3, '4', 'A-2;11/01/2024;200;extra')]
+
+
+def test_bytes_fora_da_codificacao_rejeitam_so_a_linha():
+    registros, rejeitadas = ler('A-1;10/01/2024;100\nAÇÃO;11/01/2024;200\n'.encode('latin-1')
+                                + b'A-3;12/01/2024;300\n')
+    assert [linha for linha, _ in registros] == [2, 4]
+    assert [(linha, motivo) for linha, motivo, _ in rejeitadas] == [(3, 'bytes')]
+    assert rejeitadas[0][2].startswith('A') and rejeitadas[0][2].endswith(';11/01/2024;200\n')
+    # A mesma linha é válida em latin1
+    registros, rejeitadas = ler('AÇÃO;11/01/2024;200\n'.encode('latin-1'), encoding='latin1')
+    assert registros == [(2, ['AÇÃO', '11/01/2024', '200'])] and rejeitadas == []
+
+
+def test_aspas_mal_formadas_e_sem_fechamento():
+    registros, rejeitadas = ler(b'"A-1"x;10/01/2024;100\nA-2;11/01/2024;200\nA-3;"12/01/2024;300\nA-4;1;2\n')
+    assert registros == [(3, ['A-2', '11/01/2024', '200'])]
+    # Sem fechamento, o registro vai até o fim do arquivo
+    assert [(linha, motivo) for linha, motivo, _ in rejeitadas] == [(2, 'CSV'), (4, 'CSV')]
+    assert rejeitadas[1][2] == 'A-3;"12/01/2024;300\nA-4;1;2'
+
+
+# --- Carga completa, no banco ------------------------------------------------------------
+
+SCHEMA = 'teste_importacao'
+
+
+@pytest.fixture(scope='module')
+def engine():
+    psycopg = pytest.importorskip('psycopg')
+    from sqlalchemy import create_engine
+    from benchmarks.comum import aplicar_migracoes, conectar, recriar_schema, url_conexao
+    try:
+        conn = conectar(SCHEMA)
+    except psycopg.OperationalError as e:
+        pytest.skip(f'PostgreSQL indisponível: {e}')
+    try:
+        recriar_schema(conn, SCHEMA)
+        aplicar_migracoes(conn, '003_pessoas_documento_unico.sql', '004_importacao_historica.sql')
+        engine = create_engine(url_conexao().replace('postgresql://', 'postgresql+psycopg://', 1),
+                               connect_args={'options': f'-c search_path={SCHEMA},public'})
+        yield engine
+        engine.dispose()
+    finally:
+        conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        conn.close()
+
+
+def test_linhas_mal_formadas_nao_abortam_a_carga(engine):
+    conteudo = (
+        'identificacao;datavencimento;valorparcela;statusparcela\n'
+        'P-1;10/01/2024;100,00;PENDENTE\n'
+        'P-2;11/01/2024;200,00\n'                      # campo a menos
+        '"P-3\nbis";12/01/2024;300,00;PAGA;\n'          # quebra de linha entre aspas, ; no fim
+        'P-4;13/01/2024;400,00;PENDENTE;extra\n'        # campo a mais
+    ).encode() + 'PÇ-5;14/01/2024;500,00;PENDENTE\n'.encode('latin-1') + (
+        'P-6;31/02/2024;600,00;PENDENTE\n'              # data inválida (validação em SQL)
+        'P-7;15/01/2024;700,00;PAGA\n'
+    ).encode()
+    resumo = importacao.importar_csv(engine, 'parcelas', io.BytesIO(conteudo), 'parcelas.csv', delimitador=';')
+    assert (resumo['linhas_lidas'], resumo['importadas'], resumo['erros']) == (7, 3, 4)
+
+    with engine.connect() as conexao:
+        from sqlalchemy import text
+        erros = conexao.execute(text("""
+            SELECT linha, motivo, dados FROM importacao_erros WHERE importacao_id = :id ORDER BY linha
+        """), {'id': resumo['importacao_id']}).all()
+        importadas = conexao.execute(text(
+            'SELECT identificacao FROM parcelas_contas ORDER BY identificacao')).scalars().all()
+    assert importadas == ['P-1', 'P-3\nbis', 'P-7']
+    assert [linha for linha, _, _ in erros] == [3, 6, 7, 8]
+    assert erros[0][2] == {'texto': 'P-2;11/01/2024;200,00'}
+    assert 'bytes inválidos' in erros[2][1]
+    assert erros[3][2]['identificacao'] == 'P-6'
+
+
+def test_parcela_ja_cadastrada_e_repetida_no_arquivo(engine):
+    cabecalho = 'identificacao;datavencimento;valorparcela\n'
+    importacao.importar_csv(engine, 'parcelas', io.BytesIO((cabecalho + 'D-1;10/01/2024;100\n').encode()),
+                            'a.csv', delimitador=';')
+    resumo = importacao.importar_csv(engine, 'parcelas', io.BytesIO(
+        (cabecalho + 'D-1;10/01/2024;100\nD-2;11/01/2024;200\nD-2;12/01/2024;300\n').encode()
+    ), 'b.csv', delimitador=';')
+    assert (resumo['importadas'], resumo['erros']) == (1, 2)
+
+    from sqlalchemy import text
+    with engine.connect() as conexao:
+        erros = conexao.execute(text("""
+            SELECT linha, motivo FROM importacao_erros WHERE importacao_id = :id ORDER BY linha
+        """), {'id': resumo['importacao_id']}).all()
+    assert erros == [(2, 'parcela já cadastrada'), (4, 'identificacao repetida no arquivo')]
@@ -0,0 +1,33 @@
+"""Quais comandos lentos podem receber EXPLAIN ANALYZE (perfil_sql.so_leitura), e a forma normalizada."""
+import pytest
+
+import perfil_sql
+
+
+@pytest.mark.parametrize('statement', [
+    'SELECT pessoas."idPessoas" FROM pessoas WHERE pessoas.razaosocial ILIKE %(p_1)s',
+    "SELECT count(*), coalesce(sum(valortotal), 0) FROM movimento_contas WHERE tipo IN (%(t_1)s) AND descricao <> 'nextval(x)'",
+    'WITH m AS (SELECT date_trunc(%(p)s, dataemissao) AS mes FROM movimento_contas) SELECT mes, count(*) FROM m GROUP BY mes',
+    '/* listagem */ SELECT * FROM rag_documentos WHERE classificacao_ids && ARRAY[3, 7] ORDER BY data DESC',
+])
+def test_leituras_puras_recebem_analyze(statement):
+    assert perfil_sql.so_leitura(statement)
+
+
+@pytest.mark.parametrize('statement', [
+    'SELECT pg_advisory_lock(%(k)s)',
+    'SELECT pg_try_advisory_xact_lock(hashtext(%(k)s))',
+    "SELECT nextval('versao_dados_seq')",
+    'SELECT rag_documentos_movimentos(ARRAY[1, 2])',
+    'WITH novo AS (INSERT INTO pessoas (tipo) VALUES (%(t)s) RETURNING "idPessoas") SELECT * FROM novo',
+    'SELECT * FROM parcelas_contas WHERE "idParcelasContas" = %(id)s FOR UPDATE',
+    'UPDATE pessoas SET status = %(s)s',
+    'SET LOCAL statement_timeout = 5000',
+])
+def test_demais_comandos_so_recebem_o_plano_estimado(statement):
+    assert not perfil_sql.so_leitura(statement)
+
+
+def test_normalizar_junta_literais_parametros_e_listas():
+    forma = perfil_sql.normalizar("SELECT *  FROM t\n WHERE a = 'x''y' AND b IN (%(b_1)s, %(b_2)s) AND c > 10")
+    assert forma == 'SELECT * FROM t WHERE a = ? AND b IN (?...) AND c > ?'
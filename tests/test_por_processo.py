@@ -0,0 +1,37 @@
+"""PorProcesso: um objeto por processo, recriado no primeiro uso depois de um fork."""
+import os
+import threading
+
+import por_processo
+
+
+def test_cria_uma_vez_por_processo():
+    criados = []
+    objeto = por_processo.PorProcesso(lambda: criados.append(os.getpid()) or object())
+    primeiro = objeto.garantir()
+    assert objeto.garantir() is primeiro
+    assert criados == [os.getpid()]
+    assert objeto.descartar() is primeiro
+    assert objeto.garantir() is not primeiro and len(criados) == 2
+
+
+def test_thread_renasce_no_filho_do_fork():
+    rodando = threading.Event()
+    fundo = por_processo.thread('teste_por_processo', lambda: rodando.set() or threading.Event().wait())
+    pai = fundo.garantir()
+    assert rodando.wait(5) and pai.is_alive()
+
+    leitura, escrita = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # filho: a thread do pai não existe aqui
+        rodando.clear()
+        filha = fundo.garantir()
+        ok = filha is not pai and rodando.wait(5) and filha.is_alive() and fundo.descartar() is filha
+        os.write(escrita, b'1' if ok else b'0')
+        os._exit(0)
+    os.close(escrita)
+    resposta = os.read(leitura, 1)
+    os.waitpid(pid, 0)
+    os.close(leitura)
+    assert resposta == b'1'
+    assert fundo.garantir() is pai